@@ -22,6 +22,7 @@ from role_api import router as role_router
 from import_data_api import router as import_data_router
 from sales_predict_api import router as sales_predict_router
 from schedule_api import router as schedule_router
+from order_events_api import router as order_events_router
 
 MAX_UPLOAD_SIZE_MB = get_env_int('MAX_UPLOAD_SIZE_MB', 50)
 MAX_UPLOAD_SIZE_BYTES = MAX_UPLOAD_SIZE_MB * 1024 * 1024
@@ -64,6 +65,7 @@ app.include_router(update_data_router)
 app.include_router(role_router)
 app.include_router(import_data_router)
 app.include_router(sales_predict_router)
+app.include_router(order_events_router)
 
 # 環境變數控制是否在8000端口暴露scheduler API
 # 設為 "1" 時才會在8000端口註冊scheduler路由，預設隔離到9000端口
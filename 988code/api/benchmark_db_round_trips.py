@@ -0,0 +1,186 @@
+"""
+GET 端點資料庫往返次數基準測試
+
+直接呼叫各端點函數，包裝連線池的 cursor 計算每個端點實際執行的 SQL 次數。
+每個端點執行兩輪：先將 query_with_columns 換回改版前的做法（先 execute_query 取資料、
+有資料時再開第二條連線重新執行以讀取 cursor.description）量測，再以目前實作量測。
+
+用法（需可連線的資料庫）:
+    python api/benchmark_db_round_trips.py
+"""
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+from starlette.requests import Request
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from env_loader import load_env_file
+
+load_env_file()
+import database_config
+from database_config import db_config
+
+import get_api
+import sales_predict_api
+from reference_cache import reference_cache, PRODUCTS, CUSTOMERS
+
+
+class _CountingCursor:
+    """記錄 execute 次數的 cursor 代理"""
+
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, query, params=None):
+        self._counter['executes'] += 1
+        return self._cursor.execute(query, params)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._cursor.close()
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class _CountingConnection:
+    """記錄連線取用次數的 connection 代理"""
+
+    def __init__(self, conn, counter):
+        self._conn = conn
+        self._counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self._counter)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def _install_counter(counter):
+    """替換 db_config.get_connection，回傳還原函數"""
+    original = db_config.get_connection
+
+    @contextmanager
+    def counting_connection(env=None):
+        with original(env) as conn:
+            counter['connections'] += 1
+            yield _CountingConnection(conn, counter)
+
+    db_config.get_connection = counting_connection
+    return lambda: setattr(db_config, 'get_connection', original)
+
+
+def _legacy_query_with_columns(query, params=(), env=None, as_type='rows'):
+    """改版前的查詢方式：資料與欄位名稱分兩次執行"""
+    rows = db_config.execute_query(query, params, env, fetch='all')
+    columns = []
+    if rows:
+        with db_config.get_connection(env) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                columns = [desc[0] for desc in cursor.description]
+
+    if as_type == 'rows':
+        return rows, columns
+    elif as_type == 'dict':
+        return [dict(zip(columns, row)) for row in rows]
+    import pandas as pd
+    return pd.DataFrame(rows, columns=columns) if rows else pd.DataFrame()
+
+
+@contextmanager
+def _legacy_queries():
+    """暫時以改版前的方式執行 query_with_columns"""
+    db_config.query_with_columns = _legacy_query_with_columns
+    try:
+        yield
+    finally:
+        del db_config.query_with_columns
+
+
+def _stub_request():
+    """不帶 If-None-Match 的請求，供快取端點使用"""
+    return Request({'type': 'http', 'method': 'GET', 'path': '/', 'headers': []})
+
+
+# (名稱, 呼叫方式)
+# 參考資料端點每次呼叫前先清空快取，量測的是實際查詢資料庫的次數
+ENDPOINTS = [
+    ('/get_new_orders', lambda: get_api.get_new_orders()),
+    ('/get_new_item_orders', lambda: get_api.get_new_item_orders()),
+    ('/get_new_item_customers', lambda: get_api.get_new_item_customers()),
+    ('/get_customer_data', lambda: get_api.get_customer_data(page=1, page_size=50, customer_id=None, customer_name=None)),
+    ('/get_restock_customer_ids', lambda: get_api.get_all_customer_ids()),
+    ('/get_restock_data', lambda: get_api.get_customer_latest_transactions(limit=50, offset=0)),
+    ('/get_category', lambda: get_api.get_categories(_stub_request())),
+    ('/get_subcategory', lambda: get_api.get_subcategories(_stub_request())),
+    ('/get_name_zh', lambda: get_api.get_product_names(_stub_request())),
+    ('/get_buy_new_items', lambda: get_api.get_new_products()),
+    ('/get_inventory_data', lambda: get_api.get_inventory_data()),
+    ('/get_customer_ids', lambda: get_api.get_customer_ids(_stub_request())),
+    ('/get_customer_names', lambda: get_api.get_customer_names(_stub_request())),
+    ('/get_repurchase_data', lambda: get_api.get_repurchase_data()),
+    ('/get_inactive_customers', lambda: get_api.get_inactive_customers()),
+    ('/get_sales_change_data', lambda: get_api.get_sales_change_data()),
+    ('/get_recommended_product_ids', lambda: get_api.get_product_recommendations()),
+    ('/get_rag_titles', lambda: get_api.get_rag_titles()),
+    ('/get_monthly_sales_predictions', lambda: get_api.get_monthly_sales_predictions(period=None)),
+    ('/get_delivery_schedule_filtered', lambda: get_api.get_delivery_schedule_filtered(None, None)),
+    ('/get_county', lambda: get_api.get_counties(_stub_request())),
+    ('/get_product_hierarchy', lambda: sales_predict_api.get_product_hierarchy(_stub_request())),
+]
+
+
+def _measure(call, repeat):
+    """執行 repeat 次，回傳 (每次 SQL 執行次數, 每次連線數, 平均耗時毫秒)"""
+    counter = {'executes': 0, 'connections': 0}
+    restore = _install_counter(counter)
+    elapsed = []
+    try:
+        for _ in range(repeat):
+            reference_cache.invalidate(PRODUCTS, CUSTOMERS)
+            start = time.perf_counter()
+            call()
+            elapsed.append(time.perf_counter() - start)
+    finally:
+        restore()
+    return counter['executes'] // repeat, counter['connections'] // repeat, sum(elapsed) / len(elapsed) * 1000
+
+
+def run_benchmark(repeat: int = 3):
+    """執行基準測試並列印每個端點改版前後的往返次數、連線數與平均耗時"""
+    print(f"{'端點':<34}{'改版前':>8}{'改版後':>8}{'連線數':>8}{'改版前(ms)':>12}{'改版後(ms)':>12}")
+    print('-' * 82)
+
+    total_before = 0
+    total_after = 0
+    for name, call in ENDPOINTS:
+        try:
+            with _legacy_queries():
+                before, _, before_ms = _measure(call, repeat)
+            after, connections, after_ms = _measure(call, repeat)
+        except Exception as e:
+            print(f"{name:<34}執行失敗: {e}")
+            continue
+
+        total_before += before
+        total_after += after
+        print(f"{name:<34}{before:>8}{after:>8}{connections:>8}{before_ms:>12.1f}{after_ms:>12.1f}")
+
+    print('-' * 82)
+    print(f"{'合計':<34}{total_before:>8}{total_after:>8}")
+
+
+if __name__ == "__main__":
+    try:
+        run_benchmark()
+    finally:
+        database_config.db_config.close_all_pools()
@@ -0,0 +1,100 @@
+"""
+知識庫文件背景轉換
+
+上傳的 Word / Excel / PDF 在獨立的工作進程中轉為 A4 PDF，API 請求不需等待轉換完成。
+轉換結果依原始檔雜湊保存（rag_conversions），相同檔案重新上傳時直接沿用；
+轉換中的相同檔案只會轉換一次。
+"""
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from rag_attachments import complete_conversion, fail_conversion
+
+logger = logging.getLogger(__name__)
+
+# 轉換工作進程數（可由環境變數調整）
+CONVERSION_WORKERS = int(os.getenv("RAG_CONVERSION_WORKERS", "2"))
+
+# convert_file_to_pdf 支援的副檔名
+SUPPORTED_EXTENSIONS = ('pdf', 'doc', 'docx', 'xls', 'xlsx')
+
+
+def file_extension_of(filename: str) -> str:
+    return filename.lower().rsplit('.', 1)[-1] if '.' in filename else ''
+
+
+def source_hash_of(content: bytes, filename: str) -> str:
+    """原始檔雜湊：轉換方式取決於副檔名，因此一併納入"""
+    return hashlib.sha256(file_extension_of(filename).encode('utf-8') + b'\0' + content).hexdigest()
+
+
+def _convert_in_worker(content: bytes, filename: str):
+    """在工作進程中執行轉換，回傳 (PDF 內容, 錯誤訊息)"""
+    from put_api import convert_file_to_pdf
+    try:
+        return convert_file_to_pdf(content, filename), None
+    except Exception as e:
+        return None, getattr(e, 'detail', None) or str(e)
+
+
+class DocumentConversionPool:
+    """文件轉換工作進程池，完成後寫回附件狀態"""
+
+    def __init__(self, workers: int = CONVERSION_WORKERS):
+        self.workers = max(workers, 1)
+        self._executor = None
+        self._running = {}  # source_hash -> future
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self._executor
+
+    def submit(self, source_hash: str, content: bytes, filename: str):
+        """排入轉換；相同原始檔已在轉換中時不重複排入"""
+        with self._lock:
+            if source_hash in self._running:
+                return
+            try:
+                future = self._get_executor().submit(_convert_in_worker, content, filename)
+            except BrokenProcessPool:
+                # 工作進程異常結束後重建進程池
+                self._executor = None
+                future = self._get_executor().submit(_convert_in_worker, content, filename)
+            self._running[source_hash] = future
+
+        future.add_done_callback(lambda f: self._on_done(source_hash, filename, f))
+        print(f"[API] 文件轉換已排入: {filename} ({source_hash[:8]})")
+
+    def pending_count(self) -> int:
+        """轉換中的檔案數"""
+        with self._lock:
+            return len(self._running)
+
+    def _on_done(self, source_hash: str, filename: str, future):
+        # 先移出轉換中清單再寫回結果：之後上傳的相同檔案若沒有讀到結果，會重新排入轉換
+        with self._lock:
+            self._running.pop(source_hash, None)
+
+        try:
+            pdf_content, error = future.result()
+        except Exception as e:
+            pdf_content, error = None, str(e)
+
+        try:
+            if pdf_content:
+                complete_conversion(source_hash, pdf_content)
+                print(f"[API] 文件轉換完成: {filename} ({len(pdf_content)} bytes)")
+            else:
+                fail_conversion(source_hash, error or '轉換結果為空')
+                print(f"[API ERROR] 文件轉換失敗: {filename}: {error}")
+        except Exception as e:
+            logger.error(f"寫回文件轉換結果失敗 {filename}: {e}")
+
+
+conversion_pool = DocumentConversionPool()
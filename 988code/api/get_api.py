@@ -1,14 +1,16 @@
-from fastapi import APIRouter, HTTPException, Form, Query
+from fastapi import APIRouter, HTTPException, Form, Query, Request
 import sys
 import os
 # 新增資料庫連線管理
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database_config import get_db_connection, execute_query, execute_transaction
+from database_config import get_db_connection, execute_query, execute_transaction, query_with_columns
 from env_loader import load_env_file
+from rag_attachments import ensure_rag_attachment_tables, list_attachments
+from reference_cache import cached_response, fix_latin1, PRODUCTS, CUSTOMERS
 
 # 載入環境變數
 load_env_file()
-from typing import Optional
+from typing import List, Optional
 import psycopg2
 import pandas as pd
 from datetime import datetime
@@ -19,21 +21,8 @@ router = APIRouter()
 # get
 def get_data_from_db(sql_prompt: str, params: tuple = None) -> pd.DataFrame:
     try:
-        # 使用新的資料庫連線系統
-        rows = execute_query(sql_prompt, params or (), fetch='all')
-
-        # 如果沒有結果，返回空 DataFrame
-        if not rows:
-            return pd.DataFrame()
-
-        # 需要獲取列名，使用新的連線方式
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql_prompt, params or ())
-                columns = [desc[0] for desc in cursor.description]
-
-        df = pd.DataFrame(rows, columns=columns)
-        return df
+        # 單次執行同時取得資料與欄位名稱
+        return query_with_columns(sql_prompt, params or (), as_type='dataframe')
     except Exception as e:
         print(f"[DB ERROR] {e}")
         raise
@@ -48,6 +37,136 @@ def get_new_orders():
         print(f"[API ERROR] get_new_orders: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
 
+# 新進訂單頁每次最多回傳的筆數
+NEW_ORDERS_PAGE_SIZE = 200
+
+def escape_like(value: str) -> str:
+    """跳脫 LIKE 萬用字元，讓搜尋詞以字面比對"""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+# 增量同步時往前重疊的秒數，涵蓋較早開始、較晚提交的交易（重複的訂單由前端合併）
+DELTA_OVERLAP_SECONDS = 30
+
+def new_orders_view_filter(status: Optional[str], recent_days: int, search: Optional[str]):
+    """新進訂單頁可見條件，回傳 (SQL 條件, 參數)
+
+    未確認訂單全部顯示；已確認以確認時間、已刪除以更新時間判斷是否超過保留天數，沒有時間記錄的訂單保留
+    """
+    filters = [
+        """NOT COALESCE(
+            (t.status = '1' AND t.confirmed_at < NOW() - make_interval(days => %s))
+            OR (t.status = '2' AND t.updated_at < NOW() - make_interval(days => %s)),
+            false
+        )"""
+    ]
+    params = [recent_days, recent_days]
+
+    if status:
+        filters.append("t.status = %s")
+        params.append(status)
+    if search:
+        filters.append("t.customer_name ILIKE %s")
+        params.append(f"%{escape_like(search)}%")
+
+    return " AND ".join(filters), params
+
+def get_db_now():
+    """資料庫目前時間，作為增量同步的水位"""
+    return execute_query("SELECT NOW()", fetch='one')[0].isoformat()
+
+# 新進訂單頁的可見訂單，客戶備註直接 JOIN
+@router.get("/get_new_orders_view")
+def get_new_orders_view(
+    status: Optional[str] = Query(None, description="訂單狀態：0 未確認、1 已確認、2 已刪除，不指定為全部"),
+    recent_days: int = Query(1, description="已確認/已刪除訂單的保留天數"),
+    search: Optional[str] = Query(None, description="客戶名稱搜尋詞"),
+    cursor: Optional[int] = Query(None, description="上一頁最後一筆訂單ID"),
+    limit: int = Query(NEW_ORDERS_PAGE_SIZE),
+    order_ids: Optional[List[int]] = Query(None, description="只回傳指定ID中符合條件的訂單")
+):
+    print(f"[API] get_new_orders_view 被呼叫，status={status} recent_days={recent_days} search={search} cursor={cursor} limit={limit} order_ids={order_ids}")
+    try:
+        limit = min(max(limit, 1), 1000)
+        # 先取水位再查詢，之後的變更都會出現在下一次增量同步
+        watermark = get_db_now()
+
+        condition, params = new_orders_view_filter(status, recent_days, search)
+        filters = [condition]
+        if order_ids is not None:
+            filters.append("t.id = ANY(%s)")
+            params.append(order_ids)
+        if cursor is not None:
+            filters.append("t.id > %s")
+            params.append(cursor)
+
+        # 多取一筆判斷是否還有下一頁
+        query = f"""
+        SELECT t.*, COALESCE(c.notes, '') AS customer_notes
+        FROM temp_customer_records t
+        LEFT JOIN customer c ON c.customer_id = t.customer_id
+        WHERE {' AND '.join(filters)}
+        ORDER BY t.id
+        LIMIT %s
+        """
+        params.append(limit + 1)
+
+        df = get_data_from_db(query, tuple(params))
+        orders = df.to_dict(orient="records")
+
+        next_cursor = None
+        if len(orders) > limit:
+            orders = orders[:limit]
+            next_cursor = orders[-1]["id"]
+
+        print(f"[API] get_new_orders_view 回傳 {len(orders)} 筆，next_cursor={next_cursor}")
+        return {"orders": orders, "next_cursor": next_cursor, "watermark": watermark}
+    except Exception as e:
+        print(f"[API ERROR] get_new_orders_view: {e}")
+        raise HTTPException(status_code=500, detail="資料庫查詢失敗")
+
+# 新進訂單增量同步：回傳水位之後有變動的訂單，不再符合篩選條件（含超過保留天數）的只回傳ID
+@router.get("/get_new_orders_delta")
+def get_new_orders_delta(
+    since: datetime = Query(..., description="上次同步的水位"),
+    status: Optional[str] = Query(None, description="訂單狀態：0 未確認、1 已確認、2 已刪除，不指定為全部"),
+    recent_days: int = Query(1, description="已確認/已刪除訂單的保留天數"),
+    search: Optional[str] = Query(None, description="客戶名稱搜尋詞")
+):
+    print(f"[API] get_new_orders_delta 被呼叫，since={since} status={status} search={search}")
+    try:
+        watermark = get_db_now()
+        condition, params = new_orders_view_filter(status, recent_days, search)
+
+        query = f"""
+        SELECT t.*, COALESCE(c.notes, '') AS customer_notes, ({condition}) AS is_visible
+        FROM temp_customer_records t
+        LEFT JOIN customer c ON c.customer_id = t.customer_id
+        WHERE t.updated_at >= %s::timestamptz - make_interval(secs => %s)
+           -- 資料未變動但在上次同步後超過保留天數的訂單，一併回傳以移出畫面
+           OR (t.status = '1' AND t.confirmed_at + make_interval(days => %s)
+               BETWEEN %s::timestamptz - make_interval(secs => %s) AND NOW())
+           OR (t.status = '2' AND t.updated_at + make_interval(days => %s)
+               BETWEEN %s::timestamptz - make_interval(secs => %s) AND NOW())
+        ORDER BY t.id
+        """
+        params.extend([since, DELTA_OVERLAP_SECONDS,
+                       recent_days, since, DELTA_OVERLAP_SECONDS,
+                       recent_days, since, DELTA_OVERLAP_SECONDS])
+
+        df = get_data_from_db(query, tuple(params))
+        if df.empty:
+            orders, removed = [], []
+        else:
+            visible = df["is_visible"].astype(bool)
+            orders = df[visible].drop(columns=["is_visible"]).to_dict(orient="records")
+            removed = df.loc[~visible, "id"].tolist()
+
+        print(f"[API] get_new_orders_delta 變更 {len(orders)} 筆，移出 {len(removed)} 筆")
+        return {"orders": orders, "removed": removed, "watermark": watermark}
+    except Exception as e:
+        print(f"[API ERROR] get_new_orders_delta: {e}")
+        raise HTTPException(status_code=500, detail="資料庫查詢失敗")
+
 # 得到新品購買訂單
 @router.get("/get_new_item_orders")
 def get_new_item_orders():
@@ -125,17 +244,9 @@ def get_customer_data(
             else:
                 total_count = execute_query(count_query, (), fetch='one')[0]
 
-            # 獲取資料
+            # 獲取資料（含欄位名稱）
             query_params = tuple(filter_params + [page_size, offset])
-            rows = execute_query(data_query, query_params, fetch='all')
-
-            # 獲取欄位名稱
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(data_query, query_params)
-                    columns = [desc[0] for desc in cursor.description]
-
-            df = pd.DataFrame(rows, columns=columns)
+            df = query_with_columns(data_query, query_params, as_type='dataframe')
 
         except Exception as e:
             print(f"[DB ERROR] get_customer_data: {e}")
@@ -195,13 +306,7 @@ def get_customer_latest_transactions(limit: int = 50, offset: int = 0):
         query_start = time.time()
         
         # 使用統一的資料庫連線系統
-        main_results = execute_query(query, (limit, offset), fetch='all')
-
-        # 獲取欄位名稱
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (limit, offset))
-                column_names = [desc[0] for desc in cursor.description]
+        main_results, column_names = query_with_columns(query, (limit, offset))
 
         # 計數查詢
         count_query = """
@@ -248,10 +353,9 @@ def get_customer_latest_transactions(limit: int = 50, offset: int = 0):
 
 # 得到商品類別列表
 @router.get("/get_category")
-def get_categories():
+def get_categories(request: Request):
     print("[API] get_categories 被呼叫")
-    try:
-        query = """
+    query = """
         SELECT DISTINCT category
         FROM product_master
         WHERE category IS NOT NULL
@@ -262,31 +366,23 @@ def get_categories():
         )
         ORDER BY category
         """
+
+    def load():
         df = get_data_from_db(query)
-        # 修復編碼問題
-        result = []
-        for _, row in df.iterrows():
-            category_name = row["category"]
-            # 嘗試修復編碼問題
-            if isinstance(category_name, str):
-                try:
-                    # 如果是亂碼，嘗試重新編碼
-                    category_name = category_name.encode('latin1').decode('utf-8')
-                except (UnicodeDecodeError, UnicodeEncodeError):
-                    # 如果編碼轉換失敗，保持原值
-                    pass
-            result.append({"category": category_name})
-        return result
+        # 修復編碼問題（只在重新查詢時處理）
+        return [{"category": fix_latin1(name)} for name in df["category"].tolist()]
+
+    try:
+        return cached_response(request, PRODUCTS, 'category', load)
     except Exception as e:
         print(f"[API ERROR] get_categories: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
 
 # 得到商品子類別列表
 @router.get("/get_subcategory")
-def get_subcategories():
+def get_subcategories(request: Request):
     print("[API] get_subcategories 被呼叫")
-    try:
-        query = """
+    query = """
         SELECT DISTINCT subcategory 
         FROM product_master 
         WHERE subcategory IS NOT NULL 
@@ -297,19 +393,21 @@ def get_subcategories():
         ) 
         ORDER BY subcategory
         """
-        df = get_data_from_db(query)
-        return df.to_dict(orient="records")
+    try:
+        return cached_response(request, PRODUCTS, 'subcategory',
+                               lambda: get_data_from_db(query).to_dict(orient="records"))
     except Exception as e:
         print(f"[API ERROR] get_subcategories: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
 
 # 得到商品品項列表
 @router.get("/get_name_zh")
-def get_product_names():
+def get_product_names(request: Request):
     print("[API] get_product_names 被呼叫")
+    query = 'SELECT DISTINCT name_zh FROM product_master WHERE name_zh IS NOT NULL AND is_active = \'active\' ORDER BY name_zh'
     try:
-        df = get_data_from_db('SELECT DISTINCT name_zh FROM product_master WHERE name_zh IS NOT NULL AND is_active = \'active\' ORDER BY name_zh')
-        return df.to_dict(orient="records")
+        return cached_response(request, PRODUCTS, 'name_zh',
+                               lambda: get_data_from_db(query).to_dict(orient="records"))
     except Exception as e:
         print(f"[API ERROR] get_product_names: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
@@ -352,22 +450,24 @@ def get_inventory_data():
 
 # 得到客戶ID和名稱列表
 @router.get("/get_customer_ids")
-def get_customer_ids():
+def get_customer_ids(request: Request):
     print("[API] get_customer_ids 被呼叫")
+    query = 'SELECT customer_id, customer_name FROM customer ORDER BY customer_name'
     try:
-        df = get_data_from_db('SELECT customer_id, customer_name FROM customer ORDER BY customer_name')
-        return df.to_dict(orient="records")
+        return cached_response(request, CUSTOMERS, 'customer_ids',
+                               lambda: get_data_from_db(query).to_dict(orient="records"))
     except Exception as e:
         print(f"[API ERROR] get_customer_ids: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
 
 # 得到客戶名稱列表
 @router.get("/get_customer_names")
-def get_customer_names():
+def get_customer_names(request: Request):
     print("[API] get_customer_names 被呼叫")
+    query = 'SELECT customer_name FROM customer ORDER BY customer_name'
     try:
-        df = get_data_from_db('SELECT customer_name FROM customer ORDER BY customer_name')
-        return df.to_dict(orient="records")
+        return cached_response(request, CUSTOMERS, 'customer_names',
+                               lambda: get_data_from_db(query).to_dict(orient="records"))
     except Exception as e:
         print(f"[API ERROR] get_customer_names: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
@@ -495,32 +595,40 @@ def get_rag_titles():
         print(f"[API ERROR] get_rag_titles: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
 
-# 獲取指定RAG條目的內容
+# 獲取指定RAG條目的內容（附件只回傳中繼資料）
 @router.get("/get_rag_content/{title}")
 def get_rag_content(title: str):
     try:
-        query = "SELECT title, text_content, file_content, file_name FROM rag WHERE title = %s"
+        ensure_rag_attachment_tables()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT title, text_content FROM rag WHERE title = %s", (title,))
+                result = cursor.fetchone()
+                attachments = list_attachments(cursor, title) if result else []
 
-        # 使用統一的資料庫連線系統
-        result = execute_query(query, (title,), fetch='one')
         if result:
-
-            file_names_list = []
-            if result[3] and len(result[3]) > 0:
-                file_names_list = result[3]
-
             return {
                 "title": result[0],
                 "text_content": result[1][0] if result[1] and len(result[1]) > 0 else "",
-                "has_file": result[2] is not None and len(result[2]) > 0,
-                "file_names": file_names_list
+                "has_file": len(attachments) > 0,
+                "file_names": [a['file_name'] for a in attachments],
+                "files": [
+                    {"file_name": a['file_name'], "size_bytes": a['size_bytes'], "mime_type": a['mime_type'],
+                     "status": a['status'], "error": a['error']}
+                    for a in attachments
+                ],
+                "total_size": sum(a['size_bytes'] for a in attachments),
+                "converting_count": sum(1 for a in attachments if a['status'] == 'converting')
             }
         else:
             return {
                 "title": title,
                 "text_content": "",
                 "has_file": False,
-                "file_names": []
+                "file_names": [],
+                "files": [],
+                "total_size": 0,
+                "converting_count": 0
             }
     except Exception as e:
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
@@ -555,15 +663,7 @@ def get_monthly_sales_predictions(period: str = Query(None, description="預測
             ORDER BY subcategory, product_id
             """
             # 使用統一的資料庫連線系統
-            rows = execute_query(query, (period_date,), fetch='all')
-
-            # 獲取欄位名稱
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(query, (period_date,))
-                    columns = [desc[0] for desc in cursor.description]
-
-            df = pd.DataFrame(rows, columns=columns)
+            df = query_with_columns(query, (period_date,), as_type='dataframe')
         else:
             # 沒有指定期間時，使用現有的查詢
             query = """
@@ -615,15 +715,7 @@ def get_delivery_schedule_by_date(delivery_date: str):
         ORDER BY ds.id
         """
         # 使用統一的資料庫連線系統
-        rows = execute_query(query, (delivery_date,), fetch='all')
-
-        # 獲取欄位名稱
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(query, (delivery_date,))
-                columns = [desc[0] for desc in cursor.description]
-
-        df = pd.DataFrame(rows, columns=columns)
+        df = query_with_columns(query, (delivery_date,), as_type='dataframe')
         
         return df.to_dict(orient="records")
     except Exception as e:
@@ -663,16 +755,8 @@ def get_delivery_schedule_by_category(category: str):
             WHERE pm.category = %s
             ORDER BY ds.delivery_date DESC, ds.id
             """
-        # 使用統一的資料庫連線系統
-            rows = execute_query(query, (category,), fetch='all')
-
-            # 獲取欄位名稱
-            with get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(query, (category,))
-                    columns = [desc[0] for desc in cursor.description]
-
-            df = pd.DataFrame(rows, columns=columns)
+            # 使用統一的資料庫連線系統
+            df = query_with_columns(query, (category,), as_type='dataframe')
         
         return df.to_dict(orient="records")
     except Exception as e:
@@ -717,15 +801,7 @@ def get_delivery_schedule_filtered(delivery_date: str = None, category: str = No
         base_query += " ORDER BY ds.delivery_date DESC, ds.id"
         
         # 使用統一的資料庫連線系統
-        rows = execute_query(base_query, tuple(params), fetch='all')
-
-        # 獲取欄位名稱
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(base_query, tuple(params))
-                columns = [desc[0] for desc in cursor.description]
-
-        df = pd.DataFrame(rows, columns=columns)
+        df = query_with_columns(base_query, tuple(params), as_type='dataframe')
         
         print(f"[API] 查詢成功，返回 {len(df)} 筆資料")
         return df.to_dict(orient="records")
@@ -740,40 +816,35 @@ def get_delivery_schedule_filtered(delivery_date: str = None, category: str = No
 
 # 得到縣市列表
 @router.get("/get_county")
-def get_counties():
+def get_counties(request: Request):
     print("[API] get_counties 被呼叫")
-    try:
-        query = "SELECT DISTINCT city FROM customer WHERE city IS NOT NULL AND city != '' ORDER BY city"
+    query = "SELECT DISTINCT city FROM customer WHERE city IS NOT NULL AND city != '' ORDER BY city"
+
+    def load():
         df = get_data_from_db(query)
-        # 將欄位名稱從 city 改為 county 以符合前端期望，並修復編碼問題
-        result = []
-        for _, row in df.iterrows():
-            city_name = row["city"]
-            # 嘗試修復編碼問題
-            if isinstance(city_name, str):
-                try:
-                    # 如果是亂碼，嘗試重新編碼
-                    city_name = city_name.encode('latin1').decode('utf-8')
-                except (UnicodeDecodeError, UnicodeEncodeError):
-                    # 如果編碼轉換失敗，保持原值
-                    pass
-            result.append({"county": city_name})
-        return result
+        # 將欄位名稱從 city 改為 county 以符合前端期望，並修復編碼問題（只在重新查詢時處理）
+        return [{"county": fix_latin1(name)} for name in df["city"].tolist()]
+
+    try:
+        return cached_response(request, CUSTOMERS, 'county', load)
     except Exception as e:
         print(f"[API ERROR] get_counties: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
 
 # 得到地區列表（根據縣市篩選）
 @router.get("/get_region")
-def get_regions(county: str = Query(..., description="縣市名稱")):
+def get_regions(request: Request, county: str = Query(..., description="縣市名稱")):
     print(f"[API] get_regions 被呼叫，縣市: {county}")
-    try:
+    query = "SELECT DISTINCT district FROM customer WHERE city = %s AND district IS NOT NULL AND district != '' ORDER BY district"
+
+    def load():
         # 使用統一的資料庫連線系統
-        query = "SELECT DISTINCT district FROM customer WHERE city = %s AND district IS NOT NULL AND district != '' ORDER BY district"
         rows = execute_query(query, (county,), fetch='all')
         # 將結果轉換為所需格式
-        result = [{"region": row[0]} for row in rows]
-        return result
+        return [{"region": row[0]} for row in rows]
+
+    try:
+        return cached_response(request, CUSTOMERS, ('region', county), load)
     except Exception as e:
         print(f"[API ERROR] get_regions: {e}")
         raise HTTPException(status_code=500, detail="資料庫查詢失敗")
@@ -3,7 +3,7 @@ import sys
 import os
 # 新增資料庫連線管理
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from database_config import get_db_connection, execute_query, execute_transaction
+from database_config import execute_query, execute_transaction, query_with_columns
 from env_loader import load_env_file
 
 # 載入環境變數
@@ -17,14 +17,8 @@ router = APIRouter()
 # 需要新增一個支援參數的資料庫查詢函數
 def get_data_from_db_with_params(sql_prompt: str, params: tuple = ()) -> pd.DataFrame:
     try:
-        # 使用新的資料庫連線管理系統
-        with get_db_connection() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute(sql_prompt, params)
-                rows = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-                df = pd.DataFrame(rows, columns=columns)
-        return df
+        # 使用新的資料庫連線管理系統，單次執行同時取得欄位名稱
+        return query_with_columns(sql_prompt, params, as_type='dataframe')
     except Exception as e:
         print(f"[DB ERROR] {e}")
         raise
@@ -7,6 +7,7 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database_config import get_db_connection, execute_query, execute_transaction
 from env_loader import load_env_file
+from reference_cache import invalidate_reference_cache, PRODUCTS, CUSTOMERS
 
 # 載入環境變數
 load_env_file()
@@ -17,12 +18,14 @@ import os
 import pandas as pd
 import random
 import string
+import io
+import csv
 import openpyxl
 from openpyxl import load_workbook
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import logging
-from typing import List, Dict, Optional, Tuple
+from typing import List, Dict, Optional, Tuple, Iterator
 
 # 設置日誌
 logging.basicConfig(level=logging.INFO)
@@ -38,9 +41,75 @@ def check_editor_permission(user_role: str):
 # 備用配置
 DEFAULT_CONFIG = {
     'batch_size': 100,
-    'timeout': 30
+    'timeout': 30,
+    'transaction_id_attempts': 10
 }
 
+# 銷貨記錄寫入 order_transactions 的欄位（不含 is_active 與 created_at）
+SALES_RECORD_COLUMNS = [
+    'transaction_id', 'customer_id', 'product_id', 'product_name',
+    'transaction_date', 'document_type', 'quantity', 'unit_price',
+    'currency', 'amount'
+]
+
+# COPY 時代表 NULL 的字串（預設 CSV 格式會把空字串也當成 NULL）
+COPY_NULL = r'\N'
+
+# Excel 數據起始行
+DATA_START_ROW = 8
+
+def iter_excel_rows(file_path: str, min_row: int = DATA_START_ROW) -> Iterator[Tuple[int, tuple]]:
+    """
+    以唯讀串流模式逐行讀取 Excel 作用中工作表，不將整個活頁簿載入記憶體
+    
+    Args:
+        file_path (str): Excel 文件路徑
+        min_row (int): 起始行號
+        
+    Yields:
+        tuple: (行號, 該行儲存格值)
+    """
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook.active
+        logger.info(f"工作表名稱: {worksheet.title}")
+        
+        # ERP 匯出檔的尺寸資訊常不正確，重設後讀到實際最後一行
+        worksheet.reset_dimensions()
+        
+        for row_number, values in enumerate(worksheet.iter_rows(min_row=min_row, values_only=True), start=min_row):
+            yield row_number, values
+    finally:
+        workbook.close()
+
+def cell_value(values: tuple, column: int):
+    """取得指定欄（從 1 開始）的值，唯讀模式下較短的行視為空值"""
+    return values[column - 1] if column <= len(values) else None
+
+def fetch_existing_ids(connection, table: str, column: str, ids) -> set:
+    """
+    以單次 = ANY(%s) 查詢取得資料表中已存在的 ID
+    
+    Args:
+        connection: 資料庫連線
+        table (str): 資料表名稱
+        column (str): ID 欄位名稱
+        ids (iterable): 要檢查的 ID
+        
+    Returns:
+        set: 已存在的 ID 集合
+    """
+    unique_ids = list({str(i).strip() for i in ids if i and str(i).strip()})
+    if not unique_ids:
+        return set()
+    
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT DISTINCT {column} FROM {table} WHERE {column} = ANY(%s)",
+            (unique_ids,)
+        )
+        return {row[0] for row in cursor.fetchall()}
+
 class SalesDataUploader:
     def __init__(self):
         """初始化數據上傳器"""
@@ -181,6 +250,43 @@ class SalesDataUploader:
         uuid_suffix = str(uuid.uuid4())[:2]
         return random_id + uuid_suffix
     
+    def generate_transaction_ids(self, count: int) -> List[str]:
+        """
+        在記憶體中批量生成不重複的 transaction_id，並以單次查詢排除資料庫中已存在的 ID
+        
+        Args:
+            count (int): 需要的 ID 數量
+            
+        Returns:
+            list: 長度為 count 的唯一 transaction_id 列表
+        """
+        alphabet = string.ascii_lowercase + string.digits
+        ids = set()
+        
+        for _ in range(DEFAULT_CONFIG['transaction_id_attempts']):
+            while len(ids) < count:
+                ids.add(''.join(random.choices(alphabet, k=8)))
+            
+            if not self.connection:
+                break
+            
+            with self.connection.cursor() as cursor:
+                cursor.execute(
+                    f"SELECT transaction_id FROM {self.table_config['order_transactions']} WHERE transaction_id = ANY(%s)",
+                    (list(ids),)
+                )
+                existing = {row[0] for row in cursor.fetchall()}
+            
+            if not existing:
+                break
+            
+            logger.info(f"transaction_id 與資料庫重複 {len(existing)} 筆，重新生成")
+            ids -= existing
+        else:
+            raise Exception("無法生成不重複的 transaction_id")
+        
+        return list(ids)
+    
     def transaction_id_exists(self, transaction_id: str) -> bool:
         """
         檢查 transaction_id 是否已存在
@@ -270,6 +376,40 @@ class SalesDataUploader:
                 pass
             return False
 
+    def get_existing_customers_and_products(self, data: List[Dict]) -> Tuple[set, set]:
+        """
+        以單次查詢取得數據中已存在的客戶與產品
+        
+        Args:
+            data (list): 交易記錄列表
+            
+        Returns:
+            tuple: (已存在的客戶ID集合, 已存在的產品ID集合)
+        """
+        if not self.connection:
+            raise Exception("數據庫未連接")
+        
+        customer_ids = list({(record.get('customer_id') or '').strip() for record in data} - {''})
+        product_ids = list({(record.get('product_id') or '').strip() for record in data} - {''})
+        
+        if not customer_ids and not product_ids:
+            return set(), set()
+        
+        with self.connection.cursor() as cursor:
+            query = f"""
+            SELECT DISTINCT 'customer', customer_id FROM {self.table_config['customer']}
+            WHERE customer_id = ANY(%s)
+            UNION ALL
+            SELECT DISTINCT 'product', product_id FROM {self.table_config['product_master']}
+            WHERE product_id = ANY(%s)
+            """
+            cursor.execute(query, (customer_ids, product_ids))
+            rows = cursor.fetchall()
+        
+        existing_customers = {value for kind, value in rows if kind == 'customer'}
+        existing_products = {value for kind, value in rows if kind == 'product'}
+        return existing_customers, existing_products
+    
     def get_missing_products(self, data: List[Dict]) -> List[str]:
         """
         檢查數據中哪些產品不存在於 product_master 表中
@@ -284,18 +424,12 @@ class SalesDataUploader:
             raise Exception("數據庫未連接")
         
         # 提取所有唯一的產品ID
-        unique_product_ids = set()
-        for record in data:
-            product_id = record.get('product_id')
-            if product_id and product_id.strip():
-                unique_product_ids.add(product_id.strip())
-        
-        missing_products = []
+        unique_product_ids = {(record.get('product_id') or '').strip() for record in data} - {''}
+        existing = fetch_existing_ids(self.connection, self.table_config['product_master'], 'product_id', unique_product_ids)
         
-        for product_id in unique_product_ids:
-            if not self.check_product_exists(product_id):
-                missing_products.append(product_id)
-                logger.info(f"發現新產品ID: {product_id}")
+        missing_products = sorted(unique_product_ids - existing)
+        for product_id in missing_products:
+            logger.info(f"發現新產品ID: {product_id}")
         
         return missing_products
 
@@ -317,14 +451,16 @@ class SalesDataUploader:
         skipped_products = set()
         skipped_count = 0
         
+        # 單次查詢取得所有已存在的客戶與產品
+        existing_customers, existing_products = self.get_existing_customers_and_products(data)
+        
         for record in data:
             customer_id = record.get('customer_id', '').strip()
             product_id = record.get('product_id', '').strip()
             
-            # 檢查客戶是否存在
-            customer_exists = self.check_customer_exists(customer_id) if customer_id else False
-            # 檢查產品是否存在  
-            product_exists = self.check_product_exists(product_id) if product_id else False
+            # 檢查客戶與產品是否存在
+            customer_exists = customer_id in existing_customers
+            product_exists = product_id in existing_products
             
             if customer_exists and product_exists:
                 # 客戶和產品都存在，記錄有效
@@ -360,11 +496,17 @@ class SalesDataUploader:
         skipped_customers = set()
         skipped_count = 0
         
+        # 單次查詢取得所有已存在的客戶
+        existing_customers = fetch_existing_ids(
+            self.connection, self.table_config['customer'], 'customer_id',
+            (record.get('customer_id') for record in data)
+        )
+        
         for record in data:
             customer_id = record.get('customer_id', '').strip()
             
             # 檢查客戶是否存在
-            customer_exists = self.check_customer_exists(customer_id) if customer_id else False
+            customer_exists = customer_id in existing_customers
             
             if customer_exists:
                 # 客戶存在，記錄有效
@@ -380,10 +522,12 @@ class SalesDataUploader:
         logger.info(f"客戶記錄過濾完成: 有效={len(valid_records)}, 跳過={skipped_count}")
         return valid_records, skipped_count, list(skipped_customers)
 
-    def process_file_with_product_check(self, file_path: str, delete_month_records: bool = True) -> Tuple[int, int, int, List[str], List[str]]:
+    def process_file_with_product_check(self, file_path: str, delete_month_records: bool = True, bulk: bool = True) -> Tuple[int, int, int, List[str], List[str]]:
         """
         處理整個流程：解析文件 -> 上傳存在的記錄 -> 返回缺失項目列表
         
+        bulk 為 True 時使用 COPY 暫存表的批量匯入模式
+        
         Returns:
             tuple: (刪除記錄數, 插入記錄數, 跳過記錄數, 缺失客戶列表, 缺失產品列表)
         """
@@ -396,7 +540,7 @@ class SalesDataUploader:
             
             # 1. 解析 Excel 文件
             logger.info("解析 Excel 文件以提取數據...")
-            data = self.parse_sales_data(file_path)
+            data = self.parse_sales_data(file_path, generate_ids=not bulk)
             
             # 2. 過濾有效記錄（混合模式：上傳存在的，返回缺失的）
             valid_records, skipped_count, skipped_customers, skipped_products = self.filter_valid_records(data)
@@ -406,14 +550,8 @@ class SalesDataUploader:
             
             # 3. 上傳有效記錄（即使有跳過的記錄也要上傳）
             if valid_records:
-                # 從有效記錄中提取月份資訊進行刪除
-                months_to_delete = self.extract_months_from_data(valid_records)
-                
-                if delete_month_records and months_to_delete:
-                    deleted_count = self.delete_records_by_months(months_to_delete)
-                
-                # 插入有效記錄
-                inserted_count = self.insert_all_records(valid_records)
+                # 刪除有效記錄涉及的月份後插入
+                deleted_count, inserted_count = self.replace_month_records(valid_records, delete_month_records, bulk)
             else:
                 inserted_count = 0
             
@@ -437,67 +575,46 @@ class SalesDataUploader:
             raise Exception("數據庫未連接")
         
         # 提取所有唯一的客戶ID
-        unique_customer_ids = set()
-        for record in data:
-            customer_id = record.get('customer_id')
-            if customer_id and customer_id.strip():
-                unique_customer_ids.add(customer_id.strip())
-        
-        missing_customers = []
+        unique_customer_ids = {(record.get('customer_id') or '').strip() for record in data} - {''}
+        existing = fetch_existing_ids(self.connection, self.table_config['customer'], 'customer_id', unique_customer_ids)
         
-        for customer_id in unique_customer_ids:
-            if not self.check_customer_exists(customer_id):
-                missing_customers.append(customer_id)
-                logger.info(f"發現新客戶ID: {customer_id}")
+        missing_customers = sorted(unique_customer_ids - existing)
+        for customer_id in missing_customers:
+            logger.info(f"發現新客戶ID: {customer_id}")
         
         return missing_customers
     
-    def parse_sales_data(self, file_path: str) -> List[Dict]:
+    def iter_sales_data(self, file_path: str, generate_ids: bool = True) -> Iterator[Dict]:
         """
-        解析 Excel 文件，提取交易數據
+        以串流方式逐筆產生 Excel 文件中的交易數據
         
         Args:
             file_path (str): Excel 文件路徑
+            generate_ids (bool): 是否逐筆生成 transaction_id（批量匯入時由 bulk_import_records 統一生成）
         
-        Returns:
-            list: 包含所有交易記錄的列表
+        Yields:
+            dict: 交易記錄
         """
         logger.info(f"開始解析文件: {file_path}")
         
-        # 使用 openpyxl 讀取 Excel 文件
-        workbook = load_workbook(file_path, data_only=True)
-        worksheet = workbook.active
-        
-        logger.info(f"工作表名稱: {worksheet.title}")
-        logger.info(f"數據範圍: {worksheet.calculate_dimension()}")
-        
-        # 獲取最大行數和列數
-        max_row = worksheet.max_row
-        max_col = worksheet.max_column
-        
-        logger.info(f"總行數: {max_row}, 總列數: {max_col}")
-        
-        # 數據從第8行開始
-        data = []
-        
         # 用於向前填充的變量
         current_customer_id = ''
         current_product_id = ''
         current_product_name = ''
         current_currency = ''
         
-        # 遍歷從第8行開始的所有行
-        for row in range(8, max_row + 1):
+        # 數據從第8行開始
+        for row, values in iter_excel_rows(file_path):
             # 獲取各列的值
-            customer_id_cell = worksheet.cell(row=row, column=1).value    # A列
-            product_id_cell = worksheet.cell(row=row, column=6).value     # F列
-            product_name_cell = worksheet.cell(row=row, column=11).value  # K列
-            transaction_date = worksheet.cell(row=row, column=14).value   # N列
-            document_type = worksheet.cell(row=row, column=17).value or '' # Q列
-            quantity = worksheet.cell(row=row, column=19).value           # S列
-            unit_price = worksheet.cell(row=row, column=22).value or 0    # V列
-            currency_cell = worksheet.cell(row=row, column=25).value      # Y列
-            amount = worksheet.cell(row=row, column=26).value or 0        # Z列
+            customer_id_cell = cell_value(values, 1)     # A列
+            product_id_cell = cell_value(values, 6)      # F列
+            product_name_cell = cell_value(values, 11)   # K列
+            transaction_date = cell_value(values, 14)    # N列
+            document_type = cell_value(values, 17) or '' # Q列
+            quantity = cell_value(values, 19)            # S列
+            unit_price = cell_value(values, 22) or 0     # V列
+            currency_cell = cell_value(values, 25)       # Y列
+            amount = cell_value(values, 26) or 0         # Z列
             
             # 向前填充邏輯
             if customer_id_cell and str(customer_id_cell).strip():
@@ -515,9 +632,9 @@ class SalesDataUploader:
             # 檢查是否有關鍵數據
             if transaction_date and quantity is not None and quantity != '':
                 # 生成唯一的 transaction_id
-                unique_transaction_id = self.generate_unique_transaction_id()
+                unique_transaction_id = self.generate_unique_transaction_id() if generate_ids else None
                 
-                record = {
+                yield {
                     'transaction_id': unique_transaction_id,
                     'customer_id': current_customer_id,
                     'product_id': current_product_id, 
@@ -529,8 +646,19 @@ class SalesDataUploader:
                     'currency': current_currency,
                     'amount': amount
                 }
-                
-                data.append(record)
+    
+    def parse_sales_data(self, file_path: str, generate_ids: bool = True) -> List[Dict]:
+        """
+        解析 Excel 文件，提取交易數據
+        
+        Args:
+            file_path (str): Excel 文件路徑
+            generate_ids (bool): 是否逐筆生成 transaction_id（批量匯入時由 bulk_import_records 統一生成）
+        
+        Returns:
+            list: 包含所有交易記錄的列表
+        """
+        data = list(self.iter_sales_data(file_path, generate_ids))
         
         logger.info(f"解析完成，共 {len(data)} 筆交易記錄")
         return data
@@ -657,7 +785,124 @@ class SalesDataUploader:
             logger.error(f"數據插入失敗: {str(e)}")
             raise
     
-    def process_file_with_customer_check(self, file_path: str, delete_month_records: bool = True) -> Tuple[int, int, int, List[str]]:
+    def bulk_import_records(self, data: List[Dict], months_to_delete: set = None) -> Tuple[int, int]:
+        """
+        批量匯入記錄：COPY 到暫存表後一次合併，刪除月份與寫入在同一個事務內完成
+        
+        產品的 is_active 狀態在合併時以單次 JOIN product_master 取得，
+        transaction_id 於記憶體中生成並以單次查詢確認不與既有資料重複
+        
+        Args:
+            data (list): 交易記錄列表
+            months_to_delete (set): 要先刪除的 (年份, 月份) 集合，None 表示不刪除
+            
+        Returns:
+            tuple: (刪除記錄數, 插入記錄數)
+        """
+        if not self.connection:
+            raise Exception("數據庫未連接")
+        
+        if not data:
+            return 0, 0
+        
+        table = self.table_config['order_transactions']
+        columns = ', '.join(SALES_RECORD_COLUMNS)
+        deleted_count = 0
+        
+        try:
+            logger.info(f"開始批量匯入 {len(data)} 筆記錄")
+            transaction_ids = self.generate_transaction_ids(len(data))
+            
+            # 準備 COPY 用的 CSV 內容（None 寫成 \N，空字串保留為空字串）
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            for record, transaction_id in zip(data, transaction_ids):
+                record['transaction_id'] = transaction_id
+                writer.writerow([COPY_NULL if record[col] is None else record[col] for col in SALES_RECORD_COLUMNS])
+            buffer.seek(0)
+            
+            with self.connection.cursor() as cursor:
+                # 1. 刪除涉及月份的記錄
+                for year, month in sorted(months_to_delete or []):
+                    cursor.execute(f"""
+                    DELETE FROM {table}
+                    WHERE EXTRACT(YEAR FROM transaction_date) = %s 
+                      AND EXTRACT(MONTH FROM transaction_date) = %s
+                    """, (year, month))
+                    deleted_count += cursor.rowcount
+                    logger.info(f"刪除了 {cursor.rowcount} 筆 {year}年{month}月 的記錄")
+                
+                # 2. 建立與目標表欄位型別一致的暫存表並 COPY 載入
+                cursor.execute(f"""
+                CREATE TEMP TABLE order_transactions_staging ON COMMIT DROP AS
+                SELECT {columns} FROM {table} WITH NO DATA
+                """)
+                cursor.copy_expert(
+                    f"COPY order_transactions_staging ({columns}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                    buffer
+                )
+                
+                # 3. 合併到正式表，同時帶入產品 is_active 狀態
+                cursor.execute(f"""
+                INSERT INTO {table} ({columns}, is_active, created_at)
+                SELECT {', '.join('s.' + col for col in SALES_RECORD_COLUMNS)}, pm.is_active, %s
+                FROM order_transactions_staging s
+                LEFT JOIN (
+                    SELECT DISTINCT ON (product_id) product_id, is_active
+                    FROM {self.table_config['product_master']}
+                    WHERE product_id IN (SELECT DISTINCT product_id FROM order_transactions_staging)
+                    ORDER BY product_id
+                ) pm ON pm.product_id = s.product_id
+                ON CONFLICT DO NOTHING
+                """, (datetime.datetime.now(),))
+                inserted_count = cursor.rowcount
+            
+            self.connection.commit()
+            
+            skipped = len(data) - inserted_count
+            if skipped:
+                logger.warning(f"跳過重複記錄 {skipped} 筆")
+            logger.info(f"批量匯入完成 - 刪除: {deleted_count} 筆, 插入: {inserted_count} 筆")
+            
+            return deleted_count, inserted_count
+            
+        except Exception as e:
+            self.connection.rollback()
+            logger.error(f"批量匯入失敗: {str(e)}")
+            raise
+    
+    def replace_month_records(self, records: List[Dict], delete_month_records: bool = True, bulk: bool = True) -> Tuple[int, int]:
+        """
+        刪除記錄涉及的月份後寫入記錄
+        
+        Args:
+            records (list): 交易記錄列表
+            delete_month_records (bool): 是否刪除涉及月份記錄
+            bulk (bool): 是否使用批量匯入模式
+            
+        Returns:
+            tuple: (刪除記錄數, 插入記錄數)
+        """
+        months_to_delete = self.extract_months_from_data(records)
+        logger.info(f"Excel 中包含的月份: {sorted(list(months_to_delete))}")
+        
+        if bulk:
+            return self.bulk_import_records(records, months_to_delete if delete_month_records else None)
+        
+        deleted_count = 0
+        if delete_month_records and months_to_delete:
+            logger.info(f"開始刪除 {len(months_to_delete)} 個月份的記錄...")
+            deleted_count = self.delete_records_by_months(months_to_delete)
+        
+        # 舊流程需要逐筆的 transaction_id
+        for record in records:
+            if not record.get('transaction_id'):
+                record['transaction_id'] = self.generate_unique_transaction_id()
+        
+        inserted_count = self.insert_all_records(records)
+        return deleted_count, inserted_count
+    
+    def process_file_with_customer_check(self, file_path: str, delete_month_records: bool = True, bulk: bool = True) -> Tuple[int, int, int, List[str]]:
         """
         處理整個流程：解析文件 -> 過濾有效記錄（只檢查客戶）-> 上傳資料
         
@@ -677,7 +922,7 @@ class SalesDataUploader:
             
             # 1. 解析 Excel 文件
             logger.info("解析 Excel 文件以提取數據...")
-            data = self.parse_sales_data(file_path)
+            data = self.parse_sales_data(file_path, generate_ids=not bulk)
             
             # 2. 過濾有效記錄（只檢查客戶，跳過缺失的客戶）
             valid_records, skipped_count, skipped_customers = self.filter_valid_records_by_customer(data)
@@ -690,17 +935,8 @@ class SalesDataUploader:
                 logger.warning("沒有有效記錄可以上傳")
                 return 0, 0, skipped_count, skipped_customers
             
-            # 4. 從有效記錄中提取月份資訊進行刪除
-            months_to_delete = self.extract_months_from_data(valid_records)
-            logger.info(f"Excel 中包含的月份: {sorted(list(months_to_delete))}")
-            
-            # 5. 刪除這些月份的所有記錄（如果需要）
-            if delete_month_records and months_to_delete:
-                logger.info(f"開始刪除 {len(months_to_delete)} 個月份的記錄...")
-                deleted_count = self.delete_records_by_months(months_to_delete)
-            
-            # 6. 插入有效記錄
-            inserted_count = self.insert_all_records(valid_records)
+            # 4. 刪除有效記錄涉及的月份後插入
+            deleted_count, inserted_count = self.replace_month_records(valid_records, delete_month_records, bulk)
             
             return deleted_count, inserted_count, skipped_count, skipped_customers
             
@@ -708,13 +944,14 @@ class SalesDataUploader:
             # 關閉數據庫連接
             self.close_connection()
 
-    def process_file(self, file_path: str, delete_month_records: bool = True) -> Tuple[int, int]:
+    def process_file(self, file_path: str, delete_month_records: bool = True, bulk: bool = True) -> Tuple[int, int]:
         """
         處理整個流程：解析文件 -> 刪除涉及月份記錄 -> 上傳數據庫
         
         Args:
             file_path (str): Excel 文件路徑
             delete_month_records (bool): 是否刪除涉及月份記錄，默認為 True
+            bulk (bool): 是否使用批量匯入模式，默認為 True
             
         Returns:
             tuple: (刪除記錄數, 插入記錄數)
@@ -728,19 +965,10 @@ class SalesDataUploader:
             
             # 1. 先解析 Excel 文件
             logger.info("解析 Excel 文件以提取月份信息...")
-            data = self.parse_sales_data(file_path)
-            
-            # 2. 從數據中提取所有涉及的年月
-            months_to_delete = self.extract_months_from_data(data)
-            logger.info(f"Excel 中包含的月份: {sorted(list(months_to_delete))}")
+            data = self.parse_sales_data(file_path, generate_ids=not bulk)
             
-            # 3. 刪除這些月份的所有記錄（如果需要）
-            if delete_month_records and months_to_delete:
-                logger.info(f"開始刪除 {len(months_to_delete)} 個月份的記錄...")
-                deleted_count = self.delete_records_by_months(months_to_delete)
-            
-            # 4. 直接插入新記錄
-            inserted_count = self.insert_all_records(data)
+            # 2. 刪除涉及月份的記錄後插入新記錄
+            deleted_count, inserted_count = self.replace_month_records(data, delete_month_records, bulk)
             
             return deleted_count, inserted_count
             
@@ -887,6 +1115,7 @@ async def create_customer(customer_data: dict):
                     current_time   # updated_date
                 ))
                 uploader.connection.commit()
+                invalidate_reference_cache(CUSTOMERS)
                 
                 # 回傳包含時間資訊的回應
                 return JSONResponse(
@@ -1049,6 +1278,7 @@ async def create_product(product_data: dict):
                 ))
 
                 uploader.connection.commit()
+                invalidate_reference_cache(PRODUCTS)
                 
                 return JSONResponse(
                     status_code=200,
@@ -1102,124 +1332,119 @@ class InventoryDataUploader:
             self.db_manager.__exit__(None, None, None)
             logger.info("庫存數據庫連接已關閉")
     
-    def parse_inventory_data(self, file_path: str) -> List[Dict]:
+    def iter_inventory_data(self, file_path: str) -> Iterator[Dict]:
         """
-        解析庫存 Excel 文件，提取庫存數據
+        以串流方式逐筆產生庫存 Excel 文件中的庫存數據
         
         Args:
             file_path (str): Excel 文件路徑
         
-        Returns:
-            list: 包含所有庫存記錄的列表
+        Yields:
+            dict: 庫存記錄
         """
         logger.info(f"開始解析庫存文件: {file_path}")
         
-        try:
-            # 使用 openpyxl 讀取 Excel 文件
-            workbook = load_workbook(file_path, data_only=True)
-            worksheet = workbook.active
-            
-            logger.info(f"工作表名稱: {worksheet.title}")
-            logger.info(f"數據範圍: {worksheet.calculate_dimension()}")
-            
-            # 獲取最大行數和列數
-            max_row = worksheet.max_row
-            max_col = worksheet.max_column
-            
-            logger.info(f"總行數: {max_row}, 總列數: {max_col}")
-            
-            # 根據您的 Excel 格式，數據從第8行開始（跳過標題和空行）
-            data = []
-            
-            # 遍歷從第8行開始的所有行
-            for row in range(8, max_row + 1):
-                # 根據您的 Excel 格式獲取各列的值
-                # 根據真實 Excel 格式獲取各列的值
-                product_id_cell = worksheet.cell(row=row, column=1).value        # A列: 產品編號
-                product_name_cell = worksheet.cell(row=row, column=4).value      # B列: 品名現況（保持原樣）
-                category_cell = worksheet.cell(row=row, column=8).value          # C列: 類別（保持原樣）
-                warehouse_name_cell = worksheet.cell(row=row, column=10).value   # J列: 倉庫名稱
-                total_quantity_cell = worksheet.cell(row=row, column=13).value   # M列: 數量
-                borrowed_out_cell = worksheet.cell(row=row, column=15).value     # O列: 借出數量
-                borrowed_in_cell = worksheet.cell(row=row, column=18).value      # R列: 借入數量
-                stock_quantity_cell = worksheet.cell(row=row, column=20).value   # T列: 實際在庫量
-                unit_cell = worksheet.cell(row=row, column=23).value            # W列: 單位
+        # 根據您的 Excel 格式，數據從第8行開始（跳過標題和空行）
+        for row, values in iter_excel_rows(file_path):
+            # 根據真實 Excel 格式獲取各列的值
+            product_id_cell = cell_value(values, 1)        # A列: 產品編號
+            product_name_cell = cell_value(values, 4)      # B列: 品名現況（保持原樣）
+            category_cell = cell_value(values, 8)          # C列: 類別（保持原樣）
+            warehouse_name_cell = cell_value(values, 10)   # J列: 倉庫名稱
+            total_quantity_cell = cell_value(values, 13)   # M列: 數量
+            borrowed_out_cell = cell_value(values, 15)     # O列: 借出數量
+            borrowed_in_cell = cell_value(values, 18)      # R列: 借入數量
+            stock_quantity_cell = cell_value(values, 20)   # T列: 實際在庫量
+            unit_cell = cell_value(values, 23)             # W列: 單位
+            
+            # 檢查是否有關鍵數據 (產品編號必須存在)
+            if product_id_cell and str(product_id_cell).strip():
+                product_id = str(product_id_cell).strip()
+                logger.debug(f"處理產品: {product_id}")
                 
-                # 檢查是否有關鍵數據 (產品編號必須存在)
-                if product_id_cell and str(product_id_cell).strip():
-                    product_id = str(product_id_cell).strip()
-                    logger.debug(f"處理產品: {product_id}")
-                    
-                    
-                    # 處理倉庫名稱
-                    warehouse_id = ""
-                    if warehouse_name_cell and str(warehouse_name_cell).strip():
-                        warehouse_id = str(warehouse_name_cell).strip()
-                    
-                    # 處理數量欄位
-                    total_quantity = 0
-                    borrowed_out = 0  
-                    borrowed_in = 0
-                    stock_quantity = 0
-                    
-                    try:
-                        if total_quantity_cell is not None and str(total_quantity_cell).strip():
-                            # 移除可能的文字並轉換為數字
-                            total_quantity_str = str(total_quantity_cell).replace(',', '')
-                            if total_quantity_str != '---' and total_quantity_str != '':
-                                total_quantity = float(total_quantity_str)
-                                
-                        if borrowed_out_cell is not None and str(borrowed_out_cell).strip():
-                            borrowed_out_str = str(borrowed_out_cell).replace(',', '')
-                            if borrowed_out_str != '---' and borrowed_out_str != '':
-                                borrowed_out = float(borrowed_out_str)
-                                
-                        if borrowed_in_cell is not None and str(borrowed_in_cell).strip():
-                            borrowed_in_str = str(borrowed_in_cell).replace(',', '')
-                            if borrowed_in_str != '---' and borrowed_in_str != '':
-                                borrowed_in = float(borrowed_in_str)
-                                
-                        if stock_quantity_cell is not None and str(stock_quantity_cell).strip():
-                            stock_quantity_str = str(stock_quantity_cell).replace(',', '')
-                            if stock_quantity_str != '---' and stock_quantity_str != '':
-                                stock_quantity = float(stock_quantity_str)
-                                
-                    except (ValueError, TypeError) as e:
-                        logger.warning(f"數量轉換錯誤，行 {row}: {str(e)}")
-                        continue
+                
+                # 處理倉庫名稱
+                warehouse_id = ""
+                if warehouse_name_cell and str(warehouse_name_cell).strip():
+                    warehouse_id = str(warehouse_name_cell).strip()
+                
+                # 處理數量欄位
+                total_quantity = 0
+                borrowed_out = 0  
+                borrowed_in = 0
+                stock_quantity = 0
+                
+                try:
+                    if total_quantity_cell is not None and str(total_quantity_cell).strip():
+                        # 移除可能的文字並轉換為數字
+                        total_quantity_str = str(total_quantity_cell).replace(',', '')
+                        if total_quantity_str != '---' and total_quantity_str != '':
+                            total_quantity = float(total_quantity_str)
+                            
+                    if borrowed_out_cell is not None and str(borrowed_out_cell).strip():
+                        borrowed_out_str = str(borrowed_out_cell).replace(',', '')
+                        if borrowed_out_str != '---' and borrowed_out_str != '':
+                            borrowed_out = float(borrowed_out_str)
+                            
+                    if borrowed_in_cell is not None and str(borrowed_in_cell).strip():
+                        borrowed_in_str = str(borrowed_in_cell).replace(',', '')
+                        if borrowed_in_str != '---' and borrowed_in_str != '':
+                            borrowed_in = float(borrowed_in_str)
+                            
+                    if stock_quantity_cell is not None and str(stock_quantity_cell).strip():
+                        stock_quantity_str = str(stock_quantity_cell).replace(',', '')
+                        if stock_quantity_str != '---' and stock_quantity_str != '':
+                            stock_quantity = float(stock_quantity_str)
+                            
+                except (ValueError, TypeError) as e:
+                    logger.warning(f"數量轉換錯誤，行 {row}: {str(e)}")
+                    continue
 
-                    # 處理單位
-                    unit = ""
-                    if unit_cell and str(unit_cell).strip():
-                        unit = str(unit_cell).strip()
-                    
-                    # 處理品名規格
-                    product_name_zh = ""
-                    if product_name_cell and str(product_name_cell).strip():
-                        product_name_zh = str(product_name_cell).strip()
-                    
-                    # 處理類別
-                    category = ""
-                    if category_cell and str(category_cell).strip():
-                        category = str(category_cell).strip()
-                    
-                    # 創建記錄
-                    record = {
-                        'product_id': product_id,
-                        'warehouse_id': warehouse_id,
-                        'total_quantity': total_quantity,
-                        'borrowed_out': borrowed_out,
-                        'borrowed_in': borrowed_in,
-                        'stock_quantity': stock_quantity,
-                        'unit': unit,
-                        'product_name_zh': product_name_zh,
-                        'category': category
-                    }
+                # 處理單位
+                unit = ""
+                if unit_cell and str(unit_cell).strip():
+                    unit = str(unit_cell).strip()
+                
+                # 處理品名規格
+                product_name_zh = ""
+                if product_name_cell and str(product_name_cell).strip():
+                    product_name_zh = str(product_name_cell).strip()
+                
+                # 處理類別
+                category = ""
+                if category_cell and str(category_cell).strip():
+                    category = str(category_cell).strip()
+                
+                # 創建記錄
+                record = {
+                    'product_id': product_id,
+                    'warehouse_id': warehouse_id,
+                    'total_quantity': total_quantity,
+                    'borrowed_out': borrowed_out,
+                    'borrowed_in': borrowed_in,
+                    'stock_quantity': stock_quantity,
+                    'unit': unit,
+                    'product_name_zh': product_name_zh,
+                    'category': category
+                }
 
-                    data.append(record)
-                    logger.debug(f"新增庫存記錄: 產品ID={product_id}, 倉庫={warehouse_id}, 庫存量={stock_quantity}")
-                else:
-                    logger.debug(f"第 {row} 行跳過 - 無產品編號")
+                yield record
+                logger.debug(f"新增庫存記錄: 產品ID={product_id}, 倉庫={warehouse_id}, 庫存量={stock_quantity}")
+            else:
+                logger.debug(f"第 {row} 行跳過 - 無產品編號")
+    
+    def parse_inventory_data(self, file_path: str) -> List[Dict]:
+        """
+        解析庫存 Excel 文件，提取庫存數據
+        
+        Args:
+            file_path (str): Excel 文件路徑
+        
+        Returns:
+            list: 包含所有庫存記錄的列表
+        """
+        try:
+            data = list(self.iter_inventory_data(file_path))
             
             logger.info(f"庫存解析完成，共 {len(data)} 筆有效記錄")
             return data
@@ -1257,12 +1482,31 @@ class InventoryDataUploader:
                 pass
             return False
 
-    def get_missing_products(self, data: List[Dict]) -> List[Dict]:
+    def get_existing_products(self, data: List[Dict]) -> set:
+        """
+        以單次查詢取得庫存數據中已存在於 product_master 的產品ID
+        
+        Args:
+            data (list): 庫存記錄列表
+            
+        Returns:
+            set: 已存在的產品ID集合
+        """
+        if not self.connection:
+            raise Exception("數據庫未連接")
+        
+        return fetch_existing_ids(
+            self.connection, self.table_config['product_master'], 'product_id',
+            (record.get('product_id') for record in data)
+        )
+
+    def get_missing_products(self, data: List[Dict], existing_products: set = None) -> List[Dict]:
         """
         檢查數據中哪些產品不存在於 product_master 表中
         
         Args:
             data (list): 庫存記錄列表
+            existing_products (set): 已查詢過的既有產品ID，None 時重新查詢
             
         Returns:
             list: 不存在的產品資訊列表，包含從Excel提取的欄位
@@ -1289,21 +1533,25 @@ class InventoryDataUploader:
                         'warehouse_id': safe_str(record.get('warehouse_id'))
                     }
         
+        if existing_products is None:
+            existing_products = self.get_existing_products(data)
+        
         missing_products = []
         
         for product_id, product_info in unique_products.items():
-            if not self.check_product_exists(product_id):
+            if product_id not in existing_products:
                 missing_products.append(product_info)
                 logger.info(f"發現新產品: {product_id} - {product_info.get('name_zh', '')}")
         
         return missing_products
 
-    def filter_valid_inventory_records(self, data: List[Dict]) -> Tuple[List[Dict], int, List[str]]:
+    def filter_valid_inventory_records(self, data: List[Dict], existing_products: set = None) -> Tuple[List[Dict], int, List[str]]:
         """
         過濾出有效的庫存記錄（產品存在的記錄）
         
         Args:
             data (list): 原始庫存記錄列表
+            existing_products (set): 已查詢過的既有產品ID，None 時重新查詢
             
         Returns:
             tuple: (有效記錄列表, 跳過記錄數, 跳過的產品ID列表)
@@ -1311,6 +1559,9 @@ class InventoryDataUploader:
         if not self.connection:
             raise Exception("數據庫未連接")
         
+        if existing_products is None:
+            existing_products = self.get_existing_products(data)
+        
         valid_records = []
         skipped_products = set()
         skipped_count = 0
@@ -1319,7 +1570,7 @@ class InventoryDataUploader:
             product_id = record.get('product_id', '').strip()
             
             # 檢查產品是否存在  
-            product_exists = self.check_product_exists(product_id) if product_id else False
+            product_exists = product_id in existing_products
             
             if product_exists:
                 # 產品存在，記錄有效
@@ -1515,8 +1766,10 @@ class InventoryDataUploader:
                 return 0, 0, 0, []
             
             # 2. 過濾有效記錄（混合模式：上傳存在的，返回缺失的）
-            valid_records, skipped_count, skipped_products = self.filter_valid_inventory_records(data)
-            missing_products = self.get_missing_products(data)
+            # 單次查詢既有產品，供過濾與缺失清單共用
+            existing_products = self.get_existing_products(data)
+            valid_records, skipped_count, skipped_products = self.filter_valid_inventory_records(data, existing_products)
+            missing_products = self.get_missing_products(data, existing_products)
 
             
             if skipped_count > 0:
@@ -0,0 +1,244 @@
+"""
+新進訂單變更推送
+
+temp_customer_records 的資料列觸發器以 pg_notify 發出變更的訂單ID，
+API 以單一 LISTEN 連線接收後，透過 SSE 分發給所有開啟新進訂單頁面的分頁。
+"""
+from fastapi import APIRouter, Request
+from fastapi.responses import StreamingResponse
+import sys
+import os
+# 新增資料庫連線管理
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database_config import open_dedicated_connection
+from env_loader import load_env_file
+
+# 載入環境變數
+load_env_file()
+import asyncio
+import json
+import logging
+import select
+import threading
+import time
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# NOTIFY 頻道名稱
+ORDER_CHANGE_CHANNEL = 'order_changes'
+
+# 收到第一筆通知後等待合併的秒數（批次匯入時避免逐筆推送）
+NOTIFY_DEBOUNCE_SECONDS = 0.3
+
+# 沒有通知時檢查訂閱者的間隔秒數
+LISTEN_POLL_SECONDS = 5
+
+# LISTEN 連線中斷後的重連等待秒數
+RECONNECT_DELAY_SECONDS = 3
+
+# SSE 心跳間隔與瀏覽器重連等待（毫秒）
+SSE_HEARTBEAT_SECONDS = 15
+SSE_RETRY_MS = 3000
+
+# 每個訂閱者最多暫存的事件數，超過時改送重新同步事件
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# 變更時發出訂單ID、並維護 updated_at 供增量同步使用的觸發器（已存在時不重建，避免每次連線都鎖定資料表）
+ORDER_TRIGGERS_SQL = f"""
+CREATE OR REPLACE FUNCTION touch_temp_customer_records_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := NOW();
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION notify_temp_customer_records_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('{ORDER_CHANGE_CHANNEL}', json_build_object(
+        'id', CASE WHEN TG_OP = 'DELETE' THEN OLD.id ELSE NEW.id END,
+        'op', TG_OP
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'temp_customer_records_notify'
+    ) THEN
+        CREATE TRIGGER temp_customer_records_notify
+        AFTER INSERT OR UPDATE OR DELETE ON temp_customer_records
+        FOR EACH ROW EXECUTE FUNCTION notify_temp_customer_records_change();
+    END IF;
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_trigger WHERE tgname = 'temp_customer_records_touch_updated_at'
+    ) THEN
+        CREATE TRIGGER temp_customer_records_touch_updated_at
+        BEFORE INSERT OR UPDATE ON temp_customer_records
+        FOR EACH ROW EXECUTE FUNCTION touch_temp_customer_records_updated_at();
+    END IF;
+END $$;
+"""
+
+
+def format_sse(event: dict, event_type: str = 'orders') -> str:
+    """將事件轉為 SSE 訊息格式"""
+    return f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+
+
+class OrderChangeBroker:
+    """以單一 LISTEN 連線接收訂單變更通知，並分發給所有 SSE 訂閱者
+
+    監聽執行緒在有訂閱者時才啟動，最後一個訂閱者離開後關閉連線。
+    """
+
+    def __init__(self, channel: str = ORDER_CHANGE_CHANNEL, debounce: float = NOTIFY_DEBOUNCE_SECONDS):
+        self.channel = channel
+        self.debounce = debounce
+        self._subscribers = {}  # asyncio.Queue -> 所屬事件迴圈
+        self._lock = threading.Lock()
+        self._thread = None
+        self._sequence = 0
+        self._trigger_installed = False
+
+    def subscribe(self) -> asyncio.Queue:
+        """新增訂閱者，回傳接收事件的佇列（需在事件迴圈中呼叫）"""
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        with self._lock:
+            self._subscribers[queue] = asyncio.get_running_loop()
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='order-change-listener', daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        """移除訂閱者"""
+        with self._lock:
+            self._subscribers.pop(queue, None)
+
+    def _publish(self, event: dict):
+        """將事件交給每個訂閱者所屬的事件迴圈"""
+        with self._lock:
+            self._sequence += 1
+            event = {'seq': self._sequence, **event}
+            subscribers = list(self._subscribers.items())
+
+        for queue, loop in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._offer, queue, event)
+            except RuntimeError:
+                # 事件迴圈已關閉
+                self.unsubscribe(queue)
+
+    @staticmethod
+    def _offer(queue: asyncio.Queue, event: dict):
+        """放入事件；訂閱者跟不上時清空佇列並要求重新同步"""
+        try:
+            queue.put_nowait(event)
+        except asyncio.QueueFull:
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait({'seq': event['seq'], 'resync': True})
+
+    def _run(self):
+        """監聽執行緒主迴圈：連線中斷時重連並通知訂閱者重新同步"""
+        reconnect = False
+        while True:
+            try:
+                self._listen(resync=reconnect)
+                reconnect = False
+            except Exception as e:
+                logger.error(f"訂單變更監聽中斷: {e}")
+                reconnect = True
+                time.sleep(RECONNECT_DELAY_SECONDS)
+
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None
+                    return
+
+    def _listen(self, resync: bool = False):
+        """LISTEN 直到沒有訂閱者為止，合併短時間內的通知後發布"""
+        conn = open_dedicated_connection()
+        try:
+            conn.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                if not self._trigger_installed:
+                    cursor.execute(ORDER_TRIGGERS_SQL)
+                    self._trigger_installed = True
+                cursor.execute(f"LISTEN {self.channel}")
+            logger.info(f"開始監聽訂單變更頻道: {self.channel}")
+
+            if resync:
+                self._publish({'resync': True})
+
+            changed, deleted = set(), set()
+            deadline = None
+
+            while True:
+                timeout = LISTEN_POLL_SECONDS if deadline is None else max(0, deadline - time.monotonic())
+                if select.select([conn], [], [], timeout) != ([], [], []):
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            payload = json.loads(notify.payload)
+                        except ValueError:
+                            logger.warning(f"無法解析訂單變更通知: {notify.payload}")
+                            continue
+
+                        order_id = payload.get('id')
+                        if payload.get('op') == 'DELETE':
+                            deleted.add(order_id)
+                            changed.discard(order_id)
+                        else:
+                            changed.add(order_id)
+                            deleted.discard(order_id)
+
+                        if deadline is None:
+                            deadline = time.monotonic() + self.debounce
+
+                if deadline is not None and time.monotonic() >= deadline:
+                    self._publish({'ids': sorted(changed), 'deleted': sorted(deleted)})
+                    changed, deleted = set(), set()
+                    deadline = None
+                elif deadline is None:
+                    with self._lock:
+                        if not self._subscribers:
+                            return
+        finally:
+            conn.close()
+
+
+order_change_broker = OrderChangeBroker()
+
+
+# 新進訂單變更事件（SSE）
+@router.get("/orders/events")
+async def order_events(request: Request):
+    queue = order_change_broker.subscribe()
+    print("[API] order_events 新訂閱者連線")
+
+    async def event_stream():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_sse(event)
+        finally:
+            order_change_broker.unsubscribe(queue)
+            print("[API] order_events 訂閱者離線")
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
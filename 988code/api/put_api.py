@@ -7,6 +7,12 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from database_config import get_db_connection, execute_query, execute_transaction
 from env_loader import load_env_file
+from rag_attachments import (
+    DEFAULT_MIME_TYPE, STATUS_READY, STATUS_CONVERTING, ensure_rag_attachment_tables, add_attachments,
+    add_converted_attachment, delete_attachment, delete_all_attachments, rename_attachments_title
+)
+from document_conversion import conversion_pool, file_extension_of, source_hash_of, SUPPORTED_EXTENSIONS
+from reference_cache import invalidate_reference_cache, PRODUCTS, CUSTOMERS
 
 # 載入環境變數
 load_env_file()
@@ -406,6 +412,7 @@ def update_customer(customer_id: str, update_data: CustomerUpdate):
     try:
         # 改用本地資料庫更新，避免遠端連線延遲
         update_data_to_db(sql, params)
+        invalidate_reference_cache(CUSTOMERS)
         
         # 返回更新後的記錄資料（可選）
         return {
@@ -437,6 +444,7 @@ def update_item_subcategory(update_data: ItemSubcategoryUpdate):
 
     try:
         update_data_to_db(sql, params)
+        invalidate_reference_cache(PRODUCTS)
         return {
             "message": "品項商品群組更新成功",
             "item_id": update_data.item_id,
@@ -883,8 +891,9 @@ def save_rag_knowledge(knowledge_data: RAGKnowledgeBase):
     """儲存RAG知識庫內容，包含文字和檔案"""
     check_editor_permission(knowledge_data.user_role)
     try:
-        # 準備PDF檔案數據
-        pdf_files = []
+        # 前端已轉換的 PDF 直接儲存，其他檔案交給背景轉換
+        ready_files = []
+        convert_files = []
         
         if knowledge_data.files:
             for file_info in knowledge_data.files:
@@ -903,142 +912,63 @@ def save_rag_knowledge(knowledge_data: RAGKnowledgeBase):
                 
                 # 如果是前端已轉換的檔案，直接使用內容
                 if frontend_converted:
-                    pdf_content = file_content
+                    ready_files.append((filename, file_content, DEFAULT_MIME_TYPE))
                 else:
-                    # 非前端轉換的檔案，使用後端轉換
-                    pdf_content = convert_file_to_pdf(file_content, filename)
-                
-                # 計算內容雜湊用於除錯
-                import hashlib
-                content_hash = hashlib.md5(pdf_content).hexdigest()[:8]
-                
-                pdf_files.append({
-                    'filename': filename,
-                    'pdf_content': pdf_content
-                })
+                    file_extension = file_extension_of(filename)
+                    if file_extension not in SUPPORTED_EXTENSIONS:
+                        raise HTTPException(status_code=400, detail=f"不支援的檔案格式: {file_extension}。支援的格式: pdf, doc, docx, xls, xlsx")
+                    convert_files.append((filename, file_content, source_hash_of(file_content, filename)))
         
-        # 檢查是否已存在該標題的記錄
-        check_sql = "SELECT COUNT(*) FROM rag WHERE title = %s"
-        result = query_data_from_db(check_sql, (knowledge_data.title,))
-        exists = result[0][0] > 0
+        ensure_rag_attachment_tables()
+        text_content = [knowledge_data.text_content] if knowledge_data.text_content else []
+        queued = []
         
-        if exists:
-            # 更新現有記錄
-            if knowledge_data.delete_file_index is not None:
-                # 刪除指定索引的檔案
-                get_existing_sql = "SELECT file_content, file_name FROM rag WHERE title = %s"
-                existing_data = query_data_from_db(get_existing_sql, (knowledge_data.title,))
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                # 檢查是否已存在該標題的記錄
+                cursor.execute("SELECT COUNT(*) FROM rag WHERE title = %s", (knowledge_data.title,))
+                exists = cursor.fetchone()[0] > 0
                 
-                if existing_data and existing_data[0]:
-                    existing_file_content = list(existing_data[0][0]) if existing_data[0][0] else []
-                    existing_file_names = list(existing_data[0][1]) if existing_data[0][1] else []
+                if exists:
+                    # 更新現有記錄的文字內容，檔案逐一新增或刪除
+                    cursor.execute("UPDATE rag SET text_content = %s WHERE title = %s",
+                                   (text_content, knowledge_data.title))
                     
-                    # 刪除指定索引的檔案
-                    if 0 <= knowledge_data.delete_file_index < len(existing_file_names):
-                        del existing_file_content[knowledge_data.delete_file_index]
-                        del existing_file_names[knowledge_data.delete_file_index]
-                        
-                        sql = """
-                        UPDATE rag 
-                        SET text_content = %s, file_content = %s, file_name = %s
-                        WHERE title = %s
-                        """
-                        params = (
-                            [knowledge_data.text_content] if knowledge_data.text_content else [],
-                            existing_file_content,
-                            existing_file_names,
-                            knowledge_data.title
-                        )
-                        update_data_to_db(sql, params)
-            elif pdf_files:
-                # 先獲取現有的檔案內容
-                get_existing_sql = "SELECT file_content, file_name FROM rag WHERE title = %s"
-                existing_data = query_data_from_db(get_existing_sql, (knowledge_data.title,))
-                
-                existing_file_content = existing_data[0][0] if existing_data and existing_data[0][0] else []
-                existing_file_names = existing_data[0][1] if existing_data and existing_data[0][1] else []
-                
-                # 累積新檔案到現有檔案中
-                new_file_content = list(existing_file_content) if existing_file_content else []
-                new_file_names = list(existing_file_names) if existing_file_names else []
-                
-                for file_info in pdf_files:
-                    # 檢查是否已經存在相同檔名，如果存在就跳過
-                    if file_info['filename'] not in new_file_names:
-                        hex_content = file_info['pdf_content'].hex()
-                        new_file_content.append(hex_content)
-                        new_file_names.append(file_info['filename'])
-                
-                sql = """
-                UPDATE rag 
-                SET text_content = %s, file_content = %s, file_name = %s
-                WHERE title = %s
-                """
-                params = (
-                    [knowledge_data.text_content] if knowledge_data.text_content else [],
-                    new_file_content,
-                    new_file_names,
-                    knowledge_data.title
-                )
-                update_data_to_db(sql, params)
-            elif knowledge_data.files is None:
-                # 如果files明確為None，清除檔案內容
-                sql = """
-                UPDATE rag 
-                SET text_content = %s, file_content = NULL, file_name = NULL
-                WHERE title = %s
-                """
-                params = ([knowledge_data.text_content] if knowledge_data.text_content else [], knowledge_data.title)
-                update_data_to_db(sql, params)
-            else:
-                # 只更新文字內容，不動檔案
-                sql = """
-                UPDATE rag 
-                SET text_content = %s
-                WHERE title = %s
-                """
-                params = ([knowledge_data.text_content] if knowledge_data.text_content else [], knowledge_data.title)
-                update_data_to_db(sql, params)
-        else:
-            # 新增記錄
-            if pdf_files:
-                # 儲存所有檔案到陣列中
-                file_contents = []
-                file_names = []
-                
-                for file_info in pdf_files:
-                    file_contents.append(file_info['pdf_content'].hex())
-                    file_names.append(file_info['filename'])
+                    if knowledge_data.delete_file_index is not None:
+                        # 刪除指定索引的檔案
+                        if knowledge_data.delete_file_index >= 0:
+                            delete_attachment(cursor, knowledge_data.title, knowledge_data.delete_file_index)
+                    elif knowledge_data.files is None:
+                        # 如果files明確為None，清除檔案內容
+                        delete_all_attachments(cursor, knowledge_data.title)
+                else:
+                    # 新增記錄
+                    cursor.execute("INSERT INTO rag (title, text_content) VALUES (%s, %s)",
+                                   (knowledge_data.title, text_content))
                 
-                sql = """
-                INSERT INTO rag (title, text_content, file_content, file_name)
-                VALUES (%s, %s, %s, %s)
-                """
-                params = (
-                    knowledge_data.title,
-                    [knowledge_data.text_content] if knowledge_data.text_content else [],
-                    file_contents,
-                    file_names
-                )
-                update_data_to_db(sql, params)
-            else:
-                # 只有文字內容的記錄
-                sql = """
-                INSERT INTO rag (title, text_content)
-                VALUES (%s, %s)
-                """
-                params = (
-                    knowledge_data.title,
-                    [knowledge_data.text_content] if knowledge_data.text_content else []
-                )
-                update_data_to_db(sql, params)
+                # 累積新檔案到現有檔案中（相同檔名略過），已轉換過的相同檔案直接沿用結果
+                add_attachments(cursor, knowledge_data.title, ready_files)
+                for filename, file_content, source_hash in convert_files:
+                    status = add_converted_attachment(cursor, knowledge_data.title, filename,
+                                                      source_hash, len(file_content))
+                    if status == STATUS_CONVERTING:
+                        queued.append((source_hash, file_content, filename))
+            conn.commit()
+        
+        # 提交後才排入轉換，確保轉換完成時附件已存在
+        for source_hash, file_content, filename in queued:
+            conversion_pool.submit(source_hash, file_content, filename)
         
         return {
             "message": "知識庫儲存成功",
             "title": knowledge_data.title,
-            "files_processed": len(pdf_files) if pdf_files else 0
+            "files_processed": len(ready_files) + len(convert_files),
+            "files_converting": len(queued),
+            "status": STATUS_CONVERTING if queued else STATUS_READY
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"[ERROR] RAG儲存失敗: {e}")
         raise HTTPException(status_code=500, detail=f"知識庫儲存失敗: {str(e)}")
@@ -1048,10 +978,12 @@ def delete_rag_knowledge(title: str, user_role: str):
     """刪除RAG知識庫條目"""
     check_editor_permission(user_role)
     try:
-        sql = "DELETE FROM rag WHERE title = %s"
-        params = (title,)
-        
-        update_data_to_db(sql, params)
+        ensure_rag_attachment_tables()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                delete_all_attachments(cursor, title)
+                cursor.execute("DELETE FROM rag WHERE title = %s", (title,))
+            conn.commit()
         
         return {
             "message": "知識庫條目刪除成功",
@@ -1079,11 +1011,14 @@ def update_rag_title(update_data: RAGTitleUpdate):
         if result[0][0] > 0:
             raise HTTPException(status_code=400, detail="新標題已存在，請使用其他標題")
         
-        # 更新標題
-        sql = "UPDATE rag SET title = %s WHERE title = %s"
-        params = (update_data.new_title, update_data.old_title)
-        
-        update_data_to_db(sql, params)
+        # 更新標題（附件一併改到新標題）
+        ensure_rag_attachment_tables()
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("UPDATE rag SET title = %s WHERE title = %s",
+                               (update_data.new_title, update_data.old_title))
+                rename_attachments_title(cursor, update_data.old_title, update_data.new_title)
+            conn.commit()
         
         return {
             "message": "標題更新成功",
@@ -1249,6 +1184,7 @@ def create_customer(customer_data: CustomerCreate):
 
         # 執行事務
         execute_transaction(queries_params)
+        invalidate_reference_cache(CUSTOMERS)
         
         return {"message": "客戶創建成功", "customer_id": customer_data.customer_id}
     except Exception as e:
@@ -1586,6 +1522,7 @@ def delete_customer(customer_id: str, request: CustomerDeleteRequest):
         # 刪除客戶
         delete_sql = "DELETE FROM customer WHERE customer_id = %s"
         update_data_to_db(delete_sql, (customer_id,))
+        invalidate_reference_cache(CUSTOMERS)
         
         return {
             "message": "客戶刪除成功",
@@ -1621,6 +1558,7 @@ def delete_product(request: ProductDeleteRequest):
         # 從 product_master 表中刪除
         delete_product_sql = "DELETE FROM product_master WHERE product_id = %s"
         update_data_to_db(delete_product_sql, (product_id,))
+        invalidate_reference_cache(PRODUCTS)
 
         return {
             "message": "產品刪除成功",
@@ -0,0 +1,277 @@
+"""
+RAG 知識庫附件儲存
+
+附件內容以 SHA-256 雜湊為鍵存放在 rag_blobs（bytea），相同內容只存一份；
+rag_attachments 記錄每個知識庫條目的檔名、順序、大小、MIME 類型與轉換狀態，
+檔案列表與容量統計只需查詢這張表，不需讀取檔案內容。
+rag_conversions 記錄原始檔案雜湊對應的轉換後 PDF，重複上傳時直接沿用。
+"""
+import hashlib
+import logging
+import sys
+import os
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database_config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# 轉換後存入資料庫的附件一律為 PDF
+DEFAULT_MIME_TYPE = 'application/pdf'
+
+# 附件狀態
+STATUS_READY = 'ready'
+STATUS_CONVERTING = 'converting'
+STATUS_FAILED = 'failed'
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS rag_blobs (
+    content_hash CHAR(64) PRIMARY KEY,
+    content BYTEA NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    mime_type VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS rag_attachments (
+    id SERIAL PRIMARY KEY,
+    title TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    file_name TEXT NOT NULL,
+    content_hash CHAR(64) NOT NULL REFERENCES rag_blobs (content_hash),
+    size_bytes BIGINT NOT NULL,
+    mime_type VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (title, file_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_rag_attachments_hash ON rag_attachments (content_hash);
+
+-- 背景轉換：轉換完成前 content_hash 為 NULL，以 source_hash 對應轉換工作
+ALTER TABLE rag_attachments
+    ADD COLUMN IF NOT EXISTS status VARCHAR(20) NOT NULL DEFAULT 'ready',
+    ADD COLUMN IF NOT EXISTS source_hash CHAR(64),
+    ADD COLUMN IF NOT EXISTS error TEXT,
+    ALTER COLUMN content_hash DROP NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_rag_attachments_source ON rag_attachments (source_hash)
+    WHERE status = 'converting';
+
+CREATE TABLE IF NOT EXISTS rag_conversions (
+    source_hash CHAR(64) PRIMARY KEY,
+    pdf_hash CHAR(64) NOT NULL REFERENCES rag_blobs (content_hash),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_rag_attachment_tables():
+    """建立附件資料表，並將 rag.file_content 中舊的 hex 陣列搬移到附件儲存（每個進程只執行一次）"""
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(SCHEMA_SQL)
+
+                # 服務重啟前尚未完成的轉換已隨工作進程中斷
+                cursor.execute("""
+                    UPDATE rag_attachments SET status = %s, error = '服務重啟，轉換中斷'
+                    WHERE status = %s
+                """, (STATUS_FAILED, STATUS_CONVERTING))
+                conn.commit()
+
+                cursor.execute("SELECT title FROM rag WHERE file_content IS NOT NULL")
+                legacy_titles = [row[0] for row in cursor.fetchall()]
+                for title in legacy_titles:
+                    try:
+                        _migrate_legacy_files(cursor, title)
+                        conn.commit()
+                    except Exception as e:
+                        conn.rollback()
+                        logger.error(f"搬移知識庫條目 {title} 的舊格式檔案失敗: {e}")
+
+        if legacy_titles:
+            logger.info(f"已將 {len(legacy_titles)} 個知識庫條目的舊格式檔案搬移到附件儲存")
+        _schema_ready = True
+
+
+def _migrate_legacy_files(cursor, title):
+    """將單一條目的 hex 字串陣列轉為附件，完成後清除舊欄位"""
+    cursor.execute("SELECT file_content, file_name FROM rag WHERE title = %s", (title,))
+    row = cursor.fetchone()
+    if row:
+        contents = row[0] or []
+        names = row[1] or []
+        files = [(name, bytes.fromhex(content), DEFAULT_MIME_TYPE)
+                 for name, content in zip(names, contents) if name and content]
+        add_attachments(cursor, title, files)
+    cursor.execute("UPDATE rag SET file_content = NULL, file_name = NULL WHERE title = %s", (title,))
+
+
+def content_hash_of(content):
+    """內容的 SHA-256 雜湊"""
+    return hashlib.sha256(content).hexdigest()
+
+
+def store_blob(cursor, content, mime_type=DEFAULT_MIME_TYPE):
+    """存入內容（已存在時不重複傳送），回傳內容雜湊"""
+    content_hash = content_hash_of(content)
+    cursor.execute("SELECT 1 FROM rag_blobs WHERE content_hash = %s", (content_hash,))
+    if cursor.fetchone() is None:
+        cursor.execute("""
+            INSERT INTO rag_blobs (content_hash, content, size_bytes, mime_type)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (content_hash) DO NOTHING
+        """, (content_hash, content, len(content), mime_type))
+    return content_hash
+
+
+def _next_position(cursor, title):
+    cursor.execute("SELECT COALESCE(MAX(position), -1) + 1 FROM rag_attachments WHERE title = %s", (title,))
+    return cursor.fetchone()[0]
+
+
+def add_attachments(cursor, title, files):
+    """新增已完成的附件（在呼叫端的交易中執行）
+
+    同一條目已有相同檔名時略過；內容已存在於 rag_blobs 時只新增中繼資料，不重複傳送內容。
+
+    Args:
+        files: [(檔名, 內容 bytes, MIME 類型), ...]
+
+    Returns:
+        int: 實際新增的附件數
+    """
+    added = 0
+    for name, content, mime_type in files:
+        mime_type = mime_type or DEFAULT_MIME_TYPE
+        content_hash = store_blob(cursor, content, mime_type)
+        cursor.execute("""
+            INSERT INTO rag_attachments (title, position, file_name, content_hash, size_bytes, mime_type)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON CONFLICT (title, file_name) DO NOTHING
+        """, (title, _next_position(cursor, title), name, content_hash, len(content), mime_type))
+        added += cursor.rowcount
+    return added
+
+
+def add_converted_attachment(cursor, title, name, source_hash, source_size):
+    """新增附件：已有相同原始檔的轉換結果時直接沿用，否則建立轉換中的附件
+
+    Returns:
+        str: 新增的附件狀態（ready / converting）；同名附件已存在時回傳 None
+    """
+    cursor.execute("""
+        SELECT c.pdf_hash, b.size_bytes, b.mime_type
+        FROM rag_conversions c
+        JOIN rag_blobs b ON b.content_hash = c.pdf_hash
+        WHERE c.source_hash = %s
+    """, (source_hash,))
+    converted = cursor.fetchone()
+
+    if converted:
+        pdf_hash, size_bytes, mime_type = converted
+        status = STATUS_READY
+    else:
+        # 轉換完成前以原始檔大小計算容量
+        pdf_hash, size_bytes, mime_type = None, source_size, DEFAULT_MIME_TYPE
+        status = STATUS_CONVERTING
+
+    cursor.execute("""
+        INSERT INTO rag_attachments (title, position, file_name, content_hash, size_bytes, mime_type,
+                                     status, source_hash)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        ON CONFLICT (title, file_name) DO NOTHING
+    """, (title, _next_position(cursor, title), name, pdf_hash, size_bytes, mime_type, status, source_hash))
+    return status if cursor.rowcount else None
+
+
+def complete_conversion(source_hash, pdf_content):
+    """保存轉換結果，並讓等待此原始檔的附件轉為可用"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            pdf_hash = store_blob(cursor, pdf_content)
+            cursor.execute("""
+                INSERT INTO rag_conversions (source_hash, pdf_hash) VALUES (%s, %s)
+                ON CONFLICT (source_hash) DO UPDATE SET pdf_hash = EXCLUDED.pdf_hash
+            """, (source_hash, pdf_hash))
+            cursor.execute("""
+                UPDATE rag_attachments
+                SET content_hash = %s, size_bytes = %s, mime_type = %s, status = %s, error = NULL
+                WHERE source_hash = %s AND status = %s
+            """, (pdf_hash, len(pdf_content), DEFAULT_MIME_TYPE, STATUS_READY, source_hash, STATUS_CONVERTING))
+        conn.commit()
+
+
+def fail_conversion(source_hash, error):
+    """標記等待此原始檔的附件轉換失敗（失敗結果不快取，重新上傳時會再轉換一次）"""
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("""
+                UPDATE rag_attachments SET status = %s, error = %s
+                WHERE source_hash = %s AND status = %s
+            """, (STATUS_FAILED, str(error)[:500], source_hash, STATUS_CONVERTING))
+        conn.commit()
+
+
+def delete_attachment(cursor, title, index):
+    """依列表順序刪除單一附件（在呼叫端的交易中執行），回傳是否有刪除"""
+    cursor.execute("""
+        DELETE FROM rag_attachments
+        WHERE id = (
+            SELECT id FROM rag_attachments WHERE title = %s
+            ORDER BY position, id
+            OFFSET %s LIMIT 1
+        )
+        RETURNING content_hash
+    """, (title, index))
+    deleted = cursor.fetchall()
+    _delete_unreferenced_blobs(cursor, [row[0] for row in deleted])
+    return bool(deleted)
+
+
+def delete_all_attachments(cursor, title):
+    """刪除條目的所有附件（在呼叫端的交易中執行）"""
+    cursor.execute("DELETE FROM rag_attachments WHERE title = %s RETURNING content_hash", (title,))
+    _delete_unreferenced_blobs(cursor, [row[0] for row in cursor.fetchall()])
+
+
+def rename_attachments_title(cursor, old_title, new_title):
+    """條目改名時一併更新附件（在呼叫端的交易中執行）"""
+    cursor.execute("UPDATE rag_attachments SET title = %s WHERE title = %s", (new_title, old_title))
+
+
+def _delete_unreferenced_blobs(cursor, content_hashes):
+    """刪除已沒有任何附件或轉換快取引用的內容"""
+    content_hashes = list({h for h in content_hashes if h})
+    if not content_hashes:
+        return
+    cursor.execute("""
+        DELETE FROM rag_blobs b
+        WHERE b.content_hash = ANY(%s)
+          AND NOT EXISTS (SELECT 1 FROM rag_attachments a WHERE a.content_hash = b.content_hash)
+          AND NOT EXISTS (SELECT 1 FROM rag_conversions c WHERE c.pdf_hash = b.content_hash)
+    """, (content_hashes,))
+
+
+def list_attachments(cursor, title):
+    """條目的附件中繼資料（依上傳順序），不讀取檔案內容"""
+    cursor.execute("""
+        SELECT file_name, size_bytes, mime_type, content_hash, status, error
+        FROM rag_attachments
+        WHERE title = %s
+        ORDER BY position, id
+    """, (title,))
+    return [
+        {'file_name': name, 'size_bytes': size, 'mime_type': mime_type, 'content_hash': content_hash,
+         'status': status, 'error': error}
+        for name, size, mime_type, content_hash, status, error in cursor.fetchall()
+    ]
@@ -0,0 +1,101 @@
+"""
+參考資料快取
+
+類別、子類別、品項、客戶、縣市等下拉選單資料很少變動，查詢結果以 JSON 保存在
+進程記憶體中，逾時（REFERENCE_CACHE_TTL 秒）或資料異動時失效。
+回應帶有 ETag，請求帶 If-None-Match 且內容未變時回傳 304。
+
+新增、修改、刪除產品或客戶的端點完成後呼叫 invalidate_reference_cache()。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from fastapi import Request, Response
+from fastapi.encoders import jsonable_encoder
+
+# 快取有效秒數（可由環境變數調整）
+REFERENCE_CACHE_TTL = int(os.getenv("REFERENCE_CACHE_TTL", "300"))
+
+# 快取分類：異動時依分類失效
+PRODUCTS = 'products'
+CUSTOMERS = 'customers'
+
+
+class ReferenceCache:
+    """依 (分類, 鍵) 保存序列化後的回應內容與 ETag"""
+
+    def __init__(self, ttl: int = REFERENCE_CACHE_TTL):
+        self.ttl = ttl
+        self._entries = {}  # (分類, 鍵) -> (內容, ETag, 到期時間, 版本)
+        self._versions = {}  # 分類 -> 版本號，失效時遞增
+        self._loading = {}  # (分類, 鍵) -> 載入中的鎖
+        self._lock = threading.Lock()
+
+    def _version(self, namespace):
+        return self._versions.get(namespace, 0)
+
+    def get(self, namespace, key, loader):
+        """取得快取內容，沒有或已過期時呼叫 loader 重新查詢，回傳 (內容 bytes, ETag)"""
+        cache_key = (namespace, key)
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry and entry[2] > time.monotonic() and entry[3] == self._version(namespace):
+                return entry[0], entry[1]
+            load_lock = self._loading.setdefault(cache_key, threading.Lock())
+
+        # 同一個鍵只讓一個請求查詢資料庫，其他請求等待結果
+        with load_lock:
+            with self._lock:
+                entry = self._entries.get(cache_key)
+                version = self._version(namespace)
+                if entry and entry[2] > time.monotonic() and entry[3] == version:
+                    return entry[0], entry[1]
+
+            body = json.dumps(jsonable_encoder(loader()), ensure_ascii=False).encode('utf-8')
+            etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+            with self._lock:
+                # 查詢期間資料已異動時不寫入，下一個請求重新查詢
+                if version == self._version(namespace):
+                    self._entries[cache_key] = (body, etag, time.monotonic() + self.ttl, version)
+            return body, etag
+
+    def invalidate(self, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._versions[namespace] = self._version(namespace) + 1
+            for cache_key in [k for k in self._entries if k[0] in namespaces]:
+                del self._entries[cache_key]
+
+
+reference_cache = ReferenceCache()
+
+
+def cached_response(request: Request, namespace: str, key, loader) -> Response:
+    """以快取內容回應；If-None-Match 與 ETag 相同時回傳 304"""
+    body, etag = reference_cache.get(namespace, key, loader)
+    headers = {'ETag': etag, 'Cache-Control': 'no-cache'}
+
+    if_none_match = request.headers.get('if-none-match', '')
+    if etag in [tag.strip() for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
+
+
+def invalidate_reference_cache(*namespaces):
+    """產品或客戶資料異動後使快取失效（未指定時全部失效）"""
+    reference_cache.invalidate(*(namespaces or (PRODUCTS, CUSTOMERS)))
+    print(f"[API] 參考資料快取已失效: {', '.join(namespaces or (PRODUCTS, CUSTOMERS))}")
+
+
+def fix_latin1(value):
+    """修復以 latin1 誤讀的 UTF-8 字串；無法轉換時保持原值"""
+    if isinstance(value, str):
+        try:
+            return value.encode('latin1').decode('utf-8')
+        except (UnicodeDecodeError, UnicodeEncodeError):
+            pass
+    return value
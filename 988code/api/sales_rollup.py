@@ -0,0 +1,394 @@
+"""
+銷售彙總表（rollup）
+
+依日、月兩種粒度預先彙總 order_transactions 的銷貨金額，
+維度為產品的 category / subcategory / name_zh 與客戶的 city / district。
+order_transactions 的語句層級觸發器記錄有異動的交易日期；product_master / customer
+的維度欄位（分類、品名、縣市、地區）變更時，觸發器記錄相關產品或客戶的交易日期。
+查詢前只重新彙總這些日期與所屬月份，不需每次掃描整個交易表。
+"""
+import calendar
+import logging
+import sys
+import os
+import threading
+import psycopg2
+import psycopg2.errors
+from datetime import date, datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from database_config import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# 可查詢的維度：層級 -> (維度資料表, 別名, 欄位)
+SALES_LEVELS = {
+    'category': ('product_master', 'pm', 'category'),
+    'subcategory': ('product_master', 'pm', 'subcategory'),
+    'name_zh': ('product_master', 'pm', 'name_zh'),
+    'city': ('customer', 'c', 'city'),
+    'district': ('customer', 'c', 'district'),
+}
+
+GRAIN_DAY = 'day'
+GRAIN_MONTH = 'month'
+GRANULARITIES = (GRAIN_DAY, GRAIN_MONTH)
+
+# 彙總重算時使用的 advisory lock 代號
+ROLLUP_LOCK_ID = 988021
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS sales_rollup (
+    grain VARCHAR(5) NOT NULL,
+    level VARCHAR(20) NOT NULL,
+    value TEXT NOT NULL,
+    period DATE NOT NULL,
+    total_amount NUMERIC NOT NULL,
+    PRIMARY KEY (grain, level, value, period)
+);
+
+CREATE INDEX IF NOT EXISTS idx_sales_rollup_period ON sales_rollup (grain, period);
+
+CREATE TABLE IF NOT EXISTS sales_rollup_dirty_dates (
+    transaction_date DATE PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS sales_rollup_state (
+    id INTEGER PRIMARY KEY,
+    built_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE OR REPLACE FUNCTION mark_sales_rollup_dirty() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO sales_rollup_dirty_dates (transaction_date)
+        SELECT DISTINCT transaction_date::date FROM rollup_new_rows WHERE transaction_date IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        INSERT INTO sales_rollup_dirty_dates (transaction_date)
+        SELECT DISTINCT transaction_date::date FROM rollup_old_rows WHERE transaction_date IS NOT NULL
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'order_transactions_rollup_insert') THEN
+        CREATE TRIGGER order_transactions_rollup_insert
+        AFTER INSERT ON order_transactions
+        REFERENCING NEW TABLE AS rollup_new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION mark_sales_rollup_dirty();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'order_transactions_rollup_update') THEN
+        CREATE TRIGGER order_transactions_rollup_update
+        AFTER UPDATE ON order_transactions
+        REFERENCING OLD TABLE AS rollup_old_rows NEW TABLE AS rollup_new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION mark_sales_rollup_dirty();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = 'order_transactions_rollup_delete') THEN
+        CREATE TRIGGER order_transactions_rollup_delete
+        AFTER DELETE ON order_transactions
+        REFERENCING OLD TABLE AS rollup_old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION mark_sales_rollup_dirty();
+    END IF;
+END $$;
+"""
+
+# 重算指定日期的日彙總：產品與客戶維度分別彙總，與原本各自 JOIN 的查詢結果一致
+DAY_ROLLUP_SQL = """
+INSERT INTO sales_rollup (grain, level, value, period, total_amount)
+SELECT 'day', v.level, v.value, ot.transaction_date::date, COALESCE(SUM(ot.amount), 0)
+FROM order_transactions ot
+JOIN {table} {alias} ON ot.{join_key} = {alias}.{join_key}
+CROSS JOIN LATERAL (VALUES {values}) AS v(level, value)
+WHERE ot.document_type = '銷貨'
+    AND ot.is_active = 'active'
+    AND ot.transaction_date >= %(min_date)s
+    AND ot.transaction_date < %(max_date)s::date + 1
+    AND ot.transaction_date::date IN (SELECT transaction_date FROM sales_rollup_refresh_dates)
+    AND v.value IS NOT NULL
+GROUP BY v.level, v.value, ot.transaction_date::date
+"""
+
+DIMENSION_JOIN_KEYS = {'product_master': 'product_id', 'customer': 'customer_id'}
+
+# 維度資料表異動時，將相關產品或客戶的交易日期標記為待彙總（更新時只處理維度欄位有變的資料列）
+DIMENSION_TRIGGER_SQL = """
+CREATE OR REPLACE FUNCTION mark_sales_rollup_dirty_{table}() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO sales_rollup_dirty_dates (transaction_date)
+        SELECT DISTINCT ot.transaction_date::date FROM order_transactions ot
+        WHERE ot.transaction_date IS NOT NULL
+            AND ot.{key} IN (SELECT {key} FROM rollup_new_rows)
+        ON CONFLICT DO NOTHING;
+    ELSIF TG_OP = 'DELETE' THEN
+        INSERT INTO sales_rollup_dirty_dates (transaction_date)
+        SELECT DISTINCT ot.transaction_date::date FROM order_transactions ot
+        WHERE ot.transaction_date IS NOT NULL
+            AND ot.{key} IN (SELECT {key} FROM rollup_old_rows)
+        ON CONFLICT DO NOTHING;
+    ELSE
+        INSERT INTO sales_rollup_dirty_dates (transaction_date)
+        SELECT DISTINCT ot.transaction_date::date FROM order_transactions ot
+        WHERE ot.transaction_date IS NOT NULL
+            AND ot.{key} IN (
+                SELECT COALESCE(o.{key}, n.{key})
+                FROM rollup_old_rows o
+                FULL JOIN rollup_new_rows n ON n.{key} = o.{key}
+                WHERE o.{key} IS NULL OR n.{key} IS NULL
+                    OR ({old_columns}) IS DISTINCT FROM ({new_columns})
+            )
+        ON CONFLICT DO NOTHING;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_rollup_insert') THEN
+        CREATE TRIGGER {table}_rollup_insert
+        AFTER INSERT ON {table}
+        REFERENCING NEW TABLE AS rollup_new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION mark_sales_rollup_dirty_{table}();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_rollup_update') THEN
+        CREATE TRIGGER {table}_rollup_update
+        AFTER UPDATE ON {table}
+        REFERENCING OLD TABLE AS rollup_old_rows NEW TABLE AS rollup_new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION mark_sales_rollup_dirty_{table}();
+    END IF;
+    IF NOT EXISTS (SELECT 1 FROM pg_trigger WHERE tgname = '{table}_rollup_delete') THEN
+        CREATE TRIGGER {table}_rollup_delete
+        AFTER DELETE ON {table}
+        REFERENCING OLD TABLE AS rollup_old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION mark_sales_rollup_dirty_{table}();
+    END IF;
+END $$;
+"""
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def _day_rollup_queries():
+    """每個維度資料表一條日彙總 INSERT"""
+    queries = []
+    for table, join_key in DIMENSION_JOIN_KEYS.items():
+        columns = [(level, alias, column) for level, (t, alias, column) in SALES_LEVELS.items() if t == table]
+        alias = columns[0][1]
+        values = ", ".join(f"('{level}', {alias}.{column})" for level, alias, column in columns)
+        queries.append(DAY_ROLLUP_SQL.format(table=table, alias=alias, join_key=join_key, values=values))
+    return queries
+
+
+def _dimension_trigger_queries():
+    """每個維度資料表一組標記待彙總的觸發器"""
+    queries = []
+    for table, key in DIMENSION_JOIN_KEYS.items():
+        columns = [column for t, _, column in SALES_LEVELS.values() if t == table]
+        queries.append(DIMENSION_TRIGGER_SQL.format(
+            table=table, key=key,
+            old_columns=", ".join(f"o.{column}" for column in columns),
+            new_columns=", ".join(f"n.{column}" for column in columns),
+        ))
+    return queries
+
+
+def ensure_sales_rollup():
+    """建立彙總表與觸發器；第一次建立時將所有交易日期標記為待彙總（每個進程只執行一次）"""
+    global _schema_ready
+    if _schema_ready:
+        return
+
+    with _schema_lock:
+        if _schema_ready:
+            return
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK_ID,))
+                cursor.execute(SCHEMA_SQL)
+                for query in _dimension_trigger_queries():
+                    cursor.execute(query)
+                cursor.execute("SELECT 1 FROM sales_rollup_state WHERE id = 1")
+                if cursor.fetchone() is None:
+                    _mark_all_dates_dirty(cursor)
+                    cursor.execute("INSERT INTO sales_rollup_state (id, built_at) VALUES (1, CURRENT_TIMESTAMP)")
+                    logger.info("銷售彙總表初始化，所有交易日期將重新彙總")
+            conn.commit()
+        _schema_ready = True
+
+
+def _mark_all_dates_dirty(cursor):
+    cursor.execute("""
+        INSERT INTO sales_rollup_dirty_dates (transaction_date)
+        SELECT DISTINCT transaction_date::date FROM order_transactions WHERE transaction_date IS NOT NULL
+        ON CONFLICT DO NOTHING
+    """)
+
+
+def refresh_sales_rollup():
+    """重新彙總有異動的日期及其月份，回傳處理的日期數"""
+    ensure_sales_rollup()
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM sales_rollup_dirty_dates)")
+            if not cursor.fetchone()[0]:
+                conn.rollback()
+                return 0
+
+            # 同時只允許一個重算；等待中的請求取得鎖後會看到已清空的待彙總日期
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", (ROLLUP_LOCK_ID,))
+            cursor.execute("""
+                CREATE TEMP TABLE sales_rollup_refresh_dates ON COMMIT DROP AS
+                WITH claimed AS (DELETE FROM sales_rollup_dirty_dates RETURNING transaction_date)
+                SELECT transaction_date FROM claimed
+            """)
+            cursor.execute("SELECT COUNT(*), MIN(transaction_date), MAX(transaction_date) FROM sales_rollup_refresh_dates")
+            count, min_date, max_date = cursor.fetchone()
+            if not count:
+                conn.commit()
+                return 0
+
+            cursor.execute("""
+                DELETE FROM sales_rollup
+                WHERE grain = 'day' AND period IN (SELECT transaction_date FROM sales_rollup_refresh_dates)
+            """)
+            for query in _day_rollup_queries():
+                cursor.execute(query, {'min_date': min_date, 'max_date': max_date})
+
+            # 月彙總由日彙總加總
+            cursor.execute("""
+                CREATE TEMP TABLE sales_rollup_refresh_months ON COMMIT DROP AS
+                SELECT DISTINCT date_trunc('month', transaction_date)::date AS month
+                FROM sales_rollup_refresh_dates
+            """)
+            cursor.execute("""
+                DELETE FROM sales_rollup
+                WHERE grain = 'month' AND period IN (SELECT month FROM sales_rollup_refresh_months)
+            """)
+            cursor.execute("""
+                INSERT INTO sales_rollup (grain, level, value, period, total_amount)
+                SELECT 'month', level, value, date_trunc('month', period)::date, SUM(total_amount)
+                FROM sales_rollup
+                WHERE grain = 'day'
+                    AND date_trunc('month', period)::date IN (SELECT month FROM sales_rollup_refresh_months)
+                GROUP BY level, value, date_trunc('month', period)::date
+            """)
+        conn.commit()
+
+    logger.info(f"銷售彙總表已更新 {count} 個交易日期 ({min_date} ~ {max_date})")
+    return count
+
+
+def rebuild_sales_rollup():
+    """重新彙總所有日期（觸發器建立前已發生的維度變更等，需要完整重建時使用）"""
+    ensure_sales_rollup()
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            _mark_all_dates_dirty(cursor)
+        conn.commit()
+    return refresh_sales_rollup()
+
+
+def _parse_date(value):
+    return value if isinstance(value, date) else datetime.strptime(value, '%Y-%m-%d').date()
+
+
+def month_bounds(start_date, end_date):
+    """完整落在日期範圍內的月份區間 [full_start, full_end)；範圍頭尾不足一個月的部分由日彙總補上"""
+    start_date, end_date = _parse_date(start_date), _parse_date(end_date)
+    full_start = start_date if start_date.day == 1 else \
+        (start_date.replace(day=calendar.monthrange(start_date.year, start_date.month)[1]) + timedelta(days=1))
+    after_end = end_date + timedelta(days=1)
+    full_end = after_end.replace(day=1)
+    return full_start, max(full_start, full_end)
+
+
+# 依粒度預先準備的查詢：分組以陣列參數傳入，展開後與彙總表 JOIN，所有分組一次掃描
+# 參數：$1 層級[]、$2 值[]、$3 分組序號[]、$4 開始日、$5 結束日、$6/$7 完整月份區間（月粒度）
+SERIES_STATEMENTS = {
+    GRAIN_DAY: ('sales_rollup_series_day', """
+        PREPARE sales_rollup_series_day (text[], text[], int[], date, date) AS
+        SELECT g.group_index, r.level, r.value, r.period, r.total_amount
+        FROM unnest($1, $2, $3) AS g(level, value, group_index)
+        JOIN sales_rollup r ON r.grain = 'day' AND r.level = g.level AND r.value = g.value
+        WHERE r.period BETWEEN $4 AND $5
+        ORDER BY g.group_index, r.period, r.value
+    """),
+    GRAIN_MONTH: ('sales_rollup_series_month', """
+        PREPARE sales_rollup_series_month (text[], text[], int[], date, date, date, date) AS
+        WITH g AS (SELECT * FROM unnest($1, $2, $3) AS g(level, value, group_index))
+        SELECT g.group_index, r.level, r.value, r.period, r.total_amount
+        FROM g JOIN sales_rollup r ON r.grain = 'month' AND r.level = g.level AND r.value = g.value
+        WHERE r.period >= $6 AND r.period < $7
+        UNION ALL
+        SELECT g.group_index, r.level, r.value, date_trunc('month', r.period)::date, SUM(r.total_amount)
+        FROM g JOIN sales_rollup r ON r.grain = 'day' AND r.level = g.level AND r.value = g.value
+        WHERE r.period BETWEEN $4 AND $5 AND (r.period < $6 OR r.period >= $7)
+        GROUP BY g.group_index, r.level, r.value, date_trunc('month', r.period)::date
+        ORDER BY 1, 4, 3
+    """),
+}
+
+# 已準備查詢的後端連線（連線池中的連線會重複使用，每條連線只需 PREPARE 一次）
+_prepared = set()
+_prepared_lock = threading.Lock()
+
+
+def _execute_prepared(conn, cursor, granularity, params):
+    name, prepare_sql = SERIES_STATEMENTS[granularity]
+    key = (conn.info.backend_pid, name)
+    placeholders = ", ".join(["%s"] * len(params))
+
+    with _prepared_lock:
+        prepared = key in _prepared
+    if not prepared:
+        cursor.execute(prepare_sql)
+        with _prepared_lock:
+            _prepared.add(key)
+
+    try:
+        cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+    except psycopg2.errors.InvalidSqlStatementName:
+        # 連線已重建或 session 被重設，重新準備
+        conn.rollback()
+        cursor.execute(prepare_sql)
+        cursor.execute(f"EXECUTE {name} ({placeholders})", params)
+    return cursor.fetchall()
+
+
+def query_sales_series(groups, start_date, end_date, granularity=GRAIN_DAY):
+    """以單一查詢取得多個分組的銷售序列
+
+    Args:
+        groups: [(層級, [值, ...]), ...]，可同時包含多個層級，同一個值可出現在多個分組
+        granularity: 'day' 或 'month'（月粒度的 period 為該月1日）
+
+    Returns:
+        list: [(分組序號, period, level, value, total_amount), ...]，依分組、period、value 排序
+    """
+    levels, values, group_indexes = [], [], []
+    for group_index, (level, level_values) in enumerate(groups):
+        for value in level_values:
+            levels.append(level)
+            values.append(value)
+            group_indexes.append(group_index)
+    if not levels:
+        return []
+
+    params = [levels, values, group_indexes, _parse_date(start_date), _parse_date(end_date)]
+    if granularity == GRAIN_MONTH:
+        params.extend(month_bounds(start_date, end_date))
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cursor:
+            rows = _execute_prepared(conn, cursor, granularity, params)
+        conn.rollback()
+
+    return [(group_index, period, level, value, total_amount)
+            for group_index, level, value, period, total_amount in rows]
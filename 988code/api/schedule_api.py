@@ -23,52 +23,8 @@ scheduler_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'sched
 scheduler_path = os.path.abspath(scheduler_path)
 sys.path.insert(0, scheduler_path)
 
-# 使用子進程執行以避免segfault
-import subprocess
-
-def run_task(task_id: str) -> dict:
-    """在子進程中執行任務，避免記憶體衝突"""
-    try:
-        # 構建Python命令 - 使用動態路徑而非硬編碼
-        current_file_dir = os.path.dirname(os.path.abspath(__file__))
-        scheduler_path = os.path.join(os.path.dirname(current_file_dir), 'scheduler')
-        scheduler_path = scheduler_path.replace('\\', '\\\\')  # Windows路徑轉義
-        
-        python_code = f"""
-import sys
-import json
-import os
-
-# 動態添加scheduler路徑
-scheduler_path = r'{scheduler_path}'
-sys.path.insert(0, scheduler_path)
-
-try:
-    from task_executor import execute_task
-    result = execute_task('{task_id}')
-    print(json.dumps(result))
-except Exception as e:
-    print(json.dumps({{'success': False, 'error': str(e)}}))
-"""
-        
-        # 執行子進程
-        result = subprocess.run(
-            ["python", "-c", python_code],
-            capture_output=True,
-            text=True,
-            timeout=300  # 5分鐘超時
-        )
-        
-        if result.returncode == 0 and result.stdout:
-            return json.loads(result.stdout)
-        else:
-            error_msg = result.stderr if result.stderr else "Unknown error"
-            return {"success": False, "error": error_msg}
-            
-    except subprocess.TimeoutExpired:
-        return {"success": False, "error": "Task execution timeout"}
-    except Exception as e:
-        return {"success": False, "error": str(e)}
+# 手動任務由常駐工作進程池執行（仍在子進程中執行以避免segfault）
+from job_queue import TaskWorkerPool
 
 # 導入並實例化integrated_scheduler
 try:
@@ -170,6 +126,10 @@ def get_taipei_time():
     """獲取台北時間"""
     return datetime.now(TAIPEI_TZ)
 
+# 手動任務的擁有者：重啟時只清理同一擁有者留下的任務，不影響另一個進程（主 API / 排程伺服器）進行中的任務
+# 同一角色以多個進程執行時，需各自設定不同的 SCHEDULE_JOB_OWNER
+JOB_OWNER = os.getenv("SCHEDULE_JOB_OWNER") or ("scheduler" if os.getenv("SCHEDULER_AUTOSTART") == "1" else "api")
+
 def init_schedule_tables():
     """初始化排程相關資料表"""
     try:
@@ -199,6 +159,23 @@ def init_schedule_tables():
             )
         """, fetch='none')
 
+        # 手動任務佇列使用的欄位：開始/結束時間、任務回傳結果與執行的進程
+        execute_query("""
+            ALTER TABLE schedule_history
+                ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITH TIME ZONE,
+                ADD COLUMN IF NOT EXISTS finished_at TIMESTAMP WITH TIME ZONE,
+                ADD COLUMN IF NOT EXISTS result JSONB,
+                ADD COLUMN IF NOT EXISTS owner VARCHAR(100)
+        """, fetch='none')
+
+        # 本進程重啟前尚未完成的手動任務已隨工作進程中斷
+        execute_query("""
+            UPDATE schedule_history
+            SET status = 'failed', message = '服務重啟，任務中斷', finished_at = CURRENT_TIMESTAMP
+            WHERE owner = %s
+              AND (status = 'queued' OR (status = 'running' AND started_at IS NOT NULL AND finished_at IS NULL))
+        """, (JOB_OWNER,), fetch='none')
+
         # 插入預設排程設定
         for category, config in SCHEDULE_TASKS.items():
             execute_query("""
@@ -308,90 +285,106 @@ def toggle_schedule(request: ScheduleToggleRequest):
         logging.error(f"切換排程失敗: {e}")
         raise HTTPException(status_code=500, detail=f"切換排程失敗: {str(e)}")
 
+def find_task_config(task_id: str):
+    """依任務ID取得 (任務配置, 分類)，找不到時回傳 (None, None)"""
+    for category, config in SCHEDULE_TASKS.items():
+        for task in config["tasks"]:
+            if task["id"] == task_id:
+                return task, category
+    return None, None
+
+def mark_job_running(job_id: int):
+    """工作進程開始執行任務時更新狀態"""
+    execute_query("""
+        UPDATE schedule_history
+        SET status = 'running', message = '手動執行中', started_at = CURRENT_TIMESTAMP
+        WHERE id = %s
+    """, (job_id,), fetch='none')
+
+def record_job_result(job_id: int, result: dict):
+    """記錄任務執行結果與耗時"""
+    success = result.get('success', False)
+    message = result.get('message') or ("任務執行完成" if success else "任務執行失敗")
+    execute_query("""
+        UPDATE schedule_history
+        SET status = %s, message = %s, result = %s, finished_at = CURRENT_TIMESTAMP,
+            duration_seconds = COALESCE(%s, EXTRACT(EPOCH FROM CURRENT_TIMESTAMP - COALESCE(started_at, execution_time))::INTEGER)
+        WHERE id = %s
+    """, ("success" if success else "failed", message, json.dumps(result, ensure_ascii=False, default=str),
+          result.get('duration'), job_id), fetch='none')
+
+# 常駐工作進程池；排程伺服器（SCHEDULER_AUTOSTART=1）啟動時就預熱，其餘在第一次手動執行時啟動
+task_pool = TaskWorkerPool(on_running=mark_job_running, on_done=record_job_result)
+
 @router.post("/schedule/execute")
 def execute_task(request: TaskExecuteRequest):
-    """手動執行任務"""
+    """手動執行任務：排入任務佇列後立即回傳任務ID，以 /schedule/jobs/{job_id} 查詢進度"""
+    task_config, category = find_task_config(request.task_id)
+    if not task_config:
+        raise HTTPException(status_code=400, detail="無效的任務ID")
+
     try:
-        # 找到任務配置
-        task_config = None
-        category = None
-        
-        for cat, config in SCHEDULE_TASKS.items():
-            for task in config["tasks"]:
-                if task["id"] == request.task_id:
-                    task_config = task
-                    category = cat
-                    break
-            if task_config:
-                break
-        
-        if not task_config:
-            raise HTTPException(status_code=400, detail="無效的任務ID")
-        
-        # 記錄執行開始（台北時間）
-        start_time = get_taipei_time()
-        
-        # 注意: 此處仍使用舊的資料庫連線方式，需要根據具體邏輯手動替換
-        with psycopg2.connect(
-            dbname='988',
-            user='postgres',
-            password='988988',
-            host='localhost',
-            port='5433'
-        ) as conn:
+        with get_db_connection() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("""
-                    INSERT INTO schedule_history (task_id, task_name, category, status, message)
-                    VALUES (%s, %s, %s, %s, %s)
-                """, (request.task_id, task_config["name"], category, "running", "手動執行開始"))
-                conn.commit()
-        
-        # 使用子進程執行任務
-        try:
-            execution_result = run_task(request.task_id)
-            success = execution_result.get('success', False)
-            message = execution_result.get('message', f"任務 {task_config['name']} 執行完成")
-            # 如果任務執行器提供了持續時間，使用它
-            if 'duration' in execution_result:
-                duration = execution_result['duration']
-                end_time = start_time + timedelta(seconds=duration)
-        except Exception as e:
-            success = False
-            message = f"任務 {task_config['name']} 執行失敗: {str(e)}"
-            logging.error(f"Task execution error: {e}")
-        
-        # 記錄執行結果（台北時間）
-        if 'end_time' not in locals():
-            end_time = get_taipei_time()
-        if 'duration' not in locals():
-            duration = int((end_time - start_time).total_seconds())
-        
-        # 注意: 此處仍使用舊的資料庫連線方式，需要根據具體邏輯手動替換
-        with psycopg2.connect(
-            dbname='988',
-            user='postgres',
-            password='988988',
-            host='localhost',
-            port='5433'
-        ) as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    INSERT INTO schedule_history (task_id, task_name, category, status, message, duration_seconds)
+                    INSERT INTO schedule_history (task_id, task_name, category, status, message, owner)
                     VALUES (%s, %s, %s, %s, %s, %s)
-                """, (request.task_id, task_config["name"], category, 
-                      "success" if success else "failed", message, duration))
-                conn.commit()
-        
+                    RETURNING id
+                """, (request.task_id, task_config["name"], category, "queued", "手動執行排隊中", JOB_OWNER))
+                job_id = cursor.fetchone()[0]
+            conn.commit()
+
+        task_pool.submit(job_id, request.task_id)
+
         return {
-            "success": success,
-            "message": message,
-            "duration_seconds": duration
+            "success": True,
+            "job_id": job_id,
+            "status": "queued",
+            "message": f"任務 {task_config['name']} 已排入佇列",
+            "queue_length": task_pool.queued_count()
         }
-        
+
     except Exception as e:
         logging.error(f"執行任務失敗: {e}")
         raise HTTPException(status_code=500, detail=f"執行任務失敗: {str(e)}")
 
+@router.get("/schedule/jobs/{job_id}")
+def get_job_status(job_id: int):
+    """查詢手動任務的狀態、進度與結果"""
+    try:
+        row = execute_query("""
+            SELECT id, task_id, task_name, category, status, message, duration_seconds,
+                   execution_time, started_at, finished_at, result
+            FROM schedule_history
+            WHERE id = %s
+        """, (job_id,), fetch='one')
+    except Exception as e:
+        logging.error(f"查詢任務狀態失敗: {e}")
+        raise HTTPException(status_code=500, detail=f"查詢任務狀態失敗: {str(e)}")
+
+    if not row:
+        raise HTTPException(status_code=404, detail="找不到任務")
+
+    def to_taipei(value):
+        return value.astimezone(TAIPEI_TZ).isoformat() if value else None
+
+    return {
+        "success": True,
+        "data": {
+            "job_id": row[0],
+            "task_id": row[1],
+            "task_name": row[2],
+            "category": row[3],
+            "status": row[4],
+            "message": row[5],
+            "duration_seconds": row[6],
+            "queued_at": to_taipei(row[7]),
+            "started_at": to_taipei(row[8]),
+            "finished_at": to_taipei(row[9]),
+            "result": row[10]
+        }
+    }
+
 @router.get("/schedule/history/{task_id}")
 def get_task_history(task_id: str, limit: int = 10):
     """獲取任務執行歷史"""
@@ -524,6 +517,9 @@ def get_scheduler_status():
 # 初始化資料表
 init_schedule_tables()
 
+if os.getenv("SCHEDULER_AUTOSTART") == "1":
+    task_pool.start()
+
 # 環境變數控制自動啟動整合排程器
 # 設定 SCHEDULER_AUTOSTART=1 時才自動啟動，避免在8000和9000端口重複啟動
 if integrated_scheduler and os.getenv("SCHEDULER_AUTOSTART") == "1":
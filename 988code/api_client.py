@@ -0,0 +1,262 @@
+"""
+內部 API 客戶端
+Dash 進程呼叫 FastAPI 服務共用的連線池（keep-alive），提供預設逾時、GET 重試、
+唯讀參考資料端點的相同 GET 同時發出時合併為一次請求，以及各端點的延遲統計。
+回應帶有 ETag 的 GET 會保留最近的回應，之後以 If-None-Match 重新驗證，304 時直接沿用。
+
+用法與 requests 相同，回傳 requests.Response，例外仍為 requests.exceptions.*：
+    response = api_client.get('/get_category')
+    response = api_client.post('/create_temp_order', json=data)
+"""
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+API_BASE_URL = os.getenv("API_BASE_URL", "http://127.0.0.1:8000").rstrip('/')
+
+# 連線池大小（Dash 的 callback 執行緒共用）
+API_POOL_SIZE = int(os.getenv("API_POOL_SIZE", "20"))
+
+# 未指定 timeout 時的預設值（秒）：(連線, 讀取)
+DEFAULT_TIMEOUT = (3, float(os.getenv("API_TIMEOUT", "30")))
+
+# 需要較長時間的端點（依路徑前綴比對）
+ENDPOINT_TIMEOUTS = {
+    '/import/': (3, 300),
+    '/rag/': (3, 120),
+    '/get_potential_customers_analysis': (3, 300),
+}
+
+# GET 連線失敗或 502/503/504 時的重試次數
+GET_RETRIES = int(os.getenv("API_GET_RETRIES", "2"))
+
+# 唯讀參考資料端點：相同 GET 同時發出時只送出一次
+COALESCE_PATHS = frozenset({
+    '/get_category',
+    '/get_subcategory',
+    '/get_name_zh',
+    '/get_customer_ids',
+    '/get_customer_names',
+    '/get_county',
+    '/get_region',
+    '/get_product_hierarchy',
+})
+
+# 設為 1 時所有 GET 都合併（寫入後立即查詢可能拿到寫入前已發出的回應，預設關閉）
+COALESCE_GETS = os.getenv("API_COALESCE_GETS", "0") == "1"
+
+# 超過此毫秒數的請求記錄警告
+SLOW_REQUEST_MS = int(os.getenv("API_SLOW_REQUEST_MS", "2000"))
+
+# 保留帶 ETag 回應的數量
+ETAG_CACHE_SIZE = int(os.getenv("API_ETAG_CACHE_SIZE", "256"))
+
+
+def _create_session():
+    session = requests.Session()
+    retry = Retry(
+        total=GET_RETRIES,
+        connect=GET_RETRIES,
+        read=0,
+        status=GET_RETRIES,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD'}),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=API_POOL_SIZE, max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+_session = _create_session()
+
+_in_flight = {}  # GET 請求鍵 -> _PendingRequest
+_in_flight_lock = threading.Lock()
+
+_etag_responses = OrderedDict()  # GET 請求鍵 -> 帶 ETag 的回應
+_etag_lock = threading.Lock()
+
+_stats = {}  # 端點 -> 統計
+_stats_lock = threading.Lock()
+
+
+class _PendingRequest:
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+def _resolve_url(url):
+    """相對路徑加上 API_BASE_URL；完整網址維持不變"""
+    if url.startswith('http://') or url.startswith('https://'):
+        return url
+    return f"{API_BASE_URL}/{url.lstrip('/')}"
+
+
+def _endpoint_of(method, url):
+    """統計用的端點名稱：路徑中的數字與編碼過的參數以 {} 取代"""
+    path = urlsplit(url).path or '/'
+    segments = ['{}' if segment.isdigit() or '%' in segment else segment for segment in path.split('/')]
+    return f"{method} {'/'.join(segments)}"
+
+
+def _timeout_for(url):
+    path = urlsplit(url).path
+    for prefix, timeout in ENDPOINT_TIMEOUTS.items():
+        if path.startswith(prefix):
+            return timeout
+    return DEFAULT_TIMEOUT
+
+
+def _record(endpoint, elapsed_ms, failed):
+    with _stats_lock:
+        stats = _stats.setdefault(endpoint, {'count': 0, 'errors': 0, 'total_ms': 0.0, 'max_ms': 0.0})
+        stats['count'] += 1
+        stats['errors'] += int(failed)
+        stats['total_ms'] += elapsed_ms
+        stats['max_ms'] = max(stats['max_ms'], elapsed_ms)
+
+    if elapsed_ms >= SLOW_REQUEST_MS:
+        logger.warning(f"API 請求緩慢: {endpoint} {elapsed_ms:.0f}ms")
+
+
+def _send(method, url, **kwargs):
+    kwargs.setdefault('timeout', _timeout_for(url))
+    endpoint = _endpoint_of(method, url)
+    started = time.perf_counter()
+    failed = True
+    try:
+        response = _session.request(method, url, **kwargs)
+        failed = response.status_code >= 500
+        return response
+    finally:
+        _record(endpoint, (time.perf_counter() - started) * 1000, failed)
+
+
+def _conditional_get(url, key, kwargs):
+    """有先前帶 ETag 的回應時以 If-None-Match 重新驗證，內容未變（304）時沿用"""
+    with _etag_lock:
+        cached = _etag_responses.get(key)
+    if cached is not None:
+        kwargs = {**kwargs, 'headers': {'If-None-Match': cached.headers['ETag']}}
+
+    response = _send('GET', url, **kwargs)
+    if response.status_code == 304 and cached is not None:
+        return cached
+
+    if response.status_code == 200 and response.headers.get('ETag'):
+        with _etag_lock:
+            _etag_responses[key] = response
+            _etag_responses.move_to_end(key)
+            while len(_etag_responses) > ETAG_CACHE_SIZE:
+                _etag_responses.popitem(last=False)
+    return response
+
+
+def _request_key(url, kwargs):
+    """GET 請求鍵（合併與 ETag 重新驗證用）；帶有其他參數（headers、stream 等）的請求不適用"""
+    if set(kwargs) - {'params', 'timeout'}:
+        return None
+    params = kwargs.get('params')
+    if isinstance(params, dict):
+        params = tuple(sorted((str(k), str(v)) for k, v in params.items()))
+    elif params is not None and not isinstance(params, (str, bytes, tuple)):
+        return None
+    return url, params
+
+
+def request(method, url, coalesce=None, **kwargs):
+    """發送請求（參數與 requests.request 相同）
+
+    Args:
+        coalesce: 是否與同時發出的相同 GET 合併，預設只合併 COALESCE_PATHS（API_COALESCE_GETS=1 時全部合併）
+    """
+    method = method.upper()
+    url = _resolve_url(url)
+
+    if coalesce is None:
+        coalesce = COALESCE_GETS or urlsplit(url).path in COALESCE_PATHS
+    key = _request_key(url, kwargs) if method == 'GET' else None
+    if key is None:
+        return _send(method, url, **kwargs)
+    if not coalesce:
+        return _conditional_get(url, key, kwargs)
+
+    with _in_flight_lock:
+        pending = _in_flight.get(key)
+        owner = pending is None
+        if owner:
+            pending = _in_flight[key] = _PendingRequest()
+
+    if not owner:
+        # 相同請求進行中，直接等待其結果（Response 內容已完整讀取，可共用）
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.response
+
+    try:
+        pending.response = _conditional_get(url, key, kwargs)
+        return pending.response
+    except Exception as e:
+        pending.error = e
+        raise
+    finally:
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+        pending.done.set()
+
+
+def get(url, params=None, **kwargs):
+    return request('GET', url, params=params, **kwargs)
+
+
+def post(url, data=None, json=None, **kwargs):
+    return request('POST', url, data=data, json=json, **kwargs)
+
+
+def put(url, data=None, **kwargs):
+    return request('PUT', url, data=data, **kwargs)
+
+
+def patch(url, data=None, **kwargs):
+    return request('PATCH', url, data=data, **kwargs)
+
+
+def delete(url, **kwargs):
+    return request('DELETE', url, **kwargs)
+
+
+def get_latency_stats():
+    """各端點的請求次數、錯誤數與延遲（毫秒），依總耗時排序"""
+    with _stats_lock:
+        snapshot = {endpoint: dict(stats) for endpoint, stats in _stats.items()}
+
+    result = []
+    for endpoint, stats in snapshot.items():
+        result.append({
+            'endpoint': endpoint,
+            'count': stats['count'],
+            'errors': stats['errors'],
+            'avg_ms': round(stats['total_ms'] / stats['count'], 1) if stats['count'] else 0,
+            'max_ms': round(stats['max_ms'], 1),
+            'total_ms': round(stats['total_ms'], 1),
+        })
+    return sorted(result, key=lambda item: item['total_ms'], reverse=True)
+
+
+def reset_latency_stats():
+    with _stats_lock:
+        _stats.clear()
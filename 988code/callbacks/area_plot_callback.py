@@ -8,7 +8,7 @@ import json
 from collections import defaultdict
 
 # API 服務器配置
-API_BASE_URL = "http://127.0.0.1:8000"
+API_BASE_URL = api_client.API_BASE_URL
 
 def extract_areas_from_badges(badges):
     """
@@ -78,14 +78,15 @@ def convert_date_to_api_format(date_value, is_end_date=False):
     except:
         return None
 
-def fetch_area_sales_data_by_groups(area_pairs, start_date, end_date):
+def fetch_area_sales_data_by_groups(area_pairs, start_date, end_date, granularity='day'):
     """
-    按地區類型分組查詢銷售數據
+    按地區類型分組查詢銷售數據（所有分組一次請求）
     
     Parameters:
     - area_pairs: [(area_name, area_type), ...] 格式的地區列表
     - start_date: 開始日期
     - end_date: 結束日期
+    - granularity: 'day' 或 'month'
     
     Returns:
     - tuple: (合併後的銷售數據列表, 有資料的地區列表, 沒有資料的地區列表, 地區類型映射)
@@ -108,65 +109,67 @@ def fetch_area_sales_data_by_groups(area_pairs, start_date, end_date):
     areas_with_data = set()
     areas_without_data = []
     
-    # 建立所有選中地區的集合
-    all_selected_areas = {name for name, _ in area_pairs}
-    
-    # 為每個地區類型分組分別查詢
+    request_groups = []
     for area_type, area_names in groups.items():
         api_filter_level = filter_level_mapping.get(area_type)
         if not api_filter_level:
             # 如果地區類型無效，這些地區都算沒有資料
             areas_without_data.extend(area_names)
             continue
+        request_groups.append({"group_id": area_type, "filter_level": api_filter_level, "filter_values": area_names})
+
+    if not request_groups:
+        return all_data, [], areas_without_data, area_type_mapping
+
+    requested_areas = [name for group in request_groups for name in group["filter_values"]]
+
+    try:
+        # 準備 API 請求數據（所有地區類型一次查詢）
+        request_data = {
+            "groups": request_groups,
+            "start_date": start_date,
+            "end_date": end_date,
+            "granularity": granularity
+        }
+        
+        # 調用 API
+        response = api_client.post(
+            f"{API_BASE_URL}/get_sales_data_batch",
+            json=request_data,
+            headers={"Content-Type": "application/json"}
+        )
+        
+        if response.status_code == 200:
+            api_result = response.json()
+            # 展開各分組的序列，分組標記即為地區類型
+            for group in api_result.get('groups', []):
+                for series in group['series']:
+                    for point in series['data']:
+                        all_data.append({
+                            'sales_month': point['sales_month'],
+                            'filter_value': series['filter_value'],
+                            'total_amount': point['total_amount'],
+                            'area_type': group['group_id']
+                        })
+                    # 記錄有資料的地區
+                    areas_with_data.add(series['filter_value'])
             
-        try:
-            # 準備 API 請求數據
-            request_data = {
-                "filter_level": api_filter_level,
-                "filter_values": area_names,
-                "start_date": start_date,
-                "end_date": end_date
-            }
+            # 找出沒有資料的地區
+            areas_without_data.extend(name for name in requested_areas if name not in areas_with_data)
             
-            # 調用 API
-            response = requests.post(
-                f"{API_BASE_URL}/get_sales_data",
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
+        else:
+            print(f"API 請求失敗，狀態碼: {response.status_code}")
+            # API 失敗，所有地區都算沒有資料
+            areas_without_data.extend(requested_areas)
             
-            if response.status_code == 200:
-                api_result = response.json()
-                group_data = api_result.get('data', [])
-                
-                if group_data:
-                    # 為每個數據項添加地區類型資訊
-                    for item in group_data:
-                        item['area_type'] = area_type
-                    all_data.extend(group_data)
-                    
-                    # 記錄有資料的地區
-                    for item in group_data:
-                        areas_with_data.add(item['filter_value'])
-                
-                # 找出這個組中沒有資料的地區
-                areas_in_response = {item['filter_value'] for item in group_data}
-                no_data_in_group = set(area_names) - areas_in_response
-                areas_without_data.extend(list(no_data_in_group))
-                
-            else:
-                print(f"API 請求失敗，地區類型: {area_type}, 狀態碼: {response.status_code}")
-                # API 失敗，這組的所有地區都算沒有資料
-                areas_without_data.extend(area_names)
-                
-        except requests.exceptions.RequestException as e:
-            print(f"API 請求異常，地區類型: {area_type}, 錯誤: {str(e)}")
-            # API 異常，這組的所有地區都算沒有資料
-            areas_without_data.extend(area_names)
-        except Exception as e:
-            print(f"處理地區類型 {area_type} 時發生錯誤: {str(e)}")
-            # 處理異常，這組的所有地區都算沒有資料
-            areas_without_data.extend(area_names)
+    except requests.exceptions.RequestException as e:
+        print(f"API 請求異常，錯誤: {str(e)}")
+        # API 異常，所有地區都算沒有資料
+        areas_without_data.extend(requested_areas)
+    except Exception as e:
+        print(f"處理地區銷售數據時發生錯誤: {str(e)}")
+        # 處理異常，所有地區都算沒有資料
+        areas_without_data.extend(requested_areas)
     
     return all_data, list(areas_with_data), areas_without_data, area_type_mapping
 
@@ -202,8 +205,7 @@ def create_area_plotly_chart(data, start_date, end_date, all_selected_areas=None
     else:
         end_dt = datetime.strptime(end_date, '%Y-%m')
 
-    date_range_days = (end_dt - start_dt).days + 1
-    use_daily = date_range_days <= 31
+    use_daily = sales_granularity(start_date, end_date) == 'day'
 
     # 轉換數據為 DataFrame
     df = pd.DataFrame(data) if data else pd.DataFrame()
@@ -505,7 +507,8 @@ def generate_area_chart(n_clicks, badges, start_date, end_date):
     
     try:
         # 使用新的分組查詢邏輯
-        chart_data, areas_with_data, areas_without_data, area_type_mapping = fetch_area_sales_data_by_groups(area_pairs, api_start_date, api_end_date)
+        chart_data, areas_with_data, areas_without_data, area_type_mapping = fetch_area_sales_data_by_groups(
+            area_pairs, api_start_date, api_end_date, sales_granularity(start_date, end_date))
         
         # 即使沒有數據，也要生成圖表顯示0值線條
         # if not chart_data:
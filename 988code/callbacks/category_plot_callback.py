@@ -8,7 +8,7 @@ import json
 from collections import defaultdict
 
 # API 服務器配置
-API_BASE_URL = "http://127.0.0.1:8000"
+API_BASE_URL = api_client.API_BASE_URL
 
 def extract_products_from_badges(badges):
     """
@@ -78,14 +78,15 @@ def convert_date_to_api_format(date_value, is_end_date=False):
     except:
         return None
 
-def fetch_sales_data_by_groups(product_pairs, start_date, end_date):
+def fetch_sales_data_by_groups(product_pairs, start_date, end_date, granularity='day'):
     """
-    按產品類型分組查詢銷售數據
+    按產品類型分組查詢銷售數據（所有分組一次請求）
     
     Parameters:
     - product_pairs: [(product_name, product_type), ...] 格式的產品列表
     - start_date: 開始日期
     - end_date: 結束日期
+    - granularity: 'day' 或 'month'
     
     Returns:
     - tuple: (合併後的銷售數據列表, 有資料的產品列表, 沒有資料的產品列表, 產品類型映射)
@@ -109,65 +110,67 @@ def fetch_sales_data_by_groups(product_pairs, start_date, end_date):
     products_with_data = set()
     products_without_data = []
     
-    # 建立所有選中產品的集合
-    all_selected_products = {name for name, _ in product_pairs}
-    
-    # 為每個產品類型分組分別查詢
+    request_groups = []
     for product_type, product_names in groups.items():
         api_filter_level = filter_level_mapping.get(product_type)
         if not api_filter_level:
             # 如果產品類型無效，這些產品都算沒有資料
             products_without_data.extend(product_names)
             continue
+        request_groups.append({"group_id": product_type, "filter_level": api_filter_level, "filter_values": product_names})
+
+    if not request_groups:
+        return all_data, [], products_without_data, product_type_mapping
+
+    requested_products = [name for group in request_groups for name in group["filter_values"]]
+
+    try:
+        # 準備 API 請求數據
+        request_data = {
+            "groups": request_groups,
+            "start_date": start_date,
+            "end_date": end_date,
+            "granularity": granularity
+        }
+        
+        # 調用 API
+        response = api_client.post(
+            f"{API_BASE_URL}/get_sales_data_batch",
+            json=request_data,
+            headers={"Content-Type": "application/json"}
+        )
+        
+        if response.status_code == 200:
+            api_result = response.json()
+            # 展開各分組的序列，分組標記即為產品類型
+            for group in api_result.get('groups', []):
+                for series in group['series']:
+                    for point in series['data']:
+                        all_data.append({
+                            'sales_month': point['sales_month'],
+                            'filter_value': series['filter_value'],
+                            'total_amount': point['total_amount'],
+                            'product_type': group['group_id']
+                        })
+                    # 記錄有資料的產品
+                    products_with_data.add(series['filter_value'])
             
-        try:
-            # 準備 API 請求數據
-            request_data = {
-                "filter_level": api_filter_level,
-                "filter_values": product_names,
-                "start_date": start_date,
-                "end_date": end_date
-            }
+            # 找出沒有資料的產品
+            products_without_data.extend(name for name in requested_products if name not in products_with_data)
             
-            # 調用 API
-            response = requests.post(
-                f"{API_BASE_URL}/get_sales_data",
-                json=request_data,
-                headers={"Content-Type": "application/json"}
-            )
+        else:
+            print(f"API 請求失敗，狀態碼: {response.status_code}")
+            # API 失敗，所有產品都算沒有資料
+            products_without_data.extend(requested_products)
             
-            if response.status_code == 200:
-                api_result = response.json()
-                group_data = api_result.get('data', [])
-                
-                if group_data:
-                    # 為每個數據項添加產品類型資訊
-                    for item in group_data:
-                        item['product_type'] = product_type
-                    all_data.extend(group_data)
-                    
-                    # 記錄有資料的產品
-                    for item in group_data:
-                        products_with_data.add(item['filter_value'])
-                
-                # 找出這個組中沒有資料的產品
-                products_in_response = {item['filter_value'] for item in group_data}
-                no_data_in_group = set(product_names) - products_in_response
-                products_without_data.extend(list(no_data_in_group))
-                
-            else:
-                print(f"API 請求失敗，產品類型: {product_type}, 狀態碼: {response.status_code}")
-                # API 失敗，這組的所有產品都算沒有資料
-                products_without_data.extend(product_names)
-                
-        except requests.exceptions.RequestException as e:
-            print(f"API 請求異常，產品類型: {product_type}, 錯誤: {str(e)}")
-            # API 異常，這組的所有產品都算沒有資料
-            products_without_data.extend(product_names)
-        except Exception as e:
-            print(f"處理產品類型 {product_type} 時發生錯誤: {str(e)}")
-            # 處理異常，這組的所有產品都算沒有資料
-            products_without_data.extend(product_names)
+    except requests.exceptions.RequestException as e:
+        print(f"API 請求異常，錯誤: {str(e)}")
+        # API 異常，所有產品都算沒有資料
+        products_without_data.extend(requested_products)
+    except Exception as e:
+        print(f"處理銷售數據時發生錯誤: {str(e)}")
+        # 處理異常，所有產品都算沒有資料
+        products_without_data.extend(requested_products)
     
     return all_data, list(products_with_data), products_without_data, product_type_mapping
 
@@ -204,8 +207,7 @@ def create_plotly_chart(data, start_date, end_date, all_selected_products=None,
     else:
         end_dt = datetime.strptime(end_date, '%Y-%m')
 
-    date_range_days = (end_dt - start_dt).days + 1
-    use_daily = date_range_days <= 31
+    use_daily = sales_granularity(start_date, end_date) == 'day'
 
     # 轉換數據為 DataFrame
     df = pd.DataFrame(data) if data else pd.DataFrame()
@@ -514,7 +516,8 @@ def generate_chart(n_clicks, badges, start_date, end_date, radio_value):
     
     try:
         # 使用新的分組查詢邏輯
-        chart_data, products_with_data, products_without_data, product_type_mapping = fetch_sales_data_by_groups(product_pairs, api_start_date, api_end_date)
+        chart_data, products_with_data, products_without_data, product_type_mapping = fetch_sales_data_by_groups(
+            product_pairs, api_start_date, api_end_date, sales_granularity(start_date, end_date))
         
         # 即使沒有數據，也要生成圖表顯示0值線條
         # if not chart_data:
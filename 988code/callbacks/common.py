@@ -9,7 +9,15 @@ from dash.dependencies import Input, Output, State, MATCH, ALL
 from dash import ALL
 from dash import dash_table
 from dash.exceptions import PreventUpdate
+import api_client
 
 from components.table import custom_table
 
 from app import app
+
+
+def sales_granularity(start_date, end_date):
+    """日期範圍在31天內以日為單位，否則以月為單位（YYYY-MM 視為該月1日，與圖表顯示一致）"""
+    start_dt = datetime.datetime.strptime(start_date, '%Y-%m-%d' if len(start_date.split('-')) == 3 else '%Y-%m')
+    end_dt = datetime.datetime.strptime(end_date, '%Y-%m-%d' if len(end_date.split('-')) == 3 else '%Y-%m')
+    return 'day' if (end_dt - start_dt).days + 1 <= 31 else 'month'
@@ -41,7 +41,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # API 服務器配置
-API_BASE_URL = "http://127.0.0.1:8000"  # 假設 FastAPI 在 8000 端口運行
+API_BASE_URL = api_client.API_BASE_URL
 
 # 全域變數來儲存當前選中的資料類型
 current_data_type = None
@@ -886,7 +886,7 @@ def process_sales_import(current_files, session_data, user_role):
                     # 呼叫 API 處理檔案
                     api_url = f"{API_BASE_URL}/import/sales"
                     logger.info(f"正在處理檔案: {filename}")
-                    response = requests.post(api_url, files=files, data=data, timeout=300)
+                    response = api_client.post(api_url, files=files, data=data, timeout=300)
                     
                     logger.info(f"API 回應狀態碼: {response.status_code}")
                     logger.info(f"API 回應內容: {response.text}")
@@ -1030,7 +1030,7 @@ def save_current_files(n_clicks, session_data, user_role):
                         # 先檢查客戶和產品
                         check_api_url = f"{API_BASE_URL}/import/sales/check-customers-and-products"
                         logger.info(f"正在檢查銷貨資料中的客戶和產品: {filename}")
-                        check_response = requests.post(check_api_url, files=files, data=data, timeout=300)
+                        check_response = api_client.post(check_api_url, files=files, data=data, timeout=300)
 
                         if check_response.status_code == 200:
                             check_result = check_response.json()
@@ -1066,7 +1066,7 @@ def save_current_files(n_clicks, session_data, user_role):
                                 # 沒有缺失項目，直接上傳
                                 api_url = f"{API_BASE_URL}/import/sales"
                                 logger.info(f"正在匯入銷貨資料: {filename}")
-                                response = requests.post(api_url, files=files, data=data, timeout=300)
+                                response = api_client.post(api_url, files=files, data=data, timeout=300)
 
                                 if response.status_code == 200:
                                     result = response.json()
@@ -1213,7 +1213,7 @@ def save_current_files(n_clicks, session_data, user_role):
                             # 呼叫庫存產品檢查 API
                             api_url = f"{API_BASE_URL}/import/inventory/check-products"
                             logger.info(f"正在檢查庫存產品: {filename}")
-                            response = requests.post(api_url, files=files, data=data, timeout=300)
+                            response = api_client.post(api_url, files=files, data=data, timeout=300)
                             
                             logger.info(f"庫存產品檢查 API 回應狀態碼: {response.status_code}")
                             logger.info(f"庫存產品檢查 API 回應內容: {response.text}")
@@ -1474,7 +1474,7 @@ def save_new_customer(n_clicks, customer_id, customer_name, phone, address, city
     try:
         # 呼叫創建客戶 API
         api_url = f"{API_BASE_URL}/customer/create"
-        response = requests.post(api_url, json=customer_data, timeout=30)
+        response = api_client.post(api_url, json=customer_data, timeout=30)
         
         if response.status_code == 200:
             result = response.json()
@@ -1733,7 +1733,7 @@ def save_new_product(n_clicks, product_id, warehouse_id, name_zh, category, subc
     try:
         # 呼叫創建產品 API
         api_url = f"{API_BASE_URL}/product/create"
-        response = requests.post(api_url, json=product_data, timeout=30)
+        response = api_client.post(api_url, json=product_data, timeout=30)
         
         if response.status_code == 200:
             result = response.json()
@@ -1863,7 +1863,7 @@ def process_inventory_import(current_files, session_data, user_role):
                     # 呼叫庫存 API 處理檔案
                     api_url = f"{API_BASE_URL}/import/inventory"
                     logger.info(f"正在處理庫存檔案: {filename}")
-                    response = requests.post(api_url, files=files, data=data, timeout=300)
+                    response = api_client.post(api_url, files=files, data=data, timeout=300)
                     
                     logger.info(f"庫存 API 回應狀態碼: {response.status_code}")
                     logger.info(f"庫存 API 回應內容: {response.text}")
@@ -1,5 +1,17 @@
 from dash import dash_table
 from dash import html, dcc, dash_table, Input, Output, State, ctx, callback_context, exceptions
+from dash.dependencies import MATCH, ALL
+import dash_bootstrap_components as dbc
+import pandas as pd
+import threading
+import uuid
+from collections import OrderedDict
+from functools import partial
+
+# 伺服器端分頁：每頁筆數、保留的表格資料數量、估算欄寬時的抽樣筆數
+DEFAULT_PAGE_SIZE = 100
+PAGED_TABLE_CACHE_SIZE = 32
+WIDTH_SAMPLE_ROWS = 200
 
 # 信心度顏色映射函數 (從 restock_reminder.py 複製)
 def get_confidence_color(confidence_level):
@@ -22,36 +34,53 @@ def get_row_background_color(row_data):
             return '#f8d7da'  # 淺紅色
     return 'white'  # 默認白色
 
-def custom_table(df, show_checkbox=False, show_button=False, button_text="操作", button_class="btn btn-warning btn-sm", button_id_type='status-button', checkbox_id_type='status-checkbox', sticky_columns=None, table_height='78vh', sortable_columns=None, sort_state=None):
+def _text_width(value):
+    """估算儲存格文字寬度：中文14px、英文8px，加上 padding 4px 8px 的 16px"""
+    return sum(14 if ord(c) > 127 else 8 for c in str(value)) + 16
+
+def sampled_column_widths(df, sample_rows=WIDTH_SAMPLE_ROWS):
+    """估算每個欄位的寬度
+    
+    資料超過 sample_rows 筆時平均抽樣估算，不逐一掃描每個值；
+    取標題和內容的最大值，左右各加5px（總共15px），再加5px buffer，加2px邊框
+    """
+    if len(df) > sample_rows:
+        step = len(df) / sample_rows
+        sample = df.iloc[[int(i * step) for i in range(sample_rows)]]
+    else:
+        sample = df
+
+    return {
+        col: max([_text_width(col)] + [_text_width(value) for value in sample[col]]) + 22
+        for col in df.columns
+    }
+
+def custom_table(df, show_checkbox=False, show_button=False, button_text="操作", button_class="btn btn-warning btn-sm", button_id_type='status-button', checkbox_id_type='status-checkbox', sticky_columns=None, table_height='78vh', sortable_columns=None, sort_state=None, column_widths=None, page_size=None, table_id=None):
+    """
+    建立表格
+    
+    - column_widths: 預先計算的欄位寬度（未提供時由抽樣資料估算）
+    - page_size / table_id: 資料超過 page_size 筆時改用伺服器端分頁（見 paged_table），
+      只渲染目前頁面的列；checkbox 與按鈕的 index 仍為 df 的索引值
+    """
+    if page_size and len(df) > page_size:
+        render_page = partial(
+            custom_table, show_checkbox=show_checkbox, show_button=show_button, button_text=button_text,
+            button_class=button_class, button_id_type=button_id_type, checkbox_id_type=checkbox_id_type,
+            sticky_columns=sticky_columns, table_height=table_height, sortable_columns=sortable_columns,
+            sort_state=sort_state, column_widths=sampled_column_widths(df)
+        )
+        return paged_table(df, render_page, table_id or button_id_type, page_size=page_size)
+
     if sticky_columns is None:
         sticky_columns = []
     if sortable_columns is None:
         sortable_columns = []
+    if column_widths is None:
+        column_widths = sampled_column_widths(df)
     
-    # 計算每個浮空欄位的最適寬度
-    def calculate_column_width(col):
-        # 計算標題寬度 (padding: 4px 8px = 16px)
-        # 考慮中文字符較寬的問題
-        col_str = str(col)
-        char_width = sum(14 if ord(c) > 127 else 8 for c in col_str)  # 中文14px, 英文8px
-        header_width = char_width + 16
-        
-        # 計算內容最大寬度
-        max_content_width = 0
-        for value in df[col]:
-            value_str = str(value)
-            value_char_width = sum(14 if ord(c) > 127 else 8 for c in value_str)  # 中文14px, 英文8px
-            content_width = value_char_width + 16  # padding: 4px 8px = 16px
-            max_content_width = max(max_content_width, content_width)
-        
-        # 取標題和內容的最大值，左右各加5px（總共15px），再加5px buffer，加2px邊框
-        calculated_width = max(header_width, max_content_width) + 22
-        return calculated_width
-    
-    # 計算所有浮空欄位的寬度
-    sticky_widths = {}
-    for col in sticky_columns:
-        sticky_widths[col] = calculate_column_width(col)
+    # 浮空欄位的寬度
+    sticky_widths = {col: column_widths[col] for col in sticky_columns}
     
     # 計算按鈕欄位寬度
     button_width = 100  # 固定按鈕欄位寬度
@@ -101,16 +130,8 @@ def custom_table(df, show_checkbox=False, show_button=False, button_text="操作
         
         for col in                 ([col for col in df.columns if col in sticky_columns] + 
                  [col for col in df.columns if col not in sticky_columns]) if sticky_columns else df.columns:
-            # 計算cell內容的寬度 - 取標題或內容的最大值，左右各加5px（總共15px），再加5px buffer，加2px邊框
-            col_str = str(col)
-            header_char_width = sum(14 if ord(c) > 127 else 8 for c in col_str)  # 中文14px, 英文8px
-            header_width = header_char_width + 16
-            
-            row_value_str = str(row[col])
-            content_char_width = sum(14 if ord(c) > 127 else 8 for c in row_value_str)  # 中文14px, 英文8px
-            content_width = content_char_width + 16
-            
-            cell_width = max(header_width, content_width) + 22
+            # 同一欄位使用統一寬度
+            cell_width = column_widths[col]
             
             # 決定背景顏色和文字顏色
             if col == '狀態':
@@ -383,3 +404,170 @@ def custom_table(df, show_checkbox=False, show_button=False, button_text="操作
     })
     
     return table_div
+
+
+# ===== 伺服器端分頁表格 =====
+
+_paged_tables = OrderedDict()  # token -> 表格資料與渲染函數
+_paged_tables_lock = threading.Lock()
+_paged_callbacks_registered = False
+
+def _register_paged_table(df, render_page, page_size):
+    token = uuid.uuid4().hex
+    with _paged_tables_lock:
+        _paged_tables[token] = {
+            'df': df,
+            'render_page': render_page,
+            'page_size': page_size,
+            'view': (('', None, 'asc'), list(range(len(df))))  # (檢視條件, 列位置)
+        }
+        while len(_paged_tables) > PAGED_TABLE_CACHE_SIZE:
+            _paged_tables.popitem(last=False)
+    return token
+
+def _get_paged_table(token):
+    with _paged_tables_lock:
+        entry = _paged_tables.get(token)
+        if entry is not None:
+            _paged_tables.move_to_end(token)
+        return entry
+
+def _page_count(total_rows, page_size):
+    return max(1, (total_rows + page_size - 1) // page_size)
+
+def _page_info(page, total_pages, total_rows):
+    return f"第 {page + 1} / {total_pages} 頁（共 {total_rows} 筆）"
+
+def _view_positions(df, filter_text, sort_column, sort_order):
+    """依搜尋文字與排序條件計算要顯示的列位置"""
+    frame = df.reset_index(drop=True)
+
+    if filter_text:
+        mask = pd.Series(False, index=frame.index)
+        for col in frame.columns:
+            mask |= frame[col].astype(str).str.contains(filter_text, case=False, regex=False, na=False)
+        frame = frame[mask]
+
+    if sort_column in frame.columns:
+        ascending = sort_order != 'desc'
+        try:
+            frame = frame.sort_values(sort_column, ascending=ascending, kind='mergesort')
+        except TypeError:
+            # 混合型別的欄位以文字排序
+            frame = frame.sort_values(sort_column, ascending=ascending, kind='mergesort', key=lambda s: s.astype(str))
+
+    return list(frame.index)
+
+def paged_table(df, render_page, table_id, page_size=DEFAULT_PAGE_SIZE):
+    """
+    伺服器端分頁表格
+    
+    完整資料保留在伺服器，畫面上只渲染目前頁面的列；換頁、搜尋與排序由
+    register_paged_table_callbacks 註冊的 callback 處理，每次只傳送一頁。
+    
+    - render_page: 接收單頁 DataFrame 並回傳表格元件的函數（例如 custom_table），
+      分頁切片保留原本的索引值，因此 checkbox 與按鈕的 pattern-matching id 不變
+    - table_id: 同一頁面中區分多個分頁表格
+    
+    注意：換頁後只有目前頁面的 checkbox 存在，勾選狀態不會跨頁保留。
+    """
+    if len(df) <= page_size:
+        return render_page(df)
+
+    token = _register_paged_table(df, render_page, page_size)
+    total_pages = _page_count(len(df), page_size)
+
+    nav_button = lambda label, action: dbc.Button(
+        label, id={'type': 'paged-table-nav', 'table': table_id, 'action': action},
+        color="primary", outline=True, size="sm"
+    )
+    sort_options = [{'label': str(col), 'value': col} for col in df.columns if isinstance(col, str)]
+
+    toolbar = html.Div([
+        dcc.Input(
+            id={'type': 'paged-table-filter', 'table': table_id},
+            type='text', placeholder='搜尋表格內容', debounce=True,
+            style={'width': '200px', 'marginRight': '8px'}
+        ),
+        html.Div(dcc.Dropdown(
+            id={'type': 'paged-table-sort-column', 'table': table_id},
+            options=sort_options, placeholder='排序欄位', clearable=True
+        ), style={'width': '160px', 'marginRight': '8px'}),
+        html.Div(dcc.Dropdown(
+            id={'type': 'paged-table-sort-order', 'table': table_id},
+            options=[{'label': '升冪', 'value': 'asc'}, {'label': '降冪', 'value': 'desc'}],
+            value='asc', clearable=False
+        ), style={'width': '100px', 'marginRight': '16px'}),
+        dbc.ButtonGroup([
+            nav_button("<< 最前頁", 'first'),
+            nav_button("< 上一頁", 'prev'),
+            nav_button("下一頁 >", 'next'),
+            nav_button("最末頁 >>", 'last'),
+        ], style={'marginRight': '12px'}),
+        html.Span(_page_info(0, total_pages, len(df)), id={'type': 'paged-table-info', 'table': table_id})
+    ], style={'display': 'flex', 'alignItems': 'center', 'marginBottom': '8px', 'flexWrap': 'wrap'})
+
+    return html.Div([
+        dcc.Store(id={'type': 'paged-table-state', 'table': table_id}, data={'token': token, 'page': 0}),
+        toolbar,
+        html.Div(render_page(df.iloc[:page_size]), id={'type': 'paged-table-window', 'table': table_id})
+    ])
+
+def register_paged_table_callbacks(app):
+    """註冊分頁表格的換頁、搜尋與排序 callback（所有頁面共用，只註冊一次）"""
+    global _paged_callbacks_registered
+    if _paged_callbacks_registered:
+        return
+    _paged_callbacks_registered = True
+
+    @app.callback(
+        [Output({'type': 'paged-table-window', 'table': MATCH}, 'children'),
+         Output({'type': 'paged-table-info', 'table': MATCH}, 'children'),
+         Output({'type': 'paged-table-state', 'table': MATCH}, 'data')],
+        [Input({'type': 'paged-table-nav', 'table': MATCH, 'action': ALL}, 'n_clicks'),
+         Input({'type': 'paged-table-filter', 'table': MATCH}, 'value'),
+         Input({'type': 'paged-table-sort-column', 'table': MATCH}, 'value'),
+         Input({'type': 'paged-table-sort-order', 'table': MATCH}, 'value')],
+        State({'type': 'paged-table-state', 'table': MATCH}, 'data'),
+        prevent_initial_call=True
+    )
+    def update_paged_table(nav_clicks, filter_text, sort_column, sort_order, state):
+        if not state:
+            raise exceptions.PreventUpdate
+
+        entry = _get_paged_table(state.get('token'))
+        if entry is None:
+            return html.Div("表格資料已過期，請重新查詢", style={'padding': '16px'}), "", state
+
+        view_key = ((filter_text or '').strip(), sort_column, sort_order)
+        cached_key, positions = entry['view']
+        if view_key != cached_key:
+            positions = _view_positions(entry['df'], *view_key)
+            entry['view'] = (view_key, positions)
+
+        page_size = entry['page_size']
+        total_pages = _page_count(len(positions), page_size)
+        page = state.get('page', 0)
+
+        triggered = ctx.triggered_id
+        if isinstance(triggered, dict) and triggered.get('type') == 'paged-table-nav':
+            if not any(nav_clicks):
+                raise exceptions.PreventUpdate
+            action = triggered.get('action')
+            if action == 'first':
+                page = 0
+            elif action == 'prev':
+                page = page - 1
+            elif action == 'next':
+                page = page + 1
+            elif action == 'last':
+                page = total_pages - 1
+        else:
+            # 搜尋或排序條件改變時回到第一頁
+            page = 0
+        page = min(max(page, 0), total_pages - 1)
+
+        window = entry['df'].iloc[positions[page * page_size:(page + 1) * page_size]]
+        content = entry['render_page'](window) if not window.empty else html.Div("沒有符合條件的資料", style={'padding': '16px'})
+
+        return content, _page_info(page, total_pages, len(positions)), {**state, 'page': page}
@@ -92,6 +92,24 @@ class DatabaseConfig:
             if conn:
                 pool.putconn(conn)
 
+    def open_dedicated_connection(self, env: str = None):
+        """建立不經過連線池的專用連線（供 LISTEN 等長時間佔用的用途，使用完需自行關閉）"""
+        env = env or self.default_env
+        config = self.configs.get(env)
+        if not config:
+            raise ValueError(f"無效的環境名稱: {env}")
+
+        return psycopg2.connect(
+            host=config['host'],
+            port=config['port'],
+            database=config['database'],
+            user=config['user'],
+            password=config['password'],
+            connect_timeout=10,
+            application_name='988_web_app_listener',
+            client_encoding='utf8'
+        )
+
     def execute_query(self, query: str, params: tuple = (), env: str = None, fetch: str = 'all'):
         """執行查詢"""
         with self.get_connection(env) as conn:
@@ -108,6 +126,30 @@ class DatabaseConfig:
                 else:
                     raise ValueError("fetch 參數必須是 'all', 'one', 或 'none'")
 
+    def query_with_columns(self, query: str, params: tuple = (), env: str = None, as_type: str = 'rows'):
+        """執行查詢並在同一次執行中取得欄位名稱
+
+        as_type:
+            'rows'      -> (rows, columns)
+            'dict'      -> [{column: value, ...}, ...]
+            'dataframe' -> pandas.DataFrame（無資料時仍保留欄位）
+        """
+        with self.get_connection(env) as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(query, params)
+                columns = [desc[0] for desc in cursor.description] if cursor.description else []
+                rows = cursor.fetchall() if cursor.description else []
+
+        if as_type == 'rows':
+            return rows, columns
+        elif as_type == 'dict':
+            return [dict(zip(columns, row)) for row in rows]
+        elif as_type == 'dataframe':
+            import pandas as pd
+            return pd.DataFrame(rows, columns=columns)
+        else:
+            raise ValueError("as_type 參數必須是 'rows', 'dict', 或 'dataframe'")
+
     def execute_transaction(self, queries_params: list, env: str = None):
         """執行事務（多個查詢）"""
         with self.get_connection(env) as conn:
@@ -159,10 +201,18 @@ def get_db_connection(env: str = None):
     """取得資料庫連線（便利函數）"""
     return db_config.get_connection(env)
 
+def open_dedicated_connection(env: str = None):
+    """建立不經過連線池的專用連線（便利函數）"""
+    return db_config.open_dedicated_connection(env)
+
 def execute_query(query: str, params: tuple = (), env: str = None, fetch: str = 'all'):
     """執行查詢（便利函數）"""
     return db_config.execute_query(query, params, env, fetch)
 
+def query_with_columns(query: str, params: tuple = (), env: str = None, as_type: str = 'rows'):
+    """執行查詢並同時取得欄位名稱（便利函數）"""
+    return db_config.query_with_columns(query, params, env, as_type)
+
 def execute_transaction(queries_params: list, env: str = None):
     """執行事務（便利函數）"""
     return db_config.execute_transaction(queries_params, env)
@@ -278,7 +278,7 @@ def handle_login(btn_clicks, username_submit, password_submit, username, passwor
     
     try:
         # 呼叫登入 API
-        response = requests.post("http://127.0.0.1:8000/login", 
+        response = api_client.post("/login", 
                                json={"username": username, "password": password})
         
         if response.status_code == 200:
@@ -108,7 +108,7 @@ def update_county_dropdown(n_clicks, current_badges):
                             if 'props' in span_content and 'children' in span_content['props']:
                                 selected_counties.append(span_content['props']['children'])
     
-    response = requests.get("http://127.0.0.1:8000/get_county")
+    response = api_client.get("/get_county")
     if response.status_code == 200:
         data = response.json()
         options = [{"label": item["county"], "value": item["county"]} 
@@ -143,7 +143,7 @@ def update_area_dropdown(selected_county, current_badges):
     if not selected_county:
         return [], None
     
-    response = requests.get(f"http://127.0.0.1:8000/get_region?county={selected_county}")
+    response = api_client.get(f"/get_region?county={selected_county}")
     if response.status_code == 200:
         data = response.json()
         # 排除已選的地區
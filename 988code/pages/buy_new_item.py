@@ -90,7 +90,7 @@ def validate_date_range(start_date, end_date):
 )
 def load_customer_options(page_loaded):
     try:
-        response = requests.get('http://127.0.0.1:8000/get_new_item_customers')
+        response = api_client.get('/get_new_item_customers')
         
         if response.status_code != 200:
             return []
@@ -114,7 +114,7 @@ def load_customer_options(page_loaded):
 )
 def load_new_item_data(page_loaded):
     try:
-        response = requests.get('http://127.0.0.1:8000/get_new_item_orders')
+        response = api_client.get('/get_new_item_orders')
         
         if response.status_code != 200:
             return []
@@ -137,7 +137,7 @@ def load_new_item_data(page_loaded):
 )
 def load_customer_options(data):
     try:
-        response = requests.get('http://127.0.0.1:8000/get_new_item_customers')
+        response = api_client.get('/get_new_item_customers')
         
         if response.status_code != 200:
             print(f"API回應狀態碼: {response.status_code}")
@@ -105,7 +105,7 @@ def update_dropdown(selected_type, current_badges):
                         selected_items.append(span_content['props']['children'])
     
     if selected_type == "category":
-        response = requests.get("http://127.0.0.1:8000/get_category")
+        response = api_client.get("/get_category")
         if response.status_code == 200:
             data = response.json()
             options = [{"label": item["category"], "value": item["category"]} 
@@ -114,7 +114,7 @@ def update_dropdown(selected_type, current_badges):
             options = []
         return options, "選擇類別"
     elif selected_type == "subcategory":
-        response = requests.get("http://127.0.0.1:8000/get_subcategory")
+        response = api_client.get("/get_subcategory")
         if response.status_code == 200:
             data = response.json()
             options = [{"label": item["subcategory"], "value": item["subcategory"]} 
@@ -123,7 +123,7 @@ def update_dropdown(selected_type, current_badges):
             options = []
         return options, "選擇子類別"
     elif selected_type == "item":
-        response = requests.get("http://127.0.0.1:8000/get_name_zh")
+        response = api_client.get("/get_name_zh")
         if response.status_code == 200:
             data = response.json()
             options = [{"label": item["name_zh"], "value": item["name_zh"]} 
@@ -7,7 +7,11 @@ import plotly.express as px
 import requests
 from dash import ctx
 import urllib.parse
+import api_client
 
 from components.toast import success_toast, error_toast, warning_toast, info_toast
-from components.table import custom_table
-from app import app
\ No newline at end of file
+from components.table import custom_table, paged_table, register_paged_table_callbacks, DEFAULT_PAGE_SIZE
+from app import app
+
+# 分頁表格的換頁、搜尋與排序（所有頁面共用）
+register_paged_table_callbacks(app)
@@ -442,7 +442,7 @@ def fetch_all_customer_records(selected_customer_id, selected_customer_name):
         if selected_customer_name:
             params["customer_name"] = selected_customer_name
 
-        response = requests.get("http://127.0.0.1:8000/get_customer_data", params=params)
+        response = api_client.get("/get_customer_data", params=params)
         if response.status_code != 200:
             raise ValueError(f"API 回應碼：{response.status_code}")
 
@@ -572,7 +572,7 @@ def handle_customer_exports(current_clicks, all_clicks, current_table_data, sele
 )
 def load_customer_id_options(page_loaded):
     try:
-        response = requests.get("http://127.0.0.1:8000/get_customer_ids")
+        response = api_client.get("/get_customer_ids")
         if response.status_code == 200:
             customer_id_data = response.json()
             customer_id_options = [{"label": item["customer_id"], "value": item["customer_id"]} for item in customer_id_data]
@@ -590,7 +590,7 @@ def load_customer_id_options(page_loaded):
 )
 def load_customer_name_options(page_loaded):
     try:
-        response = requests.get("http://127.0.0.1:8000/get_customer_names")
+        response = api_client.get("/get_customer_names")
         if response.status_code == 200:
             customer_name_data = response.json()
             customer_name_options = [{"label": item["customer_name"], "value": item["customer_name"]} for item in customer_name_data]
@@ -629,8 +629,8 @@ def load_customer_data(page_loaded, current_page, selected_customer_id, selected
         if selected_customer_name:
             params["customer_name"] = selected_customer_name
 
-        response = requests.get(
-            "http://127.0.0.1:8000/get_customer_data",
+        response = api_client.get(
+            "/get_customer_data",
             params=params
         )
         if response.status_code == 200:
@@ -718,7 +718,8 @@ def display_customer_table(customer_data, selected_customer_id, selected_custome
                 button_text="編輯客戶資料",
                 button_id_type="customer_data_button",
                 show_button=show_edit_button,
-                sticky_columns=['客戶ID']
+                sticky_columns=['客戶ID'],
+                page_size=DEFAULT_PAGE_SIZE
             )
         ])
     else:
@@ -727,7 +728,8 @@ def display_customer_table(customer_data, selected_customer_id, selected_custome
             button_text="編輯客戶資料",
             button_id_type="customer_data_button",
             show_button=show_edit_button,
-            sticky_columns=['客戶ID']
+            sticky_columns=['客戶ID'],
+            page_size=DEFAULT_PAGE_SIZE
         )
     
     return table_component, current_table_data, button_style, warning_style
@@ -995,7 +997,7 @@ def save_customer_data(save_clicks, customer_name, customer_id, phone_number, ad
         
         # 嘗試 API 調用，但使用較短的超時時間
         try:
-            response = requests.put(f"http://127.0.0.1:8000/customer/{original_id}", json=update_data, timeout=2)
+            response = api_client.put(f"/customer/{original_id}", json=update_data, timeout=2)
             if response.status_code == 200:
                 # API 成功，返回樂觀更新結果
                 return False, True, "客戶資料更新成功！", False, "", False, "", updated_customer_data
@@ -1281,7 +1283,7 @@ def handle_delete_confirmation(confirm_clicks, cancel_clicks, customer_id, custo
     if button_id == 'confirm-delete-customer' and confirm_clicks:
         try:
             # 調用刪除 API
-            response = requests.delete(f"http://127.0.0.1:8000/customer/{customer_id}", 
+            response = api_client.delete(f"/customer/{customer_id}", 
                                      json={"user_role": user_role or "viewer"})
             
             if response.status_code == 200:
@@ -1,6 +1,5 @@
 ﻿from .common import *
 from components.table import custom_table
-import requests
 from datetime import datetime, date
 import pandas as pd
 import calendar
@@ -574,7 +573,7 @@ def register_daily_delivery_callbacks(app):
         try:
             # 獲取該日期的統計資料
             params = {'delivery_date': selected_date}
-            response = requests.get("http://127.0.0.1:8000/get_delivery_schedule_filtered", params=params)
+            response = api_client.get("/get_delivery_schedule_filtered", params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -683,7 +682,7 @@ def register_daily_delivery_callbacks(app):
         try:
             # 根據 selected_date 從 API 獲取資料
             params = {'delivery_date': selected_date}
-            response = requests.get("http://127.0.0.1:8000/get_delivery_schedule_filtered", params=params)
+            response = api_client.get("/get_delivery_schedule_filtered", params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -813,7 +812,7 @@ def register_daily_delivery_callbacks(app):
         try:
             # 根據選中日期獲取配送資料
             params = {'delivery_date': selected_date}
-            response = requests.get("http://127.0.0.1:8000/get_delivery_schedule_filtered", params=params)
+            response = api_client.get("/get_delivery_schedule_filtered", params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -887,7 +886,7 @@ def register_daily_delivery_callbacks(app):
         try:
             # 獲取該日期的配送資料
             params = {'delivery_date': selected_date}
-            response = requests.get("http://127.0.0.1:8000/get_delivery_schedule_filtered", params=params)
+            response = api_client.get("/get_delivery_schedule_filtered", params=params)
             
             if response.status_code == 200:
                 data = response.json()
@@ -47,7 +47,7 @@ tab_content = html.Div([
     Input('product-id-dropdown', 'id')
 )
 def update_product_options(dropdown_id):
-    response = requests.get("http://127.0.0.1:8000/get_recommended_product_ids")
+    response = api_client.get("/get_recommended_product_ids")
     product_data = response.json()
     # label 只顯示產品名稱,value 保持為產品ID
     options = [{'label': item['name_zh'], 'value': item['product_id']} for item in product_data]
@@ -64,12 +64,12 @@ def update_recommended_customers(selected_product_id):
     
     try:
         # 調用 API 獲取推薦客戶
-        response = requests.get(f"http://127.0.0.1:8000/get_product_recommendations/{selected_product_id}")
+        response = api_client.get(f"/get_product_recommendations/{selected_product_id}")
         
         product_name = '推薦客戶'
         
         # 先獲取產品名稱
-        product_info_response = requests.get("http://127.0.0.1:8000/get_recommended_product_ids")
+        product_info_response = api_client.get("/get_recommended_product_ids")
         if product_info_response.status_code == 200:
             product_data = product_info_response.json()
             product_item = next((item for item in product_data if item['product_id'] == selected_product_id), None)
@@ -153,7 +153,7 @@ def load_customer_history_on_expand(trigger, selected_product_id, active_item, c
     
     try:
         # 獲取推薦客戶資料
-        response = requests.get(f"http://127.0.0.1:8000/get_product_recommendations/{selected_product_id}")
+        response = api_client.get(f"/get_product_recommendations/{selected_product_id}")
         if response.status_code != 200:
             return dash.no_update
         
@@ -174,7 +174,7 @@ def load_customer_history_on_expand(trigger, selected_product_id, active_item, c
                 
                 # 如果是當前展開的項目，載入詳細資料
                 if active_item == f'accordion-{customer_id}':
-                    history_response = requests.get(f"http://127.0.0.1:8000/get_recommended_customer_history/{customer_id}")
+                    history_response = api_client.get(f"/get_recommended_customer_history/{customer_id}")
                     
                     if history_response.status_code == 200:
                         history_data = history_response.json()
@@ -125,7 +125,7 @@ tab_content = html.Div([
     Input('customer-id-dropdown', 'id')
 )
 def update_customer_options(dropdown_id):
-    response = requests.get("http://127.0.0.1:8000/get_customer_ids")
+    response = api_client.get("/get_customer_ids")
     customer_data = response.json()
     # label 只顯示客戶名稱,value 保持為客戶ID
     options = [{'label': item['customer_name'], 'value': item['customer_id']} for item in customer_data]
@@ -141,7 +141,7 @@ def update_month_options(selected_customer_id):
         return [{'label': '所有月份', 'value': 'all'}], 'all'
     
     try:
-        response = requests.get(f"http://127.0.0.1:8000/get_customer_monthly_spending/{selected_customer_id}")
+        response = api_client.get(f"/get_customer_monthly_spending/{selected_customer_id}")
         
         if response.status_code == 200:
             monthly_data = response.json()
@@ -171,10 +171,10 @@ def update_customer_info_and_history(selected_customer_id, selected_month):
     
     try:
         # 調用 API 獲取歷史購買記錄
-        purchase_response = requests.get(f"http://127.0.0.1:8000/get_recommendation_purchase_history/{selected_customer_id}")
+        purchase_response = api_client.get(f"/get_recommendation_purchase_history/{selected_customer_id}")
         
         # 調用 API 獲取月消費金額
-        monthly_response = requests.get(f"http://127.0.0.1:8000/get_customer_monthly_spending/{selected_customer_id}")
+        monthly_response = api_client.get(f"/get_customer_monthly_spending/{selected_customer_id}")
         
         table_rows = []
         current_month_text = '當月消費總金額 $ 0'
@@ -257,7 +257,7 @@ def update_recommended_products(selected_customer_id):
     
     try:
         # 調用 API 獲取推薦產品
-        response = requests.get(f"http://127.0.0.1:8000/get_customer_recommendations/{selected_customer_id}")
+        response = api_client.get(f"/get_customer_recommendations/{selected_customer_id}")
         
         if response.status_code == 200:
             recommendation_data = response.json()
@@ -1,5 +1,6 @@
 ﻿from .common import *
 from dash import ALL, callback_context
+from functools import partial
 import global_vars
 
 tab_content = html.Div([
@@ -117,7 +118,7 @@ def save_days_to_global(n_clicks, days_value):
 )
 def load_inactive_customers_data(page_loaded):
     try:
-        response = requests.get("http://127.0.0.1:8000/get_inactive_customers")
+        response = api_client.get("/get_inactive_customers")
         if response.status_code == 200:
             try:
                 inactive_data = response.json()
@@ -310,8 +311,9 @@ def display_inactive_customer_table(filtered_data, btn_all, btn_unprocessed, btn
     # 重置索引，讓按鈕index從0開始連續
     df = df.reset_index(drop=True)
     
-    # 使用 custom_table 的新 table_height 參數
-    return create_custom_inactive_table(df, show_checkbox=show_checkbox, show_button=False, table_height="47vh")
+    # 資料量大時只渲染目前頁面，換頁、搜尋與排序在伺服器端處理
+    render_page = partial(create_custom_inactive_table, show_checkbox=show_checkbox, show_button=False, table_height="47vh")
+    return paged_table(df, render_page, 'inactive-customers', page_size=DEFAULT_PAGE_SIZE)
 
 # 顯示確認已處理按鈕
 @app.callback(
@@ -450,7 +452,7 @@ def confirm_processed(modal_confirm_clicks, checkbox_values, filtered_data, btn_
             "user_role": user_role or "viewer"
         }
 
-        response = requests.put("http://127.0.0.1:8000/inactive_customers/batch_update", json=update_data)
+        response = api_client.put("/inactive_customers/batch_update", json=update_data)
         
         if response.status_code == 200:
             result = response.json()
@@ -1,11 +1,12 @@
 ﻿from .common import *
 from dash import ALL, callback_context
+from functools import partial
 import global_vars
 
 def get_sales_change_data():
     """從API獲取滯銷品資料"""
     try:
-        response = requests.get('http://127.0.0.1:8000/get_sales_change_data')
+        response = api_client.get('/get_sales_change_data')
         response.raise_for_status()
         data = response.json()
         
@@ -80,7 +81,7 @@ def get_sales_change_data():
 def get_sales_change_data_by_threshold(threshold):
     """根據閾值從API獲取滯銷品資料"""
     try:
-        response = requests.get(f'http://127.0.0.1:8000/get_sales_change_data_by_threshold/{threshold}')
+        response = api_client.get(f'/get_sales_change_data_by_threshold/{threshold}')
         response.raise_for_status()
         data = response.json()
         
@@ -567,15 +568,16 @@ def display_sales_table(filtered_data, btn_all, btn_unprocessed, btn_processed):
         if df_display.empty:
             return html.Div("暫無資料")
         
-        # 使用自定義表格函數
-        return create_custom_sales_table(
-            df_display, 
+        # 使用自定義表格函數；資料量大時只渲染目前頁面，換頁、搜尋與排序在伺服器端處理
+        render_page = partial(
+            create_custom_sales_table,
             show_checkbox=show_checkbox, 
             show_button=True,
             button_text="詳情",
             button_id_type="sales_detail_button",
             table_height="47vh"
         )
+        return paged_table(df_display, render_page, 'sales-change', page_size=DEFAULT_PAGE_SIZE)
             
     except Exception as e:
         return html.Div(f"表格顯示錯誤: {str(e)}")
@@ -758,8 +760,8 @@ def confirm_sales_processed(modal_confirm_clicks, checkbox_values, filtered_data
         for product_id in product_ids:
             try:
                 # 呼叫新的 API 更新 sales_change_table 的 status
-                response = requests.put(
-                    f'http://127.0.0.1:8000/update_sales_change_status_by_id',
+                response = api_client.put(
+                    f'/update_sales_change_status_by_id',
                     json={
                         "product_id": product_id,
                         "status": True,
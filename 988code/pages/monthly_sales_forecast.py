@@ -1,6 +1,5 @@
 from .common import *
 from components.table import custom_table
-import requests
 from dash import ALL
 from datetime import datetime
 
@@ -94,7 +93,7 @@ tab_content = html.Div([
 def load_monthly_forecast_data(n_clicks, selected_period):
     try:
         # 呼叫 API 獲取每月銷量預測資料
-        response = requests.get(f'http://127.0.0.1:8000/get_monthly_sales_predictions?period={selected_period}')
+        response = api_client.get(f'/get_monthly_sales_predictions?period={selected_period}')
         
         if response.status_code == 200:
             data = response.json()
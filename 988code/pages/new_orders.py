@@ -5,8 +5,9 @@ datetime.now()取得當前時間
 '''
 
 from .common import *
-from dash import ALL
+from dash import ALL, Patch
 from datetime import datetime
+from flask import Response, stream_with_context
 
 # 在文件開頭新增縣市區域對應字典
 CITY_DISTRICT_MAP = {
@@ -60,7 +61,7 @@ def generate_customer_id():
 # 檢查客戶是否存在於customer表的函數
 def check_customer_exists(customer_id):
     try:
-        response = requests.get(f"http://127.0.0.1:8000/check_customer_exists/{customer_id}")
+        response = api_client.get(f"/check_customer_exists/{customer_id}")
         if response.status_code == 200:
             data = response.json()
             return data.get("exists", False)
@@ -68,87 +69,85 @@ def check_customer_exists(customer_id):
     except:
         return False
 
-# 載入訂單資料的函數
-def get_orders():
-    response = requests.get("http://127.0.0.1:8000/get_new_orders")
+# 依篩選按鈕狀態取得要查詢的訂單狀態（None 為全部）
+def selected_status(all_outline, unconfirmed_outline, confirmed_outline, deleted_outline):
+    if not all_outline:  # 全部按鈕被選中
+        return None
+    elif not unconfirmed_outline:  # 未確認按鈕被選中
+        return "0"
+    elif not confirmed_outline:  # 已確認按鈕被選中
+        return "1"
+    elif not deleted_outline:  # 已刪除按鈕被選中
+        return "2"
+    return None
+
+# 載入一頁可見訂單（狀態、保留期限、搜尋與客戶備註都在資料庫處理），回傳 (訂單, 下一頁游標, 同步水位)
+def fetch_orders_page(status=None, search=None, cursor=None, order_ids=None):
+    params = {"status": status, "search": search or None, "cursor": cursor}
+    if order_ids is not None:
+        params["order_ids"] = list(order_ids)
+    response = api_client.get("/get_new_orders_view", params=params)
     if response.status_code == 200:
         try:
-            orders = response.json()
-            # 過濾掉超過一天的已確認和已刪除訂單
-            filtered_orders = []
-            current_time = datetime.now()
-            
-            for order in orders:
-                status = order.get("status")
-                
-                # 如果是未確認狀態，直接保留
-                if status == "0":
-                    filtered_orders.append(order)
-                # 如果是已確認或已刪除狀態，檢查時間
-                elif status in ["1", "2"]:
-                    # 確定要檢查的時間欄位
-                    if status == "1":
-                        # 已確認訂單檢查確認時間
-                        time_field = order.get("confirmed_at")
-                    else:
-                        # 已刪除訂單檢查更新時間（刪除時間）
-                        time_field = order.get("updated_at")
-                    
-                    if time_field:
-                        try:
-                            # 處理時間格式
-                            if 'Z' in time_field:
-                                processed_time = datetime.fromisoformat(time_field.replace('Z', '+00:00'))
-                            else:
-                                processed_time = datetime.fromisoformat(time_field)
-                            
-                            # 如果時間在一天內，保留
-                            if (current_time - processed_time).days < 1:
-                                filtered_orders.append(order)
-                        except:
-                            # 如果時間解析失敗，保留訂單
-                            filtered_orders.append(order)
-                    else:
-                        # 如果沒有時間記錄，保留訂單
-                        filtered_orders.append(order)
-                else:
-                    # 其他狀態直接保留
-                    filtered_orders.append(order)
-            
-            # 批量獲取客戶備註
-            customer_ids = set()
-            for order in filtered_orders:
-                if order.get("customer_id"):
-                    customer_ids.add(order["customer_id"])
-
-            # 如果有需要查詢的客戶ID，批量查詢備註
-            notes_dict = {}
-            if customer_ids:
-                try:
-                    notes_response = requests.post(
-                        "http://127.0.0.1:8000/get_customer_notes_batch",
-                        json={"customer_ids": list(customer_ids)}
-                    )
-                    if notes_response.status_code == 200:
-                        notes_dict = notes_response.json()
-                        print(f"[get_orders] 批量取得 {len(notes_dict)} 筆客戶備註")
-                except Exception as e:
-                    print(f"[get_orders] 批量取得備註失敗: {e}")
-
-            # 將備註附加到每個訂單
-            for order in filtered_orders:
-                customer_id = order.get("customer_id")
-                order["customer_notes"] = notes_dict.get(customer_id, "")
-
-            return filtered_orders
+            result = response.json()
+            return result["orders"], result["next_cursor"], result["watermark"]
         except requests.exceptions.JSONDecodeError:
             print("回應內容不是有效的 JSON")
-            return []
+            return [], None, None
     else:
         print(f"API 錯誤，狀態碼：{response.status_code}")
-        return []
+        return [], None, None
 
+# 載入水位之後有變動的訂單，回傳 (符合篩選條件的訂單, 移出畫面的訂單ID, 新水位)
+def fetch_orders_delta(since, status=None, search=None):
+    params = {"since": since, "status": status, "search": search or None}
+    response = api_client.get("/get_new_orders_delta", params=params)
+    if response.status_code == 200:
+        result = response.json()
+        return result["orders"], result["removed"], result["watermark"]
+    print(f"API 錯誤，狀態碼：{response.status_code}")
+    raise Exception(f"增量同步訂單失敗，狀態碼：{response.status_code}")
+
+# 載入所有可見訂單的函數
+def get_orders(status=None, search=None):
+    orders, cursor, _ = fetch_orders_page(status, search)
+    while cursor is not None:
+        page, cursor, _ = fetch_orders_page(status, search, cursor)
+        orders.extend(page)
+    return orders
+
+# 載入單筆訂單（開啟確認視窗等只需要一筆時使用）
+def get_order_by_id(order_id):
+    orders, _, _ = fetch_orders_page(order_ids=[order_id])
+    return orders[0] if orders else None
+
+# 將增量同步的結果合併到目前的訂單列表
+def merge_order_changes(orders, changed_orders, removed_ids, cursor=None):
+    removed_ids = set(removed_ids)
+    updated = {order["id"]: order for order in changed_orders}
+    
+    merged_orders = []
+    for order in orders:
+        order_id = order.get("id")
+        if order_id in removed_ids:
+            continue
+        # 有變動的訂單原地替換，保持畫面順序
+        merged_orders.append(updated.pop(order_id, order))
     
+    # 新增的訂單；還沒載入到的分頁範圍之後由「載入更多」取得
+    merged_orders.extend(
+        order for order in updated.values()
+        if cursor is None or order["id"] <= cursor
+    )
+    return merged_orders
+
+# 產生訂單列表畫面與對應的 store 資料：(畫面, 訂單, 下一頁游標, 載入更多按鈕樣式, 同步水位)
+def render_orders_view(orders, next_cursor, watermark, user_role=None, layout=None):
+    load_more_style = {"display": "block"} if next_cursor is not None else {"display": "none"}
+    if layout is None:
+        layout = create_grouped_orders_layout(orders, user_role)
+    return layout, orders, next_cursor, load_more_style, watermark
+
 def make_card_item(order, user_role=None):
     # 直接從 order 中讀取備註（已經在 get_orders 時附加）
     customer_notes = order.get("customer_notes", "")
@@ -255,7 +254,7 @@ def get_modal_fields(customer_id, customer_name, purchase_record, product_id=Non
     customer_notes = ""
     if customer_id:
         try:
-            notes_response = requests.get(f"http://127.0.0.1:8000/get_customer_notes/{customer_id}")
+            notes_response = api_client.get(f"/get_customer_notes/{customer_id}")
             if notes_response.status_code == 200:
                 notes_data = notes_response.json()
                 customer_notes = notes_data.get("notes", "")
@@ -420,8 +419,37 @@ def create_grouped_orders_layout(orders, user_role=None):
     for group_index, (customer_key, customer_orders) in enumerate(grouped_orders.items()):
         customer_groups.append(make_customer_group(customer_key, customer_orders, group_index, user_role))
 
-    # 使用簡單的 div 包裝，不用 Accordion
-    return html.Div(customer_groups)
+    # 直接回傳客戶群組列表作為 orders-container 的 children，方便只更新變動的群組
+    return customer_groups
+
+def patch_grouped_orders_layout(old_orders, new_orders, user_role=None):
+    """只重新產生有變動的客戶群組
+
+    群組順序沒有改變（只有移除群組或在最後新增群組）時回傳 Patch，否則回傳完整 layout。
+    """
+    old_groups = group_orders_by_customer(old_orders or [])
+    new_groups = group_orders_by_customer(new_orders)
+    if not old_groups or not new_groups:
+        return create_grouped_orders_layout(new_orders, user_role)
+
+    old_keys = list(old_groups)
+    new_keys = list(new_groups)
+    kept_keys = [key for key in old_keys if key in new_groups]
+    if new_keys[:len(kept_keys)] != kept_keys:
+        return create_grouped_orders_layout(new_orders, user_role)
+
+    patched_groups = Patch()
+    # 由後往前刪除，避免索引位移
+    for group_index in reversed(range(len(old_keys))):
+        if old_keys[group_index] not in new_groups:
+            del patched_groups[group_index]
+    for group_index, customer_key in enumerate(kept_keys):
+        if new_groups[customer_key] != old_groups[customer_key]:
+            patched_groups[group_index] = make_customer_group(customer_key, new_groups[customer_key], group_index, user_role)
+    for group_index, customer_key in enumerate(new_keys[len(kept_keys):], start=len(kept_keys)):
+        patched_groups.append(make_customer_group(customer_key, new_groups[customer_key], group_index, user_role))
+
+    return patched_groups
 
 # 不在模組載入時預先載入訂單，改由 callback 動態載入
 # 這樣可以確保每次訪問頁面時都能獲取最新資料
@@ -431,18 +459,17 @@ layout = dbc.Container([
     warning_toast("new_orders", message=""),
     dcc.Store(id='user-role-store'),
     dcc.Store(id='current-order-id-store'),
-    # 添加用於儲存上次檢查時間的 Store
-    dcc.Store(id='last-update-check-time'),
-    # 新增：儲存當前訂單的雜湊值，用於比較是否有變化
-    dcc.Store(id='orders-hash-store'),
+    # 目前載入的訂單列表，收到變更推送時只更新變動的訂單
+    dcc.Store(id='orders-store'),
+    # 下一頁訂單的游標（最後一筆訂單ID）
+    dcc.Store(id='orders-cursor-store'),
+    # 增量同步水位（上次同步時的資料庫時間）
+    dcc.Store(id='orders-watermark-store'),
+    # 瀏覽器 EventSource 收到的訂單變更事件
+    dcc.Store(id='order-change-store'),
+    dcc.Store(id='order-events-connected'),
     # 新增：儲存 Accordion 的展開狀態
     dcc.Store(id='accordion-state-store', data=[]),
-    # 定時檢查是否有新訂單，每5秒檢查一次
-    dcc.Interval(
-        id='order-update-checker',
-        interval=5*1000,  # 5秒檢查一次
-        n_intervals=0
-    ),
     html.Div([
         # 左側：新增訂單按鈕
         html.Div([
@@ -484,6 +511,12 @@ layout = dbc.Container([
             "opacity": "1"
         }
     ),
+    html.Div(
+        dbc.Button("載入更多", id="load-more-orders-btn", color="secondary", outline=True, size="sm"),
+        id="load-more-orders-container",
+        className="text-center mt-3",
+        style={"display": "none"}
+    ),
     dbc.Modal([
         dbc.ModalHeader("確認訂單", id="modal-header", style={"fontWeight": "bold", "fontSize": "24px"}),
         dbc.ModalBody(id="modal-body-content"),
@@ -630,9 +663,22 @@ layout = dbc.Container([
 ], fluid=True)
 
 
+# 訂單列表相關的輸出：畫面、已載入訂單、下一頁游標、載入更多按鈕
+ORDERS_VIEW_OUTPUTS = [
+    Output("orders-container", "children", allow_duplicate=True),
+    Output("orders-store", "data", allow_duplicate=True),
+    Output("orders-cursor-store", "data", allow_duplicate=True),
+    Output("load-more-orders-container", "style", allow_duplicate=True),
+    Output("orders-watermark-store", "data", allow_duplicate=True),
+]
+
 # 初始載入訂單資料
 @app.callback(
-    Output("orders-container", "children"),
+    [Output("orders-container", "children"),
+     Output("orders-store", "data"),
+     Output("orders-cursor-store", "data"),
+     Output("load-more-orders-container", "style"),
+     Output("orders-watermark-store", "data")],
     Input("user-role-store", "data"),
     prevent_initial_call=False  # 允許初始調用
 )
@@ -640,20 +686,44 @@ def initial_load_orders(user_role):
     """頁面載入時初始載入訂單資料"""
     print(f"[INITIAL LOAD] 載入訂單資料 - user_role={user_role}")
     try:
-        orders = get_orders()
+        orders, next_cursor, watermark = fetch_orders_page()
         print(f"[INITIAL LOAD] 載入了 {len(orders)} 筆訂單")
-        return create_grouped_orders_layout(orders, user_role)
+        return render_orders_view(orders, next_cursor, watermark, user_role)
     except Exception as e:
         print(f"[INITIAL LOAD] 初始載入訂單失敗: {e}")
         import traceback
         traceback.print_exc()
-        return html.Div("載入訂單失敗", className="text-center text-danger")
+        return html.Div("載入訂單失敗", className="text-center text-danger"), None, None, {"display": "none"}, None
+
+# 載入下一頁訂單
+@app.callback(
+    ORDERS_VIEW_OUTPUTS,
+    Input("load-more-orders-btn", "n_clicks"),
+    [State("orders-store", "data"),
+     State("orders-cursor-store", "data"),
+     State("filter-all", "outline"),
+     State("filter-unconfirmed", "outline"),
+     State("filter-confirmed", "outline"),
+     State("filter-deleted", "outline"),
+     State("customer-search-input", "value"),
+     State("user-role-store", "data")],
+    prevent_initial_call=True
+)
+def load_more_orders(n_clicks, orders, cursor, all_outline, unconfirmed_outline, confirmed_outline,
+                     deleted_outline, search_value, user_role):
+    if not n_clicks or cursor is None:
+        return [dash.no_update] * 5
+
+    status = selected_status(all_outline, unconfirmed_outline, confirmed_outline, deleted_outline)
+    page, next_cursor, _ = fetch_orders_page(status, search_value, cursor)
+    # 已載入的訂單由增量同步維護，水位不變
+    return render_orders_view((orders or []) + page, next_cursor, dash.no_update, user_role)
 
 
 # 篩選顯示訂單和更新按鈕狀態
 @app.callback(
-    [Output("orders-container", "children", allow_duplicate=True),
-     Output("filter-all", "outline", allow_duplicate=True),
+    ORDERS_VIEW_OUTPUTS +
+    [Output("filter-all", "outline", allow_duplicate=True),
      Output("filter-unconfirmed", "outline", allow_duplicate=True),
      Output("filter-confirmed", "outline", allow_duplicate=True),
      Output("filter-deleted", "outline", allow_duplicate=True),
@@ -668,26 +738,21 @@ def initial_load_orders(user_role):
 def filter_orders(all_clicks, unconfirmed_clicks, confirmed_clicks, deleted_clicks, user_role):
     ctx = dash.callback_context
     if not ctx.triggered:
-        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
+        return [dash.no_update] * 10
 
     triggered_id = ctx.triggered[0]["prop_id"].split('.')[0]
-    orders = get_orders()
-
-    if triggered_id == "filter-all":
-        filtered_orders = orders
-        return create_grouped_orders_layout(filtered_orders, user_role), False, True, True, True, ""  # 清空搜尋框
-    elif triggered_id == "filter-unconfirmed":
-        filtered_orders = [order for order in orders if order.get("status") == "0"]
-        return create_grouped_orders_layout(filtered_orders, user_role), True, False, True, True, ""  # 清空搜尋框
-    elif triggered_id == "filter-confirmed":
-        filtered_orders = [order for order in orders if order.get("status") == "1"]
-        return create_grouped_orders_layout(filtered_orders, user_role), True, True, False, True, ""  # 清空搜尋框
-    elif triggered_id == "filter-deleted":
-        filtered_orders = [order for order in orders if order.get("status") == "2"]
-        return create_grouped_orders_layout(filtered_orders, user_role), True, True, True, False, ""  # 清空搜尋框
-    else:
-        filtered_orders = orders
-        return create_grouped_orders_layout(filtered_orders, user_role), False, True, True, True, ""  # 清空搜尋框
+
+    # 各篩選按鈕對應的訂單狀態與按鈕 outline 狀態
+    filter_states = {
+        "filter-all": (None, (False, True, True, True)),
+        "filter-unconfirmed": ("0", (True, False, True, True)),
+        "filter-confirmed": ("1", (True, True, False, True)),
+        "filter-deleted": ("2", (True, True, True, False)),
+    }
+    status, outlines = filter_states.get(triggered_id, filter_states["filter-all"])
+
+    orders, next_cursor, watermark = fetch_orders_page(status)
+    return (*render_orders_view(orders, next_cursor, watermark, user_role), *outlines, "")  # 清空搜尋框
 
 # 刪除按鈕，顯示確認刪除modal
 @app.callback(
@@ -717,8 +782,7 @@ def toggle_delete_modal(n_clicks_list, is_open):
     except:
         return dash.no_update, dash.no_update
     
-    orders = get_orders()
-    order = next((o for o in orders if str(o["id"]) == str(order_id)), None)
+    order = get_order_by_id(order_id)
     if order:
         # 修正：使用與 confirm_delete 相同的邏輯
         if order.get("customer_id") and order.get("customer_name"):
@@ -761,7 +825,8 @@ def close_delete_modal(n_clicks):
 def confirm_delete(n_clicks, modal_body, user_role):
     if n_clicks:
         print(f"收到刪除確認，modal_body: {modal_body}")  # 添加調試
-        orders = get_orders()
+        # 只有未確認訂單可以刪除
+        orders = get_orders(status="0")
         order_id = None
         for order in orders:
             # 使用與 toggle_delete_modal 相同的邏輯
@@ -796,7 +861,7 @@ def confirm_delete(n_clicks, modal_body, user_role):
             # 呼叫API更新資料
             try:
                 update_data["user_role"] = user_role or "viewer"
-                response = requests.put(f"http://127.0.0.1:8000/temp/{order_id}", json=update_data)
+                response = api_client.put(f"/temp/{order_id}", json=update_data)
                 print(f"API回應狀態碼: {response.status_code}")
                 print(f"API回應內容: {response.text}")
                 
@@ -850,9 +915,8 @@ def toggle_modal(n_clicks_list, is_open):
     except:
         return dash.no_update, dash.no_update, dash.no_update, dash.no_update  # 新增一個 no_update
 
-    orders = get_orders()
     # 根據 order_id 找到對應的訂單資料
-    order = next((o for o in orders if str(o["id"]) == str(order_id)), None)
+    order = get_order_by_id(order_id)
     if order:
         # 傳入所有需要的欄位
         modal_content = get_modal_fields(
@@ -870,9 +934,8 @@ def toggle_modal(n_clicks_list, is_open):
     
     return dash.no_update, dash.no_update, dash.no_update, dash.no_update  # 新增一個 no_update
     
-    orders = get_orders()
     # 根據 order_id 找到對應的訂單資料
-    order = next((o for o in orders if str(o["id"]) == str(order_id)), None)
+    order = get_order_by_id(order_id)
     if order:
         # 傳入所有需要的欄位
         modal_content = get_modal_fields(
@@ -971,14 +1034,9 @@ def submit_confirm(n_clicks, customer_id, customer_name, customer_notes, product
         print(f"[PERF] 驗證欄位完成: {time.time() - start_time:.2f}s")
 
         t1 = time.time()
-        orders = get_orders()
-        print(f"[PERF] get_orders() 耗時: {time.time() - t1:.2f}s")
-
         order_id = current_order_id
-        original_order = None
-
-        if order_id:
-            original_order = next((o for o in orders if str(o["id"]) == str(order_id)), None)
+        original_order = get_order_by_id(order_id) if order_id else None
+        print(f"[PERF] get_order_by_id() 耗時: {time.time() - t1:.2f}s")
         if order_id and original_order:
             # 如果有customer_id且存在，更新客戶備註
             t2 = time.time()
@@ -993,7 +1051,7 @@ def submit_confirm(n_clicks, customer_id, customer_name, customer_notes, product
                         "notes": customer_notes,
                         "user_role": user_role
                     }
-                    notes_response = requests.put(f"http://127.0.0.1:8000/customer/{customer_id}", json=notes_update_data)
+                    notes_response = api_client.put(f"/customer/{customer_id}", json=notes_update_data)
                     print(f"[PERF] 更新客戶備註 API 耗時: {time.time() - t3:.2f}s")
                     if notes_response.status_code != 200:
                         print(f"客戶備註更新失敗，狀態碼：{notes_response.status_code}")
@@ -1057,7 +1115,7 @@ def submit_confirm(n_clicks, customer_id, customer_name, customer_notes, product
             # 呼叫API更新資料
             try:
                 t4 = time.time()
-                response = requests.put(f"http://127.0.0.1:8000/temp/{order_id}", json=update_data)
+                response = api_client.put(f"/temp/{order_id}", json=update_data)
                 print(f"[PERF] 更新訂單 API 耗時: {time.time() - t4:.2f}s")
 
                 if response.status_code == 200:
@@ -1077,7 +1135,7 @@ def submit_confirm(n_clicks, customer_id, customer_name, customer_notes, product
                             "user_role": user_role
                         }
 
-                        transaction_response = requests.post(f"http://127.0.0.1:8000/order_transactions", json=transaction_data)
+                        transaction_response = api_client.post(f"/order_transactions", json=transaction_data)
                         print(f"[PERF] 新增交易記錄 API 耗時: {time.time() - t5:.2f}s")
                         if transaction_response.status_code != 200:
                             print(f"order_transactions 更新失敗，狀態碼：{transaction_response.status_code}")
@@ -1220,7 +1278,7 @@ def save_new_customer(n_clicks, customer_id, customer_name, phone, address, city
         
         try:
             # 先創建客戶
-            create_response = requests.post("http://127.0.0.1:8000/create_customer", json=new_customer_data)
+            create_response = api_client.post("/create_customer", json=new_customer_data)
             if create_response.status_code == 200:
                 
                 # 如果有 line_id，則將對應關係儲存到 customer_line_mapping
@@ -1231,7 +1289,7 @@ def save_new_customer(n_clicks, customer_id, customer_name, phone, address, city
                             "line_id": pending_order.get("line_id"),
                             "user_role": user_role or "viewer"
                         }
-                        mapping_response = requests.post("http://127.0.0.1:8000/customer_line_mapping", json=mapping_data)
+                        mapping_response = api_client.post("/customer_line_mapping", json=mapping_data)
                         if mapping_response.status_code != 200:
                             print(f"customer_line_mapping 新增失敗，狀態碼：{mapping_response.status_code}")
                     except Exception as e:
@@ -1258,7 +1316,7 @@ def save_new_customer(n_clicks, customer_id, customer_name, phone, address, city
                         "user_role": user_role or "viewer"
                     }
                     
-                    response = requests.post("http://127.0.0.1:8000/create_temp_order", json=new_order_data)
+                    response = api_client.post("/create_temp_order", json=new_order_data)
                     if response.status_code == 200:
                         # 新增到 order_transactions 表
                         transaction_data = {
@@ -1272,7 +1330,7 @@ def save_new_customer(n_clicks, customer_id, customer_name, phone, address, city
                             "user_role": user_role or "viewer"
                         }
                         
-                        transaction_response = requests.post(f"http://127.0.0.1:8000/order_transactions", json=transaction_data)
+                        transaction_response = api_client.post(f"/order_transactions", json=transaction_data)
 
                         # 不需要重新載入所有訂單，讓自動更新機制處理即可
                         return False, True, "新客戶創建成功，訂單已新增", False, False, "", dash.no_update
@@ -1296,7 +1354,7 @@ def save_new_customer(n_clicks, customer_id, customer_name, phone, address, city
                     }
                     
                     # 更新訂單
-                    response = requests.put(f"http://127.0.0.1:8000/temp/{pending_order['order_id']}", json=update_data)
+                    response = api_client.put(f"/temp/{pending_order['order_id']}", json=update_data)
                     if response.status_code == 200:
                         # 更新 order_transactions 表
                         transaction_data = {
@@ -1310,7 +1368,7 @@ def save_new_customer(n_clicks, customer_id, customer_name, phone, address, city
                             "user_role": user_role or "viewer"
                         }
                         
-                        transaction_response = requests.post(f"http://127.0.0.1:8000/order_transactions", json=transaction_data)
+                        transaction_response = api_client.post(f"/order_transactions", json=transaction_data)
 
                         # 不需要重新載入所有訂單，讓自動更新機制處理即可
                         return False, True, "新客戶創建成功，訂單已確認", False, False, "", dash.no_update
@@ -1508,7 +1566,7 @@ def submit_add_order(n_clicks, customer_id, customer_name, customer_notes, produ
     if customer_id and customer_notes:
         try:
             notes_update_data = {"notes": customer_notes, "user_role": user_role}
-            notes_response = requests.put(f"http://127.0.0.1:8000/customer/{customer_id}", json=notes_update_data)
+            notes_response = api_client.put(f"/customer/{customer_id}", json=notes_update_data)
             if notes_response.status_code != 200:
                 print(f"客戶備註更新失敗，狀態碼：{notes_response.status_code}")
         except Exception as e:
@@ -1529,7 +1587,7 @@ def submit_add_order(n_clicks, customer_id, customer_name, customer_notes, produ
     }
 
     try:
-        response = requests.post("http://127.0.0.1:8000/create_temp_order", json=new_order_data)
+        response = api_client.post("/create_temp_order", json=new_order_data)
         if response.status_code == 200:
             try:
                 transaction_data = {
@@ -1542,14 +1600,13 @@ def submit_add_order(n_clicks, customer_id, customer_name, customer_notes, produ
                     "transaction_date": datetime.now().isoformat(),
                     "user_role": user_role,
                 }
-                transaction_response = requests.post("http://127.0.0.1:8000/order_transactions", json=transaction_data)
+                transaction_response = api_client.post("/order_transactions", json=transaction_data)
                 if transaction_response.status_code != 200:
                     print(f"order_transactions 更新失敗，狀態碼：{transaction_response.status_code}")
             except Exception as e:
                 print(f"order_transactions 更新異常：{str(e)}")
 
-            orders = get_orders()
-            updated_orders = create_grouped_orders_layout(orders, user_role)
+            # 新訂單由變更推送加入列表，不需要重新載入所有訂單
             return (
                 False,
                 True,
@@ -1557,7 +1614,7 @@ def submit_add_order(n_clicks, customer_id, customer_name, customer_notes, produ
                 False,
                 False,
                 "",
-                updated_orders,
+                dash.no_update,
                 False,
                 dash.no_update,
                 dash.no_update,
@@ -1606,7 +1663,7 @@ def submit_add_order(n_clicks, customer_id, customer_name, customer_notes, produ
 
 # 客戶名稱搜尋功能
 @app.callback(
-    Output("orders-container", "children", allow_duplicate=True),
+    ORDERS_VIEW_OUTPUTS,
     [Input("customer-search-input", "value")],
     [State("filter-all", "outline"),
      State("filter-unconfirmed", "outline"),
@@ -1616,166 +1673,102 @@ def submit_add_order(n_clicks, customer_id, customer_name, customer_notes, produ
     prevent_initial_call=True
 )
 def search_customers(search_value, all_outline, unconfirmed_outline, confirmed_outline, deleted_outline, user_role):
-    if not search_value:
-        # 如果搜尋框為空，根據當前篩選狀態顯示所有訂單
-        orders = get_orders()
-        
-        # 判斷當前篩選狀態
-        if not all_outline:  # 全部按鈕被選中
-            filtered_orders = orders
-        elif not unconfirmed_outline:  # 未確認按鈕被選中
-            filtered_orders = [order for order in orders if order.get("status") == "0"]
-        elif not confirmed_outline:  # 已確認按鈕被選中
-            filtered_orders = [order for order in orders if order.get("status") == "1"]
-        elif not deleted_outline:  # 已刪除按鈕被選中
-            filtered_orders = [order for order in orders if order.get("status") == "2"]
-        else:
-            filtered_orders = orders
-
-        return create_grouped_orders_layout(filtered_orders, user_role)
-
-    # 執行搜尋
-    orders = get_orders()
-
-    # 根據當前篩選狀態先篩選訂單
-    if not all_outline:  # 全部按鈕被選中
-        filtered_orders = orders
-    elif not unconfirmed_outline:  # 未確認按鈕被選中
-        filtered_orders = [order for order in orders if order.get("status") == "0"]
-    elif not confirmed_outline:  # 已確認按鈕被選中
-        filtered_orders = [order for order in orders if order.get("status") == "1"]
-    elif not deleted_outline:  # 已刪除按鈕被選中
-        filtered_orders = [order for order in orders if order.get("status") == "2"]
-    else:
-        filtered_orders = orders
-    
-    # 根據搜尋詞進一步篩選客戶名稱
-    search_value_lower = search_value.lower()
-    search_result_orders = []
+    # 依目前篩選狀態與搜尋詞（只比對客戶名稱）查詢，搜尋框為空時顯示所有訂單
+    status = selected_status(all_outline, unconfirmed_outline, confirmed_outline, deleted_outline)
+    orders, next_cursor, watermark = fetch_orders_page(status, search_value)
+    return render_orders_view(orders, next_cursor, watermark, user_role)
+
+# 轉送 API 的訂單變更事件（SSE）給瀏覽器，瀏覽器無法直接連到內部 API
+@app.server.route("/order-events")
+def relay_order_events():
+    def relay():
+        with api_client.get("/orders/events", stream=True, timeout=(5, None)) as upstream:
+            for chunk in upstream.iter_content(chunk_size=None):
+                yield chunk
     
-    for order in filtered_orders:
-        # 只檢查 customer_name 是否包含搜尋詞
-        customer_name = order.get("customer_name", "")
-        if customer_name and search_value_lower in customer_name.lower():
-            search_result_orders.append(order)
-    
-    return create_grouped_orders_layout(search_result_orders, user_role)
+    return Response(
+        stream_with_context(relay()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# 在瀏覽器開啟 EventSource，收到事件時寫入 order-change-store；離開頁面時關閉
+app.clientside_callback(
+    """
+    function(user_role) {
+        if (window.orderEventSource) {
+            return window.dash_clientside.no_update;
+        }
+        var source = new EventSource('/order-events');
+        var connected = false;
+        source.addEventListener('open', function() {
+            // 重新連線時可能漏掉事件，要求完整重新同步
+            if (connected) {
+                window.dash_clientside.set_props('order-change-store', {data: {resync: true, seq: Date.now()}});
+            }
+            connected = true;
+        });
+        source.addEventListener('orders', function(event) {
+            if (!document.getElementById('orders-container')) {
+                source.close();
+                window.orderEventSource = null;
+                return;
+            }
+            window.dash_clientside.set_props('order-change-store', {data: JSON.parse(event.data)});
+        });
+        window.orderEventSource = source;
+        return true;
+    }
+    """,
+    Output("order-events-connected", "data"),
+    Input("user-role-store", "data")
+)
 
-# 自動檢查訂單更新的回調函數（優化版：比較資料變化）
+# 收到訂單變更推送時，增量同步水位之後變動的訂單，只重新產生受影響的客戶群組
 @app.callback(
-    [Output("orders-container", "children", allow_duplicate=True),
-     Output("last-update-check-time", "data"),
-     Output("orders-hash-store", "data")],
-    Input("order-update-checker", "n_intervals"),
-    [State("last-update-check-time", "data"),
-     State("orders-hash-store", "data"),
+    ORDERS_VIEW_OUTPUTS,
+    Input("order-change-store", "data"),
+    [State("orders-store", "data"),
+     State("orders-cursor-store", "data"),
+     State("orders-watermark-store", "data"),
      State("filter-all", "outline"),
      State("filter-unconfirmed", "outline"),
      State("filter-confirmed", "outline"),
      State("filter-deleted", "outline"),
      State("customer-search-input", "value"),
      State("user-role-store", "data")],
-    prevent_initial_call='initial_duplicate'  # 允許 duplicate callback 的初始調用
+    prevent_initial_call=True
 )
-def auto_check_for_updates(n_intervals, last_check_time, current_hash, all_outline, unconfirmed_outline,
-                          confirmed_outline, deleted_outline, search_value, user_role):
-    print(f"\n{'='*60}")
-    print(f"[AUTO UPDATE] Callback 被觸發 - n_intervals={n_intervals}")
-    print(f"[AUTO UPDATE] last_check_time={last_check_time}")
-    print(f"[AUTO UPDATE] current_hash={current_hash}")
+def apply_order_changes(change, orders, cursor, watermark, all_outline, unconfirmed_outline, confirmed_outline,
+                        deleted_outline, search_value, user_role):
+    if not change:
+        return [dash.no_update] * 5
+    
     try:
-        # 調用 API 檢查是否有更新
-        check_url = "http://127.0.0.1:8000/check_orders_update"
-        if last_check_time:
-            check_url += f"?last_check_time={last_check_time}"
-
-        print(f"[AUTO UPDATE] 調用 API: {check_url}")
-        response = requests.get(check_url)
-        # 使用 UTC 時間而非本地時間
-        current_time = datetime.utcnow().isoformat()
-        print(f"[AUTO UPDATE] API 回應狀態碼: {response.status_code}")
-
-        if response.status_code == 200:
-            update_data = response.json()
-            print(f"[AUTO UPDATE] API 回應資料: {update_data}")
-            has_update = update_data.get("has_update", False)
-            print(f"[AUTO UPDATE] has_update={has_update}")
-
-            # 如果有更新，重新載入資料
-            if has_update:
-                print(f"[AUTO UPDATE] 檢測到訂單更新 - 更新類型: {update_data.get('update_type')}")
-
-                # 重新載入訂單資料
-                orders = get_orders()
-                print(f"[AUTO UPDATE] 載入了 {len(orders)} 筆訂單")
-
-                # 根據當前篩選狀態過濾訂單
-                print(f"[AUTO UPDATE] 篩選器狀態 - all:{all_outline}, unconfirmed:{unconfirmed_outline}, confirmed:{confirmed_outline}, deleted:{deleted_outline}")
-                if not all_outline:  # 全部按鈕被選中
-                    filtered_orders = orders
-                    print(f"[AUTO UPDATE] 選擇「全部」篩選器")
-                elif not unconfirmed_outline:  # 未確認按鈕被選中
-                    filtered_orders = [order for order in orders if order.get("status") == "0"]
-                    print(f"[AUTO UPDATE] 選擇「未確認」篩選器")
-                elif not confirmed_outline:  # 已確認按鈕被選中
-                    filtered_orders = [order for order in orders if order.get("status") == "1"]
-                    print(f"[AUTO UPDATE] 選擇「已確認」篩選器")
-                elif not deleted_outline:  # 已刪除按鈕被選中
-                    filtered_orders = [order for order in orders if order.get("status") == "2"]
-                    print(f"[AUTO UPDATE] 選擇「已刪除」篩選器")
-                else:
-                    filtered_orders = orders
-                    print(f"[AUTO UPDATE] 沒有篩選器被選中，使用全部")
-
-                print(f"[AUTO UPDATE] 篩選後剩餘 {len(filtered_orders)} 筆訂單")
-
-                # 如果有搜尋詞，進一步過濾
-                if search_value:
-                    print(f"[AUTO UPDATE] 搜尋關鍵字: {search_value}")
-                    search_value_lower = search_value.lower()
-                    search_result_orders = []
-                    for order in filtered_orders:
-                        customer_name = order.get("customer_name", "")
-                        if customer_name and search_value_lower in customer_name.lower():
-                            search_result_orders.append(order)
-                    filtered_orders = search_result_orders
-                    print(f"[AUTO UPDATE] 搜尋後剩餘 {len(filtered_orders)} 筆訂單")
-
-                # 計算新資料的雜湊值（使用訂單ID和更新時間）
-                import hashlib
-                import json
-                data_string = json.dumps([
-                    {
-                        "id": order.get("id"),
-                        "updated_at": order.get("updated_at"),
-                        "status": order.get("status")
-                    }
-                    for order in filtered_orders
-                ], sort_keys=True)
-                new_hash = hashlib.md5(data_string.encode()).hexdigest()
-                print(f"[AUTO UPDATE] 計算新 hash: {new_hash[:8]}...")
-
-                # 比較雜湊值，只有真的有變化時才更新
-                if new_hash != current_hash:
-                    old_hash_display = current_hash[:8] if current_hash else "None"
-                    print(f"[AUTO UPDATE] 資料有變化，更新頁面 (舊hash: {old_hash_display}... -> 新hash: {new_hash[:8]}...)")
-                    return create_grouped_orders_layout(filtered_orders, user_role), current_time, new_hash
-                else:
-                    print(f"[AUTO UPDATE] 檢測到更新但資料無變化，不重新渲染")
-                    return dash.no_update, current_time, dash.no_update
-            else:
-                # 沒有更新，只更新檢查時間
-                print(f"[AUTO UPDATE] 沒有更新")
-                return dash.no_update, current_time, dash.no_update
-        else:
-            print(f"[AUTO UPDATE] API 檢查失敗，狀態碼: {response.status_code}")
-            return dash.no_update, current_time, dash.no_update
-
+        status = selected_status(all_outline, unconfirmed_outline, confirmed_outline, deleted_outline)
+        # 重新連線或伺服器要求重新同步時可能漏掉變更，沒有水位時也無法增量同步，一律重新載入
+        if change.get("resync") or orders is None or watermark is None:
+            print(f"[ORDER EVENTS] 完整重新同步訂單")
+            orders, cursor, watermark = fetch_orders_page(status, search_value)
+            return render_orders_view(orders, cursor, watermark, user_role)
+        
+        changed_orders, removed_ids, new_watermark = fetch_orders_delta(watermark, status, search_value)
+        # 實際刪除的資料列不會出現在增量結果中，由推送事件帶入
+        removed_ids = list(removed_ids) + list(change.get("deleted", []))
+        print(f"[ORDER EVENTS] 增量同步 {len(changed_orders)} 筆，移出 {len(removed_ids)} 筆")
+        
+        merged_orders = merge_order_changes(orders, changed_orders, removed_ids, cursor)
+        if merged_orders == orders:
+            return dash.no_update, dash.no_update, dash.no_update, dash.no_update, new_watermark
+        
+        layout = patch_grouped_orders_layout(orders, merged_orders, user_role)
+        return render_orders_view(merged_orders, cursor, new_watermark, user_role, layout=layout)
+    
     except Exception as e:
-        print(f"[AUTO UPDATE] 自動檢查更新失敗: {e}")
+        print(f"[ORDER EVENTS] 套用訂單變更失敗: {e}")
         import traceback
         traceback.print_exc()
-        return dash.no_update, datetime.utcnow().isoformat(), dash.no_update
+        return [dash.no_update] * 5
 
 # 根據用戶角色控制新增訂單按鈕的顯示/隱藏
 @app.callback(
@@ -230,7 +230,7 @@ layout = html.Div(style={"fontFamily": "sans-serif"}, children=[
 )
 def update_product_dropdown_options(dropdown_id):
     try:
-        response = requests.get("http://127.0.0.1:8000/get_name_zh")
+        response = api_client.get("/get_name_zh")
         if response.status_code == 200:
             data = response.json()
             options = [{"label": item["name_zh"], "value": item["name_zh"]} for item in data]
@@ -268,9 +268,9 @@ def start_analysis_with_progress(submit_btn, dropdown_value):
                 os.remove(progress_file_path)
             
             encoded_product_name = urllib.parse.quote(dropdown_value)
-            analysis_url = f"http://127.0.0.1:8000/get_potential_customers_analysis/{encoded_product_name}"
+            analysis_url = f"/get_potential_customers_analysis/{encoded_product_name}"
             print(f"呼叫分析API: {analysis_url}")
-            response = requests.get(analysis_url)
+            response = api_client.get(analysis_url)
             print(f"分析API調用結果: {response.status_code}")
             if response.status_code == 200:
                 result = response.json()
@@ -307,7 +307,7 @@ def load_potential_customers_data(n_intervals, task_data, modal_open):
     
     # 檢查是否有進度信息
     try:
-        progress_response = requests.get("http://127.0.0.1:8000/get_current_analysis_progress")
+        progress_response = api_client.get("/get_current_analysis_progress")
         if progress_response.status_code == 200:
             progress_info = progress_response.json()
             
@@ -318,8 +318,8 @@ def load_potential_customers_data(n_intervals, task_data, modal_open):
                 # 調用詳細結果API來獲取完整的客戶資料
                 try:
                     # 使用查詢參數，避免URL路徑編碼問題
-                    details_url = "http://127.0.0.1:8000/get_potential_customers_details"
-                    details_response = requests.get(details_url, params={"product_name": product_name})
+                    details_url = "/get_potential_customers_details"
+                    details_response = api_client.get(details_url, params={"product_name": product_name})
                     
                     if details_response.status_code == 200:
                         analysis_result = details_response.json()
@@ -479,7 +479,7 @@ def update_progress(n_intervals, modal_open, current_step_state):
         return dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update, dash.no_update
     
     try:
-        response = requests.get("http://127.0.0.1:8000/get_current_analysis_progress")
+        response = api_client.get("/get_current_analysis_progress")
         if response.status_code == 200:
             progress_info = response.json()
             
@@ -1,7 +1,6 @@
 from .common import *
 from components.offcanvas import create_search_offcanvas, register_offcanvas_callback
 from callbacks.export_callback import create_export_callback, add_download_component
-import requests
 import pandas as pd
 import urllib.parse
 from dash import ALL
@@ -297,7 +296,7 @@ create_export_callback(app, "product_inventory", "current-table-data", "商品
 )
 def load_category_options(page_loaded):
     try:
-        response = requests.get("http://127.0.0.1:8000/get_category")
+        response = api_client.get("/get_category")
         if response.status_code == 200:
             category_data = response.json()
             category_options = [{"label": item["category"], "value": item["category"]} for item in category_data]
@@ -315,7 +314,7 @@ def load_category_options(page_loaded):
 )
 def load_inventory_data(page_loaded):
     try:
-        response = requests.get("http://127.0.0.1:8000/get_inventory_data")
+        response = api_client.get("/get_inventory_data")
         if response.status_code == 200:
             inventory_data = response.json()
             return inventory_data
@@ -365,6 +364,7 @@ def display_inventory_table(inventory_data, selected_category, selected_subcateg
         button_text="查看群組品項",
         button_id_type="inventory_data_button",
         show_button=True,
+        page_size=DEFAULT_PAGE_SIZE
     )
     
     return table_component, current_table_data
@@ -464,7 +464,7 @@ def load_group_items(is_open, management_mode, modal_title, stored_data):
     if not stored_data:
         try:
             encoded_subcategory = urllib.parse.quote(subcategory, safe='')
-            response = requests.get(f"http://127.0.0.1:8000/get_subcategory_items/{encoded_subcategory}")
+            response = api_client.get(f"/get_subcategory_items/{encoded_subcategory}")
             if response.status_code == 200:
                 group_items_data = response.json()
                 if not group_items_data:
@@ -490,7 +490,7 @@ def load_group_items(is_open, management_mode, modal_title, stored_data):
         # 取得該商品群組所屬的類別
         category = None
         try:
-            inventory_response = requests.get("http://127.0.0.1:8000/get_inventory_data")
+            inventory_response = api_client.get("/get_inventory_data")
             if inventory_response.status_code == 200:
                 inventory_data = inventory_response.json()
                 for item in inventory_data:
@@ -505,7 +505,7 @@ def load_group_items(is_open, management_mode, modal_title, stored_data):
         if category:
             try:
                 encoded_category = urllib.parse.quote(category, safe="")
-                subcategory_response = requests.get(f"http://127.0.0.1:8000/get_subcategories_of_category/{encoded_category}")
+                subcategory_response = api_client.get(f"/get_subcategories_of_category/{encoded_category}")
                 if subcategory_response.status_code == 200:
                     subcategory_data = subcategory_response.json()
                     subcategories = subcategory_data.get('subcategories', [])
@@ -698,8 +698,8 @@ def save_changes(n_clicks, dropdown_values, input_values, stored_data, modal_tit
                         "user_role": user_role or "viewer"
                     }
                     
-                    response = requests.put(
-                        "http://127.0.0.1:8000/product_master/update_subcategory",
+                    response = api_client.put(
+                        "/product_master/update_subcategory",
                         json=update_payload
                     )
                     
@@ -716,7 +716,7 @@ def save_changes(n_clicks, dropdown_values, input_values, stored_data, modal_tit
         updated_inventory_data = []
         try:
             print("[DEBUG] 開始重新載入庫存資料")
-            reload_response = requests.get("http://127.0.0.1:8000/get_inventory_data")
+            reload_response = api_client.get("/get_inventory_data")
             if reload_response.status_code == 200:
                 updated_inventory_data = reload_response.json()
                 print(f"[DEBUG] 成功重新載入庫存資料，共 {len(updated_inventory_data)} 筆")
@@ -918,8 +918,8 @@ def execute_delete(n_clicks, stored_data, modal_title, user_role, checkbox_value
             }
 
             # 呼叫刪除 API
-            response = requests.delete(
-                "http://127.0.0.1:8000/product/delete",
+            response = api_client.delete(
+                "/product/delete",
                 json=delete_payload
             )
 
@@ -935,7 +935,7 @@ def execute_delete(n_clicks, stored_data, modal_title, user_role, checkbox_value
         # 重新載入庫存資料
         updated_inventory_data = []
         try:
-            reload_response = requests.get("http://127.0.0.1:8000/get_inventory_data")
+            reload_response = api_client.get("/get_inventory_data")
             if reload_response.status_code == 200:
                 updated_inventory_data = reload_response.json()
                 print(f"[DEBUG] 成功重新載入庫存資料，共 {len(updated_inventory_data)} 筆")
@@ -974,7 +974,7 @@ def update_subcategory_options(selected_category):
     
     try:
         encoded_category = urllib.parse.quote(selected_category, safe="")
-        response = requests.get(f"http://127.0.0.1:8000/get_subcategories_of_category/{encoded_category}")
+        response = api_client.get(f"/get_subcategories_of_category/{encoded_category}")
         if response.status_code == 200:
             subcategory_data = response.json()
             subcategories = subcategory_data.get('subcategories', [])
@@ -1061,12 +1061,12 @@ def create_new_product(n_clicks, product_id, warehouse_id, name_zh, category, su
         }
         
         # 呼叫 API 創建產品
-        response = requests.post("http://127.0.0.1:8000/product/create", json=product_data)
+        response = api_client.post("/product/create", json=product_data)
         
         if response.status_code == 200:
             # 重新載入庫存資料
             try:
-                inventory_response = requests.get("http://127.0.0.1:8000/get_inventory_data")
+                inventory_response = api_client.get("/get_inventory_data")
                 if inventory_response.status_code == 200:
                     updated_inventory_data = inventory_response.json()
                 else:
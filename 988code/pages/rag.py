@@ -3,18 +3,7 @@ from dash import callback_context
 from dash.exceptions import PreventUpdate
 from dash import ALL, no_update
 import datetime
-import openpyxl
-import xlrd
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
-import tempfile
 import base64
-import os
 
 from env_loader import get_env_int
 
@@ -23,8 +12,7 @@ from env_loader import get_env_int
 # 從資料庫載入初始條目
 def load_initial_items():
     try:
-        import requests
-        response = requests.get("http://127.0.0.1:8000/get_rag_titles")
+        response = api_client.get("/get_rag_titles")
         if response.status_code == 200:
             data = response.json()
             titles = [item['title'] for item in data]
@@ -41,509 +29,22 @@ def load_initial_items():
 # 儲存要被刪除的條目名稱
 item_to_delete = None
 
-def setup_chinese_font():
-    """設定中文字體支援"""
-    try:
-        # 嘗試註冊系統中文字體
-        # Windows 系統字體路徑
-        font_paths = [
-            r"C:\Windows\Fonts\msjh.ttc",  # 微軟正黑體
-            r"C:\Windows\Fonts\SimHei.ttf",  # 黑體
-            r"C:\Windows\Fonts\simsun.ttc",  # 新細明體
-        ]
-        
-        for font_path in font_paths:
-            if os.path.exists(font_path):
-                try:
-                    if font_path.endswith('.ttc'):
-                        # TTC 字體需要指定子字體索引
-                        pdfmetrics.registerFont(TTFont('ChineseFont', font_path, subfontIndex=0))
-                    else:
-                        pdfmetrics.registerFont(TTFont('ChineseFont', font_path))
-                    print(f"成功載入中文字體: {font_path}")
-                    return True
-                except Exception as e:
-                    print(f"載入字體 {font_path} 失敗: {e}")
-                    continue
-        
-        print("警告: 找不到中文字體，將使用預設字體")
-        return False
-    except Exception as e:
-        print(f"設定中文字體時發生錯誤: {e}")
-        return False
-
-def excel_to_pdf_bytes_win32com(excel_content, filename=None):
-    """
-    使用 win32com 將 Excel 內容轉換為 PDF 位元組 (完美保留格式)
-    
-    參數:
-    excel_content: Excel 檔案的位元組內容
-    filename: 原始檔案名稱
-    
-    返回:
-    PDF 檔案的位元組內容，轉換失敗則返回 None
-    """
-    
-    try:
-        import win32com.client
-        import tempfile
-        import os
-        import datetime
-        
-        # 判斷檔案類型
-        is_old_format = filename and filename.lower().endswith('.xls')
-        suffix = '.xls' if is_old_format else '.xlsx'
-        
-        # 建立臨時 Excel 檔案
-        with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as temp_excel:
-            temp_excel_path = temp_excel.name
-            temp_excel.write(excel_content)
-            temp_excel.flush()
-            
-        # 建立臨時 PDF 檔案路徑
-        with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
-            temp_pdf_path = temp_pdf.name
-            
-        print(f"使用 win32com 轉換: {filename}")
-        print(f"臨時 Excel: {temp_excel_path}")
-        print(f"臨時 PDF: {temp_pdf_path}")
-        
-        try:
-            # 創建 Excel 應用程序對象
-            excel = win32com.client.Dispatch("Excel.Application")
-            excel.Visible = False  # 不顯示 Excel 窗口
-            excel.DisplayAlerts = False  # 不顯示警告對話框
-            
-            # 打開 Excel 文件
-            workbook = excel.Workbooks.Open(os.path.abspath(temp_excel_path))
-            
-            # 為確保每次轉換都不同，在第一個工作表加入隱藏註解
-            try:
-                worksheet = workbook.Worksheets(1)
-                current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-                # 在最後一個空白儲存格加入時間戳註解（白色字體，不可見）
-                last_row = worksheet.UsedRange.Rows.Count + 1
-                cell = worksheet.Cells(last_row, 1)
-                cell.Value = f"<!-- {current_time} -->"
-                cell.Font.Color = 16777215  # 白色字體（不可見）
-                cell.Font.Size = 1  # 極小字體
-            except:
-                pass  # 如果加入註解失敗，繼續進行轉換
-            
-            # 導出為 PDF (0 = xlTypePDF)
-            workbook.ExportAsFixedFormat(
-                Type=0,  # xlTypePDF
-                Filename=os.path.abspath(temp_pdf_path),
-                Quality=0,  # xlQualityStandard
-                IncludeDocProps=True,
-                IgnorePrintAreas=False,
-                OpenAfterPublish=False
-            )
-            
-            # 關閉文件和應用程序
-            workbook.Close(SaveChanges=False)
-            excel.Quit()
-            
-            # 讀取生成的 PDF
-            with open(temp_pdf_path, 'rb') as pdf_file:
-                pdf_bytes = pdf_file.read()
-            
-            print(f"win32com 轉換成功，PDF 大小: {len(pdf_bytes)} bytes")
-            
-            # 清理臨時檔案
-            try:
-                os.unlink(temp_excel_path)
-                os.unlink(temp_pdf_path)
-            except:
-                pass
-            
-            return pdf_bytes
-            
-        except Exception as excel_error:
-            print(f"Excel 應用程式轉換失敗: {excel_error}")
-            # 確保清理 Excel 程序
-            try:
-                excel.Quit()
-            except:
-                pass
-            
-            # 清理臨時檔案
-            try:
-                os.unlink(temp_excel_path)
-                os.unlink(temp_pdf_path)
-            except:
-                pass
-            
-            return None
-            
-    except ImportError:
-        print("win32com 模組未安裝，請執行: pip install pywin32")
-        return None
-    except Exception as e:
-        print(f"win32com 轉換過程中發生錯誤: {str(e)}")
-        return None
-
-def excel_to_pdf_bytes(excel_content, filename=None, sheet_name=None):
-    """
-    將 Excel 內容轉換為 PDF 位元組
-    
-    參數:
-    excel_content: Excel 檔案的位元組內容
-    filename: 原始檔案名稱（用來判斷是 .xls 還是 .xlsx）
-    sheet_name: 指定工作表名稱，如果為 None 則使用第一個工作表
-    
-    返回:
-    PDF 檔案的位元組內容，轉換失敗則返回 None
-    """
-    
-    try:
-        # 設定中文字體
-        has_chinese_font = setup_chinese_font()
-        
-        # 判斷檔案類型
-        is_old_format = filename and filename.lower().endswith('.xls')
-        
-        all_sheets_data = {}
-        
-        if is_old_format:
-            # 處理 .xls 檔案
-            temp_excel_path = None
-            try:
-                with tempfile.NamedTemporaryFile(suffix='.xls', delete=False) as temp_excel:
-                    temp_excel_path = temp_excel.name
-                    temp_excel.write(excel_content)
-                    temp_excel.flush()
-                
-                # 使用 xlrd 讀取 .xls 檔案
-                workbook = xlrd.open_workbook(temp_excel_path)
-                
-                # 處理所有工作表
-                sheet_names = workbook.sheet_names()
-                print(f"發現 {len(sheet_names)} 個工作表: {', '.join(sheet_names)}")
-                
-                for sheet_idx, name in enumerate(sheet_names):
-                    worksheet = workbook.sheet_by_index(sheet_idx)
-                    print(f"正在處理工作表 {sheet_idx + 1}/{len(sheet_names)}: {name}")
-                    
-                    # 讀取工作表資料
-                    sheet_data = []
-                    max_row = worksheet.nrows
-                    max_col = worksheet.ncols
-                    
-                    if max_row > 0 and max_col > 0:
-                        print(f"  資料範圍: {max_row} 行 x {max_col} 列")
-                        
-                        # 讀取資料和格式資訊
-                        for row in range(max_row):
-                            row_data = []
-                            for col in range(max_col):
-                                try:
-                                    cell_value = worksheet.cell_value(row, col)
-                                    if cell_value is None or cell_value == "":
-                                        cell_value = ""
-                                    # 處理日期格式
-                                    if worksheet.cell_type(row, col) == xlrd.XL_CELL_DATE:
-                                        date_tuple = xlrd.xldate_as_tuple(cell_value, workbook.datemode)
-                                        cell_value = f"{date_tuple[0]}-{date_tuple[1]:02d}-{date_tuple[2]:02d}"
-                                    row_data.append(str(cell_value))
-                                except:
-                                    row_data.append("")
-                            sheet_data.append(row_data)
-                        
-                        # 對於 .xls 檔案，格式資訊較少，使用基本設定
-                        all_sheets_data[name] = {
-                            'data': sheet_data,
-                            'col_widths': None,  # .xls 格式較難獲取精確的欄寬
-                            'formatting': None   # .xls 格式的格式資訊有限
-                        }
-                    else:
-                        print(f"  工作表 {name} 無資料，跳過")
-                
-                # xlrd workbook 不需要顯式關閉
-                
-            finally:
-                # 安全地刪除臨時檔案
-                if temp_excel_path and os.path.exists(temp_excel_path):
-                    try:
-                        os.unlink(temp_excel_path)
-                    except OSError as e:
-                        print(f"警告: 無法刪除臨時檔案 {temp_excel_path}: {e}")
-                
-        else:
-            # 處理 .xlsx 檔案
-            temp_excel_path = None
-            try:
-                with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as temp_excel:
-                    temp_excel_path = temp_excel.name
-                    temp_excel.write(excel_content)
-                    temp_excel.flush()
-                
-                # 讀取 Excel 檔案
-                workbook = openpyxl.load_workbook(temp_excel_path)
-                
-                # 處理所有工作表
-                sheet_names = workbook.sheetnames
-                print(f"發現 {len(sheet_names)} 個工作表: {', '.join(sheet_names)}")
-                
-                for sheet_idx, name in enumerate(sheet_names):
-                    worksheet = workbook[name]
-                    print(f"正在處理工作表 {sheet_idx + 1}/{len(sheet_names)}: {name}")
-                    
-                    # 讀取工作表資料
-                    max_col = worksheet.max_column
-                    max_row = worksheet.max_row
-                    
-                    if max_row > 0 and max_col > 0:
-                        print(f"  資料範圍: {max_row} 行 x {max_col} 列")
-                        
-                        sheet_data = []
-                        cell_formats = []  # 儲存每個儲存格的格式資訊
-                        col_widths = []    # 儲存欄寬資訊
-                        
-                        # 讀取欄寬資訊
-                        for col in range(1, max_col + 1):
-                            col_letter = worksheet.cell(row=1, column=col).column_letter
-                            col_dimension = worksheet.column_dimensions.get(col_letter)
-                            if col_dimension and col_dimension.width:
-                                # Excel 欄寬單位轉換為點數 (大約)
-                                width_points = col_dimension.width * 7.5
-                            else:
-                                width_points = 60  # 預設寬度
-                            col_widths.append(width_points)
-                        
-                        # 讀取資料和格式資訊
-                        for row in range(1, max_row + 1):
-                            row_data = []
-                            row_formats = []
-                            for col in range(1, max_col + 1):
-                                cell = worksheet.cell(row=row, column=col)
-                                cell_value = cell.value if cell.value is not None else ""
-                                row_data.append(str(cell_value))
-                                
-                                # 讀取儲存格格式
-                                cell_format = {
-                                    'font_size': cell.font.size if cell.font.size else 11,
-                                    'bold': cell.font.bold if cell.font.bold else False,
-                                    'italic': cell.font.italic if cell.font.italic else False,
-                                    'font_name': cell.font.name if cell.font.name else 'Arial',
-                                    'alignment': cell.alignment.horizontal if cell.alignment.horizontal else 'general',
-                                    'fill_color': None,
-                                    'font_color': None
-                                }
-                                
-                                # 讀取背景顏色
-                                if cell.fill.fill_type == 'solid' and hasattr(cell.fill, 'start_color'):
-                                    if hasattr(cell.fill.start_color, 'rgb') and cell.fill.start_color.rgb:
-                                        rgb = cell.fill.start_color.rgb
-                                        if rgb and rgb != '00000000' and rgb != 'FFFFFFFF':  # 排除預設色
-                                            cell_format['fill_color'] = rgb
-                                
-                                # 讀取字體顏色
-                                if cell.font.color and hasattr(cell.font.color, 'rgb'):
-                                    if cell.font.color.rgb and cell.font.color.rgb != '00000000':
-                                        cell_format['font_color'] = cell.font.color.rgb
-                                
-                                row_formats.append(cell_format)
-                            
-                            sheet_data.append(row_data)
-                            cell_formats.append(row_formats)
-                        
-                        all_sheets_data[name] = {
-                            'data': sheet_data,
-                            'col_widths': col_widths,
-                            'formatting': cell_formats
-                        }
-                    else:
-                        print(f"  工作表 {name} 無資料，跳過")
-                
-                # 確保 workbook 被正確關閉
-                workbook.close()
-                
-            finally:
-                # 安全地刪除臨時檔案
-                if temp_excel_path and os.path.exists(temp_excel_path):
-                    try:
-                        os.unlink(temp_excel_path)
-                    except OSError as e:
-                        print(f"警告: 無法刪除臨時檔案 {temp_excel_path}: {e}")
-        
-        # 檢查是否有資料
-        if not all_sheets_data:
-            print("警告: Excel 檔案中沒有資料")
-            return None
-            
-        # 創建臨時 PDF 檔案
-        temp_pdf_path = None
-        try:
-            with tempfile.NamedTemporaryFile(suffix='.pdf', delete=False) as temp_pdf:
-                temp_pdf_path = temp_pdf.name
-                print(f"建立臨時 PDF 檔案: {temp_pdf_path}")
-            
-            # 建立 PDF 文件
-            doc = SimpleDocTemplate(temp_pdf_path, pagesize=A4)
-            story = []
-            
-            # 獲取樣式
-            styles = getSampleStyleSheet()
-            
-            # 在 PDF 中加入隱藏的時間戳註解確保唯一性
-            import datetime
-            current_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-            # 加入一個不可見的元素包含時間戳
-            from reportlab.platypus import Paragraph
-            hidden_timestamp = Paragraph(f"<!-- {current_time} -->", styles['Normal'])
-            hidden_timestamp.style.fontSize = 0.1  # 極小字體
-            hidden_timestamp.style.textColor = colors.white  # 白色文字（不可見）
-            story.append(hidden_timestamp)
-            
-            # 時間戳已透過隱藏元素加入，確保每次轉換的唯一性
-            
-            # 處理每個工作表
-            for sheet_idx, (sheet_name, sheet_info) in enumerate(all_sheets_data.items()):
-                print(f"生成 PDF 工作表 {sheet_idx + 1}/{len(all_sheets_data)}: {sheet_name}")
-                
-                # 不添加工作表標題，直接處理表格內容
-                if isinstance(sheet_info, dict):
-                    data = sheet_info['data']
-                    col_widths = sheet_info['col_widths']
-                    formatting = sheet_info['formatting']
-                else:
-                    # 向後兼容舊格式
-                    data = sheet_info
-                    col_widths = None
-                    formatting = None
-                
-                # 建立表格，套用欄寬
-                if col_widths:
-                    table = Table(data, colWidths=col_widths)
-                else:
-                    table = Table(data)
-                
-                # 動態設定表格樣式，套用 Excel 格式
-                style_commands = []
-                
-                # 基本邊框和對齊
-                style_commands.extend([
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-                    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ])
-                
-                def hex_to_color(hex_color):
-                    """將 Excel 的 hex 顏色轉換為 ReportLab 顏色"""
-                    try:
-                        if hex_color and len(hex_color) >= 6:
-                            # 移除 FF 前綴（如果有的話）
-                            if len(hex_color) == 8 and hex_color.startswith('FF'):
-                                hex_color = hex_color[2:]
-                            elif len(hex_color) == 8:
-                                hex_color = hex_color[2:]  # 移除 alpha 通道
-                            
-                            r = int(hex_color[0:2], 16) / 255.0
-                            g = int(hex_color[2:4], 16) / 255.0
-                            b = int(hex_color[4:6], 16) / 255.0
-                            return colors.Color(r, g, b)
-                    except:
-                        pass
-                    return None
-                
-                def get_alignment(excel_align):
-                    """轉換 Excel 對齊方式"""
-                    align_map = {
-                        'left': 'LEFT',
-                        'center': 'CENTER',
-                        'right': 'RIGHT',
-                        'general': 'LEFT'
-                    }
-                    return align_map.get(excel_align, 'LEFT')
-                
-                # 如果有格式資訊，套用每個儲存格的格式
-                if formatting:
-                    for row_idx, row_formats in enumerate(formatting):
-                        for col_idx, cell_format in enumerate(row_formats):
-                            cell_pos = (col_idx, row_idx)
-                            
-                            # 字體大小
-                            if cell_format.get('font_size'):
-                                font_size = max(6, min(cell_format['font_size'], 20))  # 限制字體大小範圍
-                                style_commands.append(('FONTSIZE', cell_pos, cell_pos, font_size))
-                            
-                            # 字體名稱和粗體
-                            font_name = 'ChineseFont' if has_chinese_font else 'Helvetica'
-                            if cell_format.get('bold'):
-                                if has_chinese_font:
-                                    font_name = 'ChineseFont'  # 中文字體處理粗體較複雜
-                                else:
-                                    font_name = 'Helvetica-Bold'
-                            
-                            style_commands.append(('FONTNAME', cell_pos, cell_pos, font_name))
-                            
-                            # 對齊方式
-                            alignment = get_alignment(cell_format.get('alignment', 'general'))
-                            style_commands.append(('ALIGN', cell_pos, cell_pos, alignment))
-                            
-                            # 背景顏色
-                            if cell_format.get('fill_color'):
-                                bg_color = hex_to_color(cell_format['fill_color'])
-                                if bg_color:
-                                    style_commands.append(('BACKGROUND', cell_pos, cell_pos, bg_color))
-                            
-                            # 字體顏色
-                            if cell_format.get('font_color'):
-                                text_color = hex_to_color(cell_format['font_color'])
-                                if text_color:
-                                    style_commands.append(('TEXTCOLOR', cell_pos, cell_pos, text_color))
-                else:
-                    # 沒有格式資訊時使用預設樣式
-                    if has_chinese_font:
-                        style_commands.extend([
-                            ('FONTNAME', (0, 0), (-1, -1), 'ChineseFont'),
-                            ('FONTSIZE', (0, 0), (-1, -1), 10),
-                            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ])
-                    else:
-                        style_commands.extend([
-                            ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                            ('FONTSIZE', (0, 0), (-1, -1), 10),
-                            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                        ])
-                
-                table_style = TableStyle(style_commands)
-                
-                table.setStyle(table_style)
-                story.append(table)
-                
-                # 工作表之間加入適當分隔
-                if sheet_idx < len(all_sheets_data) - 1:  # 不是最後一個工作表
-                    story.append(Spacer(1, 40))  # 表格間距
-            
-            # 生成 PDF
-            doc.build(story)
-            
-            # 讀取生成的 PDF 位元組
-            with open(temp_pdf_path, 'rb') as pdf_file:
-                pdf_bytes = pdf_file.read()
-            
-            print("Excel 轉 PDF 成功")
-            return pdf_bytes
-            
-        finally:
-            # 安全地清理臨時 PDF 檔案
-            if temp_pdf_path and os.path.exists(temp_pdf_path):
-                try:
-                    os.unlink(temp_pdf_path)
-                except OSError as e:
-                    print(f"警告: 無法刪除臨時 PDF 檔案 {temp_pdf_path}: {e}")
-                
-    except FileNotFoundError:
-        print("錯誤: 找不到檔案")
-        return None
-    except Exception as e:
-        print(f"Excel 轉 PDF 過程中發生錯誤: {str(e)}")
-        return None
-
 # 儲存當前選中的條目
 current_selected_item = None
 
+# 背景轉換狀態顯示文字
+FILE_STATUS_LABELS = {
+    'converting': '（轉換中）',
+    'failed': '（轉換失敗）'
+}
+
+def db_file_display_names(content_data):
+    """資料庫檔案的顯示名稱，尚未轉換完成的檔案附上狀態"""
+    files = content_data.get('files')
+    if files is None:
+        return content_data.get('file_names', [])
+    return [f"{f['file_name']}{FILE_STATUS_LABELS.get(f.get('status'), '')}" for f in files]
+
 # 生成檔案顯示內容的函數  
 def generate_file_display_content(file_names):
     """在callback中動態生成檔案顯示內容"""
@@ -786,9 +287,8 @@ def add_client(n_clicks, new_name, current_list, user_role):
         }
         
         # 呼叫API在資料庫新增記錄
-        import requests
         knowledge_data["user_role"] = user_role or "viewer"
-        response = requests.put("http://127.0.0.1:8000/rag/save_knowledge", json=knowledge_data)
+        response = api_client.put("/rag/save_knowledge", json=knowledge_data)
         
         if response.status_code == 200:
             # 資料庫新增成功，更新UI
@@ -898,25 +398,13 @@ def is_allowed_file(filename):
 def calculate_total_file_size(current_title):
     """計算資料庫中已存在的檔案總大小（bytes）"""
     try:
-        # 直接查詢資料庫計算檔案大小（避免透過 API 傳輸大量資料）
+        # 直接查詢附件中繼資料的大小欄位，不需讀取檔案內容
         from database_config import execute_query
 
-        # 查詢 file_content 欄位
-        query = "SELECT file_content FROM rag WHERE title = %s"
+        query = "SELECT COALESCE(SUM(size_bytes), 0) FROM rag_attachments WHERE title = %s"
         result = execute_query(query, (current_title,), fetch='one')
 
-        if result and result[0]:
-            file_contents = result[0]  # file_content 是陣列
-            total_size = 0
-
-            for hex_data in file_contents:
-                if hex_data:
-                    # hex 字串長度 / 2 = 實際檔案大小
-                    total_size += len(hex_data) // 2
-
-            return total_size
-
-        return 0
+        return int(result[0]) if result else 0
 
     except Exception as e:
         print(f"[ERROR] 計算檔案總大小失敗: {e}")
@@ -961,11 +449,10 @@ def update_output(list_of_contents, list_of_names, list_of_dates, current_title)
     existing_total_size = 0
     if current_title:
         try:
-            import requests
-            response = requests.get(f"http://127.0.0.1:8000/get_rag_content/{current_title}")
+            response = api_client.get(f"/get_rag_content/{current_title}")
             if response.status_code == 200:
                 content_data = response.json()
-                existing_db_files = content_data.get('file_names', [])
+                existing_db_files = db_file_display_names(content_data)
                 # 計算現有檔案總大小
                 existing_total_size = calculate_total_file_size(current_title)
         except Exception as e:
@@ -980,7 +467,6 @@ def update_output(list_of_contents, list_of_names, list_of_dates, current_title)
                 invalid_files.append(filename)
                 continue
 
-            # 處理 Excel 檔案：轉換為 PDF
             processed_contents = contents
             processed_filename = filename
             upload_timestamp = normalize_upload_timestamp(date)
@@ -1018,49 +504,8 @@ def update_output(list_of_contents, list_of_names, list_of_dates, current_title)
                 # 總容量超限，直接中斷
                 break
 
-            # 檢查是否為 Excel 檔案
-            extension = filename.lower().split('.')[-1] if '.' in filename else ''
-            if extension in ['xls', 'xlsx']:
-                try:
-                    # 解碼 base64 內容
-                    # 轉換 Excel 為 PDF
-                    print(f"正在將 {filename} 轉換為 PDF...")
-                    print(f"原始檔案大小: {len(decoded_content)} bytes")
-
-                    pdf_bytes = excel_to_pdf_bytes_win32com(decoded_content, filename)
-                    
-                    if pdf_bytes:
-                        # 成功轉換，更新檔案名稱和內容
-                        base_name = filename.rsplit('.', 1)[0]  # 移除原始副檔名
-                        processed_filename = f"{base_name}.pdf"
-                        conversion_success = True
-                        
-                        print(f"轉換後 PDF 大小: {len(pdf_bytes)} bytes")
-                        
-                        # 重新編碼為 base64
-                        pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-                        processed_contents = "data:application/pdf;base64," + pdf_base64
-                        
-                        # 驗證 base64 編碼是否正確
-                        import hashlib
-                        test_decode = base64.b64decode(pdf_base64)
-                        decode_hash = hashlib.md5(test_decode).hexdigest()[:8]
-                        print(f"[驗證] base64 編碼後重新解碼的雜湊: {decode_hash}")
-                        
-                        # 加上檔案內容的簡短雜湊來確認唯一性
-                        content_hash = hashlib.md5(pdf_bytes).hexdigest()[:8]
-                        print(f"Excel 檔案 {filename} 已成功轉換為 {processed_filename}，內容雜湊: {content_hash}")
-                    else:
-                        # 轉換失敗，記錄錯誤但不中斷處理
-                        print(f"警告: Excel 檔案 {filename} 轉換失敗，將使用原始檔案")
-                        conversion_success = False
-                        
-                except Exception as e:
-                    print(f"處理 Excel 檔案 {filename} 時發生錯誤: {e}")
-                    # 轉換失敗時使用原始檔案
-                    conversion_success = False
-            else:
-                conversion_success = False
+            # 非 PDF 檔案交由 API 背景轉換，不在 Dash 進程內轉換
+            conversion_success = False
             
             # 檢查是否已存在相同檔名，如果存在就更新，否則新增
             existing_file_index = next((i for i, f in enumerate(uploaded_files_store) if f['filename'] == processed_filename), -1)
@@ -1353,13 +798,12 @@ def display_client_data(n_clicks_list, id_list, current_list):
         
         # 從資料庫載入條目內容
         try:
-            import requests
-            response = requests.get(f"http://127.0.0.1:8000/get_rag_content/{client_name}")
+            response = api_client.get(f"/get_rag_content/{client_name}")
             if response.status_code == 200:
                 content_data = response.json()
                 text_content = content_data.get('text_content', '')
                 has_file = content_data.get('has_file', False)
-                file_names = content_data.get('file_names', [])
+                file_names = db_file_display_names(content_data)
             else:
                 text_content = ''
                 has_file = False
@@ -1727,9 +1171,8 @@ def handle_delete_modal_buttons(confirm_clicks, cancel_clicks, is_open, current_
     if 'confirm-delete-modal' in triggered_button and item_to_delete:
         try:
             # 呼叫API從資料庫刪除記錄
-            import requests
-            response = requests.put(
-                f"http://127.0.0.1:8000/rag/delete_knowledge/{item_to_delete}",
+            response = api_client.put(
+                f"/rag/delete_knowledge/{item_to_delete}",
                 params={"user_role": user_role or "viewer"}
             )
             
@@ -1806,13 +1249,12 @@ def handle_save_button(n_clicks, title, text_content, current_list, user_role):
         title_updated = False
         old_title = current_selected_item  # 記住原標題
         if current_selected_item and title != current_selected_item:
-            import requests
             update_data = {
                 "old_title": current_selected_item,
                 "new_title": title
             }
             update_data["user_role"] = user_role or "viewer"
-            response = requests.put("http://127.0.0.1:8000/rag/update_title", json=update_data)
+            response = api_client.put("/rag/update_title", json=update_data)
             
             if response.status_code == 200:
                 title_updated = True
@@ -1858,9 +1300,8 @@ def handle_save_button(n_clicks, title, text_content, current_list, user_role):
         }
         
         # 呼叫API儲存內容
-        import requests
         knowledge_data["user_role"] = user_role or "viewer"
-        response = requests.put("http://127.0.0.1:8000/rag/save_knowledge", json=knowledge_data)
+        response = api_client.put("/rag/save_knowledge", json=knowledge_data)
         
         if response.status_code == 200:
             # 清空上傳檔案暫存（因為已經儲存到資料庫）
@@ -1868,10 +1309,10 @@ def handle_save_button(n_clicks, title, text_content, current_list, user_role):
             
             # 重新從資料庫載入檔案列表
             try:
-                content_response = requests.get(f"http://127.0.0.1:8000/get_rag_content/{title}")
+                content_response = api_client.get(f"/get_rag_content/{title}")
                 if content_response.status_code == 200:
                     content_data = content_response.json()
-                    updated_file_names = content_data.get('file_names', [])
+                    updated_file_names = db_file_display_names(content_data)
                 else:
                     updated_file_names = []
             except:
@@ -1993,8 +1434,6 @@ def delete_existing_file(n_clicks_list, title, text_content, user_role):
     
     try:
         # 呼叫API清除檔案內容
-        import requests
-        
         # 準備刪除指定檔案的數據
         knowledge_data = {
             "title": title,
@@ -2005,15 +1444,15 @@ def delete_existing_file(n_clicks_list, title, text_content, user_role):
         
         # 更新資料庫，清除file_content和file_name
         knowledge_data["user_role"] = user_role or "viewer"
-        response = requests.put("http://127.0.0.1:8000/rag/save_knowledge", json=knowledge_data)
+        response = api_client.put("/rag/save_knowledge", json=knowledge_data)
         
         if response.status_code == 200:
             # 重新載入檔案列表
             try:
-                content_response = requests.get(f"http://127.0.0.1:8000/get_rag_content/{title}")
+                content_response = api_client.get(f"/get_rag_content/{title}")
                 if content_response.status_code == 200:
                     content_data = content_response.json()
-                    updated_file_names = content_data.get('file_names', [])
+                    updated_file_names = db_file_display_names(content_data)
                     # Generate updated database files content
                     db_files_content = []
                     if updated_file_names:
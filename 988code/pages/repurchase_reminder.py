@@ -1,5 +1,4 @@
 from .common import *
-import requests
 from datetime import datetime
 from dash import callback_context, ALL
 from dash.exceptions import PreventUpdate
@@ -174,7 +173,7 @@ def initialize_page(_):
     days_input = global_vars.get_repurchase_days()
     
     try:
-        response = requests.get(f"http://127.0.0.1:8000/get_repurchase_reminders/{days_input}")
+        response = api_client.get(f"/get_repurchase_reminders/{days_input}")
         
         if response.status_code == 200:
             data = response.json()
@@ -239,7 +238,7 @@ def load_repurchase_data(n_clicks, days_input):
     days_input = global_vars.get_repurchase_days()
     
     try:
-        response = requests.get(f"http://127.0.0.1:8000/get_repurchase_reminders/{days_input}")
+        response = api_client.get(f"/get_repurchase_reminders/{days_input}")
         
         if response.status_code == 200:
             data = response.json()
@@ -393,8 +392,8 @@ def update_reminded_status(n_clicks, checkbox_values, stored_data, days_input, u
         # 發送PUT API請求更新提醒狀態
         has_permission_error = False
         for id in selected_ids:
-            response = requests.put(
-                f"http://127.0.0.1:8000/update_repurchase_reminder/{id}",
+            response = api_client.put(
+                f"/update_repurchase_reminder/{id}",
                 params={"user_role": user_role or "viewer"}
             )
             if response.status_code == 403:
@@ -407,7 +406,7 @@ def update_reminded_status(n_clicks, checkbox_values, stored_data, days_input, u
             return html.Div(), stored_data, False, "", False, "", True, "權限不足：僅限編輯者使用此功能", []
         
         # 重新載入資料
-        response = requests.get(f"http://127.0.0.1:8000/get_repurchase_reminders/{days_input}")
+        response = api_client.get(f"/get_repurchase_reminders/{days_input}")
         if response.status_code == 200:
             data = response.json()
             if not data:
@@ -532,8 +531,8 @@ def save_note_edit(save_clicks, textarea_value, stored_data, edit_index, days_in
         customer_id = df.iloc[edit_index]['id']
         
         # 調用API更新備註
-        response = requests.put(
-            f"http://127.0.0.1:8000/update_repurchase_note/{customer_id}", 
+        response = api_client.put(
+            f"/update_repurchase_note/{customer_id}", 
             json={
                 "repurchase_note": textarea_value or "",
                 "user_role": user_role or "viewer"
@@ -546,7 +545,7 @@ def save_note_edit(save_clicks, textarea_value, stored_data, edit_index, days_in
             return html.Div(), stored_data, False, False, "", True, f"API更新失敗: {response.status_code}", False, "", []
         
         # 重新載入資料
-        response = requests.get(f"http://127.0.0.1:8000/get_repurchase_reminders/{days_input}")
+        response = api_client.get(f"/get_repurchase_reminders/{days_input}")
         if response.status_code == 200:
             data = response.json()
             if not data:
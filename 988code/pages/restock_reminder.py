@@ -275,7 +275,7 @@ layout = html.Div(style={"fontFamily": "sans-serif"}, children=[
 def reload_table_data():
     """重新載入表格資料並返回表格內容和資料"""
     try:
-        response = requests.get('http://127.0.0.1:8000/get_restock_data',
+        response = api_client.get('/get_restock_data',
                               params={'limit': 5000}, timeout=60)
         if response.status_code != 200:
             return None, [], True, "無法獲取資料"
@@ -371,7 +371,7 @@ def load_data_and_handle_errors(page_loaded, current_page):
 
         # 載入分頁數據
         offset = (current_page - 1) * 50
-        response = requests.get('http://127.0.0.1:8000/get_restock_data',
+        response = api_client.get('/get_restock_data',
                               params={'limit': 50, 'offset': offset},
                               timeout=60)
         if response.status_code == 200:
@@ -504,7 +504,7 @@ def load_data_and_handle_errors(page_loaded, current_page):
 )
 def load_customer_options(page_loaded):
     try:
-        response = requests.get('http://127.0.0.1:8000/get_restock_customer_ids')
+        response = api_client.get('/get_restock_customer_ids')
         if response.status_code == 200:
             data = response.json()
             customer_ids = data['customer_ids']
@@ -533,7 +533,7 @@ def handle_simple_pagination(first_clicks, prev_clicks, next_clicks, last_clicks
 
     # 從API獲取總頁數資訊 (簡單方法)
     try:
-        response = requests.get('http://127.0.0.1:8000/get_restock_data', params={'limit': 1, 'offset': 0}, timeout=10)
+        response = api_client.get('/get_restock_data', params={'limit': 1, 'offset': 0}, timeout=10)
         if response.status_code == 200:
             result = response.json()
             total_count = result.get('total', 0)
@@ -611,7 +611,7 @@ def show_detail_modal(view_clicks, table_data):
                 params = {}
                 if product_id_str:
                     params['product_id'] = product_id_str
-                response = requests.get(f'http://127.0.0.1:8000/get_restock_history/{customer_id}', params=params if params else None)
+                response = api_client.get(f'/get_restock_history/{customer_id}', params=params if params else None)
                 if response.status_code == 200:
                     history_data = response.json()
                     history_df = pd.DataFrame(history_data)
@@ -1050,8 +1050,8 @@ def handle_final_confirm(confirm_clicks, radio_values, selected_items_from_store
                             'user_role': 'editor'
                         }
 
-                        update_response = requests.put(
-                            'http://127.0.0.1:8000/update_restock_prediction_status',
+                        update_response = api_client.put(
+                            '/update_restock_prediction_status',
                             json=payload,
                             timeout=30
                         )
@@ -1,5 +1,4 @@
 from pages.common import *
-import requests
 import json
 from datetime import datetime, timezone, timedelta
 import threading
@@ -202,7 +201,7 @@ layout = html.Div([
 
 # 後端API基地址配置
 # 主API服務 - 一般業務功能
-API_BASE_URL = "http://127.0.0.1:8000"
+API_BASE_URL = api_client.API_BASE_URL
 
 # Scheduler API配置 - 隔離scheduler操作到專用端口
 SCHEDULER_BASE_POST = "http://127.0.0.1:9000"  # POST操作（execute, toggle, start/stop）
@@ -229,7 +228,7 @@ SCHEDULE_MAPPING = {
 def load_schedule_status(n_intervals):
     """從後端載入排程狀態"""
     try:
-        response = requests.get(f'{SCHEDULER_BASE_GET}/schedule/tasks')
+        response = api_client.get(f'{SCHEDULER_BASE_GET}/schedule/tasks')
         if response.status_code == 200:
             data = response.json().get('data', {})
             
@@ -285,7 +284,7 @@ def toggle_restock(value):
 def toggle_schedule_category(category, value):
     """通用的排程開關函數"""
     try:
-        response = requests.post(f'{SCHEDULER_BASE_POST}/schedule/toggle', 
+        response = api_client.post(f'{SCHEDULER_BASE_POST}/schedule/toggle', 
                                json={"category": category, "enabled": value})
         if response.status_code == 200:
             status_text = 'enabled' if value else 'disabled'
@@ -349,7 +348,7 @@ def load_line_settings_initial(n_intervals):
 
     try:
         # 調用 GET API 獲取當前狀態
-        response = requests.get(f'{API_BASE_URL}/line-reply-status')
+        response = api_client.get(f'{API_BASE_URL}/line-reply-status')
         if response.status_code == 200:
             data = response.json()
             enabled = data.get('enabled', False)
@@ -406,7 +405,7 @@ def toggle_line_reply(value):
         with open(log_file, "a") as f:
             f.write(f"Calling API: {api_url} with payload: {payload}\n")
 
-        response = requests.put(api_url, json=payload)
+        response = api_client.put(api_url, json=payload)
 
         with open(log_file, "a") as f:
             f.write(f"API response status: {response.status_code}\n")
@@ -9,6 +9,7 @@ import logging
 from pathlib import Path
 from typing import List, Dict
 import os
+from potential_customer_finder.keyword_matcher import KeywordMatcher
 
 logger = logging.getLogger(__name__)
 
@@ -18,6 +19,7 @@ class ChatAnalyzer:
     def __init__(self):
         # 動態獲取最新的聊天記錄目錄
         self.chat_dir = self._get_latest_chat_history_dir()
+        self._keyword_matcher = None
 
         if not self.chat_dir.exists():
             logger.warning(f"聊天記錄目錄不存在: {self.chat_dir}")
@@ -156,21 +158,16 @@ class ChatAnalyzer:
         
         return True
     
+    def get_keyword_matcher(self, keywords: List[str]) -> KeywordMatcher:
+        """取得關鍵詞比對器，同一組關鍵詞重複使用已建立的自動機"""
+        keywords = list(keywords)
+        if self._keyword_matcher is None or self._keyword_matcher.keywords != keywords:
+            self._keyword_matcher = KeywordMatcher(keywords)
+        return self._keyword_matcher
+
     def _search_keywords_in_message(self, keywords: List[str], message: str) -> List[Dict]:
         """在訊息中搜尋關鍵詞"""
-        matches = []
-        message_lower = message.lower()
-        
-        for keyword in keywords:
-            if keyword.lower() in message_lower:
-                matches.append({
-                    'keyword': keyword,
-                    'match_type': 'exact',
-                    'confidence': 1.0,
-                    'position': message_lower.find(keyword.lower())
-                })
-        
-        return matches
+        return self.get_keyword_matcher(keywords).match(message)
 
 def get_chat_analyzer() -> ChatAnalyzer:
     """獲取聊天分析器實例"""
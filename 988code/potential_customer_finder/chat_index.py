@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+產品潛在客戶搜尋系統 - 聊天記錄持久化索引
+以字元雙字組（bigram）建立聊天訊息的倒排索引，保存在 SQLite 檔案中。
+依檔案修改時間與大小的清單增量更新，只重新讀取新增或變更的聊天記錄檔案，
+產品搜尋時以索引查詢候選訊息，不需再逐一讀取所有 CSV 檔案。
+需重新讀取的檔案很多時（例如新的匯出目錄），以多進程平行解析，
+解析結果陸續交回單一寫入端，同時處理中的檔案數有上限以控制記憶體用量。
+"""
+
+import itertools
+import logging
+import multiprocessing
+import os
+import sqlite3
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from potential_customer_finder.chat_analyzer import ChatAnalyzer, get_chat_analyzer
+
+logger = logging.getLogger(__name__)
+
+# 索引檔案位置（與關鍵詞快取同目錄）
+CHAT_INDEX_FILE = Path(__file__).parent / "cache" / "chat_index.sqlite3"
+
+# 索引格式版本，格式變更時遞增以觸發完整重建
+INDEX_VERSION = "1"
+
+# n-gram 長度：中文詞彙多為兩個字，使用雙字組
+NGRAM_SIZE = 2
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    file_name TEXT PRIMARY KEY,
+    mtime REAL NOT NULL,
+    size INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL,
+    row_number INTEGER,
+    customer_name TEXT,
+    customer_id TEXT,
+    content TEXT NOT NULL,
+    content_lower TEXT NOT NULL,
+    date TEXT,
+    date_str TEXT,
+    sender_name TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_file ON messages (file_name);
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    PRIMARY KEY (gram, message_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_grams_message ON grams (message_id);
+"""
+
+# SQLite 單一語句的參數上限內分批查詢
+SQL_BATCH_SIZE = 500
+
+# 需重新索引的檔案數達到此值時改用多進程解析
+PARALLEL_MIN_FILES = 50
+
+# 解析進程數（可由環境變數調整）
+INDEX_WORKERS = int(os.getenv("CHAT_INDEX_WORKERS", str(os.cpu_count() or 1)))
+
+# 每個解析進程最多預先排入的檔案數，限制等待寫入的解析結果數量
+FILES_IN_FLIGHT_PER_WORKER = 2
+
+
+def extract_ngrams(text: str, n: int = NGRAM_SIZE) -> set:
+    """取出文字中所有長度為 n 的字元組（不足 n 個字時回傳空集合）"""
+    return {text[i:i + n] for i in range(len(text) - n + 1)}
+
+
+# 解析進程各自持有的聊天分析器
+_worker_analyzer = None
+
+
+def _init_parse_worker():
+    global _worker_analyzer
+    _worker_analyzer = get_chat_analyzer()
+
+
+def parse_chat_file(csv_file, analyzer: Optional[ChatAnalyzer] = None) -> List[tuple]:
+    """讀取聊天記錄檔案並轉為索引資料
+
+    Returns:
+        List[tuple]: [(messages 資料表欄位值, n-gram 列表), ...]
+    """
+    analyzer = analyzer or _worker_analyzer
+    rows = []
+    for record in analyzer._read_chat_file(Path(csv_file)):
+        content_lower = record['content'].lower()
+        rows.append((
+            (record['file_source'], record.get('row_number'), record['customer_name'],
+             record.get('customer_id'), record['content'], content_lower,
+             record['date'], record['date_str'], record['sender_name']),
+            list(extract_ngrams(content_lower))
+        ))
+    return rows
+
+
+class ChatIndex:
+    """聊天記錄倒排索引
+
+    索引只保存 ChatAnalyzer._read_chat_file 讀出的客戶文字訊息，
+    搜尋結果與逐檔掃描時 _search_keywords_in_message 的比對規則（不分大小寫的子字串）一致。
+    """
+
+    def __init__(self, index_file: Path = CHAT_INDEX_FILE, analyzer: Optional[ChatAnalyzer] = None):
+        self.index_file = Path(index_file)
+        self.analyzer = analyzer or get_chat_analyzer()
+        self.chat_dir = self.analyzer.chat_dir
+        self._lock = threading.Lock()
+
+        self.index_file.parent.mkdir(parents=True, exist_ok=True)
+        with self._connect() as conn:
+            conn.executescript(SCHEMA_SQL)
+            self._check_version(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(str(self.index_file), timeout=30)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _check_version(self, conn: sqlite3.Connection):
+        """索引格式版本不符時清空索引"""
+        row = conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if row and row[0] == INDEX_VERSION:
+            return
+        if row:
+            logger.info(f"聊天索引版本變更 ({row[0]} -> {INDEX_VERSION})，將重新建立索引")
+        conn.execute("DELETE FROM grams")
+        conn.execute("DELETE FROM messages")
+        conn.execute("DELETE FROM files")
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('version', ?)", (INDEX_VERSION,))
+
+    # ---- 增量更新 ----
+
+    def update(self, progress: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """依檔案清單增量更新索引
+
+        修改時間或大小變更的檔案重新讀取，目錄中已不存在的檔案從索引移除。
+        切換到新的 line_oa_chat_csv* 匯出目錄時，內容未變的同名檔案仍需重新讀取一次
+        （匯出時間不同），之後即可沿用。
+
+        Args:
+            progress: 進度回呼 progress(已處理檔案數, 需處理檔案總數)
+
+        Returns:
+            Dict: total_files、indexed_files（本次重新索引）、removed_files、messages
+        """
+        with self._lock, self._connect() as conn:
+            current = {}
+            if self.chat_dir.exists():
+                for csv_file in self.chat_dir.glob("*.csv"):
+                    stat = csv_file.stat()
+                    current[csv_file.name] = (csv_file, stat.st_mtime, stat.st_size)
+
+            manifest = {name: (mtime, size) for name, mtime, size
+                        in conn.execute("SELECT file_name, mtime, size FROM files")}
+
+            removed = [name for name in manifest if name not in current]
+            changed = [name for name, (_, mtime, size) in current.items()
+                       if manifest.get(name) != (mtime, size)]
+
+            for name in removed:
+                self._remove_file(conn, name)
+
+            parsed = self._parse_files([current[name][0] for name in changed])
+            for i, (csv_file, rows) in enumerate(parsed, 1):
+                _, mtime, size = current[csv_file.name]
+                self._remove_file(conn, csv_file.name)
+                self._insert_rows(conn, rows)
+                conn.execute("INSERT INTO files (file_name, mtime, size) VALUES (?, ?, ?)",
+                             (csv_file.name, mtime, size))
+                if progress:
+                    progress(i, len(changed))
+
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('chat_dir', ?)",
+                         (str(self.chat_dir),))
+            message_count = conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+        if changed or removed:
+            logger.info(f"聊天索引更新完成：重新索引 {len(changed)} 個檔案，移除 {len(removed)} 個檔案，"
+                        f"共 {message_count} 條訊息")
+
+        return {
+            'total_files': len(current),
+            'indexed_files': len(changed),
+            'removed_files': len(removed),
+            'messages': message_count
+        }
+
+    @staticmethod
+    def _remove_file(conn: sqlite3.Connection, file_name: str):
+        conn.execute("DELETE FROM grams WHERE message_id IN (SELECT id FROM messages WHERE file_name = ?)",
+                     (file_name,))
+        conn.execute("DELETE FROM messages WHERE file_name = ?", (file_name,))
+        conn.execute("DELETE FROM files WHERE file_name = ?", (file_name,))
+
+    def _parse_files(self, csv_files: List[Path]):
+        """依完成順序逐一產生 (檔案, 解析結果)
+
+        檔案少或無法 fork 時在本進程依序解析；否則以進程池平行解析，
+        同時排入的檔案數有上限，寫入端跟不上時不會累積大量解析結果。
+        """
+        workers = min(INDEX_WORKERS, len(csv_files))
+        if len(csv_files) < PARALLEL_MIN_FILES or workers <= 1 or \
+                'fork' not in multiprocessing.get_all_start_methods():
+            for csv_file in csv_files:
+                yield csv_file, parse_chat_file(csv_file, self.analyzer)
+            return
+
+        logger.info(f"以 {workers} 個進程平行解析 {len(csv_files)} 個聊天記錄檔案")
+        remaining = iter(csv_files)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork'),
+                                 initializer=_init_parse_worker) as executor:
+            running = {executor.submit(parse_chat_file, str(csv_file)): csv_file
+                       for csv_file in itertools.islice(remaining, workers * FILES_IN_FLIGHT_PER_WORKER)}
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    csv_file = running.pop(future)
+                    for next_file in itertools.islice(remaining, 1):
+                        running[executor.submit(parse_chat_file, str(next_file))] = next_file
+                    yield csv_file, future.result()
+
+    @staticmethod
+    def _insert_rows(conn: sqlite3.Connection, rows: List[tuple]):
+        for values, grams in rows:
+            cursor = conn.execute(
+                """
+                INSERT INTO messages (file_name, row_number, customer_name, customer_id,
+                                      content, content_lower, date, date_str, sender_name)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                values
+            )
+            conn.executemany("INSERT OR IGNORE INTO grams (gram, message_id) VALUES (?, ?)",
+                             [(gram, cursor.lastrowid) for gram in grams])
+
+    # ---- 查詢 ----
+
+    def _candidate_ids(self, conn: sqlite3.Connection, keyword_lower: str) -> List[int]:
+        """包含關鍵詞所有 n-gram 的訊息ID（尚需以子字串確認）"""
+        grams = sorted(extract_ngrams(keyword_lower))
+        if not grams:
+            # 關鍵詞短於 n-gram 長度時直接比對小寫內容
+            return [row[0] for row in conn.execute(
+                "SELECT id FROM messages WHERE instr(content_lower, ?) > 0", (keyword_lower,))]
+
+        placeholders = ', '.join('?' * len(grams))
+        return [row[0] for row in conn.execute(
+            f"""
+            SELECT message_id FROM grams
+            WHERE gram IN ({placeholders})
+            GROUP BY message_id
+            HAVING COUNT(*) = ?
+            """,
+            (*grams, len(grams))
+        )]
+
+    def search(self, keywords: List[str]) -> List[Dict]:
+        """搜尋包含任一關鍵詞的訊息
+
+        Returns:
+            List[Dict]: 每筆包含訊息欄位（與 _read_chat_file 的紀錄相同）及 matches，
+                        matches 格式與 ChatAnalyzer._search_keywords_in_message 相同，
+                        依檔案名稱與列號排序
+        """
+        matcher = self.analyzer.get_keyword_matcher(keywords)
+
+        with self._connect() as conn:
+            candidates = {}  # message_id -> 候選關鍵詞集合
+            for keyword in keywords:
+                for message_id in self._candidate_ids(conn, keyword.lower()):
+                    candidates.setdefault(message_id, set()).add(keyword)
+
+            results = []
+            message_ids = list(candidates)
+            for start in range(0, len(message_ids), SQL_BATCH_SIZE):
+                batch = message_ids[start:start + SQL_BATCH_SIZE]
+                rows = conn.execute(
+                    f"""
+                    SELECT id, file_name, row_number, customer_name, customer_id,
+                           content, content_lower, date, date_str, sender_name
+                    FROM messages WHERE id IN ({', '.join('?' * len(batch))})
+                    """,
+                    batch
+                ).fetchall()
+
+                for (message_id, file_name, row_number, customer_name, customer_id,
+                     content, content_lower, date, date_str, sender_name) in rows:
+                    matches = [match for match in matcher.match(content, content_lower)
+                               if match['keyword'] in candidates[message_id]]
+                    if not matches:
+                        continue
+                    results.append({
+                        'customer_name': customer_name,
+                        'customer_id': customer_id,
+                        'content': content,
+                        'date': date,
+                        'date_str': date_str,
+                        'sender_name': sender_name,
+                        'file_source': file_name,
+                        'row_number': row_number,
+                        'matches': matches
+                    })
+
+        results.sort(key=lambda r: (r['file_source'], r['row_number'] or 0))
+        return results
+
+
+def get_chat_index() -> ChatIndex:
+    """獲取聊天記錄索引實例"""
+    return ChatIndex()
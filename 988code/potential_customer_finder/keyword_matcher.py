@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+產品潛在客戶搜尋系統 - 多關鍵詞比對器
+以 Aho-Corasick 自動機一次掃描訊息，找出所有關鍵詞及其第一次出現的位置。
+自動機依關鍵詞集合建立一次，整個搜尋過程重複使用。
+"""
+
+from collections import deque
+from typing import Dict, List
+
+
+class KeywordMatcher:
+    """多關鍵詞比對器（不分大小寫）
+
+    match() 的結果與逐一執行 keyword.lower() in message.lower() 及 find() 相同：
+    依關鍵詞原順序回傳，每個關鍵詞只回報第一次出現的位置。
+    match_type 與 confidence 會寫入每筆結果，模糊比對、同義詞等其他比對類型
+    可各自建立一個比對器後合併結果。
+    """
+
+    def __init__(self, keywords: List[str], match_type: str = 'exact', confidence: float = 1.0):
+        self.keywords = list(keywords)
+        self.match_type = match_type
+        self.confidence = confidence
+
+        # 相同小寫形式的關鍵詞共用一個模式
+        self.patterns = list(dict.fromkeys(keyword.lower() for keyword in self.keywords))
+        self._pattern_ids = {pattern: i for i, pattern in enumerate(self.patterns)}
+        self._build()
+
+    def _build(self):
+        """建立 goto / fail / output 表"""
+        self._goto = [{}]
+        self._output = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            if not pattern:
+                continue
+            state = 0
+            for char in pattern:
+                next_state = self._goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self._goto)
+                    self._goto[state][char] = next_state
+                    self._goto.append({})
+                    self._output.append([])
+                state = next_state
+            self._output[state].append(pattern_id)
+
+        # 以廣度優先計算失敗連結，並合併失敗狀態的輸出
+        self._fail = [0] * len(self._goto)
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+        # 空字串關鍵詞在任何訊息中都出現於位置 0
+        self._empty_pattern_id = self._pattern_ids.get('')
+
+    def find_positions(self, text_lower: str) -> Dict[int, int]:
+        """掃描已轉小寫的文字，回傳 {模式ID: 第一次出現的位置}"""
+        positions = {}
+        if self._empty_pattern_id is not None:
+            positions[self._empty_pattern_id] = 0
+
+        remaining = len(self.patterns) - len(positions)
+        goto, fail, output, patterns = self._goto, self._fail, self._output, self.patterns
+        state = 0
+        for index, char in enumerate(text_lower):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+
+            for pattern_id in output[state]:
+                # 同一模式的出現依結尾位置遞增，第一次遇到即為最早的起始位置
+                if pattern_id not in positions:
+                    positions[pattern_id] = index - len(patterns[pattern_id]) + 1
+                    remaining -= 1
+            if not remaining:
+                break
+
+        return positions
+
+    def match(self, message: str, message_lower: str = None) -> List[Dict]:
+        """在訊息中搜尋所有關鍵詞
+
+        Args:
+            message: 原始訊息
+            message_lower: 已轉小寫的訊息（有的話可省去轉換）
+
+        Returns:
+            List[Dict]: keyword、match_type、confidence、position
+        """
+        if message_lower is None:
+            message_lower = message.lower()
+
+        positions = self.find_positions(message_lower)
+        if not positions:
+            return []
+
+        matches = []
+        for keyword in self.keywords:
+            position = positions.get(self._pattern_ids[keyword.lower()])
+            if position is not None:
+                matches.append({
+                    'keyword': keyword,
+                    'match_type': self.match_type,
+                    'confidence': self.confidence,
+                    'position': position
+                })
+        return matches
@@ -6,11 +6,12 @@
 
 import json
 import csv
+import os
 import shutil
 from pathlib import Path
 from datetime import datetime
 from typing import List, Dict
-from potential_customer_finder.chat_analyzer import get_chat_analyzer
+from potential_customer_finder.chat_index import get_chat_index
 from potential_customer_finder.keyword_generator import get_keyword_generator
 from potential_customer_finder.database_manager import get_database_manager
 from potential_customer_finder.customer_integration_analyzer import get_customer_integration_analyzer
@@ -42,7 +43,7 @@ def setup_search_results_directory():
 ```
 customer_search_results/
 ├── by_date/           # 按日期分組的搜尋結果
-├── by_product/        # 按產品分組的搜尋結果
+├── by_product/        # 按產品分組的搜尋結果（連結到 by_date/）
 ├── reports/           # 綜合分析報告與搜尋索引
 │   └── search_index.json  # 搜尋索引檔案
 └── README.md          # 本說明檔案
@@ -51,7 +52,7 @@ customer_search_results/
 ## 使用說明
 
 1. **by_date/**: 每次搜尋都會在此建立時間戳記資料夾
-2. **by_product/**: 同一產品的搜尋結果會建立產品專用資料夾
+2. **by_product/**: 同一產品的搜尋結果會建立產品專用資料夾（檔案為指向 by_date/ 的連結）
 3. **reports/**: 跨產品或跨時間的分析報告，包含搜尋索引檔案
    - **search_index.json**: 所有搜尋的索引和快速查詢
 
@@ -92,6 +93,37 @@ def save_search_index(index_data):
     with open(index_file, 'w', encoding='utf-8') as f:
         json.dump(index_data, f, ensure_ascii=False, indent=2, default=str)
 
+def write_results_json(json_file: Path, header: Dict, results: List[Dict]):
+    """寫入搜尋結果 JSON：標頭欄位照常縮排，results 逐筆序列化寫入，不需先組出整份文件"""
+    with open(json_file, 'w', encoding='utf-8') as f:
+        f.write('{\n')
+        for key, value in header.items():
+            f.write(f'  {json.dumps(key)}: {json.dumps(value, ensure_ascii=False, default=str)},\n')
+        f.write('  "results": [')
+        for i, result in enumerate(results):
+            f.write(',\n    ' if i else '\n    ')
+            f.write(json.dumps(result, ensure_ascii=False, default=str))
+        f.write('\n  ]\n}\n' if results else ']\n}\n')
+
+def link_result_files(files: List[Path], product_folder: Path, result_filename: str):
+    """在按產品資料夾建立指向按日期資料夾檔案的相對連結
+
+    無法建立符號連結時（例如 Windows 未開啟權限），改寫入一個記錄原始檔案位置的索引檔。
+    """
+    try:
+        for file_path in files:
+            link_path = product_folder / file_path.name
+            if link_path.is_symlink() or link_path.exists():
+                link_path.unlink()
+            link_path.symlink_to(os.path.relpath(file_path, product_folder))
+    except OSError as e:
+        logger.warning(f"無法建立結果檔案連結，改寫入索引檔: {e}")
+        links_file = product_folder / f"{result_filename}_files.json"
+        with open(links_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'files': [str(file_path.relative_to(SEARCH_RESULTS_DIR)) for file_path in files]
+            }, f, ensure_ascii=False, indent=2)
+
 def organized_complete_search(product_name: str):
     """組織化的完整搜尋系統"""
     
@@ -150,49 +182,40 @@ def organized_complete_search(product_name: str):
     
         # 進行完整搜尋
         print("開始完整搜尋所有檔案...")
-        progress_tracker.update_step(4, "檔案搜尋中", "開始掃描所有聊天記錄檔案...")
-        analyzer = get_chat_analyzer()
-        
-        all_results = []
-        csv_files = list(analyzer.chat_dir.glob("*.csv"))
-        total_files = len(csv_files)
-        
-        print(f"將搜尋 {total_files} 個檔案...")
-        progress_tracker.add_message(f"發現 {total_files} 個聊天記錄檔案待處理")
-        
-        for i, csv_file in enumerate(csv_files, 1):
-            # 更頻繁的進度更新：每50個檔案更新一次前端進度
-            if i % 50 == 0 or i == total_files or (total_files - i < 10):
-                step_message = f"搜尋進度: {i}/{total_files} ({i*100/total_files:.1f}%)"
+        progress_tracker.update_step(4, "檔案搜尋中", "正在更新聊天記錄索引...")
+        chat_index = get_chat_index()
+
+        def report_index_progress(done, total):
+            # 每50個檔案更新一次前端進度
+            if done % 50 == 0 or done == total:
+                step_message = f"索引更新進度: {done}/{total} ({done*100/total:.1f}%)"
                 progress_tracker.update_step(4, "檔案搜尋中", step_message)
-                print(f"   進度: {i}/{total_files} ({i*100/total_files:.1f}%)")
+                print(f"   {step_message}")
+
+        index_stats = chat_index.update(progress=report_index_progress)
+        total_files = index_stats['total_files']
         
-            try:
-                chat_records = analyzer._read_chat_file(csv_file)
-                
-                for record in chat_records:
-                    matches = analyzer._search_keywords_in_message(keywords, record['content'])
-                    
-                    if matches:
-                        for match in matches:
-                            result = {
-                                'product_name': product_name,
-                                'customer_name': record['customer_name'],
-                                'customer_id': record.get('customer_id'),  # 加入 customer_id
-                                'message_content': record['content'],
-                                'message_date': record['date'],
-                                'date_str': record['date_str'],
-                                'sender_name': record['sender_name'],
-                                'matched_keyword': match['keyword'],
-                                'match_type': match['match_type'],
-                                'match_score': match['confidence'],
-                                'file_source': record['file_source']
-                            }
-                            all_results.append(result)
-            
-            except Exception as e:
-                print(f"⚠️ 錯誤處理檔案 {csv_file.name}: {e}")
-                continue
+        print(f"將搜尋 {total_files} 個檔案（本次重新索引 {index_stats['indexed_files']} 個）...")
+        progress_tracker.add_message(f"發現 {total_files} 個聊天記錄檔案，"
+                                     f"重新索引 {index_stats['indexed_files']} 個")
+        
+        all_results = []
+        for record in chat_index.search(keywords):
+            for match in record['matches']:
+                result = {
+                    'product_name': product_name,
+                    'customer_name': record['customer_name'],
+                    'customer_id': record.get('customer_id'),  # 加入 customer_id
+                    'message_content': record['content'],
+                    'message_date': record['date'],
+                    'date_str': record['date_str'],
+                    'sender_name': record['sender_name'],
+                    'matched_keyword': match['keyword'],
+                    'match_type': match['match_type'],
+                    'match_score': match['confidence'],
+                    'file_source': record['file_source']
+                }
+                all_results.append(result)
         
         print(f"\n搜尋完成！找到 {len(all_results)} 個匹配結果")
         progress_tracker.update_step(5, "資料分析", f"檔案搜尋完成，找到 {len(all_results)} 個匹配結果")
@@ -209,99 +232,101 @@ def organized_complete_search(product_name: str):
         # 準備檔案名稱（使用相同的清理邏輯）
         result_filename = f"{clean_product_name}_{timestamp}"
     
-        # 保存到兩個位置的檔案
+        # 保存到按日期資料夾，按產品資料夾只建立連結
         progress_tracker.update_step(6, "保存結果", "正在保存分析結果和更新索引...")
-        for folder in [date_folder, product_folder]:
-            # JSON 檔案
-            json_file = folder / f"{result_filename}_{len(all_results)}_matches.json"
-            print(f"正在保存JSON檔案: {json_file.absolute()}")
-            with open(json_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'product_name': product_name,
-                    'keywords_used': keywords,
-                    'total_results': len(all_results),
-                    'files_searched': total_files,
-                    'search_timestamp': timestamp,
-                    'search_date': date_str,
-                    'search_type': 'complete_all_files_organized',
-                    'classification_stats': classified_results['stats'],
-                    'results': all_results
-                }, f, ensure_ascii=False, indent=2, default=str)
-            
-            # CSV 檔案
-            csv_file = folder / f"{result_filename}_{len(all_results)}_matches.csv"
-            with open(csv_file, 'w', encoding='utf-8-sig', newline='') as f:
-                if all_results:
-                    fieldnames = [
-                        '產品名稱', '客戶名稱', '客戶ID', '訊息內容', '訊息日期',
-                        '匹配關鍵詞', '匹配類型', '匹配分數', '來源檔案',
-                        '有客戶ID', '購買狀態', '可以處理'
-                    ]
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    
-                    for result in all_results:
-                        writer.writerow({
-                            '產品名稱': result['product_name'],
-                            '客戶名稱': result['customer_name'],
-                            '客戶ID': result.get('customer_id', ''),
-                            '訊息內容': result['message_content'],
-                            '訊息日期': result['date_str'] or '',
-                            '匹配關鍵詞': result['matched_keyword'],
-                            '匹配類型': result['match_type'],
-                            '匹配分數': f"{result['match_score']:.2f}",
-                            '來源檔案': result['file_source'],
-                            '有客戶ID': '是' if result.get('has_customer_id', False) else '否',
-                            '購買狀態': result.get('purchase_status', 'unknown'),
-                            '可以處理': '是' if result.get('can_process', False) else '否'
-                        })
-            
-            # 關鍵詞檔案
-            keywords_file = folder / f"{result_filename}_keywords.json"
-            with open(keywords_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'product_name': product_name,
-                    'keywords': keywords,
-                    'count': len(keywords),
-                    'generated_at': timestamp
-                }, f, ensure_ascii=False, indent=2)
-        
-            # 客戶分類檔案
-            classification_file = folder / f"{result_filename}_classification.json"
-            with open(classification_file, 'w', encoding='utf-8') as f:
-                json.dump({
-                    'product_name': product_name,
-                    'classification_timestamp': timestamp,
-                    'stats': classified_results['stats'],
-                    'can_process_customers': [
-                        {
-                            'customer_name': r['customer_name'],
-                            'customer_id': r['customer_id'],
-                            'matched_keyword': r['matched_keyword'],
-                            'message_content': r['message_content'][:100] + '...' if len(r['message_content']) > 100 else r['message_content'],
-                            'file_source': r['file_source']
-                        }
-                        for r in classified_results['can_process']
-                    ],
-                    'already_purchased_customers': [
-                        {
-                            'customer_name': r['customer_name'],
-                            'customer_id': r['customer_id'],
-                            'matched_keyword': r['matched_keyword'],
-                            'file_source': r['file_source']
-                        }
-                        for r in classified_results['already_purchased']
-                    ],
-                    'cannot_process_customers': [
-                        {
-                            'customer_name': r['customer_name'],
-                            'matched_keyword': r['matched_keyword'],
-                            'reason': '無客戶ID',
-                            'file_source': r['file_source']
-                        }
-                        for r in classified_results['cannot_process']
-                    ]
-                }, f, ensure_ascii=False, indent=2)
+        folder = date_folder
+        
+        # JSON 檔案（結果逐筆寫入，每筆一行）
+        json_file = folder / f"{result_filename}_{len(all_results)}_matches.json"
+        print(f"正在保存JSON檔案: {json_file.absolute()}")
+        write_results_json(json_file, {
+            'product_name': product_name,
+            'keywords_used': keywords,
+            'total_results': len(all_results),
+            'files_searched': total_files,
+            'search_timestamp': timestamp,
+            'search_date': date_str,
+            'search_type': 'complete_all_files_organized',
+            'classification_stats': classified_results['stats']
+        }, all_results)
+        
+        # CSV 檔案
+        csv_file = folder / f"{result_filename}_{len(all_results)}_matches.csv"
+        with open(csv_file, 'w', encoding='utf-8-sig', newline='') as f:
+            if all_results:
+                fieldnames = [
+                    '產品名稱', '客戶名稱', '客戶ID', '訊息內容', '訊息日期',
+                    '匹配關鍵詞', '匹配類型', '匹配分數', '來源檔案',
+                    '有客戶ID', '購買狀態', '可以處理'
+                ]
+                writer = csv.DictWriter(f, fieldnames=fieldnames)
+                writer.writeheader()
+                
+                for result in all_results:
+                    writer.writerow({
+                        '產品名稱': result['product_name'],
+                        '客戶名稱': result['customer_name'],
+                        '客戶ID': result.get('customer_id', ''),
+                        '訊息內容': result['message_content'],
+                        '訊息日期': result['date_str'] or '',
+                        '匹配關鍵詞': result['matched_keyword'],
+                        '匹配類型': result['match_type'],
+                        '匹配分數': f"{result['match_score']:.2f}",
+                        '來源檔案': result['file_source'],
+                        '有客戶ID': '是' if result.get('has_customer_id', False) else '否',
+                        '購買狀態': result.get('purchase_status', 'unknown'),
+                        '可以處理': '是' if result.get('can_process', False) else '否'
+                    })
+        
+        # 關鍵詞檔案
+        keywords_file = folder / f"{result_filename}_keywords.json"
+        with open(keywords_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'product_name': product_name,
+                'keywords': keywords,
+                'count': len(keywords),
+                'generated_at': timestamp
+            }, f, ensure_ascii=False, indent=2)
+    
+        # 客戶分類檔案
+        classification_file = folder / f"{result_filename}_classification.json"
+        with open(classification_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'product_name': product_name,
+                'classification_timestamp': timestamp,
+                'stats': classified_results['stats'],
+                'can_process_customers': [
+                    {
+                        'customer_name': r['customer_name'],
+                        'customer_id': r['customer_id'],
+                        'matched_keyword': r['matched_keyword'],
+                        'message_content': r['message_content'][:100] + '...' if len(r['message_content']) > 100 else r['message_content'],
+                        'file_source': r['file_source']
+                    }
+                    for r in classified_results['can_process']
+                ],
+                'already_purchased_customers': [
+                    {
+                        'customer_name': r['customer_name'],
+                        'customer_id': r['customer_id'],
+                        'matched_keyword': r['matched_keyword'],
+                        'file_source': r['file_source']
+                    }
+                    for r in classified_results['already_purchased']
+                ],
+                'cannot_process_customers': [
+                    {
+                        'customer_name': r['customer_name'],
+                        'matched_keyword': r['matched_keyword'],
+                        'reason': '無客戶ID',
+                        'file_source': r['file_source']
+                    }
+                    for r in classified_results['cannot_process']
+                ]
+            }, f, ensure_ascii=False, indent=2)
+
+        link_result_files([json_file, csv_file, keywords_file, classification_file],
+                          product_folder, result_filename)
     
         # 生成統計報告（只在按日期資料夾）
         stats_file = date_folder / f"{result_filename}_statistics.txt"
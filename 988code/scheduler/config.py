@@ -56,6 +56,27 @@ class SchedulerConfig:
         'monthly_prediction': 'monthly.01:00',     # 月銷售預測（每月1號）
     }
     
+    # 夜間任務鏈：每天從此時間開始，依相依關係與資源預算平行執行（取代固定時間間隔）
+    NIGHTLY_CHAIN_START = '00:30'
+    
+    # 夜間任務鏈的資源預算
+    RESOURCE_BUDGET = {
+        'cpu': os.cpu_count() or 2,
+        'memory_mb': 8192,
+        'db_connections': 4
+    }
+    
+    # 夜間任務的前置任務與資源需求
+    NIGHTLY_JOBS = {
+        'monthly_sales_reset': {'depends_on': [], 'resources': {'cpu': 1, 'memory_mb': 256, 'db_connections': 1}},
+        'monthly_prediction': {'depends_on': ['monthly_sales_reset'], 'resources': {'cpu': 2, 'memory_mb': 2048, 'db_connections': 1}},
+        'sales_change_check': {'depends_on': ['monthly_sales_reset'], 'resources': {'cpu': 1, 'memory_mb': 512, 'db_connections': 1}},
+        'weekly_recommendation': {'depends_on': [], 'resources': {'cpu': 2, 'memory_mb': 3072, 'db_connections': 1}},
+        'trigger_health_check': {'depends_on': [], 'resources': {'cpu': 1, 'memory_mb': 256, 'db_connections': 1}},
+        'inactive_customer_check': {'depends_on': [], 'resources': {'cpu': 1, 'memory_mb': 512, 'db_connections': 1}},
+        'repurchase_reminder': {'depends_on': [], 'resources': {'cpu': 1, 'memory_mb': 512, 'db_connections': 1}},
+    }
+    
     # 排程類別
     SCHEDULE_CATEGORIES = {
         'restock': {
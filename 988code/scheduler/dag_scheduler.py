@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+相依任務排程器（DAG）
+將夜間任務鏈建模為有向無環圖：前置任務完成後立即啟動後續任務，
+互不相依的任務在 CPU / 記憶體 / 資料庫連線預算內平行執行。
+每個任務的執行時間會記錄下來，下次執行時優先啟動關鍵路徑上的任務。
+"""
+
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime
+
+# 沒有歷史執行時間時的預估秒數
+DEFAULT_ESTIMATED_SECONDS = 60
+
+# 任務狀態
+SUCCESS = 'success'
+FAILED = 'failed'
+SKIPPED = 'skipped'      # 執行條件不成立（例如非每月1號），後續任務照常執行
+CANCELLED = 'cancelled'  # 前置任務失敗，不執行
+
+
+class DagJob:
+    """DAG 中的單一任務
+
+    Args:
+        name: 任務名稱（唯一）
+        func: 執行函數，回傳 False 或拋出例外視為失敗
+        depends_on: 前置任務名稱列表
+        resources: 資源需求，例如 {'cpu': 2, 'memory_mb': 2048, 'db_connections': 1}
+        condition: 執行條件函數，回傳 False 時略過此任務
+    """
+
+    def __init__(self, name, func, depends_on=None, resources=None, condition=None):
+        self.name = name
+        self.func = func
+        self.depends_on = list(depends_on or [])
+        self.resources = dict(resources or {})
+        self.condition = condition
+
+
+class DagScheduler:
+    """在資源預算內平行執行 DAG 任務"""
+
+    def __init__(self, budget, timing_file=None, logger=None):
+        """
+        Args:
+            budget: 資源預算，例如 {'cpu': 4, 'memory_mb': 8192, 'db_connections': 8}
+            timing_file: 保存每個任務最近執行時間的 JSON 檔案，None 時不保存
+        """
+        self.budget = dict(budget)
+        self.timing_file = timing_file
+        self.logger = logger or logging.getLogger(__name__)
+
+    # ---- 圖結構 ----
+
+    @staticmethod
+    def topological_order(jobs):
+        """回傳拓撲排序後的任務名稱；有未知前置任務或循環相依時拋出 ValueError"""
+        names = {job.name for job in jobs}
+        for job in jobs:
+            unknown = set(job.depends_on) - names
+            if unknown:
+                raise ValueError(f"任務 {job.name} 的前置任務不存在: {sorted(unknown)}")
+
+        remaining = {job.name: set(job.depends_on) for job in jobs}
+        order = []
+        while remaining:
+            ready = sorted(name for name, deps in remaining.items() if not deps)
+            if not ready:
+                raise ValueError(f"任務相依關係有循環: {sorted(remaining)}")
+            for name in ready:
+                order.append(name)
+                del remaining[name]
+            for deps in remaining.values():
+                deps.difference_update(ready)
+        return order
+
+    def critical_path_lengths(self, jobs, estimates):
+        """每個任務到 DAG 結尾的最長預估時間（含自身），用於決定啟動優先順序"""
+        dependents = {job.name: [] for job in jobs}
+        for job in jobs:
+            for dep in job.depends_on:
+                dependents[dep].append(job.name)
+
+        lengths = {}
+        for name in reversed(self.topological_order(jobs)):
+            tail = max((lengths[child] for child in dependents[name]), default=0)
+            lengths[name] = estimates.get(name, DEFAULT_ESTIMATED_SECONDS) + tail
+        return lengths
+
+    # ---- 執行時間記錄 ----
+
+    def load_timings(self):
+        """讀取各任務最近一次的執行秒數"""
+        if not self.timing_file or not os.path.exists(self.timing_file):
+            return {}
+        try:
+            with open(self.timing_file, 'r', encoding='utf-8') as f:
+                return {name: record['duration'] for name, record in json.load(f).items()}
+        except Exception as e:
+            self.logger.warning(f"讀取任務執行時間失敗: {e}")
+            return {}
+
+    def save_timings(self, results):
+        """保存成功任務的執行時間（保留其他任務的舊紀錄）"""
+        if not self.timing_file:
+            return
+        try:
+            records = {}
+            if os.path.exists(self.timing_file):
+                with open(self.timing_file, 'r', encoding='utf-8') as f:
+                    records = json.load(f)
+            for name, result in results.items():
+                if result['status'] == SUCCESS:
+                    records[name] = {'duration': result['duration'], 'finished_at': result['finished_at']}
+
+            os.makedirs(os.path.dirname(self.timing_file) or '.', exist_ok=True)
+            with open(self.timing_file, 'w', encoding='utf-8') as f:
+                json.dump(records, f, ensure_ascii=False, indent=2)
+        except Exception as e:
+            self.logger.warning(f"保存任務執行時間失敗: {e}")
+
+    # ---- 執行 ----
+
+    def _fits(self, resources, in_use):
+        return all(in_use.get(key, 0) + amount <= self.budget.get(key, amount)
+                   for key, amount in resources.items())
+
+    def _clamp(self, resources):
+        """需求超過總預算的任務以總預算計算，確保仍可單獨執行"""
+        return {key: min(amount, self.budget.get(key, amount)) for key, amount in resources.items()}
+
+    def _execute(self, job):
+        started = time.time()
+        started_at = datetime.now().isoformat()
+        try:
+            if job.condition is not None and not job.condition():
+                status = SKIPPED
+            else:
+                status = FAILED if job.func() is False else SUCCESS
+            error = None
+        except Exception as e:
+            status, error = FAILED, str(e)
+            self.logger.error(f"任務 {job.name} 執行失敗: {e}")
+
+        return {
+            'status': status,
+            'started_at': started_at,
+            'finished_at': datetime.now().isoformat(),
+            'duration': round(time.time() - started, 1),
+            'error': error
+        }
+
+    def run(self, jobs):
+        """執行整個 DAG，回傳 {任務名稱: 執行結果}
+
+        前置任務成功或略過後才啟動後續任務；前置任務失敗時後續任務標記為 cancelled。
+        """
+        jobs_by_name = {job.name: job for job in jobs}
+        self.topological_order(jobs)
+
+        estimates = self.load_timings()
+        priority = self.critical_path_lengths(jobs, estimates)
+        critical_path_seconds = max(priority.values(), default=0)
+        self.logger.info(f"DAG 開始執行，共 {len(jobs)} 個任務，預估關鍵路徑 {critical_path_seconds:.0f} 秒")
+
+        results = {}
+        pending = set(jobs_by_name)
+        running = {}  # future -> job name
+        in_use = {}
+        run_started = time.time()
+
+        with ThreadPoolExecutor(max_workers=max(len(jobs), 1), thread_name_prefix='dag-job') as executor:
+            while pending or running:
+                # 前置任務失敗的任務直接取消
+                for name in sorted(pending):
+                    if any(results.get(dep, {}).get('status') in (FAILED, CANCELLED)
+                           for dep in jobs_by_name[name].depends_on):
+                        pending.discard(name)
+                        results[name] = {'status': CANCELLED, 'started_at': None, 'finished_at': None,
+                                         'duration': 0, 'error': '前置任務失敗'}
+                        self.logger.warning(f"任務 {name} 因前置任務失敗而取消")
+
+                # 依關鍵路徑長度由長到短啟動可執行且資源足夠的任務
+                ready = [name for name in pending
+                         if all(dep in results for dep in jobs_by_name[name].depends_on)]
+                for name in sorted(ready, key=lambda n: -priority[n]):
+                    resources = self._clamp(jobs_by_name[name].resources)
+                    if not self._fits(resources, in_use):
+                        continue
+                    for key, amount in resources.items():
+                        in_use[key] = in_use.get(key, 0) + amount
+                    pending.discard(name)
+                    running[executor.submit(self._execute, jobs_by_name[name])] = name
+                    self.logger.info(f"啟動任務 {name}（使用資源 {resources}）")
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    results[name] = future.result()
+                    for key, amount in self._clamp(jobs_by_name[name].resources).items():
+                        in_use[key] -= amount
+                    self.logger.info(f"任務 {name} {results[name]['status']}，耗時 {results[name]['duration']} 秒")
+
+        total = time.time() - run_started
+        self.logger.info(f"DAG 執行完成，總耗時 {total:.0f} 秒（預估關鍵路徑 {critical_path_seconds:.0f} 秒）")
+        self.save_timings(results)
+        return results
@@ -10,6 +10,8 @@ import psycopg2
 import pandas as pd
 from datetime import datetime, timedelta
 
+from prediction_writer import upsert_predictions
+
 class DatabaseIntegration:
     """數據庫整合類別"""
     
@@ -230,54 +232,13 @@ class DatabaseIntegration:
             return False
         
         try:
-            with conn.cursor() as cur:
-                imported_count = 0
-                error_count = 0
-                
-                for prediction in predictions:
-                    try:
-                        # 只處理會購買的預測記錄 - 只上傳will_purchase_anything=True的記錄
-                        if prediction.get('will_purchase_anything', False):
-                            # 處理空值
-                            product_id = prediction.get('product_id', '') or ''
-                            
-                            cur.execute("""
-                                INSERT INTO prophet_predictions (
-                                    customer_id, product_id, prediction_date, will_purchase_anything,
-                                    purchase_probability, estimated_quantity, confidence_level,
-                                    original_segment, prediction_batch_id, created_at
-                                ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW())
-                                ON CONFLICT (customer_id, product_id, prediction_date)
-                                DO UPDATE SET
-                                    will_purchase_anything = EXCLUDED.will_purchase_anything,
-                                    purchase_probability = EXCLUDED.purchase_probability,
-                                    estimated_quantity = EXCLUDED.estimated_quantity,
-                                    confidence_level = EXCLUDED.confidence_level,
-                                    prediction_batch_id = EXCLUDED.prediction_batch_id,
-                                    updated_at = NOW()
-                                WHERE prophet_predictions.prediction_status = 'active';
-                            """, (
-                                prediction['customer_id'],
-                                product_id,
-                                prediction['prediction_date'],
-                                prediction['will_purchase_anything'],
-                                prediction.get('purchase_probability', 0),
-                                prediction.get('estimated_quantity', 0),
-                                prediction.get('confidence_level', 'unknown'),
-                                prediction.get('original_segment', ''),
-                                batch_id
-                            ))
-                            
-                            imported_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        self.logger.warning(f"預測導入失敗: {str(e)[:100]}")
-                
-                conn.commit()
-                
-                self.logger.info(f"導入完成: 成功 {imported_count}, 失敗 {error_count}")
-                return error_count == 0
+            # 只處理會購買的預測記錄 - 只上傳will_purchase_anything=True的記錄
+            purchase_predictions = [p for p in predictions if p.get('will_purchase_anything', False)]
+            
+            summary = upsert_predictions(conn, purchase_predictions, batch_id, logger=self.logger)
+            
+            self.logger.info(f"導入完成: 成功 {summary['written']}, 失敗 {summary['failed']}")
+            return summary['failed'] == 0
                 
         except Exception as e:
             self.logger.error(f"數據庫導入異常: {e}")
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+手動任務佇列與常駐工作進程池
+API 收到手動執行請求後立即回傳任務ID，任務排入佇列，由常駐的 task_worker.py
+進程依序執行。工作進程啟動時預先載入套件與模型，避免每次執行都重新冷啟動；
+任務仍在獨立進程中執行，崩潰或超時時只重啟該工作進程。
+"""
+
+import json
+import logging
+import os
+import queue
+import subprocess
+import sys
+import threading
+
+SCHEDULER_DIR = os.path.dirname(os.path.abspath(__file__))
+WORKER_SCRIPT = os.path.join(SCHEDULER_DIR, 'task_worker.py')
+
+# 工作進程數量與單一任務超時秒數（可由環境變數調整）
+DEFAULT_WORKERS = int(os.getenv("SCHEDULE_WORKERS", "2"))
+DEFAULT_JOB_TIMEOUT = int(os.getenv("SCHEDULE_JOB_TIMEOUT", "3600"))
+
+
+class TaskWorkerPool:
+    """常駐工作進程池
+
+    每個工作執行緒擁有一個 task_worker.py 子進程，從共用佇列取出任務交給子進程執行，
+    並透過 on_running(job_id) / on_done(job_id, result) 回報狀態。
+    """
+
+    def __init__(self, workers=DEFAULT_WORKERS, job_timeout=DEFAULT_JOB_TIMEOUT,
+                 on_running=None, on_done=None):
+        self.workers = max(workers, 1)
+        self.job_timeout = job_timeout
+        self.on_running = on_running or (lambda job_id: None)
+        self.on_done = on_done or (lambda job_id, result: None)
+
+        self.logger = logging.getLogger(__name__)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._processes = {}
+        self._lock = threading.Lock()
+        self.jobs = {}  # job_id -> 'queued' / 'running'
+
+    def start(self):
+        """啟動工作執行緒與子進程（重複呼叫無作用）"""
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._worker_loop, args=(index,),
+                                          name=f'task-worker-{index}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        self.logger.info(f"任務工作進程池已啟動，共 {self.workers} 個工作進程")
+
+    def submit(self, job_id, task_id):
+        """排入任務，立即返回"""
+        self.start()
+        with self._lock:
+            self.jobs[job_id] = 'queued'
+        self._queue.put({"job_id": job_id, "task_id": task_id})
+
+    def get_job_state(self, job_id):
+        """任務在本進程池中的狀態；已完成或不在本進程池時回傳 None"""
+        with self._lock:
+            return self.jobs.get(job_id)
+
+    def queued_count(self):
+        """佇列中等待執行的任務數"""
+        return self._queue.qsize()
+
+    def shutdown(self):
+        """停止所有工作執行緒與子進程"""
+        for _ in self._threads:
+            self._queue.put(None)
+        for process in list(self._processes.values()):
+            if process.poll() is None:
+                process.kill()
+
+    def _spawn(self, index):
+        """啟動工作進程並等待預先載入完成"""
+        process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT],
+            cwd=SCHEDULER_DIR,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            text=True,
+            encoding='utf-8',
+            bufsize=1
+        )
+        self._processes[index] = process
+
+        message = self._read_message(process)
+        if not message or message.get("event") != "ready":
+            process.kill()
+            raise RuntimeError("工作進程啟動失敗")
+
+        self.logger.info(f"工作進程 {index} 已就緒 (pid={message.get('pid')})")
+        return process
+
+    @staticmethod
+    def _read_message(process):
+        """讀取一行回報；子進程結束時回傳 None"""
+        line = process.stdout.readline()
+        return json.loads(line) if line else None
+
+    def _worker_loop(self, index):
+        process = None
+        while True:
+            # 先啟動子進程再等待任務，讓第一個任務也能使用已預熱的進程
+            if process is None or process.poll() is not None:
+                try:
+                    process = self._spawn(index)
+                except Exception as e:
+                    self.logger.error(f"工作進程 {index} 啟動失敗: {e}")
+                    process = None
+
+            job = self._queue.get()
+            if job is None:
+                break
+
+            if process is None:
+                self._finish(job["job_id"], {"success": False, "message": "工作進程無法啟動", "duration": 0})
+                continue
+
+            process = self._run_job(process, job)
+
+        if process is not None and process.poll() is None:
+            process.kill()
+
+    def _run_job(self, process, job):
+        """將任務交給子進程並等待結果，回傳之後可繼續使用的子進程（異常時回傳 None）"""
+        job_id = job["job_id"]
+        timed_out = threading.Event()
+
+        def kill_on_timeout():
+            timed_out.set()
+            process.kill()
+
+        timer = threading.Timer(self.job_timeout, kill_on_timeout)
+        timer.start()
+        try:
+            process.stdin.write(json.dumps(job) + "\n")
+            process.stdin.flush()
+
+            while True:
+                message = self._read_message(process)
+                if message is None:
+                    break
+                if message.get("event") == "running":
+                    with self._lock:
+                        self.jobs[job_id] = 'running'
+                    self._safe_call(self.on_running, job_id)
+                elif message.get("event") == "done":
+                    self._finish(job_id, message.get("result") or {})
+                    return process
+        except (OSError, ValueError) as e:
+            self.logger.error(f"任務 {job_id} 與工作進程通訊失敗: {e}")
+        finally:
+            timer.cancel()
+
+        # 子進程異常結束（崩潰或超時），下一個任務會重新啟動子進程
+        error = "Task execution timeout" if timed_out.is_set() else "工作進程異常結束"
+        self._finish(job_id, {"success": False, "message": error, "error": error})
+        return None
+
+    def _finish(self, job_id, result):
+        with self._lock:
+            self.jobs.pop(job_id, None)
+        self._safe_call(self.on_done, job_id, result)
+
+    def _safe_call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            self.logger.error(f"任務狀態回報失敗: {e}")
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+90天特徵計算引擎
+以 groupby 一次算出客戶、產品、客戶×產品聚合，再廣播到各目標日期
+"""
+
+import logging
+
+import pandas as pd
+import numpy as np
+
+# 從未購買時的天數預設值
+NEVER_PURCHASED_DAYS = 999
+
+# 特徵欄位（與訓練時的欄位名稱與順序一致）
+FEATURE_COLUMNS = [
+    # 目標日期特徵
+    'prediction_day_of_week',
+    'prediction_day_of_month',
+    'prediction_month',
+    'prediction_quarter',
+
+    # 客戶90天特徵
+    'customer_purchase_days_90d',
+    'customer_total_amount_90d',
+    'customer_avg_amount_90d',
+    'customer_total_quantity_90d',
+    'customer_unique_products_90d',
+    'days_since_customer_last_purchase',
+
+    # 產品90天特徵
+    'product_sale_days_90d',
+    'product_total_quantity_90d',
+    'product_unique_customers_90d',
+    'product_avg_quantity_per_sale_90d',
+
+    # 客戶-產品90天特徵
+    'cp_purchase_count_90d',
+    'cp_total_quantity_90d',
+    'cp_avg_quantity_90d',
+    'cp_total_amount_90d',
+    'days_since_cp_last_purchase',
+]
+
+
+def compute_aggregates(feature_data, by=None):
+    """計算客戶、產品、客戶×產品三組聚合
+
+    by: 額外的分組欄位（例如 'sample_date'），用於一次計算多個時間窗口
+
+    Returns:
+        (customer_stats, product_stats, cp_stats) 三個以分組鍵為欄位的 DataFrame
+    """
+    prefix = [by] if by else []
+
+    customer_stats = feature_data.groupby(prefix + ['customer_id'], sort=False).agg(
+        customer_purchase_days_90d=('transaction_date', 'nunique'),
+        customer_total_amount_90d=('amount', 'sum'),
+        customer_avg_amount_90d=('amount', 'mean'),
+        customer_total_quantity_90d=('quantity', 'sum'),
+        customer_unique_products_90d=('product_id', 'nunique'),
+        customer_last_purchase=('transaction_date', 'max'),
+    ).reset_index()
+
+    product_stats = feature_data.groupby(prefix + ['product_id'], sort=False).agg(
+        product_sale_days_90d=('transaction_date', 'nunique'),
+        product_total_quantity_90d=('quantity', 'sum'),
+        product_unique_customers_90d=('customer_id', 'nunique'),
+        product_avg_quantity_per_sale_90d=('quantity', 'mean'),
+    ).reset_index()
+
+    cp_stats = feature_data.groupby(prefix + ['customer_id', 'product_id'], sort=False).agg(
+        cp_purchase_count_90d=('quantity', 'size'),
+        cp_total_quantity_90d=('quantity', 'sum'),
+        cp_avg_quantity_90d=('quantity', 'mean'),
+        cp_total_amount_90d=('amount', 'sum'),
+        cp_last_purchase=('transaction_date', 'max'),
+    ).reset_index()
+
+    return customer_stats, product_stats, cp_stats
+
+
+def add_date_features(df, date_column):
+    """依目標日期欄位加入時間特徵"""
+    dates = pd.to_datetime(df[date_column])
+    df['prediction_day_of_week'] = dates.dt.weekday
+    df['prediction_day_of_month'] = dates.dt.day
+    df['prediction_month'] = dates.dt.month
+    df['prediction_quarter'] = (dates.dt.month - 1) // 3 + 1
+    return df
+
+
+def days_since(reference_dates, last_purchase):
+    """向量化計算距離最後一次購買的天數（未購買為 999，並限制最大值）"""
+    reference = pd.to_datetime(reference_dates).dt.normalize()
+    last = pd.to_datetime(last_purchase).dt.normalize()
+    days = (reference - last).dt.days
+    return days.fillna(NEVER_PURCHASED_DAYS).clip(upper=NEVER_PURCHASED_DAYS).astype(int)
+
+
+def join_aggregates(frame, aggregates, date_column, by=None):
+    """將聚合結果合併到 (客戶, 產品, 日期) 列，並補齊無歷史的預設值"""
+    customer_stats, product_stats, cp_stats = aggregates
+    prefix = [by] if by else []
+
+    frame = frame.merge(customer_stats, on=prefix + ['customer_id'], how='left')
+    frame = frame.merge(product_stats, on=prefix + ['product_id'], how='left')
+    frame = frame.merge(cp_stats, on=prefix + ['customer_id', 'product_id'], how='left')
+
+    frame['days_since_customer_last_purchase'] = days_since(
+        frame[date_column], frame['customer_last_purchase']
+    )
+    frame['days_since_cp_last_purchase'] = days_since(
+        frame[date_column], frame['cp_last_purchase']
+    )
+    frame = frame.drop(columns=['customer_last_purchase', 'cp_last_purchase'])
+
+    # 無歷史資料的聚合（count/sum/mean/nunique）皆視為 0
+    stat_columns = [
+        col for col in FEATURE_COLUMNS
+        if col not in ('days_since_customer_last_purchase', 'days_since_cp_last_purchase')
+        and col in frame.columns
+    ]
+    frame[stat_columns] = frame[stat_columns].fillna(0)
+
+    return add_date_features(frame, date_column)
+
+
+class FeatureEngine:
+    """預測用90天特徵引擎 - 聚合只計算一次，供所有組合與目標日期共用"""
+
+    def __init__(self, feature_data):
+        self.feature_data = feature_data
+        self.aggregates = compute_aggregates(feature_data)
+
+    def build_features(self, combinations, target_dates):
+        """為所有 (客戶, 產品) × 目標日期 生成特徵表
+
+        Returns:
+            DataFrame，包含 customer_id、product_id、target_date、day_offset 與所有特徵欄位
+        """
+        pairs = pd.DataFrame(list(combinations), columns=['customer_id', 'product_id'])
+        dates = pd.DataFrame({
+            'target_date': pd.to_datetime(list(target_dates)),
+            'day_offset': np.arange(1, len(target_dates) + 1),
+        })
+
+        frame = pairs.merge(dates, how='cross')
+        return join_aggregates(frame, self.aggregates, 'target_date')
+
+    def cp_average_quantity(self):
+        """客戶-產品歷史平均購買數量（估算預測數量用）"""
+        _, _, cp_stats = self.aggregates
+        return cp_stats.set_index(['customer_id', 'product_id'])['cp_avg_quantity_90d']
+
+
+def predict_high_confidence(model, feature_names, feature_data, combinations, prediction_date, threshold,
+                            logger=None):
+    """批量計算特徵並預測，回傳機率達到閾值的 (客戶, 產品) 組合
+
+    批量預測失敗時記錄原因並改為逐筆預測，個別失敗的組合略過
+    """
+    logger = logger or logging.getLogger(__name__)
+    if not combinations:
+        return []
+
+    features = FeatureEngine(feature_data).build_features(combinations, [prediction_date])
+    try:
+        probabilities = model.predict_proba(features[feature_names])[:, 1]
+    except Exception as e:
+        logger.warning(f"批量預測失敗，改為逐筆預測: {e}")
+        probabilities = np.zeros(len(features))
+        for i in range(len(features)):
+            try:
+                probabilities[i] = model.predict_proba(features[feature_names].iloc[[i]])[0][1]
+            except Exception as row_error:
+                row = features.iloc[i]
+                logger.warning(f"預測失敗 {row['customer_id']}-{row['product_id']}: {row_error}")
+
+    selected = features.loc[probabilities >= threshold, ['customer_id', 'product_id']]
+    return list(selected.itertuples(index=False, name=None))
@@ -5,6 +5,7 @@ CatBoost預測服務
 """
 
 import os
+import sys
 import json
 import pickle
 import logging
@@ -13,7 +14,18 @@ import numpy as np
 import psycopg2
 from datetime import datetime, timedelta
 
-from config import MLConfig
+try:
+    from config import MLConfig
+    from feature_engine import FeatureEngine
+except ImportError:
+    from ml_system.config import MLConfig
+    from ml_system.feature_engine import FeatureEngine
+
+# 共用的預測寫入器位於 scheduler 目錄（在 ml_system 目錄中執行時需加入路徑）
+SCHEDULER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if SCHEDULER_DIR not in sys.path:
+    sys.path.append(SCHEDULER_DIR)
+from prediction_writer import upsert_predictions
 
 class CatBoostPredictor:
     """CatBoost預測服務"""
@@ -360,59 +372,6 @@ class CatBoostPredictor:
         
         return combinations
     
-    def calculate_90day_features(self, customer_id, product_id, feature_data, target_date):
-        """計算單個客戶-產品-目標日期的90天特徵"""
-        # 獲取相關數據
-        customer_data = feature_data[feature_data['customer_id'] == customer_id]
-        product_data = feature_data[feature_data['product_id'] == product_id]
-        cp_data = feature_data[
-            (feature_data['customer_id'] == customer_id) & 
-            (feature_data['product_id'] == product_id)
-        ]
-        
-        features = {
-            # 目標日期特徵（保持與現有模型兼容的名稱）
-            'prediction_day_of_week': target_date.weekday(),
-            'prediction_day_of_month': target_date.day,
-            'prediction_month': target_date.month,
-            'prediction_quarter': (target_date.month - 1) // 3 + 1,
-            
-            # 客戶90天特徵
-            'customer_purchase_days_90d': customer_data['transaction_date'].nunique(),
-            'customer_total_amount_90d': customer_data['amount'].sum(),
-            'customer_avg_amount_90d': customer_data['amount'].mean() if len(customer_data) > 0 else 0,
-            'customer_total_quantity_90d': customer_data['quantity'].sum(),
-            'customer_unique_products_90d': customer_data['product_id'].nunique(),
-            'days_since_customer_last_purchase': self._days_since_last_purchase(customer_data, target_date),
-            
-            # 產品90天特徵  
-            'product_sale_days_90d': product_data['transaction_date'].nunique(),
-            'product_total_quantity_90d': product_data['quantity'].sum(),
-            'product_unique_customers_90d': product_data['customer_id'].nunique(),
-            'product_avg_quantity_per_sale_90d': product_data['quantity'].mean() if len(product_data) > 0 else 0,
-            
-            # 客戶-產品90天特徵
-            'cp_purchase_count_90d': len(cp_data),
-            'cp_total_quantity_90d': cp_data['quantity'].sum(),
-            'cp_avg_quantity_90d': cp_data['quantity'].mean() if len(cp_data) > 0 else 0,
-            'cp_total_amount_90d': cp_data['amount'].sum(),
-            'days_since_cp_last_purchase': self._days_since_last_purchase(cp_data, target_date),
-        }
-        
-        return features
-    
-    def _days_since_last_purchase(self, data, reference_date):
-        """計算距離最後一次購買的天數"""
-        if len(data) == 0:
-            return 999  # 大數值表示從未購買
-        
-        last_purchase = data['transaction_date'].max()
-        if pd.isna(last_purchase):
-            return 999
-        
-        days_diff = (reference_date - last_purchase.date()).days
-        return min(days_diff, 999)  # 限制最大值
-    
     def _get_weekday_purchase_count(self, data, target_weekday):
         """計算該客戶-產品在特定星期幾的歷史購買次數"""
         if len(data) == 0:
@@ -423,81 +382,67 @@ class CatBoostPredictor:
         return len(weekday_purchases)
     
     def predict_combinations(self, combinations, feature_data, prediction_date):
-        """批量預測客戶-產品組合 - 為每天獨立預測並選擇最佳日期"""
+        """批量預測客戶-產品組合 - 為每天獨立預測並選擇最佳日期
+
+        特徵由 FeatureEngine 一次聚合後廣播到未來7天，所有 (組合, 日期) 以單次 predict_proba 評分
+        """
         self.logger.info(f"開始7天窗口預測 {len(combinations):,} 個組合...")
-        
-        # 為每個組合預測未來7天，然後選擇最佳日期
+
+        if not combinations:
+            return []
+
+        target_dates = [
+            prediction_date + timedelta(days=day_offset)
+            for day_offset in range(1, MLConfig.PREDICTION_HORIZON_DAYS + 1)
+        ]
+
+        # 1. 一次計算所有組合 × 目標日期的特徵
+        engine = FeatureEngine(feature_data)
+        features = engine.build_features(combinations, target_dates)
+        self.logger.info(f"特徵表生成完成: {len(features):,} 列 ({len(combinations):,} 組合 × {len(target_dates)} 天)")
+
+        # 2. 確保特徵順序後批量預測
+        features_matrix = features.reindex(columns=self.feature_names, fill_value=0)
+        try:
+            features['probability'] = self.model.predict_proba(features_matrix)[:, 1].astype(float)
+        except Exception as e:
+            self.logger.error(f"批量預測失敗: {e}")
+            return []
+
+        # 3. 每個組合選擇概率最高的日期（同分時取較早日期）
+        features = features.sort_values(['customer_id', 'product_id', 'day_offset'])
+        all_day_probabilities = features.groupby(['customer_id', 'product_id'], sort=False)['probability'].agg(list)
+        best_rows = features.loc[features.groupby(['customer_id', 'product_id'], sort=False)['probability'].idxmax()]
+
+        # 只有概率超過閾值才保留
+        best_rows = best_rows[best_rows['probability'] >= MLConfig.PREDICTION_THRESHOLD]
+
+        # 估算購買數量（基於歷史平均）
+        avg_quantity = engine.cp_average_quantity()
+
         best_predictions = []
-        
-        for i, (customer_id, product_id) in enumerate(combinations):
-            if i % 1000 == 0 and i > 0:
-                self.logger.info(f"組合預測進度: {i:,}/{len(combinations):,}")
-            
-            try:
-                # 為該組合預測未來7天
-                daily_predictions = []
-                
-                for day_offset in range(1, MLConfig.PREDICTION_HORIZON_DAYS + 1):
-                    target_date = prediction_date + timedelta(days=day_offset)
-                    
-                    # 計算該特定日期的特徵
-                    features = self.calculate_90day_features(
-                        customer_id, product_id, feature_data, target_date
-                    )
-                    
-                    # 轉換為DataFrame並確保特徵順序
-                    features_df = pd.DataFrame([features])
-                    features_df = features_df.reindex(columns=self.feature_names, fill_value=0)
-                    
-                    # 預測該日期的購買概率
-                    try:
-                        prob = self.model.predict_proba(features_df)[0, 1]
-                        daily_predictions.append({
-                            'date': target_date,
-                            'probability': float(prob),
-                            'day_offset': day_offset
-                        })
-                    except Exception as e:
-                        self.logger.warning(f"客戶{customer_id}-產品{product_id}日期{target_date}預測失敗: {e}")
-                        continue
-                
-                # 選擇概率最高的日期
-                if daily_predictions:
-                    best_day = max(daily_predictions, key=lambda x: x['probability'])
-                    
-                    # 只有概率超過閾值才保留
-                    if best_day['probability'] >= MLConfig.PREDICTION_THRESHOLD:
-                        # 估算購買數量（基於歷史平均）
-                        cp_data = feature_data[
-                            (feature_data['customer_id'] == customer_id) & 
-                            (feature_data['product_id'] == product_id)
-                        ]
-                        
-                        if len(cp_data) > 0:
-                            avg_quantity = cp_data['quantity'].mean()
-                            estimated_quantity = max(1, int(avg_quantity))
-                        else:
-                            estimated_quantity = 1
-                        
-                        best_predictions.append({
-                            'customer_id': customer_id,
-                            'product_id': product_id,
-                            'prediction_date': best_day['date'],
-                            'purchase_probability': best_day['probability'],
-                            'estimated_quantity': estimated_quantity,
-                            'confidence_level': 'high' if best_day['probability'] >= 0.8 else 'medium',
-                            'will_purchase_anything': True,
-                            'original_segment': 'ML預測客戶',
-                            'best_day_offset': best_day['day_offset'],
-                            'all_day_probabilities': [p['probability'] for p in daily_predictions]
-                        })
-                        
-            except Exception as e:
-                self.logger.warning(f"客戶{customer_id}-產品{product_id}組合預測失敗: {e}")
-        
+        for row in best_rows.itertuples(index=False):
+            combo = (row.customer_id, row.product_id)
+            quantity = avg_quantity.get(combo)
+            estimated_quantity = max(1, int(quantity)) if quantity is not None and not pd.isna(quantity) else 1
+
+            best_predictions.append({
+                'customer_id': row.customer_id,
+                'product_id': row.product_id,
+                'prediction_date': row.target_date.date(),
+                'purchase_probability': row.probability,
+                'estimated_quantity': estimated_quantity,
+                'confidence_level': 'high' if row.probability >= 0.8 else 'medium',
+                'will_purchase_anything': True,
+                'original_segment': 'ML預測客戶',
+                'best_day_offset': int(row.day_offset),
+                'all_day_probabilities': all_day_probabilities.loc[combo]
+            })
+
         self.logger.info(f"最佳日期預測完成: {len(best_predictions):,} 個高品質預測")
-        self.logger.info(f"平均最佳概率: {np.mean([p['purchase_probability'] for p in best_predictions]):.3f}")
-        
+        if best_predictions:
+            self.logger.info(f"平均最佳概率: {np.mean([p['purchase_probability'] for p in best_predictions]):.3f}")
+
         return best_predictions
     
     def save_predictions_to_database(self, predictions, batch_id):
@@ -511,54 +456,10 @@ class CatBoostPredictor:
             return False
         
         try:
-            with conn.cursor() as cur:
-                imported_count = 0
-                error_count = 0
-                
-                for prediction in predictions:
-                    try:
-                        # 為新預測結構添加額外信息到notes
-                        notes = f"最佳日期偏移: +{prediction.get('best_day_offset', 'N/A')}天"
-                        if 'all_day_probabilities' in prediction:
-                            notes += f", 7天概率: {prediction['all_day_probabilities']}"
-                        
-                        cur.execute("""
-                            INSERT INTO prophet_predictions (
-                                customer_id, product_id, prediction_date, will_purchase_anything,
-                                purchase_probability, estimated_quantity, confidence_level,
-                                original_segment, prediction_batch_id, created_at, prediction_status
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), 'active')
-                            ON CONFLICT (customer_id, product_id, prediction_date)
-                            DO UPDATE SET
-                                will_purchase_anything = EXCLUDED.will_purchase_anything,
-                                purchase_probability = EXCLUDED.purchase_probability,
-                                estimated_quantity = EXCLUDED.estimated_quantity,
-                                confidence_level = EXCLUDED.confidence_level,
-                                prediction_batch_id = EXCLUDED.prediction_batch_id,
-                                updated_at = NOW()
-                            WHERE prophet_predictions.prediction_status = 'active'
-                        """, (
-                            prediction['customer_id'],
-                            prediction['product_id'],
-                            prediction['prediction_date'],
-                            prediction['will_purchase_anything'],
-                            prediction['purchase_probability'],
-                            prediction['estimated_quantity'],
-                            prediction['confidence_level'],
-                            prediction['original_segment'],
-                            batch_id
-                        ))
-                        
-                        imported_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        self.logger.warning(f"預測導入失敗: {str(e)[:100]}")
-                
-                conn.commit()
-                
-                self.logger.info(f"資料庫導入完成: 成功 {imported_count}, 失敗 {error_count}")
-                return error_count == 0
+            summary = upsert_predictions(conn, predictions, batch_id, logger=self.logger)
+            
+            self.logger.info(f"資料庫導入完成: 成功 {summary['written']}, 失敗 {summary['failed']} ({summary['batches']} 批)")
+            return summary['failed'] == 0
                 
         except Exception as e:
             self.logger.error(f"資料庫導入異常: {e}")
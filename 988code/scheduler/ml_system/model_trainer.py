@@ -9,7 +9,6 @@ import json
 import pickle
 import logging
 import pandas as pd
-import numpy as np
 import psycopg2
 from datetime import datetime, timedelta
 from catboost import CatBoostClassifier
@@ -25,6 +24,11 @@ scheduler_dir = os.path.dirname(current_dir)
 if scheduler_dir not in sys.path:
     sys.path.insert(0, scheduler_dir)
 
+try:
+    from ml_system.sample_builder import build_training_samples, get_sample_dates, summarize_samples
+except ImportError:
+    from sample_builder import build_training_samples, get_sample_dates, summarize_samples
+
 try:
     from ml_system.config import MLConfig
 except ImportError:
@@ -172,157 +176,24 @@ class CatBoostTrainer:
         """生成訓練樣本 - 每個樣本用90天特徵 + 7天標籤"""
         self.logger.info("開始生成訓練樣本...")
         
-        # 計算有效日期範圍
-        min_date = transactions_df['transaction_date'].min()
-        max_date = transactions_df['transaction_date'].max()
-        
-        # 從第90天開始到倒數第7天，每10天生成一次樣本（減少計算量）
-        start_sample_date = min_date + timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-        end_sample_date = max_date - timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS)
-        
-        samples = []
-        sample_dates = pd.date_range(start_sample_date, end_sample_date, freq='15D')  # 每15天一個樣本點，保持更多近期數據
+        # 從第90天開始到倒數第7天，每15天一個樣本點
+        sample_dates = get_sample_dates(transactions_df)
         
-        self.logger.info(f"樣本生成日期範圍: {start_sample_date} ~ {end_sample_date}")
+        if len(sample_dates) > 0:
+            self.logger.info(f"樣本生成日期範圍: {sample_dates[0]} ~ {sample_dates[-1]}")
         self.logger.info(f"預計生成 {len(sample_dates)} 個時間點的樣本")
         
-        for i, sample_date in enumerate(sample_dates):
-            if i % 5 == 0:
-                self.logger.info(f"處理進度: {i+1}/{len(sample_dates)} ({(i+1)/len(sample_dates)*100:.1f}%)")
-            
-            # 獲取該日期的90天特徵數據
-            feature_start = sample_date - timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-            feature_data = transactions_df[
-                (transactions_df['transaction_date'] >= feature_start) &
-                (transactions_df['transaction_date'] < sample_date)
-            ]
-            
-            # 獲取該日期後7天的標籤數據
-            label_start = sample_date
-            label_end = sample_date + timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS)
-            label_data = transactions_df[
-                (transactions_df['transaction_date'] >= label_start) &
-                (transactions_df['transaction_date'] < label_end)
-            ]
-            
-            # 生成該時間點的樣本
-            date_samples = self._create_samples_for_date(
-                feature_data, label_data, sample_date
-            )
-            samples.extend(date_samples)
-        
-        self.logger.info(f"生成訓練樣本完成: {len(samples):,} 筆")
-        return samples
-    
-    def _create_samples_for_date(self, feature_data, label_data, sample_date):
-        """為特定日期創建樣本 - 智能採樣策略"""
-        samples = []
-        
-        # 1. 獲取有購買歷史的客戶-產品組合（智能採樣）
-        historical_pairs = set(zip(feature_data['customer_id'], feature_data['product_id']))
-        positive_pairs = set(zip(label_data['customer_id'], label_data['product_id']))
+        # 正樣本包含所有有購買的組合，負樣本為正樣本的4倍
+        samples = build_training_samples(
+            transactions_df, sample_dates, negative_ratio=4, require_history=False
+        )
         
-        self.logger.info(f"歷史組合數: {len(historical_pairs)}, 正樣本數: {len(positive_pairs)}")
+        for sample_date, row in summarize_samples(samples).iterrows():
+            self.logger.info(f"{sample_date.date()} 樣本數: {row['positive'] + row['negative']} (正:{row['positive']}, 負:{row['negative']})")
         
-        # 2. 創建正樣本（所有有購買的組合）
-        for customer_id, product_id in positive_pairs:
-            features = self._calculate_features(
-                customer_id, product_id, feature_data, sample_date
-            )
-            
-            sample = {
-                **features,
-                'label': 1,
-                'sample_date': sample_date,
-                'customer_id': customer_id,
-                'product_id': product_id
-            }
-            samples.append(sample)
-        
-        # 3. 創建負樣本 - 智能選擇
-        # 從有歷史但這次沒購買的組合中採樣
-        negative_candidates = historical_pairs - positive_pairs
-        
-        # 限制負樣本數量為正樣本的3-5倍（平衡樣本）
-        max_negative_samples = min(len(negative_candidates), len(positive_pairs) * 4)
-        
-        if max_negative_samples > 0:
-            # 隨機選擇負樣本 - 修復numpy選擇錯誤
-            negative_candidates_list = list(negative_candidates)
-            selected_indices = np.random.choice(
-                len(negative_candidates_list), 
-                size=max_negative_samples, 
-                replace=False
-            )
-            negative_pairs = [negative_candidates_list[i] for i in selected_indices]
-            
-            for customer_id, product_id in negative_pairs:
-                features = self._calculate_features(
-                    customer_id, product_id, feature_data, sample_date
-                )
-                
-                sample = {
-                    **features,
-                    'label': 0,
-                    'sample_date': sample_date,
-                    'customer_id': customer_id,
-                    'product_id': product_id
-                }
-                samples.append(sample)
-        
-        self.logger.info(f"該時間點樣本數: {len(samples)} (正:{len(positive_pairs)}, 負:{len(samples)-len(positive_pairs)})")
+        self.logger.info(f"生成訓練樣本完成: {len(samples):,} 筆")
         return samples
     
-    def _calculate_features(self, customer_id, product_id, feature_data, sample_date):
-        """計算90天特徵"""
-        # 獲取相關數據
-        customer_data = feature_data[feature_data['customer_id'] == customer_id]
-        product_data = feature_data[feature_data['product_id'] == product_id]
-        cp_data = feature_data[
-            (feature_data['customer_id'] == customer_id) & 
-            (feature_data['product_id'] == product_id)
-        ]
-        
-        features = {
-            # 時間特徵
-            'prediction_day_of_week': sample_date.weekday(),
-            'prediction_day_of_month': sample_date.day,
-            'prediction_month': sample_date.month,
-            'prediction_quarter': (sample_date.month - 1) // 3 + 1,
-            
-            # 客戶90天特徵
-            'customer_purchase_days_90d': customer_data['transaction_date'].nunique(),
-            'customer_total_amount_90d': customer_data['amount'].sum(),
-            'customer_avg_amount_90d': customer_data['amount'].mean() if len(customer_data) > 0 else 0,
-            'customer_total_quantity_90d': customer_data['quantity'].sum(),
-            'customer_unique_products_90d': customer_data['product_id'].nunique(),
-            'days_since_customer_last_purchase': self._days_since_last_purchase(customer_data, sample_date),
-            
-            # 產品90天特徵  
-            'product_sale_days_90d': product_data['transaction_date'].nunique(),
-            'product_total_quantity_90d': product_data['quantity'].sum(),
-            'product_unique_customers_90d': product_data['customer_id'].nunique(),
-            'product_avg_quantity_per_sale_90d': product_data['quantity'].mean() if len(product_data) > 0 else 0,
-            
-            # 客戶-產品90天特徵
-            'cp_purchase_count_90d': len(cp_data),
-            'cp_total_quantity_90d': cp_data['quantity'].sum(),
-            'cp_avg_quantity_90d': cp_data['quantity'].mean() if len(cp_data) > 0 else 0,
-            'cp_total_amount_90d': cp_data['amount'].sum(),
-            'days_since_cp_last_purchase': self._days_since_last_purchase(cp_data, sample_date),
-        }
-        
-        return features
-    
-    def _days_since_last_purchase(self, data, reference_date):
-        """計算距離最後一次購買的天數"""
-        if len(data) == 0:
-            return 999  # 大數值表示從未購買
-        
-        last_purchase = data['transaction_date'].max()
-        days_diff = (reference_date - last_purchase).days
-        return min(days_diff, 999)  # 限制最大值
-    
     def train_model(self):
         """訓練CatBoost模型"""
         self.logger.info("開始模型訓練流程...")
@@ -334,15 +205,12 @@ class CatBoostTrainer:
             return False
         
         # 2. 生成樣本
-        training_samples = self.generate_training_samples(transactions_df)
-        if not training_samples:
+        samples_df = self.generate_training_samples(transactions_df)
+        if samples_df is None or samples_df.empty:
             self.logger.error("生成訓練樣本失敗")
             return False
         
-        # 3. 轉換為DataFrame
-        samples_df = pd.DataFrame(training_samples)
-        
-        # 檢查正負樣本比例
+        # 3. 檢查正負樣本比例
         positive_samples = (samples_df['label'] == 1).sum()
         negative_samples = (samples_df['label'] == 0).sum()
         
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+訓練樣本生成器
+所有訓練器共用：一次切出每個樣本日期的90天窗口，以分組聚合計算特徵
+特徵計算與預測服務共用 feature_engine，確保訓練與預測特徵一致
+"""
+
+from datetime import timedelta
+
+import pandas as pd
+import numpy as np
+
+try:
+    from config import MLConfig
+    from feature_engine import FEATURE_COLUMNS, compute_aggregates, join_aggregates
+except ImportError:
+    from ml_system.config import MLConfig
+    from ml_system.feature_engine import FEATURE_COLUMNS, compute_aggregates, join_aggregates
+
+PAIR_KEYS = ['sample_date', 'customer_id', 'product_id']
+SAMPLE_COLUMNS = FEATURE_COLUMNS + ['label', 'sample_date', 'customer_id', 'product_id']
+
+
+def get_sample_dates(transactions_df, trim_horizon=True):
+    """計算樣本日期：從第90天開始，每 SAMPLE_FREQUENCY_DAYS 天一個時間點
+
+    trim_horizon: 是否保留最後7天作為標籤期間（使用獨立標籤數據時設為 False）
+    """
+    min_date = transactions_df['transaction_date'].min()
+    max_date = transactions_df['transaction_date'].max()
+
+    start_sample_date = min_date + timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
+    end_sample_date = max_date - timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS) if trim_horizon else max_date
+
+    return pd.date_range(start_sample_date, end_sample_date,
+                         freq=f'{MLConfig.SAMPLE_FREQUENCY_DAYS}D')
+
+
+def _slice_windows(transactions_df, sample_dates, days_before, days_after):
+    """切出每個樣本日期的 [sample_date - days_before, sample_date + days_after) 窗口並標記 sample_date"""
+    df = transactions_df.sort_values('transaction_date', kind='mergesort')
+    dates = df['transaction_date'].values
+
+    frames = []
+    for sample_date in sample_dates:
+        sample_date = pd.Timestamp(sample_date)
+        lo = np.searchsorted(dates, (sample_date - pd.Timedelta(days=days_before)).to_datetime64(), side='left')
+        hi = np.searchsorted(dates, (sample_date + pd.Timedelta(days=days_after)).to_datetime64(), side='left')
+        frames.append(df.iloc[lo:hi].assign(sample_date=sample_date))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def build_training_samples(transactions_df, sample_dates, label_data=None,
+                           negative_ratio=4, require_history=True):
+    """生成所有樣本日期的訓練樣本
+
+    Args:
+        transactions_df: 每日彙總交易（customer_id, product_id, transaction_date, quantity, amount）
+        sample_dates: 樣本日期序列
+        label_data: 固定標籤數據（例如VAL期間）；None 時使用每個樣本日期後7天
+        negative_ratio: 每個樣本日期的負樣本上限為正樣本數的倍數
+        require_history: 正樣本是否只保留90天內有購買歷史的組合
+
+    Returns:
+        DataFrame，欄位為 FEATURE_COLUMNS + label, sample_date, customer_id, product_id
+    """
+    sample_dates = [pd.Timestamp(d) for d in sample_dates]
+    if not sample_dates or len(transactions_df) == 0:
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
+
+    # 1. 一次切出所有樣本日期的90天特徵窗口並分組聚合
+    feature_windows = _slice_windows(transactions_df, sample_dates, MLConfig.FEATURE_CALCULATION_DAYS, 0)
+    aggregates = compute_aggregates(feature_windows, by='sample_date')
+    historical = aggregates[2][PAIR_KEYS]
+
+    # 2. 正樣本組合
+    if label_data is not None:
+        label_pairs = label_data[['customer_id', 'product_id']].drop_duplicates()
+        positives = pd.DataFrame({'sample_date': sample_dates}).merge(label_pairs, how='cross')
+    else:
+        label_windows = _slice_windows(transactions_df, sample_dates, 0, MLConfig.PREDICTION_HORIZON_DAYS)
+        positives = label_windows[PAIR_KEYS].drop_duplicates()
+
+    positive_counts = positives.groupby('sample_date').size()
+
+    # 3. 分出有歷史的正樣本與負樣本候選
+    marked = historical.merge(positives.assign(_positive=True), on=PAIR_KEYS, how='left')
+    if require_history:
+        positives = marked.loc[marked['_positive'].notna(), PAIR_KEYS]
+    negative_candidates = marked.loc[marked['_positive'].isna(), PAIR_KEYS]
+
+    # 4. 負樣本隨機抽樣，每個樣本日期上限為正樣本數 × negative_ratio
+    negative_candidates = negative_candidates.iloc[np.random.permutation(len(negative_candidates))]
+    limits = negative_candidates['sample_date'].map(positive_counts * negative_ratio).fillna(0)
+    negatives = negative_candidates[negative_candidates.groupby('sample_date').cumcount() < limits]
+
+    # 5. 合併樣本並計算特徵
+    samples = pd.concat([positives.assign(label=1), negatives.assign(label=0)], ignore_index=True)
+    samples = join_aggregates(samples, aggregates, 'sample_date', by='sample_date')
+
+    return samples[SAMPLE_COLUMNS]
+
+
+def summarize_samples(samples_df):
+    """每個樣本日期的正負樣本數"""
+    if samples_df.empty:
+        return pd.DataFrame(columns=['positive', 'negative'])
+    counts = samples_df.groupby(['sample_date', 'label']).size().unstack(fill_value=0)
+    return counts.rename(columns={1: 'positive', 0: 'negative'}).reindex(columns=['positive', 'negative'], fill_value=0)
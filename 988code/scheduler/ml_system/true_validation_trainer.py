@@ -9,7 +9,6 @@ import json
 import pickle
 import logging
 import pandas as pd
-import numpy as np
 import psycopg2
 from datetime import datetime, timedelta
 from catboost import CatBoostClassifier
@@ -24,6 +23,13 @@ scheduler_dir = os.path.dirname(current_dir)
 if scheduler_dir not in sys.path:
     sys.path.insert(0, scheduler_dir)
 
+try:
+    from ml_system.sample_builder import build_training_samples, get_sample_dates
+    from ml_system.feature_engine import predict_high_confidence
+except ImportError:
+    from sample_builder import build_training_samples, get_sample_dates
+    from feature_engine import predict_high_confidence
+
 try:
     from ml_system.config import MLConfig
 except ImportError:
@@ -189,157 +195,20 @@ class TrueValidationTrainer:
         """生成純歷史訓練樣本 - 不涉及VAL數據"""
         self.logger.info("開始生成純歷史訓練樣本...")
         
-        # 計算樣本生成範圍
-        min_date = train_data['transaction_date'].min()
-        max_date = train_data['transaction_date'].max()
-        
-        # 從第90天開始到結束，每15天生成一次樣本
-        start_sample_date = min_date + timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-        end_sample_date = max_date - timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS)
-        
-        sample_dates = pd.date_range(start_sample_date, end_sample_date, 
-                                   freq=f'{MLConfig.SAMPLE_FREQUENCY_DAYS}D')
+        # 從第90天開始到結束前7天，每15天生成一次樣本
+        sample_dates = get_sample_dates(train_data)
         
         self.logger.info(f"純歷史樣本生成配置:")
-        self.logger.info(f"  樣本日期範圍: {start_sample_date} ~ {end_sample_date}")
+        if len(sample_dates) > 0:
+            self.logger.info(f"  樣本日期範圍: {sample_dates[0]} ~ {sample_dates[-1]}")
         self.logger.info(f"  樣本時間點: {len(sample_dates)} 個")
         
-        samples = []
-        for i, sample_date in enumerate(sample_dates):
-            if i % 3 == 0:
-                self.logger.info(f"  歷史樣本進度: {i+1}/{len(sample_dates)} ({(i+1)/len(sample_dates)*100:.1f}%)")
-            
-            # 獲取該日期的90天特徵數據
-            feature_start = sample_date - timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-            feature_data = train_data[
-                (train_data['transaction_date'] >= feature_start) &
-                (train_data['transaction_date'] < sample_date)
-            ]
-            
-            # 獲取該日期後7天的標籤數據（純歷史）
-            label_start = sample_date
-            label_end = sample_date + timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS)
-            label_data = train_data[
-                (train_data['transaction_date'] >= label_start) &
-                (train_data['transaction_date'] < label_end)
-            ]
-            
-            # 生成該時間點的樣本
-            date_samples = self._create_samples_for_date(feature_data, label_data, sample_date)
-            samples.extend(date_samples)
+        # 正樣本只考慮有歷史的組合，負樣本為正樣本的4倍
+        samples = build_training_samples(train_data, sample_dates, negative_ratio=4, require_history=True)
         
         self.logger.info(f"純歷史樣本生成完成: {len(samples):,} 筆")
         return samples
     
-    def _create_samples_for_date(self, feature_data, label_data, sample_date):
-        """為特定日期創建樣本"""
-        samples = []
-        
-        # 獲取有購買歷史的客戶-產品組合
-        historical_pairs = set(zip(feature_data['customer_id'], feature_data['product_id']))
-        positive_pairs = set(zip(label_data['customer_id'], label_data['product_id']))
-        
-        # 創建正樣本
-        for customer_id, product_id in positive_pairs:
-            if (customer_id, product_id) in historical_pairs:
-                features = self._calculate_features(customer_id, product_id, feature_data, sample_date)
-                sample = {
-                    **features,
-                    'label': 1,
-                    'sample_date': sample_date,
-                    'customer_id': customer_id,
-                    'product_id': product_id
-                }
-                samples.append(sample)
-        
-        # 創建負樣本
-        negative_candidates = historical_pairs - positive_pairs
-        max_negative_samples = min(len(negative_candidates), len(positive_pairs) * 4)
-        
-        if max_negative_samples > 0:
-            negative_candidates_list = list(negative_candidates)
-            selected_indices = np.random.choice(
-                len(negative_candidates_list), 
-                size=max_negative_samples, 
-                replace=False
-            )
-            negative_pairs = [negative_candidates_list[i] for i in selected_indices]
-            
-            for customer_id, product_id in negative_pairs:
-                features = self._calculate_features(customer_id, product_id, feature_data, sample_date)
-                sample = {
-                    **features,
-                    'label': 0,
-                    'sample_date': sample_date,
-                    'customer_id': customer_id,
-                    'product_id': product_id
-                }
-                samples.append(sample)
-        
-        return samples
-    
-    def _calculate_features(self, customer_id, product_id, feature_data, sample_date):
-        """計算90天特徵"""
-        # 獲取相關數據
-        customer_data = feature_data[feature_data['customer_id'] == customer_id]
-        product_data = feature_data[feature_data['product_id'] == product_id]
-        cp_data = feature_data[
-            (feature_data['customer_id'] == customer_id) & 
-            (feature_data['product_id'] == product_id)
-        ]
-        
-        features = {
-            # 時間特徵
-            'prediction_day_of_week': sample_date.weekday(),
-            'prediction_day_of_month': sample_date.day,
-            'prediction_month': sample_date.month,
-            'prediction_quarter': (sample_date.month - 1) // 3 + 1,
-            
-            # 客戶90天特徵
-            'customer_purchase_days_90d': customer_data['transaction_date'].nunique(),
-            'customer_total_amount_90d': customer_data['amount'].sum(),
-            'customer_avg_amount_90d': customer_data['amount'].mean() if len(customer_data) > 0 else 0,
-            'customer_total_quantity_90d': customer_data['quantity'].sum(),
-            'customer_unique_products_90d': customer_data['product_id'].nunique(),
-            'days_since_customer_last_purchase': self._days_since_last_purchase(customer_data, sample_date),
-            
-            # 產品90天特徵  
-            'product_sale_days_90d': product_data['transaction_date'].nunique(),
-            'product_total_quantity_90d': product_data['quantity'].sum(),
-            'product_unique_customers_90d': product_data['customer_id'].nunique(),
-            'product_avg_quantity_per_sale_90d': product_data['quantity'].mean() if len(product_data) > 0 else 0,
-            
-            # 客戶-產品90天特徵
-            'cp_purchase_count_90d': len(cp_data),
-            'cp_total_quantity_90d': cp_data['quantity'].sum(),
-            'cp_avg_quantity_90d': cp_data['quantity'].mean() if len(cp_data) > 0 else 0,
-            'cp_total_amount_90d': cp_data['amount'].sum(),
-            'days_since_cp_last_purchase': self._days_since_last_purchase(cp_data, sample_date),
-        }
-        
-        return features
-    
-    def _days_since_last_purchase(self, data, reference_date):
-        """計算距離最後一次購買的天數"""
-        if len(data) == 0:
-            return 999
-        
-        last_purchase = data['transaction_date'].max()
-        
-        # Convert to datetime objects for comparison
-        if hasattr(reference_date, 'date'):
-            ref_date = reference_date.date()
-        else:
-            ref_date = reference_date
-            
-        if hasattr(last_purchase, 'date'):
-            last_date = last_purchase.date()
-        else:
-            last_date = pd.to_datetime(last_purchase).date()
-        
-        days_diff = (ref_date - last_date).days
-        return min(days_diff, 999)
-    
     def train_on_historical_data(self, train_data):
         """第一階段：基於純歷史數據訓練模型"""
         self.logger.info("=== 第一階段：純歷史數據訓練 ===")
@@ -347,7 +216,7 @@ class TrueValidationTrainer:
         # 生成純歷史訓練樣本
         training_samples = self.generate_historical_training_samples(train_data)
         
-        if not training_samples:
+        if training_samples is None or training_samples.empty:
             self.logger.error("純歷史樣本生成失敗")
             return False
         
@@ -421,23 +290,11 @@ class TrueValidationTrainer:
         
         self.logger.info(f"需要預測的組合: {len(val_combinations):,} 對")
         
-        # 3. 為每個組合進行預測
-        predictions = []
-        for i, (customer_id, product_id) in enumerate(val_combinations):
-            if i % 1000 == 0 and i > 0:
-                self.logger.info(f"VAL預測進度: {i:,}/{len(val_combinations):,}")
-            
-            # 計算特徵
-            features = self._calculate_features(customer_id, product_id, feature_data, prediction_date)
-            feature_vector = [features[col] for col in self.feature_names]
-            
-            # 預測
-            try:
-                prob = self.model.predict_proba([feature_vector])[0][1]
-                if prob >= MLConfig.PREDICTION_THRESHOLD:
-                    predictions.append((customer_id, product_id))
-            except Exception as e:
-                self.logger.warning(f"預測失敗 {customer_id}-{product_id}: {e}")
+        # 3. 以共用特徵引擎批量預測所有組合
+        predictions = predict_high_confidence(
+            self.model, self.feature_names, feature_data, val_combinations, prediction_date,
+            MLConfig.PREDICTION_THRESHOLD, self.logger
+        )
         
         self.logger.info(f"高信心預測: {len(predictions):,} 個組合")
         
@@ -505,7 +362,7 @@ class TrueValidationTrainer:
         # 使用完整數據生成訓練樣本
         full_samples = self.generate_historical_training_samples(full_data)
         
-        if not full_samples:
+        if full_samples is None or full_samples.empty:
             self.logger.error("完整樣本生成失敗")
             return False
         
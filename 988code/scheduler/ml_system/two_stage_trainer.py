@@ -9,7 +9,6 @@ import json
 import pickle
 import logging
 import pandas as pd
-import numpy as np
 import psycopg2
 from datetime import datetime, timedelta
 from catboost import CatBoostClassifier
@@ -24,6 +23,13 @@ scheduler_dir = os.path.dirname(current_dir)
 if scheduler_dir not in sys.path:
     sys.path.insert(0, scheduler_dir)
 
+try:
+    from ml_system.sample_builder import build_training_samples, get_sample_dates
+    from ml_system.feature_engine import predict_high_confidence
+except ImportError:
+    from sample_builder import build_training_samples, get_sample_dates
+    from feature_engine import predict_high_confidence
+
 try:
     from config import MLConfig  # 直接導入（ml_system目錄內）
 except ImportError:
@@ -212,164 +218,23 @@ class TwoStageCatBoostTrainer:
         """為指定期間生成訓練樣本"""
         self.logger.info(f"開始生成{period_name}樣本...")
         
-        # 計算樣本生成範圍
-        min_date = transactions_df['transaction_date'].min()
-        max_date = transactions_df['transaction_date'].max()
-        
         # 從第90天開始到最後一天，每15天生成一次樣本
-        start_sample_date = min_date + timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-        end_sample_date = max_date
-        
-        sample_dates = pd.date_range(start_sample_date, end_sample_date, 
-                                   freq=f'{MLConfig.SAMPLE_FREQUENCY_DAYS}D')
+        sample_dates = get_sample_dates(transactions_df, trim_horizon=False)
         
         self.logger.info(f"{period_name}樣本生成配置:")
-        self.logger.info(f"  樣本日期範圍: {start_sample_date} ~ {end_sample_date}")
+        if len(sample_dates) > 0:
+            self.logger.info(f"  樣本日期範圍: {sample_dates[0]} ~ {sample_dates[-1]}")
         self.logger.info(f"  樣本時間點: {len(sample_dates)} 個 (每{MLConfig.SAMPLE_FREQUENCY_DAYS}天)")
         
-        samples = []
-        for i, sample_date in enumerate(sample_dates):
-            if i % 3 == 0:
-                self.logger.info(f"  {period_name}樣本進度: {i+1}/{len(sample_dates)} ({(i+1)/len(sample_dates)*100:.1f}%)")
-            
-            # 獲取該日期的90天特徵數據
-            feature_start = sample_date - timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-            feature_data = transactions_df[
-                (transactions_df['transaction_date'] >= feature_start) &
-                (transactions_df['transaction_date'] < sample_date)
-            ]
-            
-            # 獲取標籤數據（根據是否為驗證階段使用不同邏輯）
-            if val_data is not None:
-                # 第一段：使用獨立的VAL數據作為標籤
-                label_data = val_data
-            else:
-                # 第二段：使用該日期後7天的數據作為標籤
-                label_start = sample_date
-                label_end = sample_date + timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS)
-                label_data = transactions_df[
-                    (transactions_df['transaction_date'] >= label_start) &
-                    (transactions_df['transaction_date'] < label_end)
-                ]
-            
-            # 生成該時間點的樣本
-            date_samples = self._create_samples_for_date(
-                feature_data, label_data, sample_date
-            )
-            samples.extend(date_samples)
+        # 第一段：使用獨立的VAL數據作為標籤；第二段：使用該日期後7天的數據作為標籤
+        samples = build_training_samples(
+            transactions_df, sample_dates, label_data=val_data,
+            negative_ratio=2, require_history=True
+        )
         
         self.logger.info(f"{period_name}樣本生成完成: {len(samples):,} 筆")
         return samples
     
-    def _create_samples_for_date(self, feature_data, label_data, sample_date):
-        """為特定日期創建樣本"""
-        samples = []
-        
-        # 獲取有購買歷史的客戶-產品組合
-        historical_pairs = set(zip(feature_data['customer_id'], feature_data['product_id']))
-        positive_pairs = set(zip(label_data['customer_id'], label_data['product_id']))
-        
-        # 創建正樣本
-        for customer_id, product_id in positive_pairs:
-            if (customer_id, product_id) in historical_pairs:  # 只考慮有歷史的組合
-                features = self._calculate_features(customer_id, product_id, feature_data, sample_date)
-                sample = {
-                    **features,
-                    'label': 1,
-                    'sample_date': sample_date,
-                    'customer_id': customer_id,
-                    'product_id': product_id
-                }
-                samples.append(sample)
-        
-        # 創建負樣本
-        negative_candidates = historical_pairs - positive_pairs
-        max_negative_samples = min(len(negative_candidates), len(positive_pairs) * 2)
-        
-        if max_negative_samples > 0:
-            negative_candidates_list = list(negative_candidates)
-            selected_indices = np.random.choice(
-                len(negative_candidates_list), 
-                size=max_negative_samples, 
-                replace=False
-            )
-            negative_pairs = [negative_candidates_list[i] for i in selected_indices]
-            
-            for customer_id, product_id in negative_pairs:
-                features = self._calculate_features(customer_id, product_id, feature_data, sample_date)
-                sample = {
-                    **features,
-                    'label': 0,
-                    'sample_date': sample_date,
-                    'customer_id': customer_id,
-                    'product_id': product_id
-                }
-                samples.append(sample)
-        
-        return samples
-    
-    def _calculate_features(self, customer_id, product_id, feature_data, sample_date):
-        """計算90天特徵"""
-        # 獲取相關數據
-        customer_data = feature_data[feature_data['customer_id'] == customer_id]
-        product_data = feature_data[feature_data['product_id'] == product_id]
-        cp_data = feature_data[
-            (feature_data['customer_id'] == customer_id) & 
-            (feature_data['product_id'] == product_id)
-        ]
-        
-        features = {
-            # 時間特徵
-            'prediction_day_of_week': sample_date.weekday(),
-            'prediction_day_of_month': sample_date.day,
-            'prediction_month': sample_date.month,
-            'prediction_quarter': (sample_date.month - 1) // 3 + 1,
-            
-            # 客戶90天特徵
-            'customer_purchase_days_90d': customer_data['transaction_date'].nunique(),
-            'customer_total_amount_90d': customer_data['amount'].sum(),
-            'customer_avg_amount_90d': customer_data['amount'].mean() if len(customer_data) > 0 else 0,
-            'customer_total_quantity_90d': customer_data['quantity'].sum(),
-            'customer_unique_products_90d': customer_data['product_id'].nunique(),
-            'days_since_customer_last_purchase': self._days_since_last_purchase(customer_data, sample_date),
-            
-            # 產品90天特徵  
-            'product_sale_days_90d': product_data['transaction_date'].nunique(),
-            'product_total_quantity_90d': product_data['quantity'].sum(),
-            'product_unique_customers_90d': product_data['customer_id'].nunique(),
-            'product_avg_quantity_per_sale_90d': product_data['quantity'].mean() if len(product_data) > 0 else 0,
-            
-            # 客戶-產品90天特徵
-            'cp_purchase_count_90d': len(cp_data),
-            'cp_total_quantity_90d': cp_data['quantity'].sum(),
-            'cp_avg_quantity_90d': cp_data['quantity'].mean() if len(cp_data) > 0 else 0,
-            'cp_total_amount_90d': cp_data['amount'].sum(),
-            'days_since_cp_last_purchase': self._days_since_last_purchase(cp_data, sample_date),
-        }
-        
-        return features
-    
-    def _days_since_last_purchase(self, data, reference_date):
-        """計算距離最後一次購買的天數"""
-        if len(data) == 0:
-            return 999
-        
-        last_purchase = data['transaction_date'].max()
-        
-        # 處理不同的日期格式
-        if hasattr(reference_date, 'date'):
-            ref_date = reference_date.date()
-        else:
-            ref_date = reference_date
-            
-        if hasattr(last_purchase, 'date'):
-            last_date = last_purchase.date()
-        else:
-            last_date = pd.to_datetime(last_purchase).date()
-        
-        days_diff = (ref_date - last_date).days
-        return min(days_diff, 999)
-    
     def train_stage1_with_validation(self):
         """第一段：使用真實VAL期間進行驗證訓練"""
         self.logger.info("=== 開始第一段驗證訓練 ===")
@@ -397,7 +262,7 @@ class TwoStageCatBoostTrainer:
         # 生成訓練樣本（使用VAL數據作為標籤）
         training_samples = self.generate_samples_for_period(train1_data, val_data, "第一段")
         
-        if not training_samples:
+        if training_samples is None or training_samples.empty:
             self.logger.error("第一段樣本生成失敗")
             return False
         
@@ -488,7 +353,7 @@ class TwoStageCatBoostTrainer:
         # 生成訓練樣本（不使用獨立VAL數據）
         training_samples = self.generate_samples_for_period(train2_data, None, "第二段")
         
-        if not training_samples:
+        if training_samples is None or training_samples.empty:
             self.logger.error("第二段樣本生成失敗")
             return False
         
@@ -605,7 +470,7 @@ class TwoStageCatBoostTrainer:
         # 生成歷史訓練樣本
         training_samples = self.generate_historical_samples(train_data)
         
-        if not training_samples:
+        if training_samples is None or training_samples.empty:
             self.logger.error("歷史樣本生成失敗")
             return False
         
@@ -655,44 +520,15 @@ class TwoStageCatBoostTrainer:
         """生成純歷史訓練樣本（避免未來信息洩漏）"""
         self.logger.info("開始生成歷史訓練樣本...")
         
-        # 計算樣本生成範圍
-        min_date = train_data['transaction_date'].min()
-        max_date = train_data['transaction_date'].max()
-        
         # 從第90天開始到最後一天前7天，每15天生成一次樣本
-        start_sample_date = min_date + timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-        end_sample_date = max_date - timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS)
-        
-        sample_dates = pd.date_range(start_sample_date, end_sample_date, 
-                                   freq=f'{MLConfig.SAMPLE_FREQUENCY_DAYS}D')
+        sample_dates = get_sample_dates(train_data)
         
         self.logger.info(f"歷史樣本生成配置:")
-        self.logger.info(f"  樣本日期範圍: {start_sample_date} ~ {end_sample_date}")
+        if len(sample_dates) > 0:
+            self.logger.info(f"  樣本日期範圍: {sample_dates[0]} ~ {sample_dates[-1]}")
         self.logger.info(f"  樣本時間點: {len(sample_dates)} 個")
         
-        samples = []
-        for i, sample_date in enumerate(sample_dates):
-            if i % 3 == 0:
-                self.logger.info(f"  歷史樣本進度: {i+1}/{len(sample_dates)} ({(i+1)/len(sample_dates)*100:.1f}%)")
-            
-            # 獲取該日期的90天特徵數據
-            feature_start = sample_date - timedelta(days=MLConfig.FEATURE_CALCULATION_DAYS)
-            feature_data = train_data[
-                (train_data['transaction_date'] >= feature_start) &
-                (train_data['transaction_date'] < sample_date)
-            ]
-            
-            # 獲取該日期後7天的標籤數據（純歷史，不涉及預測期間）
-            label_start = sample_date
-            label_end = sample_date + timedelta(days=MLConfig.PREDICTION_HORIZON_DAYS)
-            label_data = train_data[
-                (train_data['transaction_date'] >= label_start) &
-                (train_data['transaction_date'] < label_end)
-            ]
-            
-            # 生成該時間點的樣本
-            date_samples = self._create_samples_for_date(feature_data, label_data, sample_date)
-            samples.extend(date_samples)
+        samples = build_training_samples(train_data, sample_dates, negative_ratio=2, require_history=True)
         
         self.logger.info(f"歷史樣本生成完成: {len(samples):,} 筆")
         return samples
@@ -731,23 +567,11 @@ class TwoStageCatBoostTrainer:
         
         self.logger.info(f"需要預測的組合: {len(prediction_combinations):,} 對")
         
-        # 對每個組合進行預測
-        predictions = []
-        for i, (customer_id, product_id) in enumerate(prediction_combinations):
-            if i % 1000 == 0 and i > 0:
-                self.logger.info(f"預測進度: {i:,}/{len(prediction_combinations):,}")
-            
-            # 計算特徵
-            features = self._calculate_features(customer_id, product_id, feature_data, prediction_start)
-            feature_vector = [features[col] for col in self.feature_names]
-            
-            # 預測
-            try:
-                prob = self.model.predict_proba([feature_vector])[0][1]
-                if prob >= MLConfig.PREDICTION_THRESHOLD:
-                    predictions.append((customer_id, product_id))
-            except Exception as e:
-                self.logger.warning(f"預測失敗 {customer_id}-{product_id}: {e}")
+        # 以共用特徵引擎批量預測所有組合
+        predictions = predict_high_confidence(
+            self.model, self.feature_names, feature_data, prediction_combinations, prediction_start,
+            MLConfig.PREDICTION_THRESHOLD, self.logger
+        )
         
         self.logger.info(f"高信心預測: {len(predictions):,} 個組合")
         
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+預測結果批量寫入模組
+所有預測產生者（CatBoost 預測服務、CatBoost 每日系統、數據庫整合）共用，
+以 execute_values 分批 upsert 到 prophet_predictions，每批一條語句
+"""
+
+import logging
+
+from psycopg2.extras import execute_values
+
+# 預設每批寫入筆數
+DEFAULT_PAGE_SIZE = 1000
+
+# 寫入 prophet_predictions 的欄位（created_at 與 prediction_status 由模板填入）
+PREDICTION_COLUMNS = [
+    'customer_id', 'product_id', 'prediction_date', 'will_purchase_anything',
+    'purchase_probability', 'estimated_quantity', 'confidence_level',
+    'original_segment', 'prediction_batch_id'
+]
+
+UPSERT_QUERY = f"""
+    INSERT INTO prophet_predictions (
+        {', '.join(PREDICTION_COLUMNS)}, created_at, prediction_status
+    ) VALUES %s
+    ON CONFLICT (customer_id, product_id, prediction_date)
+    DO UPDATE SET
+        will_purchase_anything = EXCLUDED.will_purchase_anything,
+        purchase_probability = EXCLUDED.purchase_probability,
+        estimated_quantity = EXCLUDED.estimated_quantity,
+        confidence_level = EXCLUDED.confidence_level,
+        prediction_batch_id = EXCLUDED.prediction_batch_id,
+        updated_at = NOW()
+    WHERE prophet_predictions.prediction_status = 'active'
+"""
+
+UPSERT_TEMPLATE = "(%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), 'active')"
+
+
+def _to_python(value):
+    """將 numpy 純量轉為 Python 原生型別，供 psycopg2 轉換"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+def prediction_row(prediction, batch_id):
+    """將單筆預測字典轉為寫入欄位順序的 tuple"""
+    return tuple(_to_python(value) for value in (
+        prediction['customer_id'],
+        prediction.get('product_id', '') or '',
+        prediction['prediction_date'],
+        prediction.get('will_purchase_anything', True),
+        prediction.get('purchase_probability', 0),
+        prediction.get('estimated_quantity', 0),
+        prediction.get('confidence_level', 'unknown'),
+        prediction.get('original_segment', ''),
+        batch_id
+    ))
+
+
+def upsert_predictions(conn, predictions, batch_id, page_size=DEFAULT_PAGE_SIZE, logger=None):
+    """分批 upsert 預測結果到 prophet_predictions 並提交
+
+    每批在獨立的 savepoint 中執行，失敗的批次回滾並記錄，不影響其他批次。
+    同一 (customer_id, product_id, prediction_date) 出現多次時保留最後一筆，
+    與逐筆 upsert 後寫覆蓋前寫的結果一致。
+
+    Args:
+        conn: psycopg2 連線
+        predictions: 預測字典列表
+        batch_id: 預測批次ID
+        page_size: 每批寫入筆數
+        logger: 日誌記錄器，None 時使用本模組的 logger
+
+    Returns:
+        dict: total（輸入筆數）、written（成功寫入筆數）、failed（失敗筆數）、
+              batches（批次數）、errors（失敗批次的 batch/start/size/error）
+    """
+    logger = logger or logging.getLogger(__name__)
+
+    rows = {}
+    for prediction in predictions:
+        row = prediction_row(prediction, batch_id)
+        rows[row[:3]] = row
+    rows = list(rows.values())
+
+    summary = {'total': len(predictions), 'written': 0, 'failed': 0, 'batches': 0, 'errors': []}
+
+    with conn.cursor() as cur:
+        for start in range(0, len(rows), page_size):
+            batch = rows[start:start + page_size]
+            summary['batches'] += 1
+
+            cur.execute("SAVEPOINT prediction_batch")
+            try:
+                execute_values(cur, UPSERT_QUERY, batch, template=UPSERT_TEMPLATE, page_size=page_size)
+                cur.execute("RELEASE SAVEPOINT prediction_batch")
+                summary['written'] += len(batch)
+            except Exception as e:
+                cur.execute("ROLLBACK TO SAVEPOINT prediction_batch")
+                summary['failed'] += len(batch)
+                summary['errors'].append({
+                    'batch': summary['batches'],
+                    'start': start,
+                    'size': len(batch),
+                    'error': str(e)[:200]
+                })
+                logger.warning(f"預測批次 {summary['batches']} 寫入失敗（第 {start} 筆起 {len(batch)} 筆）: {str(e)[:100]}")
+
+    conn.commit()
+    return summary
@@ -22,6 +22,7 @@ if predict_main_path not in sys.path:
 from database_integration import DatabaseIntegration
 from task_executor import execute_task
 from config import DatabaseConfig, SchedulerConfig, LoggingConfig, get_db_config
+from dag_scheduler import DagScheduler, DagJob
 
 # Import database modules from predict_product_main
 from hybrid_cv_optimized_system import HybridCVOptimizedSystem
@@ -778,41 +779,61 @@ Prophet每日預測報告
         
         self.logger.info(f"觸發器健康檢查報告已保存: {report_file}")
     
+    def build_nightly_jobs(self):
+        """建立夜間任務鏈的 DAG 任務（相依關係與資源需求見 SchedulerConfig.NIGHTLY_JOBS）"""
+        is_first_of_month = lambda: self.get_current_time().day == 1
+        is_sunday = lambda: self.get_current_time().weekday() == 6
+        
+        job_funcs = {
+            'monthly_sales_reset': (self.monthly_sales_change_reset_job, is_first_of_month),
+            'monthly_prediction': (self.monthly_sales_prediction_job, is_first_of_month),
+            'sales_change_check': (self.daily_sales_change_job, None),
+            'weekly_recommendation': (self.weekly_recommendation_job, is_sunday),
+            'trigger_health_check': (self.daily_trigger_health_check_job, None),
+            'inactive_customer_check': (self.daily_inactive_customer_job, None),
+            'repurchase_reminder': (self.daily_repurchase_reminder_job, None),
+        }
+        
+        jobs = []
+        for name, spec in SchedulerConfig.NIGHTLY_JOBS.items():
+            func, condition = job_funcs[name]
+            jobs.append(DagJob(name, func, depends_on=spec['depends_on'],
+                               resources=spec['resources'], condition=condition))
+        return jobs
+    
+    def run_nightly_chain(self):
+        """執行夜間任務鏈：前置任務完成後立即啟動後續任務，獨立任務在資源預算內平行執行"""
+        current_time = self.get_current_time()
+        self.logger.info(f"開始夜間任務鏈 (UTC+8: {current_time.strftime('%Y-%m-%d %H:%M:%S')})")
+        
+        dag = DagScheduler(
+            SchedulerConfig.RESOURCE_BUDGET,
+            timing_file=os.path.join(LoggingConfig.LOG_DIR, 'nightly_dag_timings.json'),
+            logger=self.logger
+        )
+        results = dag.run(self.build_nightly_jobs())
+        
+        for name, result in results.items():
+            self.logger.info(f"- {name}: {result['status']} ({result['duration']} 秒)")
+        
+        return all(result['status'] in ('success', 'skipped') for result in results.values())
+    
     def setup_schedule(self):
         """設定排程任務 (所有時間為UTC+8)"""
         
         # 每天晚上10點執行預測生成（預測明天）
         schedule.every().day.at("22:00").do(self.daily_prediction_job)
         
-        # 每月1號凌晨0點30分執行銷量重置（先重置再預測）
-        schedule.every().day.at("00:30").do(self.check_and_run_monthly_sales_reset)
-        
-        # 每月1號凌晨1點執行月銷售預測
-        schedule.every().day.at("01:00").do(self.check_and_run_monthly_prediction)
-        
-        # 每週日凌晨2點執行推薦系統更新
-        schedule.every().sunday.at("02:00").do(self.weekly_recommendation_job)
-        
-        # 每天凌晨2點執行觸發器健康檢查
-        schedule.every().day.at("02:00").do(self.daily_trigger_health_check_job)
-        
-        # 每天凌晨2點30分執行不活躍客戶檢查
-        schedule.every().day.at("02:30").do(self.daily_inactive_customer_job)
-        
-        # 每天凌晨4點執行回購提醒維護
-        schedule.every().day.at("04:00").do(self.daily_repurchase_reminder_job)
-        
-        # 每天早上6點執行銷量變化檢查
-        schedule.every().day.at("06:00").do(self.daily_sales_change_job)
+        # 每天凌晨0點30分啟動夜間任務鏈：
+        # 銷量重置（每月1號）完成後才執行月銷售預測與銷量變化檢查，
+        # 推薦系統更新（週日）、觸發器健康檢查、不活躍客戶檢查、回購提醒維護互不相依，平行執行
+        schedule.every().day.at(SchedulerConfig.NIGHTLY_CHAIN_START).do(self.run_nightly_chain)
         
         self.logger.info("排程設定完成 (時區: UTC+8):")
-        self.logger.info("- 每月1號 00:30: 銷量重置")
-        self.logger.info("- 每月1號 01:00: 月銷售預測")
-        self.logger.info("- 週日 02:00: 推薦系統更新")
-        self.logger.info("- 每天 03:30: 觸發器健康檢查")
-        self.logger.info("- 每天 05:00: 不活躍客戶檢查")
-        self.logger.info("- 每天 06:00: 回購提醒維護")
-        self.logger.info("- 每天 07:00: 銷量變化檢查")
+        self.logger.info(f"- 每天 {SchedulerConfig.NIGHTLY_CHAIN_START}: 夜間任務鏈")
+        self.logger.info("  - 每月1號: 銷量重置 → 月銷售預測、銷量變化檢查")
+        self.logger.info("  - 週日: 推薦系統更新")
+        self.logger.info("  - 每天: 觸發器健康檢查、不活躍客戶檢查、回購提醒維護、銷量變化檢查")
         self.logger.info("- 每天 22:00: CatBoost預測生成（每日重新訓練）")
     
     def check_and_run_monthly_prediction(self):
@@ -1000,9 +1021,10 @@ def main():
     print("8. 手動執行銷量變化檢查")
     print("9. 手動執行月度銷量重置")
     print("10. 手動執行觸發器健康檢查")
+    print("11. 手動執行夜間任務鏈")
     
     try:
-        choice = input("\n請輸入選項 (1-10): ").strip()
+        choice = input("\n請輸入選項 (1-11): ").strip()
         
         if choice == "1":
             scheduler.test_complete_system()
@@ -1024,6 +1046,8 @@ def main():
             scheduler.test_monthly_sales_reset()
         elif choice == "10":
             scheduler.test_trigger_health_check()
+        elif choice == "11":
+            scheduler.run_nightly_chain()
         else:
             print("無效選項")
             
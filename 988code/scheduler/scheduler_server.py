@@ -62,6 +62,7 @@ def root():
             "/schedule/toggle",
             "/schedule/status",
             "/schedule/history/{task_id}",
+            "/schedule/jobs/{job_id}",
             "/schedule/start_scheduler",
             "/schedule/stop_scheduler",
             "/schedule/scheduler_status"
@@ -85,7 +86,8 @@ def main():
     print("  GET  /              - 服務狀態")
     print("  GET  /health        - 健康檢查")
     print("  GET  /schedule/tasks - 獲取所有任務")
-    print("  POST /schedule/execute - 手動執行任務")
+    print("  POST /schedule/execute - 手動執行任務（排入佇列，回傳任務ID）")
+    print("  GET  /schedule/jobs/{job_id} - 查詢手動任務狀態")
     print("  POST /schedule/toggle - 切換排程開關")
     print("  GET  /schedule/status - 排程系統狀態")
     print("  POST /schedule/start_scheduler - 啟動排程器")
@@ -26,6 +26,9 @@ class TaskExecutor:
     """任務執行器類"""
     
     def __init__(self):
+        # 每日預測服務，第一次使用時建立
+        self.daily_predictor = None
+        
         self.task_map = {
             # 補貨排程 (restock)
             "daily_prediction": self.execute_daily_prediction,
@@ -87,79 +90,53 @@ class TaskExecutor:
             }
     
     
+    def get_daily_predictor(self):
+        """取得常駐的 CatBoost 預測服務（模型只在檔案更新時重新載入）"""
+        if self.daily_predictor is None:
+            from ml_system.model_service import CatBoostPredictor
+            self.daily_predictor = CatBoostPredictor()
+        return self.daily_predictor
+    
+    def warm_up(self):
+        """預先載入常用套件與預測模型，供常駐工作進程使用"""
+        import pandas  # noqa: F401
+        import numpy  # noqa: F401
+        try:
+            import catboost  # noqa: F401
+        except ImportError:
+            logging.warning("catboost 未安裝，略過預先載入")
+        
+        try:
+            predictor = self.get_daily_predictor()
+            if predictor.ensure_model_loaded():
+                logging.info("每日預測模型已預先載入")
+        except Exception as e:
+            logging.warning(f"預先載入每日預測模型失敗: {e}")
+    
     def execute_daily_prediction(self):
         """執行每日預測（使用優化後的模型配置）"""
         try:
-            import os
-            import subprocess
-            
-            # 直接在 ml_system 目錄中執行預測腳本
-            current_dir = os.path.dirname(__file__)
-            ml_system_dir = os.path.join(current_dir, 'ml_system')
+            from ml_system.config import MLConfig
             
             logging.info("=== 執行每日預測 (優化配置) ===")
             
-            # 創建臨時腳本來執行預測
-            script_content = '''
-from model_service import CatBoostPredictor
-from config import MLConfig
-
-predictor = CatBoostPredictor()
-result = predictor.daily_prediction_process()
-
-if result:
-    print("PREDICTION_SUCCESS")
-    print(f"THRESHOLD:{MLConfig.PREDICTION_THRESHOLD}")
-    print(f"WEIGHTS:{MLConfig.CATBOOST_PARAMS['class_weights']}")
-else:
-    print("PREDICTION_FAILED")
-'''
-            
-            script_path = os.path.join(ml_system_dir, 'temp_daily_prediction.py')
-            with open(script_path, 'w', encoding='utf-8') as f:
-                f.write(script_content)
-            
-            try:
-                # 在 ml_system 目錄中執行預測
-                result = subprocess.run([
-                    'python', 'temp_daily_prediction.py'
-                ], cwd=ml_system_dir, capture_output=True, text=True, timeout=300)
-                
-                # 清理臨時文件
-                if os.path.exists(script_path):
-                    os.remove(script_path)
-                
-                if result.returncode == 0:
-                    output_lines = result.stdout.strip().split('\n')
-                    if 'PREDICTION_SUCCESS' in output_lines:
-                        threshold_line = [line for line in output_lines if line.startswith('THRESHOLD:')]
-                        weights_line = [line for line in output_lines if line.startswith('WEIGHTS:')]
-                        
-                        config_info = {}
-                        if threshold_line:
-                            config_info['threshold'] = threshold_line[0].split(':', 1)[1]
-                        if weights_line:
-                            config_info['weights'] = weights_line[0].split(':', 1)[1]
-                        
-                        logging.info("每日預測執行成功")
-                        return {
-                            "status": "completed", 
-                            "message": "CatBoost每日預測完成", 
-                            "config": config_info
-                        }
-                    else:
-                        logging.error("預測執行失敗")
-                        return {"status": "failed", "message": "CatBoost每日預測失敗"}
-                else:
-                    logging.error(f"預測執行出錯: {result.stderr}")
-                    return {"status": "failed", "message": f"預測執行錯誤: {result.stderr[:100]}"}
-                    
-            except subprocess.TimeoutExpired:
-                logging.error("預測執行超時")
-                return {"status": "failed", "message": "預測執行超時"}
-            except Exception as e:
-                logging.error(f"執行預測時發生錯誤: {e}")
-                return {"error": str(e)}
+            # 在同一進程中執行預測，常駐工作進程可重用已載入的模型
+            predictor = self.get_daily_predictor()
+            result = predictor.daily_prediction_process()
+            
+            if result:
+                logging.info("每日預測執行成功")
+                return {
+                    "status": "completed", 
+                    "message": "CatBoost每日預測完成", 
+                    "config": {
+                        "threshold": str(MLConfig.PREDICTION_THRESHOLD),
+                        "weights": str(MLConfig.CATBOOST_PARAMS['class_weights'])
+                    }
+                }
+            else:
+                logging.error("預測執行失敗")
+                return {"status": "failed", "message": "CatBoost每日預測失敗"}
                     
         except Exception as e:
             logging.error(f"CatBoost每日預測錯誤: {e}")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+常駐任務工作進程
+由 job_queue.TaskWorkerPool 啟動，啟動時預先載入 pandas、CatBoost 與預測模型，
+之後重複從 stdin 讀取任務、以 stdout 回報進度與結果（每行一個 JSON）。
+
+任務本身的 print 輸出會導向 stderr，避免與回報協定混在一起。
+"""
+
+import json
+import os
+import sys
+import time
+
+# 添加當前目錄到路徑
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def main():
+    # 保留原本的 stdout 作為回報通道，其餘輸出一律導向 stderr
+    channel = sys.stdout
+    sys.stdout = sys.stderr
+
+    def report(message):
+        channel.write(json.dumps(message, ensure_ascii=False, default=str) + "\n")
+        channel.flush()
+
+    from task_executor import task_executor
+    task_executor.warm_up()
+    report({"event": "ready", "pid": os.getpid()})
+
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+
+        job = json.loads(line)
+        job_id = job["job_id"]
+        report({"event": "running", "job_id": job_id})
+
+        start_time = time.time()
+        try:
+            result = task_executor.execute_task(job["task_id"])
+        except Exception as e:
+            result = {
+                "success": False,
+                "message": f"Task {job['task_id']} failed: {str(e)}",
+                "duration": int(time.time() - start_time),
+                "error": str(e)
+            }
+
+        report({"event": "done", "job_id": job_id, "result": result})
+
+
+if __name__ == "__main__":
+    main()
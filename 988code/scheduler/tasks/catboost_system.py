@@ -27,6 +27,8 @@ for path in (current_dir, scheduler_path):
     if path not in sys.path:
         sys.path.insert(0, path)
 
+from prediction_writer import upsert_predictions
+
 OptimizedRollingPredictionModel = None
 _last_import_error = None
 
@@ -245,69 +247,33 @@ class CatBoostPredictionSystem:
                 except Exception as e:
                     self.logger.warning(f"讀取最後購買時間失敗，將不套用購買後刷新規則: {str(e)}")
 
-                imported_count = 0
-                error_count = 0
+                # 僅當「從未預測過」或「自上次預測後有新購買」才寫入
+                predictions_to_write = []
                 skipped_count = 0
                 
                 for prediction in predictions:
-                    try:
-                        # 僅當「從未預測過」或「自上次預測後有新購買」才寫入
-                        key = (prediction['customer_id'], prediction['product_id'])
-                        last_pred_at = last_pred_map.get(key)
-                        last_buy_at = last_buy_map.get(key)
+                    key = (prediction['customer_id'], prediction['product_id'])
+                    last_pred_at = last_pred_map.get(key)
+                    last_buy_at = last_buy_map.get(key)
 
-                        should_write = False
-                        if last_pred_at is None:
+                    should_write = False
+                    if last_pred_at is None:
+                        should_write = True
+                    else:
+                        if last_buy_at is not None and last_buy_at > last_pred_at:
                             should_write = True
-                        else:
-                            if last_buy_at is not None and last_buy_at > last_pred_at:
-                                should_write = True
 
-                        if not should_write:
-                            skipped_count += 1
-                            continue
-                        cur.execute("""
-                            INSERT INTO prophet_predictions (
-                                customer_id, product_id, prediction_date, will_purchase_anything,
-                                purchase_probability, estimated_quantity, confidence_level,
-                                original_segment, prediction_batch_id, created_at, prediction_status
-                            ) VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), 'active')
-                            ON CONFLICT (customer_id, product_id, prediction_date)
-                            DO UPDATE SET
-                                will_purchase_anything = EXCLUDED.will_purchase_anything,
-                                purchase_probability = EXCLUDED.purchase_probability,
-                                estimated_quantity = EXCLUDED.estimated_quantity,
-                                confidence_level = EXCLUDED.confidence_level,
-                                prediction_batch_id = EXCLUDED.prediction_batch_id,
-                                updated_at = NOW()
-                            WHERE prophet_predictions.prediction_status = 'active';
-                        """, (
-                            prediction['customer_id'],
-                            prediction['product_id'],
-                            prediction['prediction_date'],
-                            prediction['will_purchase_anything'],
-                            prediction['purchase_probability'],
-                            prediction['estimated_quantity'],
-                            prediction['confidence_level'],
-                            prediction['original_segment'],
-                            batch_id
-                        ))
-                        
-                        imported_count += 1
-                        
-                    except Exception as e:
-                        error_count += 1
-                        self.logger.warning(f"預測導入失敗: {str(e)[:100]}")
-                
-                conn.commit()
-                # 額外記錄被跳過的筆數
-                try:
-                    self.logger.info(f"略過(自上次預測後無新購買) {skipped_count} 筆")
-                except Exception:
-                    pass
-                
-                self.logger.info(f"資料庫導入完成: 成功 {imported_count}, 失敗 {error_count}")
-                return error_count == 0
+                    if not should_write:
+                        skipped_count += 1
+                        continue
+                    predictions_to_write.append(prediction)
+            
+            summary = upsert_predictions(conn, predictions_to_write, batch_id, logger=self.logger)
+            
+            # 額外記錄被跳過的筆數
+            self.logger.info(f"略過(自上次預測後無新購買) {skipped_count} 筆")
+            self.logger.info(f"資料庫導入完成: 成功 {summary['written']}, 失敗 {summary['failed']} ({summary['batches']} 批)")
+            return summary['failed'] == 0
                 
         except Exception as e:
             self.logger.error(f"資料庫導入異常: {e}")
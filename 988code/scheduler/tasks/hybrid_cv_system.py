@@ -46,6 +46,11 @@ class HybridCVOptimizedSystem:
         self.current_month = self.prediction_month - relativedelta(months=1)  # 當前月
         self.history_start = self.prediction_month - relativedelta(months=18)  # 18個月歷史
         self.recent_3_months_start = self.prediction_month - relativedelta(months=4)  # 最近3個月開始
+        self.recent_5_months_start = self.prediction_month - relativedelta(months=5)  # SKU分配權重期間開始
+        
+        # 一次載入的 月份×子類別×SKU 歷史彙總（見 load_history_data）
+        self.history_data = None
+        self.subcategory_monthly = None
         
         self.logger.info("=== 混合CV優化預測系統 ===")
         self.logger.info(f"預測月份: {self.prediction_month.strftime('%Y年%m月')}")
@@ -177,62 +182,80 @@ class HybridCVOptimizedSystem:
                 conn.close()
             return None
     
-    def get_monthly_history(self, subcategory):
-        """獲取月度歷史數據"""
+    def load_history_data(self):
+        """一次載入歷史期間 月份×子類別×SKU 的銷售彙總，供各子類別預測與SKU分配共用"""
         conn = self.get_database_connection()
         if conn is None:
             return None
         
         try:
             query = """
-            WITH monthly_sales AS (
-                SELECT 
-                    DATE_TRUNC('month', ot.transaction_date) as ds,
-                    SUM(ot.quantity) as quantity
-                FROM order_transactions ot
-                JOIN product_master pm ON ot.product_id = pm.product_id
-                WHERE pm.subcategory = %s
-                  AND pm.is_active = 'active'
-                  AND ot.transaction_date >= %s::date
-                  AND ot.transaction_date < %s::date
-                  AND ot.document_type = '銷貨'
-                  AND ot.quantity > 0
-                GROUP BY DATE_TRUNC('month', ot.transaction_date)
-            ),
-            month_series AS (
-                SELECT generate_series(
-                    %s::date,
-                    %s::date,
-                    '1 month'::interval
-                )::date as ds
-            )
             SELECT 
-                ms.ds,
-                COALESCE(s.quantity, 0) as y
-            FROM month_series ms
-            LEFT JOIN monthly_sales s ON ms.ds = s.ds
-            ORDER BY ms.ds
+                pm.subcategory,
+                pm.product_id,
+                DATE_TRUNC('month', ot.transaction_date)::date as month,
+                MAX(ot.product_name) as product_name,
+                SUM(ot.quantity) as quantity,
+                COUNT(*) as line_count,
+                SUM(CASE WHEN ot.transaction_date >= %s::date THEN ot.quantity ELSE 0 END) as recent_quantity
+            FROM order_transactions ot
+            JOIN product_master pm ON ot.product_id = pm.product_id
+            WHERE pm.is_active = 'active'
+              AND ot.transaction_date >= %s::date
+              AND ot.transaction_date < %s::date
+              AND ot.document_type = '銷貨'
+              AND ot.quantity > 0
+            GROUP BY pm.subcategory, pm.product_id, DATE_TRUNC('month', ot.transaction_date)
             """
             
             # 準備查詢參數
             params = (
-                subcategory,
+                self.recent_5_months_start.strftime('%Y-%m-%d'),  # 最近5個月開始
                 self.history_start.strftime('%Y-%m-%d'),  # 歷史開始
-                self.prediction_month.strftime('%Y-%m-%d'),  # 預測月份
-                self.history_start.strftime('%Y-%m-01'),  # 系列開始
-                self.current_month.strftime('%Y-%m-01')  # 系列結束（當前月）
+                self.prediction_month.strftime('%Y-%m-%d')  # 預測月份
             )
             
             df = pd.read_sql(query, conn, params=params)
             conn.close()
             
+            df['month'] = pd.to_datetime(df['month'])
+            for column in ['quantity', 'line_count', 'recent_quantity']:
+                df[column] = df[column].astype(float)
+            
+            self.history_data = df
+            self.subcategory_monthly = df.groupby(['subcategory', 'month'])['quantity'].sum()
+            
+            self.logger.info(f"載入歷史彙總 {len(df)} 筆（{df['subcategory'].nunique()} 個子類別，{df['product_id'].nunique()} 個SKU）")
             return df
             
         except Exception as e:
+            self.logger.error(f"載入歷史彙總失敗: {e}")
             if conn:
                 conn.close()
             return None
     
+    def get_monthly_history(self, subcategory):
+        """獲取月度歷史數據"""
+        if self.history_data is None and self.load_history_data() is None:
+            return None
+        
+        # 歷史開始至當前月的完整月份序列，沒有銷售的月份補0
+        month_series = pd.date_range(
+            self.history_start.strftime('%Y-%m-01'),
+            self.current_month.strftime('%Y-%m-01'),
+            freq='MS'
+        )
+        
+        if subcategory in self.subcategory_monthly.index.get_level_values('subcategory'):
+            monthly_sales = self.subcategory_monthly.loc[subcategory]
+        else:
+            monthly_sales = pd.Series(dtype=float)
+        
+        return pd.DataFrame({
+            'ds': month_series,
+            'y': monthly_sales.reindex(month_series, fill_value=0).to_numpy()
+        })
+    
     def predict_ultra_stable(self, subcategory, history):
         """超穩定產品預測 (CV <= 0.3)"""
         # 使用最近3個月平均
@@ -340,98 +363,51 @@ class HybridCVOptimizedSystem:
     
     def get_sku_allocation_factors(self, subcategory):
         """獲取SKU分配因子"""
-        conn = self.get_database_connection()
-        if conn is None:
+        if self.history_data is None and self.load_history_data() is None:
             return None
         
-        try:
-            # 使用更長的歷史期間來計算分配比例
-            query = """
-            WITH sku_sales AS (
-                SELECT 
-                    pm.product_id,
-                    MAX(ot.product_name) as product_name,  -- 取最常見的名稱
-                    SUM(ot.quantity) as total_quantity,
-                    COUNT(DISTINCT DATE_TRUNC('month', ot.transaction_date)) as active_months,
-                    AVG(ot.quantity) as avg_quantity
-                FROM order_transactions ot
-                JOIN product_master pm ON ot.product_id = pm.product_id
-                WHERE pm.subcategory = %s
-                  AND pm.is_active = 'active'
-                  AND ot.transaction_date >= %s::date
-                  AND ot.transaction_date < %s::date
-                  AND ot.document_type = '銷貨'
-                  AND ot.quantity > 0
-                GROUP BY pm.product_id
-            ),
-            recent_sales AS (
-                -- 最近5個月的銷售權重
-                SELECT 
-                    pm.product_id,
-                    SUM(ot.quantity) as recent_quantity,
-                    SUM(CASE WHEN DATE_TRUNC('month', ot.transaction_date) = %s::date THEN ot.quantity ELSE 0 END) as month_minus_3,
-                    SUM(CASE WHEN DATE_TRUNC('month', ot.transaction_date) = %s::date THEN ot.quantity ELSE 0 END) as month_minus_2,
-                    SUM(CASE WHEN DATE_TRUNC('month', ot.transaction_date) = %s::date THEN ot.quantity ELSE 0 END) as month_minus_1
-                FROM order_transactions ot
-                JOIN product_master pm ON ot.product_id = pm.product_id
-                WHERE pm.subcategory = %s
-                  AND pm.is_active = 'active'
-                  AND ot.transaction_date >= %s::date
-                  AND ot.transaction_date < %s::date
-                  AND ot.document_type = '銷貨'
-                  AND ot.quantity > 0
-                GROUP BY pm.product_id
-            )
-            SELECT 
-                s.product_id,
-                s.product_name,
-                s.total_quantity,
-                s.active_months,
-                s.avg_quantity,
-                COALESCE(r.recent_quantity, 0) as recent_quantity,
-                COALESCE(r.month_minus_3, 0) as month_minus_3,
-                COALESCE(r.month_minus_2, 0) as month_minus_2,
-                COALESCE(r.month_minus_1, 0) as month_minus_1,
-                -- 使用最近銷售的比例，如果沒有則使用歷史比例
-                CASE 
-                    WHEN SUM(COALESCE(r.recent_quantity, 0)) OVER() > 0 
-                    THEN COALESCE(r.recent_quantity, 0)::float / SUM(COALESCE(r.recent_quantity, 0)) OVER()
-                    ELSE s.total_quantity::float / NULLIF(SUM(s.total_quantity) OVER(), 0)
-                END as allocation_ratio
-            FROM sku_sales s
-            LEFT JOIN recent_sales r ON s.product_id = r.product_id
-            WHERE s.total_quantity > 0
-            ORDER BY COALESCE(r.recent_quantity, s.total_quantity) DESC
-            """
-            
-            # 準備查詢參數
-            month_minus_3 = self.prediction_month - relativedelta(months=3)
-            month_minus_2 = self.prediction_month - relativedelta(months=2)
-            month_minus_1 = self.prediction_month - relativedelta(months=1)
-            recent_5_months_start = self.prediction_month - relativedelta(months=5)
-            
-            params = (
-                subcategory,  # 子類別
-                self.history_start.strftime('%Y-%m-%d'),  # 歷史開始
-                self.prediction_month.strftime('%Y-%m-%d'),  # 預測月份
-                month_minus_3.strftime('%Y-%m-01'),  # 3個月前
-                month_minus_2.strftime('%Y-%m-01'),  # 2個月前
-                month_minus_1.strftime('%Y-%m-01'),  # 1個月前
-                subcategory,  # 子類別（第二次）
-                recent_5_months_start.strftime('%Y-%m-%d'),  # 最近5個月開始
-                self.prediction_month.strftime('%Y-%m-%d')  # 預測月份
-            )
-            
-            df = pd.read_sql(query, conn, params=params)
-            conn.close()
-            
-            return df
-            
-        except Exception as e:
-            self.logger.error(f"獲取SKU分配因子失敗: {e}")
-            if conn:
-                conn.close()
-            return None
+        sku_months = self.history_data[self.history_data['subcategory'] == subcategory]
+        if sku_months.empty:
+            return sku_months
+        
+        month_minus_3 = pd.Timestamp((self.prediction_month - relativedelta(months=3)).strftime('%Y-%m-01'))
+        month_minus_2 = pd.Timestamp((self.prediction_month - relativedelta(months=2)).strftime('%Y-%m-01'))
+        month_minus_1 = pd.Timestamp((self.prediction_month - relativedelta(months=1)).strftime('%Y-%m-01'))
+        
+        sku_months = sku_months.assign(
+            month_minus_3=sku_months['quantity'].where(sku_months['month'] == month_minus_3, 0),
+            month_minus_2=sku_months['quantity'].where(sku_months['month'] == month_minus_2, 0),
+            month_minus_1=sku_months['quantity'].where(sku_months['month'] == month_minus_1, 0),
+        )
+        
+        # 使用更長的歷史期間來計算分配比例
+        df = sku_months.groupby('product_id').agg(
+            product_name=('product_name', 'max'),
+            total_quantity=('quantity', 'sum'),
+            active_months=('month', 'nunique'),
+            line_count=('line_count', 'sum'),
+            recent_quantity=('recent_quantity', 'sum'),
+            month_minus_3=('month_minus_3', 'sum'),
+            month_minus_2=('month_minus_2', 'sum'),
+            month_minus_1=('month_minus_1', 'sum'),
+        ).reset_index()
+        df['avg_quantity'] = df['total_quantity'] / df['line_count']
+        df = df[df['total_quantity'] > 0]
+        
+        # 使用最近銷售的比例，如果沒有則使用歷史比例
+        if df['recent_quantity'].sum() > 0:
+            df['allocation_ratio'] = df['recent_quantity'] / df['recent_quantity'].sum()
+        else:
+            df['allocation_ratio'] = df['total_quantity'] / df['total_quantity'].sum()
+        
+        # 最近有銷售的SKU依最近銷量排序，否則依歷史銷量
+        sort_key = df['recent_quantity'].where(df['recent_quantity'] > 0, df['total_quantity'])
+        df = df.loc[sort_key.sort_values(ascending=False, kind='mergesort').index]
+        
+        return df[[
+            'product_id', 'product_name', 'total_quantity', 'active_months', 'avg_quantity',
+            'recent_quantity', 'month_minus_3', 'month_minus_2', 'month_minus_1', 'allocation_ratio'
+        ]].reset_index(drop=True)
     
     def allocate_to_skus(self, subcategory, subcategory_prediction):
         """分配預測到SKU"""
@@ -512,6 +488,11 @@ class HybridCVOptimizedSystem:
             self.logger.error("沒有找到符合條件的子類別")
             return None, None
         
+        # 一次載入所有子類別與SKU的月度歷史，後續預測與分配都在記憶體中進行
+        if self.load_history_data() is None:
+            self.logger.error("無法載入歷史銷售數據")
+            return None, None
+        
         subcategory_results = []
         sku_results = []
         
@@ -5,6 +5,7 @@ from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
 from sklearn.preprocessing import LabelEncoder
 from scipy import stats
+from scipy import sparse
 import warnings
 import os
 from dotenv import load_dotenv
@@ -13,10 +14,22 @@ warnings.filterwarnings('ignore')
 # 載入環境變數
 load_dotenv(os.path.join(os.path.dirname(__file__), '..', '..', '.env'))
 
+# 相似度矩陣分塊計算的列數（控制暫存記憶體）
+SIMILARITY_CHUNK_SIZE = 1024
+
+# 推薦分數分塊計算的客戶數
+SCORING_CHUNK_SIZE = 512
+
 class RecommendationSystem:
-    def __init__(self, db_config):
-        """初始化推薦系統"""
+    def __init__(self, db_config, similarity_dtype=np.float32, similarity_top_k=None):
+        """初始化推薦系統
+
+        similarity_dtype: 相似度矩陣的資料型別（預設 float32 以節省記憶體）
+        similarity_top_k: 設定時每個產品只保留最相似的 k 個產品，以稀疏矩陣儲存
+        """
         self.db_config = db_config
+        self.similarity_dtype = similarity_dtype
+        self.similarity_top_k = similarity_top_k
         self.conn = None
         self.customer_product_matrix = None
         self.product_similarity_matrix = None
@@ -24,6 +37,7 @@ class RecommendationSystem:
         self.transactions_df = None
         self.customer_price_profiles = None  # 客戶分類別價格檔案
         self.category_price_stats = None     # 各類別價格統計
+        self.scoring_inputs = None           # 矩陣化推薦評分的輸入
         
     def connect_db(self):
         """連接到PostgreSQL數據庫"""
@@ -209,112 +223,111 @@ class RecommendationSystem:
         
         return similarity
     
-    def calculate_product_similarity(self):
-        """計算產品間的相似度（僅限活躍產品）"""
-        print("開始計算活躍產品相似度...")
-        
+    def _prepare_similarity_features(self):
+        """將產品屬性編碼為整數陣列，並對齊每個產品的平均價格與類別價格標準差"""
         # 處理缺失值
         self.products_df = self.products_df.fillna('unknown')
         
         # 為類別特徵編碼
-        le_category = LabelEncoder()
-        le_subcategory = LabelEncoder()
-        le_specification = LabelEncoder()
-        le_process = LabelEncoder()
-        
-        # 編碼各個特徵
-        category_encoded = le_category.fit_transform(self.products_df['category'].astype(str))
-        subcategory_encoded = le_subcategory.fit_transform(self.products_df['subcategory'].astype(str))
-        specification_encoded = le_specification.fit_transform(self.products_df['specification'].astype(str))
-        process_encoded = le_process.fit_transform(self.products_df['process_type'].astype(str))
-        
-        # 計算各個特徵的相似度矩陣
-        n_products = len(self.products_df)
+        attribute_codes = [
+            LabelEncoder().fit_transform(self.products_df[column].astype(str))
+            for column in ['category', 'subcategory', 'specification', 'process_type']
+        ]
         
-        # 類別相似度
-        category_similarity = np.zeros((n_products, n_products))
-        for i in range(n_products):
-            for j in range(n_products):
-                category_similarity[i][j] = 1 if category_encoded[i] == category_encoded[j] else 0
-        
-        # 子類別相似度
-        subcategory_similarity = np.zeros((n_products, n_products))
-        for i in range(n_products):
-            for j in range(n_products):
-                subcategory_similarity[i][j] = 1 if subcategory_encoded[i] == subcategory_encoded[j] else 0
-        
-        # 規格相似度
-        specification_similarity = np.zeros((n_products, n_products))
-        for i in range(n_products):
-            for j in range(n_products):
-                specification_similarity[i][j] = 1 if specification_encoded[i] == specification_encoded[j] else 0
-        
-        # 處理方式相似度
-        process_similarity = np.zeros((n_products, n_products))
-        for i in range(n_products):
-            for j in range(n_products):
-                process_similarity[i][j] = 1 if process_encoded[i] == process_encoded[j] else 0
-        
-        # 價格相似度矩陣
-        print("計算活躍產品價格相似度矩陣...")
-        price_similarity = np.zeros((n_products, n_products))
-        
-        # 獲取每個產品的平均價格
-        product_avg_prices = {}
-        for product_id in self.products_df['product_id']:
-            product_prices = self.transactions_df[
-                self.transactions_df['product_id'] == product_id
-            ]['unit_price']
-            if not product_prices.empty:
-                product_avg_prices[product_id] = product_prices.mean()
-        
-        # 計算產品間價格相似度
-        for i in range(n_products):
-            for j in range(n_products):
-                product_i = self.products_df.iloc[i]['product_id']
-                product_j = self.products_df.iloc[j]['product_id']
-                category_i = self.products_df.iloc[i]['category']
-                category_j = self.products_df.iloc[j]['category']
-                
-                if category_i != category_j:
-                    price_similarity[i][j] = 0  # 不同類別的產品價格不比較
-                elif product_i in product_avg_prices and product_j in product_avg_prices:
-                    # 在同類別內比較價格
-                    price_i = product_avg_prices[product_i]
-                    price_j = product_avg_prices[product_j]
-                    
-                    # 獲取類別標準差
-                    category_stats = self.category_price_stats[
-                        self.category_price_stats['category'] == category_i
-                    ]
-                    
-                    if not category_stats.empty and category_stats.iloc[0]['std'] > 0:
-                        price_diff = abs(price_i - price_j)
-                        category_std = category_stats.iloc[0]['std']
-                        # 使用高斯函數
-                        price_similarity[i][j] = np.exp(-0.5 * (price_diff / category_std) ** 2)
-                    else:
-                        price_similarity[i][j] = 1.0 if price_i == price_j else 0.5
-                else:
-                    price_similarity[i][j] = 0.5  # 默認值
-        
-        # 綜合相似度（5個因子的平均）
-        self.product_similarity_matrix = (
-            category_similarity + 
-            subcategory_similarity + 
-            specification_similarity + 
-            process_similarity +
-            price_similarity
-        ) / 5.0
+        # 每個產品的平均價格（無交易記錄為 NaN）
+        product_avg_prices = self.transactions_df.groupby('product_id')['unit_price'].mean()
+        prices = self.products_df['product_id'].map(product_avg_prices).to_numpy(dtype=float)
+        
+        # 每個產品所屬類別的價格標準差（無統計資料為 NaN）
+        category_std = self.category_price_stats.set_index('category')['std']
+        stds = self.products_df['category'].map(category_std).to_numpy(dtype=float)
+        
+        return attribute_codes, prices, stds
+    
+    def _similarity_rows(self, start, stop, attribute_codes, prices, stds):
+        """計算第 start~stop 個產品對所有產品的綜合相似度（5個因子的平均）"""
+        rows = slice(start, stop)
+        similarity = np.zeros((stop - start, len(prices)), dtype=self.similarity_dtype)
+        
+        # category、subcategory、specification、process_type：編碼相等即為 1
+        for codes in attribute_codes:
+            similarity += codes[rows, None] == codes[None, :]
+        
+        # 價格相似度：僅同類別內比較，使用類別標準差的高斯函數
+        category_codes = attribute_codes[0]
+        same_category = category_codes[rows, None] == category_codes[None, :]
+        has_prices = ~np.isnan(prices[rows, None]) & ~np.isnan(prices[None, :])
+        
+        with np.errstate(invalid='ignore'):
+            price_diff = np.abs(prices[rows, None] - prices[None, :])
+            row_std = stds[rows, None]
+            gaussian = np.exp(-0.5 * (price_diff / row_std) ** 2)
+            use_gaussian = row_std > 0
+        
+        fallback = np.where(price_diff == 0, 1.0, 0.5)
+        price_similarity = np.where(
+            has_prices,
+            np.where(use_gaussian, gaussian, fallback),
+            0.5  # 默認值
+        )
+        # 不同類別的產品價格不比較
+        similarity += np.where(same_category, price_similarity, 0.0).astype(self.similarity_dtype)
+        
+        similarity /= 5.0
+        return similarity
+    
+    def _top_k_rows(self, block, top_k):
+        """保留每列相似度最高的 top_k 個值，回傳 (欄索引, 值)"""
+        k = min(top_k, block.shape[1])
+        columns = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        values = np.take_along_axis(block, columns, axis=1)
+        return columns, values
+    
+    def calculate_product_similarity(self):
+        """計算產品間的相似度（僅限活躍產品）"""
+        print("開始計算活躍產品相似度...")
+        
+        attribute_codes, prices, stds = self._prepare_similarity_features()
+        n_products = len(self.products_df)
+        top_k = self.similarity_top_k
+        
+        # 分塊計算，每塊以屬性編碼的廣播相等與向量化高斯價格核計算
+        print("計算活躍產品相似度矩陣（含價格）...")
+        if top_k:
+            k = max(min(top_k, n_products), 1)
+            indices = np.empty((n_products, k), dtype=np.int32)
+            values = np.empty((n_products, k), dtype=self.similarity_dtype)
+        else:
+            dense = np.empty((n_products, n_products), dtype=self.similarity_dtype)
+        
+        for start in range(0, n_products, SIMILARITY_CHUNK_SIZE):
+            stop = min(start + SIMILARITY_CHUNK_SIZE, n_products)
+            block = self._similarity_rows(start, stop, attribute_codes, prices, stds)
+            if top_k:
+                indices[start:stop], values[start:stop] = self._top_k_rows(block, top_k)
+            else:
+                dense[start:stop] = block
+        
+        if top_k:
+            self.product_similarity_matrix = sparse.csr_matrix(
+                (values.ravel(), indices.ravel(), np.arange(0, n_products * k + 1, k)),
+                shape=(n_products, n_products)
+            )
+            stored_values = self.product_similarity_matrix.data
+            print(f"以稀疏矩陣儲存每個產品最相似的 {k} 個產品")
+        else:
+            self.product_similarity_matrix = dense
+            stored_values = dense
         
         print("活躍產品相似度計算完成! (包含5個因子: category, subcategory, specification, process, price)")
         
         # 顯示相似度統計
-        print(f"相似度矩陣統計:")
-        print(f"- 平均相似度: {self.product_similarity_matrix.mean():.4f}")
-        print(f"- 相似度標準差: {self.product_similarity_matrix.std():.4f}")
-        print(f"- 最高相似度: {self.product_similarity_matrix.max():.4f}")
-        print(f"- 最低相似度: {self.product_similarity_matrix.min():.4f}")
+        if stored_values.size > 0:
+            print(f"相似度矩陣統計:")
+            print(f"- 平均相似度: {stored_values.mean():.4f}")
+            print(f"- 相似度標準差: {stored_values.std():.4f}")
+            print(f"- 最高相似度: {stored_values.max():.4f}")
+            print(f"- 最低相似度: {stored_values.min():.4f}")
         
         return True
     
@@ -340,107 +353,147 @@ class RecommendationSystem:
         print(f"包含 {self.customer_product_matrix.shape[1]} 個活躍產品")
         return True
     
+    def build_scoring_inputs(self):
+        """建立矩陣化評分所需的輸入：二元用戶-物品稀疏矩陣、子類別 one-hot、客戶×類別價格矩陣"""
+        _, prices, stds = self._prepare_similarity_features()
+        product_ids = self.products_df['product_id'].to_numpy()
+        product_idx = pd.Series(np.arange(len(product_ids)), index=product_ids)
+        product_idx = product_idx[~product_idx.index.duplicated()]
+        customer_ids = self.customer_product_matrix.index.to_numpy()
+        customer_idx = pd.Series(np.arange(len(customer_ids)), index=customer_ids)
+        
+        # 二元用戶-物品矩陣（列與 customer_product_matrix 對齊，欄與 products_df 對齊）
+        pairs = self.transactions_df[['customer_id', 'product_id']].drop_duplicates()
+        pairs = pairs[pairs['product_id'].isin(product_idx.index) & pairs['customer_id'].isin(customer_idx.index)]
+        user_item = sparse.csr_matrix(
+            (np.ones(len(pairs), dtype=np.float32),
+             (customer_idx.loc[pairs['customer_id']].to_numpy(), product_idx.loc[pairs['product_id']].to_numpy())),
+            shape=(len(customer_ids), len(product_ids))
+        )
+        
+        # 子類別 one-hot（依產品順序首次出現排序），'unknown' 不參與子類別排除
+        subcategory_codes, subcategories = pd.factorize(self.products_df['subcategory'])
+        subcategory_onehot = sparse.csr_matrix(
+            (np.ones(len(product_ids), dtype=np.float32), (np.arange(len(product_ids)), subcategory_codes)),
+            shape=(len(product_ids), len(subcategories))
+        )
+        known_subcategory = (subcategories != 'unknown')[subcategory_codes]
+        
+        # 客戶×類別平均價格矩陣（無價格檔案為 NaN）
+        category_codes, categories = pd.factorize(self.products_df['category'])
+        category_idx = pd.Series(np.arange(len(categories)), index=categories)
+        price_affinity = np.full((len(customer_ids), len(categories)), np.nan)
+        for customer_id, profiles in self.customer_price_profiles.items():
+            if customer_id not in customer_idx.index:
+                continue
+            for category, profile in profiles.items():
+                if category in category_idx.index:
+                    price_affinity[customer_idx.loc[customer_id], category_idx.loc[category]] = profile['avg_price']
+        
+        self.scoring_inputs = {
+            'product_ids': product_ids,
+            'customer_ids': customer_ids,
+            'user_item': user_item,
+            'purchase_counts': np.asarray(user_item.sum(axis=1)).ravel(),
+            'subcategories': subcategories,
+            'subcategory_codes': subcategory_codes,
+            'subcategory_onehot': subcategory_onehot,
+            'known_subcategory': known_subcategory,
+            'category_codes': category_codes,
+            'price_affinity': price_affinity,
+            'prices': prices,
+            'stds': stds,
+        }
+        return self.scoring_inputs
+    
+    def _iter_score_chunks(self):
+        """分塊計算客戶×產品的相似度分數、價格匹配度與綜合分數
+
+        Yields:
+            (起始列, 相似度分數, 價格匹配度, 綜合分數)；不可推薦的組合綜合分數為 -inf
+        """
+        inputs = self.scoring_inputs or self.build_scoring_inputs()
+        prices, stds = inputs['prices'], inputs['stds']
+        n_customers = len(inputs['customer_ids'])
+        
+        for start in range(0, n_customers, SCORING_CHUNK_SIZE):
+            stop = min(start + SCORING_CHUNK_SIZE, n_customers)
+            user_item = inputs['user_item'][start:stop]
+            purchase_counts = inputs['purchase_counts'][start:stop]
+            
+            # 相似度分數 = 已購買產品相似度的平均（用戶-物品矩陣 × 相似度矩陣）
+            score_sum = user_item @ self.product_similarity_matrix.T
+            score_sum = score_sum.toarray() if sparse.issparse(score_sum) else np.asarray(score_sum)
+            base_similarity = score_sum / np.maximum(purchase_counts, 1)[:, None]
+            
+            # 價格匹配度：客戶在產品類別的平均價格與產品平均價格的高斯相似度
+            customer_prices = inputs['price_affinity'][start:stop][:, inputs['category_codes']]
+            with np.errstate(invalid='ignore'):
+                price_diff = np.abs(prices[None, :] - customer_prices)
+                gaussian = np.exp(-0.5 * (price_diff / stds[None, :]) ** 2)
+                use_gaussian = stds[None, :] > 0
+            price_match = np.where(use_gaussian, gaussian, np.where(price_diff == 0, 1.0, 0.5))
+            price_match = np.where(np.isnan(prices)[None, :] | np.isnan(customer_prices), 0.5, price_match)
+            
+            # 排除已購買的產品、已購買相同subcategory的產品，以及沒有購買歷史的客戶
+            purchased = user_item.toarray() > 0
+            purchased_subcategory = (user_item @ inputs['subcategory_onehot']).toarray() > 0
+            same_subcategory = purchased_subcategory[:, inputs['subcategory_codes']] & inputs['known_subcategory'][None, :]
+            eligible = ~purchased & ~same_subcategory & (purchase_counts > 0)[:, None]
+            
+            final_score = np.where(eligible, base_similarity * price_match, -np.inf)
+            yield start, base_similarity, price_match, final_score
+    
     def recommend_products_for_customers(self, top_n=7):
         """為每個活躍客戶推薦活躍產品（包含價格匹配），每個subcategory最多推薦1個產品"""
         print("為活躍客戶推薦活躍產品...")
         
-        recommendations = []
+        inputs = self.build_scoring_inputs()
+        product_ids = inputs['product_ids']
+        customer_ids = inputs['customer_ids']
+        subcategories = inputs['subcategories']
+        subcategory_columns = [
+            np.flatnonzero(inputs['subcategory_codes'] == code) for code in range(len(subcategories))
+        ]
         
-        # 建立產品ID到索引的映射
-        product_ids = list(self.products_df['product_id'])
-        product_id_to_idx = {pid: idx for idx, pid in enumerate(product_ids)}
+        recommendations = []
         
-        for customer_id in self.customer_product_matrix.index:
-            # 獲取客戶已購買的產品
-            purchased_products = self.customer_product_matrix.loc[customer_id]
-            purchased_product_ids = purchased_products[purchased_products > 0].index.tolist()
+        for start, base_similarity, price_match, final_score in self._iter_score_chunks():
+            n_rows = final_score.shape[0]
+            rows = np.arange(n_rows)
             
-            # 獲取客戶已購買產品的subcategory
-            purchased_subcategories = set()
-            for pid in purchased_product_ids:
-                product_info = self.products_df[self.products_df['product_id'] == pid]
-                if not product_info.empty:
-                    subcategory = product_info.iloc[0]['subcategory']
-                    if pd.notna(subcategory) and subcategory != 'unknown':
-                        purchased_subcategories.add(subcategory)
-            
-            # 按subcategory分組計算推薦分數
-            subcategory_recommendations = {}
-            
-            for product_id in product_ids:
-                if product_id in purchased_product_ids:
-                    continue  # 跳過已購買的產品
-                
-                # 檢查產品的subcategory是否已購買過
-                product_info = self.products_df[self.products_df['product_id'] == product_id]
-                if not product_info.empty:
-                    product_subcategory = product_info.iloc[0]['subcategory']
-                    if (pd.notna(product_subcategory) and 
-                        product_subcategory != 'unknown' and 
-                        product_subcategory in purchased_subcategories):
-                        continue  # 跳過相同subcategory的產品
-                    
-                    # 初始化subcategory分組
-                    if product_subcategory not in subcategory_recommendations:
-                        subcategory_recommendations[product_subcategory] = []
-                    
-                if product_id not in product_id_to_idx:
-                    continue
-                    
-                product_idx = product_id_to_idx[product_id]
-                score = 0
-                count = 0
-                
-                # 基於已購買產品的相似度計算推薦分數
-                for purchased_id in purchased_product_ids:
-                    if purchased_id in product_id_to_idx:
-                        purchased_idx = product_id_to_idx[purchased_id]
-                        similarity = self.product_similarity_matrix[product_idx][purchased_idx]
-                        score += similarity
-                        count += 1
-                
-                # 加入價格匹配度
-                price_match = self.calculate_price_similarity(customer_id, product_id)
-                
-                if count > 0:
-                    # 綜合分數：相似度 * 價格匹配度
-                    final_score = (score / count) * price_match
-                    
-                    # 計算詳細分數組成
-                    base_similarity = score / count
-                    
-                    # 加入到對應的subcategory分組
-                    if product_info.iloc[0]['subcategory'] in subcategory_recommendations:
-                        subcategory_recommendations[product_info.iloc[0]['subcategory']].append({
-                            'product_id': product_id,
-                            'final_score': final_score,
-                            'base_similarity': base_similarity,
-                            'price_match': price_match
-                        })
-            
-            # 每個subcategory選出最佳的1個產品
-            subcategory_best = []
-            for subcategory, products in subcategory_recommendations.items():
-                if products:
-                    # 選出該subcategory中分數最高的產品
-                    best_product = max(products, key=lambda x: x['final_score'])
-                    best_product['subcategory'] = subcategory
-                    subcategory_best.append(best_product)
+            # 每個subcategory選出分數最高的1個產品
+            best_products = np.empty((n_rows, len(subcategories)), dtype=int)
+            best_scores = np.empty((n_rows, len(subcategories)))
+            for code, columns in enumerate(subcategory_columns):
+                best = columns[final_score[:, columns].argmax(axis=1)]
+                best_products[:, code] = best
+                best_scores[:, code] = final_score[rows, best]
             
             # 從各subcategory的最佳產品中選出top_n個
-            if subcategory_best:
-                top_products = sorted(subcategory_best, 
-                                    key=lambda x: x['final_score'], reverse=True)[:top_n]
-                
-                for rank, product_data in enumerate(top_products, 1):
+            k = min(top_n, len(subcategories))
+            if k == 0:
+                continue
+            top = np.argpartition(-best_scores, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(best_scores, top, axis=1)
+            order = np.lexsort((top, -top_scores), axis=-1)
+            top = np.take_along_axis(top, order, axis=1)
+            
+            for row in rows:
+                rank = 0
+                for code in top[row]:
+                    if not np.isfinite(best_scores[row, code]):
+                        continue
+                    product = best_products[row, code]
+                    rank += 1
                     recommendations.append({
-                        'customer_id': customer_id,
-                        'recommended_product_id': product_data['product_id'],
+                        'customer_id': customer_ids[start + row],
+                        'recommended_product_id': product_ids[product],
                         'rank': rank,
-                        'similarity_score': round(product_data['base_similarity'], 4),
-                        'price_match_score': round(product_data['price_match'], 4),
-                        'final_score': round(product_data['final_score'], 4),
-                        'subcategory': product_data['subcategory']
+                        'similarity_score': round(float(base_similarity[row, product]), 4),
+                        'price_match_score': round(float(price_match[row, product]), 4),
+                        'final_score': round(float(final_score[row, product]), 4),
+                        'subcategory': subcategories[code]
                     })
         
         customer_recommendations_df = pd.DataFrame(recommendations)
@@ -451,100 +504,54 @@ class RecommendationSystem:
         """為每個活躍產品推薦活躍客戶（包含價格匹配），避免推薦給已購買相同subcategory的客戶"""
         print("為活躍產品推薦活躍客戶...")
         
+        inputs = self.scoring_inputs or self.build_scoring_inputs()
+        product_ids = inputs['product_ids']
+        customer_ids = inputs['customer_ids']
+        
+        # 只為有交易記錄的產品推薦
+        product_idx = pd.Series(np.arange(len(product_ids)), index=product_ids)
+        product_idx = product_idx[~product_idx.index.duplicated()]
+        target_products = product_idx.reindex(self.customer_product_matrix.columns).dropna().astype(int).to_numpy()
+        
+        # 逐塊合併每個產品目前分數最高的 top_n 個客戶
+        best = None
+        for start, base_similarity, price_match, final_score in self._iter_score_chunks():
+            chunk = {
+                'score': final_score[:, target_products],
+                'base': base_similarity[:, target_products],
+                'price': price_match[:, target_products],
+                'customer': np.broadcast_to(
+                    np.arange(start, start + final_score.shape[0])[:, None], (final_score.shape[0], len(target_products))
+                ),
+            }
+            if best is not None:
+                chunk = {key: np.vstack([best[key], chunk[key]]) for key in chunk}
+            
+            k = min(top_n, chunk['score'].shape[0])
+            top = np.argpartition(-chunk['score'], k - 1, axis=0)[:k]
+            best = {key: np.take_along_axis(values, top, axis=0) for key, values in chunk.items()}
+        
         recommendations = []
         
-        for product_id in self.customer_product_matrix.columns:
-            # 獲取已購買該產品的客戶
-            product_customers = self.customer_product_matrix[product_id]
-            purchased_customers = product_customers[product_customers > 0].index.tolist()
-            
-            # 獲取當前產品的subcategory
-            current_product_info = self.products_df[self.products_df['product_id'] == product_id]
-            if current_product_info.empty:
-                continue
-                
-            current_subcategory = current_product_info.iloc[0]['subcategory']
-            
-            # 計算推薦分數
-            recommendation_scores = {}
-            
-            for customer_id in self.customer_product_matrix.index:
-                if customer_id in purchased_customers:
-                    continue  # 跳過已購買的客戶
-                
-                # 獲取客戶的購買歷史
-                customer_products = self.customer_product_matrix.loc[customer_id]
-                customer_purchased = customer_products[customer_products > 0].index.tolist()
-                
-                if not customer_purchased:
-                    continue  # 跳過沒有購買歷史的客戶
-                
-                # 檢查客戶是否已購買過相同subcategory的產品
-                has_same_subcategory = False
-                if pd.notna(current_subcategory) and current_subcategory != 'unknown':
-                    for purchased_id in customer_purchased:
-                        purchased_product_info = self.products_df[self.products_df['product_id'] == purchased_id]
-                        if not purchased_product_info.empty:
-                            purchased_subcategory = purchased_product_info.iloc[0]['subcategory']
-                            if (pd.notna(purchased_subcategory) and 
-                                purchased_subcategory == current_subcategory):
-                                has_same_subcategory = True
-                                break
-                
-                if has_same_subcategory:
-                    continue  # 跳過已購買相同subcategory產品的客戶
-                
-                # 基於產品相似度計算推薦分數
-                if product_id in self.products_df['product_id'].values:
-                    product_idx = list(self.products_df['product_id']).index(product_id)
-                    score = 0
-                    count = 0
-                    
-                    for purchased_id in customer_purchased:
-                        if purchased_id in list(self.products_df['product_id']):
-                            purchased_idx = list(self.products_df['product_id']).index(purchased_id)
-                            similarity = self.product_similarity_matrix[product_idx][purchased_idx]
-                            score += similarity
-                            count += 1
-                    
-                    # 加入價格匹配度
-                    price_match = self.calculate_price_similarity(customer_id, product_id)
-                    
-                    if count > 0:
-                        # 綜合分數：相似度 * 價格匹配度
-                        final_score = (score / count) * price_match
-                        recommendation_scores[customer_id] = final_score
+        if best is not None:
+            # 分數相同時依客戶順序排列
+            order = np.lexsort((best['customer'], -best['score']), axis=0)
+            best = {key: np.take_along_axis(values, order, axis=0) for key, values in best.items()}
             
-            # 選擇top_n個推薦客戶
-            if recommendation_scores:
-                top_customers = sorted(recommendation_scores.items(), 
-                                     key=lambda x: x[1], reverse=True)[:top_n]
-                
-                for rank, (customer_id, score) in enumerate(top_customers, 1):
-                    # 計算詳細分數
-                    customer_products = self.customer_product_matrix.loc[customer_id]
-                    customer_purchased = customer_products[customer_products > 0].index.tolist()
-                    
-                    base_similarity = 0
-                    count = 0
-                    product_idx = list(self.products_df['product_id']).index(product_id)
-                    
-                    for purchased_id in customer_purchased:
-                        if purchased_id in list(self.products_df['product_id']):
-                            purchased_idx = list(self.products_df['product_id']).index(purchased_id)
-                            base_similarity += self.product_similarity_matrix[product_idx][purchased_idx]
-                            count += 1
-                    
-                    base_similarity = base_similarity / count if count > 0 else 0
-                    price_match = self.calculate_price_similarity(customer_id, product_id)
-                    
+            for column, product in enumerate(target_products):
+                rank = 0
+                for row in range(best['score'].shape[0]):
+                    score = best['score'][row, column]
+                    if not np.isfinite(score):
+                        continue
+                    rank += 1
                     recommendations.append({
-                        'product_id': product_id,
-                        'recommended_customer_id': customer_id,
+                        'product_id': product_ids[product],
+                        'recommended_customer_id': customer_ids[best['customer'][row, column]],
                         'rank': rank,
-                        'similarity_score': round(base_similarity, 4),
-                        'price_match_score': round(price_match, 4),
-                        'final_score': round(score, 4)
+                        'similarity_score': round(float(best['base'][row, column]), 4),
+                        'price_match_score': round(float(best['price'][row, column]), 4),
+                        'final_score': round(float(score), 4)
                     })
         
         product_recommendations_df = pd.DataFrame(recommendations)